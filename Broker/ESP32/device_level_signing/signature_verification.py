@@ -1,10 +1,24 @@
 import paho.mqtt.client as mqtt
-import struct
+import argparse
 import csv
 import os
+import sys
 import time
-from nacl.signing import VerifyKey
-from nacl.exceptions import BadSignatureError
+
+# Shared helpers (iotbench/) live at the repo root
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "..", "..")))
+from iotbench.anomaly import JitterDetector
+from iotbench.archive import add_archive_args, archive_from_args
+from iotbench.codec import FLAG_RECORD_BATCH, CodecError, split_frame_meta
+from iotbench.compression import add_decompression_args, decompressor_from_args
+from iotbench.identity import UntrustedKey, add_trust_args, trust_from_args
+from iotbench.metrics import add_metrics_args, metrics_from_args
+from iotbench.profiling import add_profiling_args, stages_from_args
+from iotbench.replay import add_replay_args, replay_from_args
+from iotbench.resources import add_resource_args, resources_from_args
+from iotbench.schemes import add_scheme_args, scheme_from_args
+from iotbench.therm_batch import batch_rows
+from iotbench.tsstore import add_store_args, store_from_args
 
 # --- CONFIGURATION ---
 MQTT_BROKER = "localhost" 
@@ -13,84 +27,193 @@ MAX_LOGS = 10000
 
 # File Setup
 current_dir = os.path.dirname(os.path.abspath(__file__))
-log_file_path = os.path.join(current_dir, "benchmark_results.csv")
+
+parser = argparse.ArgumentParser(description="Verify signed ESP32 thermometer readings.")
+parser.add_argument("--broker", default=MQTT_BROKER)
+parser.add_argument("--port", type=int, default=1883)
+parser.add_argument("--out-dir", default=current_dir, help="where benchmark_results.csv is written")
+parser.add_argument("--max-logs", type=int, default=MAX_LOGS, help="0 = run until interrupted")
+add_scheme_args(parser)
+add_profiling_args(parser)
+add_resource_args(parser)
+add_metrics_args(parser)
+add_decompression_args(parser)
+add_store_args(parser)
+add_replay_args(parser)
+add_archive_args(parser)
+add_trust_args(parser)
+args = parser.parse_args()
+scheme = scheme_from_args(args)
+
+MAX_LOGS = args.max_logs
+os.makedirs(args.out_dir, exist_ok=True)
+log_file_path = os.path.join(args.out_dir, "benchmark_results.csv")
+stages = stages_from_args(args, args.out_dir, prefix="profile_esp32")
+resources = resources_from_args(args, progress=lambda: len(results_buffer))
+registry, metrics, exporter = metrics_from_args(args, topic=TOPIC, device="esp32")
+registry.gauge("queue_depth", lambda: len(results_buffer), "Rows held in memory until the CSV is written.")
+decompressor = decompressor_from_args(args)
+replay = replay_from_args(args)
+archive = archive_from_args(args, stream="esp32", scheme=scheme)
+trust = trust_from_args(args, scheme)
+prepare = trust.prepare if trust else scheme.prepare  # pre-decoded, pinned keys with --trust-store
+if archive:
+    registry.gauge("archive_backlog", lambda: archive.backlog, "Raw payloads waiting for the archive's flush thread.")
+store = store_from_args(args, device="esp32", kind="therm")
+if store:
+    registry.gauge("store_backlog", lambda: store.backlog, "Verified payloads waiting for the store's flush thread.")
 
 # Memory Buffer
 results_buffer = []
+messages = 0  # signed messages; one per row unless the ESP32 batches readings
 failures = 0
+malformed = 0  # payloads the codec rejected before any crypto
+sign_jitter = JitterDetector("SignTime_uS")
+verify_jitter = JitterDetector("VerifyTime_uS")
 
-print(f"Ready. Listening for 10k messages on topic '{TOPIC}'...")
+print(f"Ready. Listening for {MAX_LOGS or 'unlimited'} messages on topic '{TOPIC}' ({scheme.name})...")
 
 def on_message(client, userdata, msg):
-    global failures
+    global messages, failures, malformed
     payload = msg.payload
+    lap = stages.lap()
     
+    # Raw payload to the archive first; with --archive-only proof is left to its audit
+    if archive:
+        archive.append(payload)
+        lap.mark("archive")
+        if archive.deferred:
+            metrics.observe_unverified(len(payload))
+            lap.total("on_message")
+            if MAX_LOGS and archive.appended >= MAX_LOGS:
+                finalize_benchmark(client)
+            return
+
     try:
-        # 1. Slice Payload [msg][sig(64)][pub(32)][time(4)]
-        # Extract SignTime (Last 4 bytes)
-        sign_time_us = struct.unpack('<I', payload[-4:])[0]
-        
-        # Extract Public Key (32 bytes before the time)
-        pub_key_bytes = payload[-36:-4]
-        
-        # Extract Signature (64 bytes before the public key)
-        signature = payload[-100:-36]
-        
-        # Extract Raw Message (Everything else)
-        raw_msg_bytes = payload[:-100]
-        raw_msg_str = raw_msg_bytes.decode('ascii')
+        # 1. Slice Payload [msg][sig(64)][pub(32)][time(4)] (sizes per scheme)
+        frame = scheme.decode_frame(payload)
+        raw_msg_bytes, signature, pub_key_bytes, sign_time_us = frame.data, frame.tag, frame.key, frame.sign_time_us
+        lap.mark("decode")
 
         # 2. Benchmark Verification
         # We use nanoseconds for high precision, then convert to microseconds
         v_start = time.perf_counter_ns()
         
-        is_valid = False
-        try:
-            verify_key = VerifyKey(pub_key_bytes)
-            verify_key.verify(raw_msg_bytes, signature)
-            is_valid = True
-        except BadSignatureError:
-            is_valid = False
-            failures += 1
+        verifier = prepare(pub_key_bytes)
+        lap.mark("key_decode")
+        is_valid = scheme.verify_prepared(verifier, raw_msg_bytes, signature)
         
         v_end = time.perf_counter_ns()
         verify_time_us = (v_end - v_start) / 1000
+        lap.mark("verify")
+
+        # A replayed payload verifies too; drop it before it is counted or stored
+        is_replay = is_valid and replay is not None and replay.seen(frame)
+        lap.mark("replay")
+        if is_replay:
+            metrics.observe_replay(len(payload))
+            return
+
+        # Decompress after verifying (pass-through unless the producer used --compress);
+        # --sequence payloads carry a signed (timestamp, seq) ahead of the message
+        _, _, raw_msg_bytes = split_frame_meta(frame)
+        raw_msg_bytes = decompressor.decompress_verified(frame.flags, raw_msg_bytes, is_valid)
+        lap.mark("decompress")
+
+        # One ASCII reading, or K binary readings expanded to the same text;
+        # a payload that failed verification is logged as hex, never parsed
+        if not is_valid:
+            readings = [bytes(raw_msg_bytes).hex()]
+            failures += 1
+        elif frame.flags & FLAG_RECORD_BATCH:
+            readings = [reading for _, reading in batch_rows(raw_msg_bytes)]
+        else:
+            readings = [bytes(raw_msg_bytes).decode('ascii')]
+        lap.mark("expand")
+
+        # Verified payloads go to the store; its flush thread decodes and writes them
+        if store and is_valid:
+            store.append(time.time_ns() // 1000, raw_msg_bytes, frame.flags)
+        lap.mark("store")
+
+        # 3. Anomaly Tracking (O(1), safe in the hot path)
+        for event in sign_jitter.update(sign_time_us) + verify_jitter.update(verify_time_us):
+            if event.kind == "changepoint":
+                print(f"Changepoint at #{event.index}: {event.detail}")
+        lap.mark("anomaly")
 
-        # 3. Store in Buffer
+        # 4. Store in Buffer (one row per reading; Batch/Reading locate it in its message)
         entry_number = len(results_buffer)
-        results_buffer.append([entry_number, raw_msg_str, sign_time_us, f"{verify_time_us:.2f}", is_valid])
+        batch = len(readings)
+        results_buffer.extend([entry_number + i, reading, sign_time_us, f"{verify_time_us:.2f}", is_valid, batch, i]
+                              for i, reading in enumerate(readings))
+        messages += 1
+        metrics.observe(len(payload), verify_time_us, sign_time_us, is_valid)
+        lap.mark("buffer")
 
-        # 4. Progress Tracking
-        if len(results_buffer) % 500 == 0:
+        # 5. Progress Tracking
+        if len(results_buffer) // 500 != entry_number // 500:
             print(f"Collected: {len(results_buffer)}/{MAX_LOGS} | Current Failures: {failures}")
+        lap.mark("progress")
+        lap.total("on_message")
 
-        # 5. Completion Logic
-        if len(results_buffer) >= MAX_LOGS:
+        # 6. Completion Logic
+        if MAX_LOGS and len(results_buffer) >= MAX_LOGS:
             finalize_benchmark(client)
             
+    except UntrustedKey:
+        metrics.observe_untrusted(len(payload))  # counted in trust.rejected; no crypto spent
+    except CodecError as e:
+        malformed += 1
+        metrics.observe_malformed(len(payload))
+        print(f"Malformed payload: {e}")
     except Exception as e:
         print(f"Error parsing payload: {e}")
 
 def finalize_benchmark(client):
     print("\nBenchmark Complete! Writing to file...")
+    lap = stages.lap()
     
     with open(log_file_path, 'w', newline='') as f:
         writer = csv.writer(f)
-        writer.writerow(["Entry", "Message", "SignTime_uS", "VerifyTime_uS", "Valid"])
+        writer.writerow(["Entry", "Message", "SignTime_uS", "VerifyTime_uS", "Valid", "Batch", "Reading"])
         writer.writerows(results_buffer)
+    lap.mark("csv_write")
     
-    # Calculate Stats
+    # Calculate Stats (per signed message: each batch row carries 1/Batch of its timings)
     total = len(results_buffer)
-    fail_rate = (failures / total) * 100
-    avg_sign = sum(row[2] for row in results_buffer) / total
-    avg_verify = sum(float(row[3]) for row in results_buffer) / total
+    fail_rate = (failures / messages) * 100 if messages else 0
+    avg_sign = sum(row[2] / row[5] for row in results_buffer) / messages if messages else 0
+    avg_verify = sum(float(row[3]) / row[5] for row in results_buffer) / messages if messages else 0
 
     print("--- RESULTS ---")
-    print(f"Total Messages:  {total}")
+    print(f"Total Messages:  {messages}")
+    if total != messages:
+        print(f"Total Readings:  {total} ({total / messages:.1f} per message)")
     print(f"Failure Rate:    {fail_rate:.2f}%")
+    print(f"Malformed:       {malformed}")
+    if replay:
+        replay.report()
+    if trust:
+        trust.report()
     print(f"Avg Sign Time:   {avg_sign:.2f} us")
     print(f"Avg Verify Time: {avg_verify:.2f} us")
     print(f"File Saved:      {log_file_path}")
+    sign_jitter.report()
+    verify_jitter.report()
+    stages.report()
+    stages.write_csv(os.path.join(args.out_dir, "stage_timings.csv"),
+                     os.path.join(args.out_dir, "stage_histograms.csv"))
+    if resources:
+        resources.finish(args.out_dir)
+    if archive:
+        archive.close()
+        archive.report()
+    if store:
+        store.close()
+        print(f"Stored:          {store.written} records in {store.path} ({store.rejected} rejected)")
+    if exporter:
+        exporter.stop()
     
     client.disconnect()
 
@@ -99,8 +222,12 @@ client = mqtt.Client()
 client.on_message = on_message
 
 try:
-    client.connect(MQTT_BROKER, 1883)
+    client.connect(args.broker, args.port)
     client.subscribe(TOPIC)
     client.loop_forever()
 except KeyboardInterrupt:
-    print("\nStopped by user. Data not saved.")
\ No newline at end of file
+    if results_buffer or (archive and archive.appended):
+        print("\nStopped by user. Saving what was collected...")
+        finalize_benchmark(client)
+    else:
+        print("\nStopped by user. No data collected.")
\ No newline at end of file
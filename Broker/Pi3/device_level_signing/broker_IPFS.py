@@ -1,9 +1,24 @@
 import paho.mqtt.client as mqtt
-import struct
+import argparse
 import csv
 import os
 import time
-import subprocess
+import sys
+
+# Shared helpers (iotbench/) live at the repo root
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "..", "..")))
+from iotbench.anomaly import JitterDetector
+from iotbench.archive import add_archive_args, archive_from_args
+from iotbench.blockstore import add_blockstore_args, blockstore_from_args
+from iotbench.codec import CodecError, split_frame_meta
+from iotbench.cid import find_ipfs_exe
+from iotbench.compression import add_decompression_args, decompressor_from_args
+from iotbench.metrics import add_metrics_args, metrics_from_args
+from iotbench.profiling import add_profiling_args, stages_from_args
+from iotbench.replay import add_replay_args, replay_from_args
+from iotbench.resources import add_resource_args, resources_from_args
+from iotbench.schemes import add_scheme_args, scheme_from_args
+from iotbench.tsstore import add_store_args, store_from_args
 
 # --- CONFIGURATION ---
 MQTT_BROKER = "localhost"
@@ -13,6 +28,29 @@ IPFS_EXE = r"C:\Users\green\kubo\kubo\ipfs.exe"
 
 # --- FILE SETUP ---
 current_dir = os.path.dirname(os.path.abspath(__file__))
+
+parser = argparse.ArgumentParser(description="Verify CID-tagged Pi 3 LED frames.")
+parser.add_argument("--broker", default=MQTT_BROKER)
+parser.add_argument("--port", type=int, default=1883)
+parser.add_argument("--out-dir", default=current_dir, help="where benchmark_pi_results_N.csv is written")
+parser.add_argument("--max-logs", type=int, default=MAX_LOGS, help="0 = run until interrupted")
+parser.add_argument("--ipfs-exe", default=IPFS_EXE, help="kubo binary; falls back to in-process CIDs if missing")
+add_scheme_args(parser, default="cid")
+add_profiling_args(parser)
+add_resource_args(parser)
+add_metrics_args(parser)
+add_decompression_args(parser)
+add_store_args(parser)
+add_replay_args(parser)
+add_archive_args(parser)
+add_blockstore_args(parser)
+args = parser.parse_args()
+
+MAX_LOGS = args.max_logs
+IPFS_EXE = find_ipfs_exe(args.ipfs_exe)
+scheme = scheme_from_args(args, ipfs_exe=IPFS_EXE)
+current_dir = args.out_dir
+os.makedirs(current_dir, exist_ok=True)
 base_filename = "benchmark_pi_results"
 extension = ".csv"
 counter = 1
@@ -21,90 +59,125 @@ while os.path.exists(os.path.join(current_dir, f"{base_filename}_{counter}{exten
     counter += 1
 
 log_file_path = os.path.join(current_dir, f"{base_filename}_{counter}{extension}")
+stages = stages_from_args(args, current_dir, prefix=f"profile_pi_{counter}")
+resources = resources_from_args(args, progress=lambda: len(results_buffer))
+registry, metrics, exporter = metrics_from_args(args, topic=TOPIC, device="pi3")
+registry.gauge("queue_depth", lambda: len(results_buffer), "Rows held in memory until the CSV is written.")
+decompressor = decompressor_from_args(args)
+replay = replay_from_args(args)
+archive = archive_from_args(args, stream="pi3", scheme=scheme)
+if archive:
+    registry.gauge("archive_backlog", lambda: archive.backlog, "Raw payloads waiting for the archive's flush thread.")
+store = store_from_args(args, device="pi3", kind="light")
+if store:
+    registry.gauge("store_backlog", lambda: store.backlog, "Verified payloads waiting for the store's flush thread.")
+blocks = blockstore_from_args(args, stream=f"light_{counter}")
+if blocks:
+    registry.gauge("blockstore_backlog", lambda: blocks.backlog, "Verified frames waiting for the blockstore's flush thread.")
 
 results_buffer = []
 failures = 0
+malformed = 0  # payloads the codec rejected before any crypto
+sign_jitter = JitterDetector("HashTime_uS")
+verify_jitter = JitterDetector("VerifyTime_uS")
 
 print(f"Logging to: {log_file_path}")
+print(f"CID backend: {IPFS_EXE or 'in-process (kubo not found)'}")
 print(f"Ready. Listening for light data on '{TOPIC}'...")
 
-def ipfs_only_hash(data_bytes: bytes) -> str:
-    """
-    Returns CID (v1) for data_bytes without storing it.
-    Requires local IPFS daemon and `ipfs` CLI on PATH.
-    """
-    try:
-        result = subprocess.run(
-            [IPFS_EXE, "add", "-q", "--only-hash", "--cid-version=1", "--raw-leaves", "-"],
-            input=data_bytes,
-            stdout=subprocess.PIPE,
-            stderr=subprocess.PIPE,
-            check=True
-        )
-        return result.stdout.decode("utf-8").strip()
-    except subprocess.CalledProcessError as e:
-        print(f"[IPFS ERROR] {e.stderr.decode('utf-8', errors='ignore').strip()}")
-        return ""
-
 def on_message(client, userdata, msg):
-    global failures
+    global failures, malformed
     payload = msg.payload
+    lap = stages.lap()
+    
+    # Raw payload to the archive first; with --archive-only proof is left to its audit
+    if archive:
+        archive.append(payload)
+        lap.mark("archive")
+        if archive.deferred:
+            metrics.observe_unverified(len(payload))
+            lap.total("on_message")
+            if MAX_LOGS and archive.appended >= MAX_LOGS:
+                finalize_benchmark(client)
+            return
 
     try:
         # Structure: [Data][CID][CID_LEN(2)][Time(4)]
-        if len(payload) < 6:
-            raise ValueError("Payload too short to contain CID_LEN + Time.")
-
-        sign_time_us = struct.unpack('<I', payload[-4:])[0]
-        cid_len = struct.unpack('<H', payload[-6:-4])[0]
-
-        if cid_len <= 0:
-            raise ValueError("CID length invalid.")
-
-        cid_start = len(payload) - 4 - 2 - cid_len
-        if cid_start < 0:
-            raise ValueError("CID length exceeds payload size.")
-
-        cid_bytes = payload[cid_start:cid_start + cid_len]
-        raw_msg_bytes = payload[:cid_start]
-
-        # Convert binary LED data to Hex for readable CSV logging
-        raw_msg_hex = raw_msg_bytes.hex()[:20] + "..."
+        # Footer layout and length checks live in the scheme
+        frame = scheme.decode_frame(payload)
+        raw_msg_bytes, cid_bytes, _, sign_time_us = frame.data, frame.tag, frame.key, frame.sign_time_us
+        lap.mark("decode")
 
         # Benchmark Verification (CID recompute)
         v_start = time.perf_counter_ns()
 
-        is_valid = False
-        computed_cid = ipfs_only_hash(raw_msg_bytes)
-        if computed_cid and computed_cid.encode("utf-8") == cid_bytes:
-            is_valid = True
-        else:
+        is_valid = scheme.verify(raw_msg_bytes, cid_bytes)
+        if not is_valid:
             failures += 1
 
         v_end = time.perf_counter_ns()
         verify_time_us = (v_end - v_start) / 1000
+        lap.mark("verify")
+
+        # A replayed payload verifies too; drop it before it is counted or stored
+        is_replay = is_valid and replay is not None and replay.seen(frame)
+        lap.mark("replay")
+        if is_replay:
+            metrics.observe_replay(len(payload))
+            return
+
+        # Decompress after verifying (pass-through unless the producer used --compress);
+        # --sequence payloads carry a signed (timestamp, seq) ahead of the message
+        _, _, raw_msg_bytes = split_frame_meta(frame)
+        raw_msg_bytes = decompressor.decompress_verified(frame.flags, raw_msg_bytes, is_valid)
+        # Convert binary LED data to Hex for readable CSV logging
+        raw_msg_hex = raw_msg_bytes.hex()[:20] + "..."
+        lap.mark("decompress")
+
+        # Verified payloads go to the store; its flush thread decodes and writes them
+        if store and is_valid:
+            store.append(time.time_ns() // 1000, raw_msg_bytes, frame.flags)
+        if blocks and is_valid:
+            blocks.put(raw_msg_bytes)
+        lap.mark("store")
+
+        # Anomaly Tracking
+        for event in sign_jitter.update(sign_time_us) + verify_jitter.update(verify_time_us):
+            if event.kind == "changepoint":
+                print(f"Changepoint at #{event.index}: {event.detail}")
+        lap.mark("anomaly")
 
         # Store in Buffer
         entry_number = len(results_buffer)
         results_buffer.append([entry_number, raw_msg_hex, sign_time_us, f"{verify_time_us:.2f}", is_valid])
+        metrics.observe(len(payload), verify_time_us, sign_time_us, is_valid)
+        lap.mark("buffer")
 
         # Progress Indicator
         if len(results_buffer) % 100 == 0:
             print(f"Collected: {len(results_buffer)}/{MAX_LOGS} | Failures: {failures}")
+        lap.mark("progress")
+        lap.total("on_message")
 
-        if len(results_buffer) >= MAX_LOGS:
+        if MAX_LOGS and len(results_buffer) >= MAX_LOGS:
             finalize_benchmark(client)
 
+    except CodecError as e:
+        malformed += 1
+        metrics.observe_malformed(len(payload))
+        print(f"Malformed payload: {e}")
     except Exception as e:
         print(f"Error parsing payload: {e}")
 
 def finalize_benchmark(client):
     print("\nBenchmark Complete! Writing to file...")
+    lap = stages.lap()
 
     with open(log_file_path, 'w', newline='') as f:
         writer = csv.writer(f)
         writer.writerow(["Entry", "MessageHex", "SignTime_uS", "VerifyTime_uS", "Valid"])
         writer.writerows(results_buffer)
+    lap.mark("csv_write")
 
     total = len(results_buffer)
     fail_rate = (failures / total) * 100 if total > 0 else 0
@@ -114,8 +187,28 @@ def finalize_benchmark(client):
     print("--- RESULTS (Pi 3 vs Laptop) ---")
     print(f"Total Messages:  {total}")
     print(f"Failure Rate:    {fail_rate:.2f}%")
+    print(f"Malformed:       {malformed}")
+    if replay:
+        replay.report()
     print(f"Avg Sign Time:   {avg_sign:.2f} us (Pi 3)")
     print(f"Avg Verify Time: {avg_verify:.2f} us (Laptop)")
+    sign_jitter.report()
+    verify_jitter.report()
+    stages.report()
+    stages.write_csv(os.path.join(current_dir, f"stage_timings_pi_{counter}.csv"),
+                     os.path.join(current_dir, f"stage_histograms_pi_{counter}.csv"))
+    if resources:
+        resources.finish(current_dir, f"pi_{counter}")
+    if archive:
+        archive.close()
+        archive.report()
+    if store:
+        store.close()
+        print(f"Stored:          {store.written} records in {store.path} ({store.rejected} rejected)")
+    if blocks:
+        blocks.report(blocks.close())
+    if exporter:
+        exporter.stop()
 
     client.disconnect()
     os._exit(0)
@@ -125,10 +218,12 @@ client = mqtt.Client()
 client.on_message = on_message
 
 try:
-    client.connect(MQTT_BROKER, 1883)
+    client.connect(args.broker, args.port)
     client.subscribe(TOPIC)
     client.loop_forever()
 except KeyboardInterrupt:
     print("\nStopped by user.")
+    if results_buffer or (archive and archive.appended):
+        finalize_benchmark(client)
 except ConnectionRefusedError:
     print("Error: Could not connect to MQTT Broker. Is Mosquitto running?")
\ No newline at end of file
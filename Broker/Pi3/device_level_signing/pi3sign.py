@@ -1,10 +1,23 @@
 import paho.mqtt.client as mqtt
-import struct
+import argparse
 import csv
 import os
+import sys
 import time
-from nacl.signing import VerifyKey
-from nacl.exceptions import BadSignatureError
+
+# Shared helpers (iotbench/) live at the repo root
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "..", "..")))
+from iotbench.anomaly import JitterDetector
+from iotbench.archive import add_archive_args, archive_from_args
+from iotbench.codec import CodecError, split_frame_meta
+from iotbench.compression import add_decompression_args, decompressor_from_args
+from iotbench.identity import UntrustedKey, add_trust_args, trust_from_args
+from iotbench.metrics import add_metrics_args, metrics_from_args
+from iotbench.profiling import add_profiling_args, stages_from_args
+from iotbench.replay import add_replay_args, replay_from_args
+from iotbench.resources import add_resource_args, resources_from_args
+from iotbench.schemes import add_scheme_args, scheme_from_args
+from iotbench.tsstore import add_store_args, store_from_args
 
 # --- CONFIGURATION ---
 # Since this runs ON the laptop (where the broker is), use localhost
@@ -16,6 +29,27 @@ MAX_LOGS = 5000
 # File Setup
 # --- FILE SETUP ---
 current_dir = os.path.dirname(os.path.abspath(__file__))
+
+parser = argparse.ArgumentParser(description="Verify signed Pi 3 LED frames.")
+parser.add_argument("--broker", default=MQTT_BROKER)
+parser.add_argument("--port", type=int, default=1883)
+parser.add_argument("--out-dir", default=current_dir, help="where benchmark_pi_results_N.csv is written")
+parser.add_argument("--max-logs", type=int, default=MAX_LOGS, help="0 = run until interrupted")
+add_scheme_args(parser)
+add_profiling_args(parser)
+add_resource_args(parser)
+add_metrics_args(parser)
+add_decompression_args(parser)
+add_store_args(parser)
+add_replay_args(parser)
+add_archive_args(parser)
+add_trust_args(parser)
+args = parser.parse_args()
+scheme = scheme_from_args(args)
+
+MAX_LOGS = args.max_logs
+current_dir = args.out_dir
+os.makedirs(current_dir, exist_ok=True)
 base_filename = "benchmark_pi_results"
 extension = ".csv"
 counter = 1
@@ -25,69 +59,129 @@ while os.path.exists(os.path.join(current_dir, f"{base_filename}_{counter}{exten
     counter += 1
 
 log_file_path = os.path.join(current_dir, f"{base_filename}_{counter}{extension}")
+stages = stages_from_args(args, current_dir, prefix=f"profile_pi_{counter}")
+resources = resources_from_args(args, progress=lambda: len(results_buffer))
+registry, metrics, exporter = metrics_from_args(args, topic=TOPIC, device="pi3")
+registry.gauge("queue_depth", lambda: len(results_buffer), "Rows held in memory until the CSV is written.")
+decompressor = decompressor_from_args(args)
+replay = replay_from_args(args)
+archive = archive_from_args(args, stream="pi3", scheme=scheme)
+trust = trust_from_args(args, scheme)
+prepare = trust.prepare if trust else scheme.prepare  # pre-decoded, pinned keys with --trust-store
+if archive:
+    registry.gauge("archive_backlog", lambda: archive.backlog, "Raw payloads waiting for the archive's flush thread.")
+store = store_from_args(args, device="pi3", kind="light")
+if store:
+    registry.gauge("store_backlog", lambda: store.backlog, "Verified payloads waiting for the store's flush thread.")
 
 results_buffer = []
 failures = 0
+malformed = 0  # payloads the codec rejected before any crypto
+sign_jitter = JitterDetector("SignTime_uS")
+verify_jitter = JitterDetector("VerifyTime_uS")
 
 print(f"Logging to: {log_file_path}")
-print(f"Ready. Listening for light data on '{TOPIC}'...")
+print(f"Ready. Listening for light data on '{TOPIC}' ({scheme.name})...")
 
 def on_message(client, userdata, msg):
-    global failures
+    global failures, malformed
     payload = msg.payload
+    lap = stages.lap()
     
+    # Raw payload to the archive first; with --archive-only proof is left to its audit
+    if archive:
+        archive.append(payload)
+        lap.mark("archive")
+        if archive.deferred:
+            metrics.observe_unverified(len(payload))
+            lap.total("on_message")
+            if MAX_LOGS and archive.appended >= MAX_LOGS:
+                finalize_benchmark(client)
+            return
+
     try:
-        # Structure: [Data] [Sig(64)] [Pub(32)] [Time(4)]
+        # Structure: [Data] [Sig(64)] [Pub(32)] [Time(4)] for ed25519,
+        # other schemes differ only in the tag/key sizes
         
-        # 1. Extract Footer (Last 100 bytes)
-        sign_time_us = struct.unpack('<I', payload[-4:])[0]
-        pub_key_bytes = payload[-36:-4]
-        signature = payload[-100:-36]
-        
-        # 2. Extract Data (Everything before the footer)
-        raw_msg_bytes = payload[:-100]
-        
-        # Convert binary LED data to Hex for readable CSV logging
-        # We only log the first 20 chars to keep the CSV file size manageable
-        raw_msg_hex = raw_msg_bytes.hex()[:20] + "..."
+        # 1 + 2. Split Footer and Data
+        frame = scheme.decode_frame(payload)
+        raw_msg_bytes, signature, pub_key_bytes, sign_time_us = frame.data, frame.tag, frame.key, frame.sign_time_us
+        lap.mark("decode")
 
         # 3. Benchmark Verification
         v_start = time.perf_counter_ns()
         
-        is_valid = False
-        try:
-            # Recreate the key from the bytes sent in the packet
-            verify_key = VerifyKey(pub_key_bytes)
-            verify_key.verify(raw_msg_bytes, signature)
-            is_valid = True
-        except BadSignatureError:
-            is_valid = False
+        # Ed25519 recreates the key from the bytes sent in the packet (looked up with --trust-store)
+        verifier = prepare(pub_key_bytes)
+        lap.mark("key_decode")
+        is_valid = scheme.verify_prepared(verifier, raw_msg_bytes, signature)
+        if not is_valid:
             failures += 1
         
         v_end = time.perf_counter_ns()
         verify_time_us = (v_end - v_start) / 1000
+        lap.mark("verify")
+
+        # A replayed payload verifies too; drop it before it is counted or stored
+        is_replay = is_valid and replay is not None and replay.seen(frame)
+        lap.mark("replay")
+        if is_replay:
+            metrics.observe_replay(len(payload))
+            return
+
+        # Decompress after verifying (pass-through unless the producer used --compress);
+        # --sequence payloads carry a signed (timestamp, seq) ahead of the message
+        _, _, raw_msg_bytes = split_frame_meta(frame)
+        raw_msg_bytes = decompressor.decompress_verified(frame.flags, raw_msg_bytes, is_valid)
+        # Convert binary LED data to Hex for readable CSV logging
+        # We only log the first 20 chars to keep the CSV file size manageable
+        raw_msg_hex = raw_msg_bytes.hex()[:20] + "..."
+        lap.mark("decompress")
+
+        # Verified payloads go to the store; its flush thread decodes and writes them
+        if store and is_valid:
+            store.append(time.time_ns() // 1000, raw_msg_bytes, frame.flags)
+        lap.mark("store")
+
+        # 4. Anomaly Tracking
+        for event in sign_jitter.update(sign_time_us) + verify_jitter.update(verify_time_us):
+            if event.kind == "changepoint":
+                print(f"Changepoint at #{event.index}: {event.detail}")
+        lap.mark("anomaly")
 
-        # 4. Store in Buffer
+        # 5. Store in Buffer
         entry_number = len(results_buffer)
         results_buffer.append([entry_number, raw_msg_hex, sign_time_us, f"{verify_time_us:.2f}", is_valid])
+        metrics.observe(len(payload), verify_time_us, sign_time_us, is_valid)
+        lap.mark("buffer")
 
         # Progress Indicator
         if len(results_buffer) % 100 == 0:
             print(f"Collected: {len(results_buffer)}/{MAX_LOGS} | Failures: {failures}")
+        lap.mark("progress")
+        lap.total("on_message")
 
-        if len(results_buffer) >= MAX_LOGS:
+        if MAX_LOGS and len(results_buffer) >= MAX_LOGS:
             finalize_benchmark(client)
             
+    except UntrustedKey:
+        metrics.observe_untrusted(len(payload))  # counted in trust.rejected; no crypto spent
+    except CodecError as e:
+        malformed += 1
+        metrics.observe_malformed(len(payload))
+        print(f"Malformed payload: {e}")
     except Exception as e:
         print(f"Error parsing payload: {e}")
 
 def finalize_benchmark(client):
     print("\nBenchmark Complete! Writing to file...")
+    lap = stages.lap()
     
     with open(log_file_path, 'w', newline='') as f:
         writer = csv.writer(f)
         writer.writerow(["Entry", "MessageHex", "SignTime_uS", "VerifyTime_uS", "Valid"])
         writer.writerows(results_buffer)
+    lap.mark("csv_write")
     
     total = len(results_buffer)
     fail_rate = (failures / total) * 100 if total > 0 else 0
@@ -97,8 +191,28 @@ def finalize_benchmark(client):
     print("--- RESULTS (Pi 3 vs Laptop) ---")
     print(f"Total Messages:  {total}")
     print(f"Failure Rate:    {fail_rate:.2f}%")
+    print(f"Malformed:       {malformed}")
+    if replay:
+        replay.report()
+    if trust:
+        trust.report()
     print(f"Avg Sign Time:   {avg_sign:.2f} us (Pi 3)")
     print(f"Avg Verify Time: {avg_verify:.2f} us (Laptop)")
+    sign_jitter.report()
+    verify_jitter.report()
+    stages.report()
+    stages.write_csv(os.path.join(current_dir, f"stage_timings_pi_{counter}.csv"),
+                     os.path.join(current_dir, f"stage_histograms_pi_{counter}.csv"))
+    if resources:
+        resources.finish(current_dir, f"pi_{counter}")
+    if archive:
+        archive.close()
+        archive.report()
+    if store:
+        store.close()
+        print(f"Stored:          {store.written} records in {store.path} ({store.rejected} rejected)")
+    if exporter:
+        exporter.stop()
     
     client.disconnect()
     os._exit(0) # Force exit to stop the loop
@@ -108,10 +222,12 @@ client = mqtt.Client()
 client.on_message = on_message
 
 try:
-    client.connect(MQTT_BROKER, 1883)
+    client.connect(args.broker, args.port)
     client.subscribe(TOPIC)
     client.loop_forever()
 except KeyboardInterrupt:
     print("\nStopped by user.")
+    if results_buffer or (archive and archive.appended):
+        finalize_benchmark(client)
 except ConnectionRefusedError:
     print("Error: Could not connect to MQTT Broker. Is Mosquitto running?")
\ No newline at end of file
@@ -2,15 +2,25 @@
 # NeoPixel library strandtest example with MQTT, Ed25519 Signing, and Stress-Testing
 # Developed for IoT Data Integrity Benchmark
 
-import time
 import argparse
 import struct
-import subprocess
 import os
-import signal
+import sys
 import paho.mqtt.client as mqtt
-from rpi_ws281x import *
-from nacl.signing import SigningKey
+
+# Shared helpers (iotbench/) live at the repo root
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "..", "..")))
+from iotbench.compression import Compressor, add_compression_args, compressor_from_args
+from iotbench.identity import add_identity_args, signing_key_from_args
+from iotbench.pacing import FramePacer, add_pacing_args, pacer_from_args
+from iotbench.profiling import StageTimer, add_profiling_args, stages_from_args
+from iotbench.resources import add_resource_args, resources_from_args
+from iotbench.schemes import add_scheme_args, get_scheme, scheme_from_args
+from iotbench.stress import start_stress_test, stop_stress_test
+try:
+    from rpi_ws281x import *
+except ImportError:  # no LED library here: drive the mock strip
+    from iotbench.ledstrip import Adafruit_NeoPixel, Color
 
 # --- CONFIGURATION ---
 MQTT_BROKER = "laptop.local"  # <--- CHANGE THIS TO YOUR LAPTOP IP
@@ -24,36 +34,16 @@ LED_INVERT = False
 LED_CHANNEL = 0
 
 # --- STRESS TESTING SETUP ---
+# Pi 3B+ has 4 cores. We stress all 4 at the target load percentage.
+STRESS_WORKERS = 4
 stress_process = None
 
-def start_stress_test(cpu_load=50):
-    """Starts stress-ng in the background to simulate heavy system load."""
-    global stress_process
-    print(f"--- STARTING STRESS TEST: {cpu_load}% CPU LOAD ---")
-    # Pi 3B+ has 4 cores. We stress all 4 at the target load percentage.
-    stress_command = [
-        "stress-ng",
-        "--cpu", "4",
-        "--cpu-load", str(cpu_load),
-        "--quiet"
-    ]
-    # Use os.setsid to ensure we can kill the entire process group later
-    stress_process = subprocess.Popen(stress_command, preexec_fn=os.setsid)
-
-def stop_stress_test():
-    """Cleanly terminates the stress-ng background process."""
-    global stress_process
-    if stress_process:
-        print("--- STOPPING STRESS TEST ---")
-        try:
-            os.killpg(os.getpgid(stress_process.pid), signal.SIGTERM)
-        except ProcessLookupError:
-            pass
-
 # --- CRYPTO & MQTT SETUP ---
-signing_key = SigningKey.generate()
-verify_key = signing_key.verify_key
-pub_key_bytes = verify_key.encode()
+# Fresh Ed25519 key pair by default; --scheme or --device-key swaps it at startup
+scheme = get_scheme("ed25519", generate=True)
+stages = StageTimer(enabled=False)  # --stage-timers enables it at startup
+compressor = Compressor("none")  # --compress picks a codec at startup
+pacer = FramePacer()  # --pacing picks the frame timing at startup
 
 client = mqtt.Client()
 
@@ -70,34 +60,42 @@ except Exception as e:
 # --- THE INTERCEPTOR FUNCTION ---
 def sign_and_show(strip):
     """Captures LED state, signs it, sends it to MQTT, then updates physical LEDs."""
+    lap = stages.lap()
+
     # 1. CAPTURE
     pixel_data = [strip.getPixelColor(i) for i in range(strip.numPixels())]
+    lap.mark("capture")
 
     # 2. PACK
     msg_bytes = struct.pack(f'<{strip.numPixels()}I', *pixel_data)
+    lap.mark("pack")
+
+    # 2b. COMPRESS (pass-through unless --compress); the tag covers the compressed bytes
+    msg_bytes = compressor.compress(msg_bytes)
+    lap.mark("compress")
 
-    # 3. SIGN & BENCHMARK
-    start_time = time.perf_counter()
-    signed_obj = signing_key.sign(msg_bytes)
-    signature = signed_obj.signature
-    sign_time_us = int((time.perf_counter() - start_time) * 1_000_000)
+    # 3. SIGN & BENCHMARK (duration in Microseconds)
+    signature, sign_time_us = scheme.timed_tag(msg_bytes)
+    lap.mark("sign")
 
     # 4. CONSTRUCT PAYLOAD: [Data] [Sig] [Pub] [Time]
-    time_bytes = struct.pack('<I', sign_time_us)
-    full_payload = msg_bytes + signature + pub_key_bytes + time_bytes
+    full_payload = scheme.encode(msg_bytes, signature, sign_time_us, compressor.flags)
+    lap.mark("encode")
 
     # 5. PUBLISH
     client.publish(MQTT_TOPIC, full_payload)
+    lap.mark("publish")
 
     # 6. PHYSICAL UPDATE
     strip.show()
+    lap.mark("show")
 
 # --- ANIMATION FUNCTIONS ---
 def colorWipe(strip, color, wait_ms=50):
     for i in range(strip.numPixels()):
         strip.setPixelColor(i, color)
         sign_and_show(strip)
-        time.sleep(wait_ms/1000.0)
+        pacer.wait("colorWipe", wait_ms)
 
 def theaterChase(strip, color, wait_ms=50, iterations=10):
     for j in range(iterations):
@@ -105,7 +103,7 @@ def theaterChase(strip, color, wait_ms=50, iterations=10):
             for i in range(0, strip.numPixels(), 3):
                 strip.setPixelColor(i+q, color)
             sign_and_show(strip)
-            time.sleep(wait_ms/1000.0)
+            pacer.wait("theaterChase", wait_ms)
             for i in range(0, strip.numPixels(), 3):
                 strip.setPixelColor(i+q, 0)
 
@@ -124,14 +122,14 @@ def rainbow(strip, wait_ms=20, iterations=1):
         for i in range(strip.numPixels()):
             strip.setPixelColor(i, wheel((i+j) & 255))
         sign_and_show(strip)
-        time.sleep(wait_ms/1000.0)
+        pacer.wait("rainbow", wait_ms)
 
 def rainbowCycle(strip, wait_ms=20, iterations=5):
     for j in range(256*iterations):
         for i in range(strip.numPixels()):
             strip.setPixelColor(i, wheel((int(i * 256 / strip.numPixels()) + j) & 255))
         sign_and_show(strip)
-        time.sleep(wait_ms/1000.0)
+        pacer.wait("rainbowCycle", wait_ms)
 
 def theaterChaseRainbow(strip, wait_ms=50):
     for j in range(256):
@@ -139,7 +137,7 @@ def theaterChaseRainbow(strip, wait_ms=50):
             for i in range(0, strip.numPixels(), 3):
                 strip.setPixelColor(i+q, wheel((i+j) % 255))
             sign_and_show(strip)
-            time.sleep(wait_ms/1000.0)
+            pacer.wait("theaterChaseRainbow", wait_ms)
             for i in range(0, strip.numPixels(), 3):
                 strip.setPixelColor(i+q, 0)
 
@@ -148,14 +146,28 @@ if __name__ == '__main__':
     parser = argparse.ArgumentParser()
     parser.add_argument('-c', '--clear', action='store_true', help='clear the display on exit')
     parser.add_argument('-s', '--stress', type=int, default=0, help='CPU load percentage (0-100)')
+    add_scheme_args(parser)
+    add_profiling_args(parser)
+    add_resource_args(parser)
+    add_compression_args(parser)
+    add_pacing_args(parser)
+    add_identity_args(parser)
     args = parser.parse_args()
+    scheme = scheme_from_args(args, generate=True, signing_key=signing_key_from_args(args))
+    compressor = compressor_from_args(args)
+    pacer = pacer_from_args(args)
+    if args.mock_leds:
+        from iotbench.ledstrip import Adafruit_NeoPixel
+    out_dir = os.path.dirname(os.path.abspath(__file__))
+    stages = stages_from_args(args, out_dir, prefix="profile_producer")
+    resources = resources_from_args(args, progress=lambda: pacer.frames)
 
     strip = Adafruit_NeoPixel(LED_COUNT, LED_PIN, LED_FREQ_HZ, LED_DMA, LED_INVERT, LED_BRIGHTNESS, LED_CHANNEL)
     strip.begin()
 
     # Trigger stress test if requested via argument
     if args.stress > 0:
-        start_stress_test(cpu_load=args.stress)
+        stress_process = start_stress_test(cpu_load=args.stress, workers=STRESS_WORKERS)
 
     print('Press Ctrl-C to quit.')
 
@@ -171,7 +183,13 @@ if __name__ == '__main__':
             rainbowCycle(strip)
 
     except KeyboardInterrupt:
-        stop_stress_test()
+        if resources:
+            resources.finish(out_dir, "producer")  # before the stress load stops
+        stop_stress_test(stress_process)
+        stages.report()
+        stages.write_csv(os.path.join(out_dir, "stage_timings_producer.csv"))
+        pacer.report()
+        pacer.write_csv(os.path.join(out_dir, "frame_pacing_producer.csv"))
         if args.clear:
             colorWipe(strip, Color(0,0,0), 10)
         print("\nBenchmark terminated.")
\ No newline at end of file
@@ -1,11 +1,25 @@
 import paho.mqtt.client as mqtt
-import struct
+import argparse
 import time
 import os
 import csv
 import statistics
 import datetime
-import subprocess
+import sys
+
+# Shared helpers (iotbench/) live at the repo root
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "..", "..")))
+from iotbench.anomaly import JitterDetector
+from iotbench.archive import add_archive_args, archive_from_args
+from iotbench.blockstore import add_blockstore_args, blockstore_from_args
+from iotbench.codec import CodecError, split_frame_meta
+from iotbench.cid import find_ipfs_exe
+from iotbench.compression import add_decompression_args, decompressor_from_args
+from iotbench.metrics import add_metrics_args, metrics_from_args
+from iotbench.profiling import add_profiling_args, stages_from_args
+from iotbench.replay import add_replay_args, replay_from_args
+from iotbench.resources import add_resource_args, resources_from_args
+from iotbench.schemes import add_scheme_args, scheme_from_args
 
 # --- CONFIGURATION ---
 MQTT_BROKER = "localhost" 
@@ -15,6 +29,25 @@ IPFS_EXE = r"C:\Users\green\kubo\kubo\ipfs.exe"
 # --- UPDATED DIRECTORY SETUP ---
 current_dir = r"C:\Users\green\Documents\Senior_Project_Repo\Broker\Pi5\IPFS\results"
 
+parser = argparse.ArgumentParser(description="Verify CID-tagged Pi 5 video chunks.")
+parser.add_argument("--broker", default=MQTT_BROKER)
+parser.add_argument("--port", type=int, default=1883)
+parser.add_argument("--out-dir", default=current_dir, help="where the run's video and CSVs are written")
+parser.add_argument("--ipfs-exe", default=IPFS_EXE, help="kubo binary; falls back to in-process CIDs if missing")
+add_scheme_args(parser, default="cid")
+add_profiling_args(parser)
+add_resource_args(parser)
+add_metrics_args(parser)
+add_decompression_args(parser)
+add_replay_args(parser)
+add_archive_args(parser)
+add_blockstore_args(parser)
+args = parser.parse_args()
+
+current_dir = args.out_dir
+IPFS_EXE = find_ipfs_exe(args.ipfs_exe)
+scheme = scheme_from_args(args, ipfs_exe=IPFS_EXE)
+
 if not os.path.exists(current_dir):
     os.makedirs(current_dir)
 
@@ -35,6 +68,18 @@ RUN_ID = get_global_run_id(current_dir)
 OUTPUT_VIDEO = os.path.join(current_dir, f"final_ipfs_stream_{RUN_ID}.h264")
 RAW_LOG_FILE = os.path.join(current_dir, f"raw_packet_data_{RUN_ID}.csv")
 SUMMARY_FILE = os.path.join(current_dir, f"benchmark_summary_{RUN_ID}.csv")
+stages = stages_from_args(args, current_dir, prefix=f"profile_{RUN_ID}")
+resources = resources_from_args(args, progress=lambda: len(metrics_buffer))
+registry, metrics, exporter = metrics_from_args(args, topic=TOPIC, device="pi5")
+registry.gauge("queue_depth", lambda: len(metrics_buffer), "Rows held in memory until the CSV is written.")
+decompressor = decompressor_from_args(args)
+replay = replay_from_args(args)
+archive = archive_from_args(args, stream="pi5", scheme=scheme)
+if archive:
+    registry.gauge("archive_backlog", lambda: archive.backlog, "Raw payloads waiting for the archive's flush thread.")
+blocks = blockstore_from_args(args, stream=f"final_ipfs_stream_{RUN_ID}")
+if blocks:
+    registry.gauge("blockstore_backlog", lambda: blocks.backlog, "Verified chunks waiting for the blockstore's flush thread.")
 
 # Open video file for writing
 video_file = open(OUTPUT_VIDEO, "wb")
@@ -44,83 +89,99 @@ metrics_buffer = []
 sign_times = []
 verify_times = []
 failures = 0
+malformed = 0  # payloads the codec rejected before any crypto
+sign_jitter = JitterDetector("HashTime_uS")
+verify_jitter = JitterDetector("VerifyTime_uS")
 
 print(f"--- BENCHMARK RUN #{RUN_ID} READY (IPFS) ---")
 print(f"Directory: {current_dir}")
 print(f"Saving to: Video ({RUN_ID}), Raw Logs ({RUN_ID}), Summary ({RUN_ID})")
+print(f"CID backend: {IPFS_EXE or 'in-process (kubo not found)'}")
 print(f"Waiting for stream on '{TOPIC}'...")
 
-def ipfs_only_hash(data_bytes: bytes) -> str:
-    """
-    Returns CID (v1) for data_bytes without storing it.
-    Requires local IPFS daemon and `ipfs` CLI on PATH.
-    """
-    try:
-        result = subprocess.run(
-            [IPFS_EXE, "add", "-q", "--only-hash", "--cid-version=1", "--raw-leaves", "-"],
-            input=data_bytes,
-            stdout=subprocess.PIPE,
-            stderr=subprocess.PIPE,
-            check=True
-        )
-        return result.stdout.decode("utf-8").strip()
-    except subprocess.CalledProcessError as e:
-        print(f"[IPFS ERROR] {e.stderr.decode('utf-8', errors='ignore').strip()}")
-        return ""
-
 def on_message(client, userdata, msg):
-    global failures
+    global failures, malformed
     payload = msg.payload
+    lap = stages.lap()
     
+    # Raw payload to the archive first; with --archive-only proof is left to its audit
+    if archive:
+        archive.append(payload)
+        lap.mark("archive")
+        if archive.deferred:
+            metrics.observe_unverified(len(payload))
+            lap.total("on_message")
+            return
+
     try:
         # 1. Unpack Footer [Data] [CID] [CID_LEN(2)] [Time(4)]
-        if len(payload) < 6:
-            raise ValueError("Payload too short.")
-
-        device_sign_time_us = struct.unpack('<I', payload[-4:])[0]
-        cid_len = struct.unpack('<H', payload[-6:-4])[0]
-
-        if cid_len <= 0:
-            raise ValueError("CID length invalid.")
-
-        cid_start = len(payload) - 4 - 2 - cid_len
-        if cid_start < 0:
-            raise ValueError("CID length exceeds payload size.")
-
-        cid_bytes = payload[cid_start:cid_start + cid_len]
-        chunk_data = payload[:cid_start]
+        # Footer layout and length checks live in the scheme
+        frame = scheme.decode_frame(payload)
+        chunk_data, cid_bytes, _, device_sign_time_us = frame.data, frame.tag, frame.key, frame.sign_time_us
+        # Per-frame payloads carry (timestamp, seq) ahead of the H.264 bytes
+        _, _, video_data = split_frame_meta(frame)
+        lap.mark("decode")
 
         # 2. Benchmark Verification (CID recompute)
         v_start = time.perf_counter_ns()
         
-        is_valid = False
-        computed_cid = ipfs_only_hash(chunk_data)
-        if computed_cid and computed_cid.encode("utf-8") == cid_bytes:
-            is_valid = True
-            video_file.write(chunk_data)
+        is_valid = scheme.verify(chunk_data, cid_bytes)
+        lap.mark("verify")
+        # A replayed chunk verifies too; drop it before it is counted or written
+        is_replay = is_valid and replay is not None and replay.seen(frame)
+        lap.mark("replay")
+        if is_replay:
+            metrics.observe_replay(len(payload))
+            return
+        if is_valid:
+            video_data = decompressor.decompress(frame.flags, video_data)
+            video_file.write(video_data)
+            # Content-addressed copy; hashing and writes happen on the blockstore's thread
+            if blocks:
+                blocks.put(video_data)
         else:
-            is_valid = False
             failures += 1
             print(f"⚠️ FAILURE at Chunk #{len(metrics_buffer)}")
         
         laptop_verify_time_us = (time.perf_counter_ns() - v_start) / 1000
+        lap.mark("disk_write")
+
+        # 3. Anomaly Tracking
+        for event in sign_jitter.update(device_sign_time_us) + verify_jitter.update(laptop_verify_time_us):
+            if event.kind == "changepoint":
+                print(f"Changepoint at Chunk #{event.index + 1}: {event.detail}")
+        lap.mark("anomaly")
 
-        # 3. Store Data
+        # 4. Store Data
         chunk_id = len(metrics_buffer) + 1
         sign_times.append(device_sign_time_us)
         verify_times.append(laptop_verify_time_us)
-        metrics_buffer.append([chunk_id, len(chunk_data), device_sign_time_us, f"{laptop_verify_time_us:.2f}", is_valid])
+        metrics_buffer.append([chunk_id, len(video_data), device_sign_time_us, f"{laptop_verify_time_us:.2f}", is_valid])
+        metrics.observe(len(payload), laptop_verify_time_us, device_sign_time_us, is_valid, written=len(video_data) if is_valid else 0)
+        lap.mark("buffer")
 
         if chunk_id % 100 == 0:
             print(f"Chunk #{chunk_id:<5} | Hash: {device_sign_time_us:<4}us | Verify: {laptop_verify_time_us:<6.2f}us")
+        lap.mark("progress")
+        lap.total("on_message")
 
+    except CodecError as e:
+        malformed += 1
+        metrics.observe_malformed(len(payload))
+        print(f"Malformed payload: {e}")
     except Exception as e:
         print(f"Error: {e}")
 
 def finalize_benchmark():
     print(f"\n{'='*20} RUN {RUN_ID} COMPLETE (IPFS) {'='*20}")
     video_file.close()
+    if blocks:
+        blocks.report(blocks.close())
     
+    if archive:
+        archive.close()
+        archive.report()
+
     if not metrics_buffer:
         print("No data collected.")
         return
@@ -134,15 +195,24 @@ def finalize_benchmark():
     success_rate = ((total_chunks - failures)/total_chunks)*100
 
     # Save Detailed Raw Log
+    lap = stages.lap()
     with open(RAW_LOG_FILE, "w", newline='') as f:
         writer = csv.writer(f)
         writer.writerow(["Chunk_ID", "Size_Bytes", "HashTime_uS", "VerifyTime_uS", "Valid"])
         writer.writerows(metrics_buffer)
+    lap.mark("csv_write")
+
+    sign_jitter.report()
+    verify_jitter.report()
+    print(f"Malformed payloads: {malformed}")
+    if replay:
+        replay.report()
+    anomaly_fields = {**sign_jitter.summary_fields("Hash"), **verify_jitter.summary_fields("Verify")}
 
     # Save Run Summary
     with open(SUMMARY_FILE, "w", newline='') as f:
         writer = csv.writer(f)
-        writer.writerow(["Run_ID", "Timestamp", "Total_Chunks", "Success_Rate", "Avg_Hash_uS", "Max_Hash_uS", "Avg_Verify_uS", "Max_Verify_uS"])
+        writer.writerow(["Run_ID", "Timestamp", "Total_Chunks", "Success_Rate", "Avg_Hash_uS", "Max_Hash_uS", "Avg_Verify_uS", "Max_Verify_uS", "Malformed", "Replays", *anomaly_fields])
         writer.writerow([
             RUN_ID,
             datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
@@ -151,17 +221,29 @@ def finalize_benchmark():
             f"{avg_sign:.2f}",
             max_sign,
             f"{avg_verify:.2f}",
-            f"{max_verify:.2f}"
+            f"{max_verify:.2f}",
+            malformed,
+            replay.replays if replay else "",
+            *anomaly_fields.values()
         ])
+    lap.mark("summary_write")
+    stages.report()
+    stages.write_csv(os.path.join(current_dir, f"stage_timings_{RUN_ID}.csv"),
+                     os.path.join(current_dir, f"stage_histograms_{RUN_ID}.csv"))
+    if resources:
+        resources.finish(current_dir, RUN_ID)
+    if exporter:
+        exporter.stop()
     
     print(f"Results saved as set #{RUN_ID} in results folder.")
-    os.startfile(current_dir)
+    if hasattr(os, "startfile"):
+        os.startfile(current_dir)
 
 client = mqtt.Client(mqtt.CallbackAPIVersion.VERSION2)
 client.on_message = on_message
 
 try:
-    client.connect(MQTT_BROKER, 1883)
+    client.connect(args.broker, args.port)
     client.subscribe(TOPIC)
     client.loop_forever()
 except KeyboardInterrupt:
@@ -1,12 +1,25 @@
 import paho.mqtt.client as mqtt
-import struct
+import argparse
 import time
 import os
 import csv
 import statistics
 import datetime
-from nacl.signing import VerifyKey
-from nacl.exceptions import BadSignatureError
+import sys
+
+# Shared helpers (iotbench/) live at the repo root
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "..", "..")))
+from iotbench.anomaly import JitterDetector
+from iotbench.archive import add_archive_args, archive_from_args
+from iotbench.chain import add_chain_check_args, chains_from_args
+from iotbench.codec import CodecError, split_frame_meta
+from iotbench.compression import add_decompression_args, decompressor_from_args
+from iotbench.identity import UntrustedKey, add_trust_args, trust_from_args
+from iotbench.metrics import add_metrics_args, metrics_from_args
+from iotbench.profiling import add_profiling_args, stages_from_args
+from iotbench.replay import add_replay_args, replay_from_args
+from iotbench.resources import add_resource_args, resources_from_args
+from iotbench.schemes import add_scheme_args, scheme_from_args
 
 # --- CONFIGURATION ---
 MQTT_BROKER = "localhost" 
@@ -16,6 +29,24 @@ TOPIC = "cam"
 # Using the specific path you requested
 current_dir = r"C:\Users\green\Documents\Senior_Project_Repo\Broker\Pi5\device_level_signing\results"
 
+parser = argparse.ArgumentParser(description="Verify signed Pi 5 video chunks.")
+parser.add_argument("--broker", default=MQTT_BROKER)
+parser.add_argument("--port", type=int, default=1883)
+parser.add_argument("--out-dir", default=current_dir, help="where the run's video and CSVs are written")
+add_scheme_args(parser)
+add_profiling_args(parser)
+add_resource_args(parser)
+add_metrics_args(parser)
+add_decompression_args(parser)
+add_replay_args(parser)
+add_archive_args(parser)
+add_trust_args(parser)
+add_chain_check_args(parser)
+args = parser.parse_args()
+scheme = scheme_from_args(args)
+
+current_dir = args.out_dir
+
 if not os.path.exists(current_dir):
     os.makedirs(current_dir)
 
@@ -37,6 +68,20 @@ RUN_ID = get_global_run_id(current_dir)
 OUTPUT_VIDEO = os.path.join(current_dir, f"final_signed_stream_{RUN_ID}.h264")
 RAW_LOG_FILE = os.path.join(current_dir, f"raw_packet_data_{RUN_ID}.csv")
 SUMMARY_FILE = os.path.join(current_dir, f"benchmark_summary_{RUN_ID}.csv")
+stages = stages_from_args(args, current_dir, prefix=f"profile_{RUN_ID}")
+resources = resources_from_args(args, progress=lambda: len(metrics_buffer))
+registry, metrics, exporter = metrics_from_args(args, topic=TOPIC, device="pi5")
+registry.gauge("queue_depth", lambda: len(metrics_buffer), "Rows held in memory until the CSV is written.")
+decompressor = decompressor_from_args(args)
+replay = replay_from_args(args)
+archive = archive_from_args(args, stream="pi5", scheme=scheme)
+trust = trust_from_args(args, scheme)
+prepare = trust.prepare if trust else scheme.prepare  # pre-decoded, pinned keys with --trust-store
+chains = chains_from_args(args, scheme, prepare)
+if archive:
+    registry.gauge("archive_backlog", lambda: archive.backlog, "Raw payloads waiting for the archive's flush thread.")
+if chains:
+    registry.gauge("chain_held", lambda: chains.held, "Chained chunks held until a signature vouches for them.")
 
 # Open video file for writing
 video_file = open(OUTPUT_VIDEO, "wb")
@@ -46,55 +91,127 @@ metrics_buffer = []
 sign_times = []
 verify_times = []
 failures = 0
+malformed = 0  # payloads the codec rejected before any crypto
+sign_jitter = JitterDetector("SignTime_uS")
+verify_jitter = JitterDetector("VerifyTime_uS")
 
 print(f"--- BENCHMARK RUN #{RUN_ID} READY ---")
 print(f"Directory: {current_dir}")
 print(f"Saving to: Video ({RUN_ID}), Raw Logs ({RUN_ID}), Summary ({RUN_ID})")
-print(f"Waiting for stream on '{TOPIC}'...")
+print(f"Waiting for stream on '{TOPIC}' ({scheme.name})...")
 
-def on_message(client, userdata, msg):
+def record_chunk(payload, frame, video_data, is_valid, in_order, verify_ns, lap, chain_status=None):
+    """Replay check, video write, anomaly tracking and the CSV row for one verified (or settled) chunk."""
     global failures
+    w_start = time.perf_counter_ns()
+    # A replayed chunk verifies too; drop it before it is counted or written
+    is_replay = is_valid and replay is not None and replay.seen(frame)
+    lap.mark("replay")
+    if is_replay:
+        metrics.observe_replay(len(payload))
+        return
+    if is_valid:
+        video_data = decompressor.decompress(frame.flags, video_data)
+        if in_order:  # a late chunk is authentic, but appending it would corrupt the stream
+            video_file.write(video_data)
+    else:
+        failures += 1
+        print(f"⚠️ FAILURE at Chunk #{len(metrics_buffer)}")
+
+    # Verification includes the video write, as in earlier runs
+    laptop_verify_time_us = (verify_ns + time.perf_counter_ns() - w_start) / 1000
+    device_sign_time_us = frame.sign_time_us
+    lap.mark("disk_write")
+
+    # 3. Anomaly Tracking
+    for event in sign_jitter.update(device_sign_time_us) + verify_jitter.update(laptop_verify_time_us):
+        if event.kind == "changepoint":
+            print(f"Changepoint at Chunk #{event.index + 1}: {event.detail}")
+    lap.mark("anomaly")
+
+    # 4. Store Data
+    chunk_id = len(metrics_buffer) + 1
+    sign_times.append(device_sign_time_us)
+    verify_times.append(laptop_verify_time_us)
+    row = [chunk_id, len(video_data), device_sign_time_us, f"{laptop_verify_time_us:.2f}", is_valid]
+    metrics_buffer.append(row + [chain_status] if chains else row)
+    metrics.observe(len(payload), laptop_verify_time_us, device_sign_time_us, is_valid, written=len(video_data) if is_valid else 0)
+    lap.mark("buffer")
+
+    if chunk_id % 100 == 0:
+        print(f"Chunk #{chunk_id:<5} | Sign: {device_sign_time_us:<4}us | Verify: {laptop_verify_time_us:<6.2f}us")
+    lap.mark("progress")
+
+def record_settled(settled, lap):
+    """Records the chunks StreamChains released, in stream order."""
+    for (payload, frame, video_data, verify_ns), check in settled:
+        if check.status in ("gap", "reorder", "tamper"):
+            print(f"Chain {check.status} at Chunk #{len(metrics_buffer) + 1}"
+                  + (f" ({check.missing} missing)" if check.missing else ""))
+        record_chunk(payload, frame, video_data, check.valid, check.in_order, verify_ns, lap, check.status)
+
+def on_message(client, userdata, msg):
+    global malformed
     payload = msg.payload
+    lap = stages.lap()
     
+    # Raw payload to the archive first; with --archive-only proof is left to its audit
+    if archive:
+        archive.append(payload)
+        lap.mark("archive")
+        if archive.deferred:
+            metrics.observe_unverified(len(payload))
+            lap.total("on_message")
+            return
+
     try:
-        # 1. Unpack Footer [Data] [Sig(64)] [Pub(32)] [Time(4)]
-        device_sign_time_us = struct.unpack('<I', payload[-4:])[0]
-        pub_key_bytes = payload[-36:-4]
-        signature = payload[-100:-36]
-        chunk_data = payload[:-100]
+        # 1. Unpack Footer [Data] [Sig(64)] [Pub(32)] [Time(4)] (sizes per scheme)
+        frame = scheme.decode_frame(payload)
+        chunk_data, signature, pub_key_bytes = frame.data, frame.tag, frame.key
+        # Per-frame payloads carry (timestamp, seq) ahead of the H.264 bytes
+        _, _, video_data = split_frame_meta(frame)
+        lap.mark("decode")
 
         # 2. Benchmark Verification
         v_start = time.perf_counter_ns()
         
-        is_valid = False
-        try:
-            verify_key = VerifyKey(pub_key_bytes)
-            verify_key.verify(chunk_data, signature)
-            is_valid = True
-            video_file.write(chunk_data)
-        except BadSignatureError:
-            is_valid = False
-            failures += 1
-            print(f"⚠️ FAILURE at Chunk #{len(metrics_buffer)}")
-        
-        laptop_verify_time_us = (time.perf_counter_ns() - v_start) / 1000
-
-        # 3. Store Data
-        chunk_id = len(metrics_buffer) + 1
-        sign_times.append(device_sign_time_us)
-        verify_times.append(laptop_verify_time_us)
-        metrics_buffer.append([chunk_id, len(chunk_data), device_sign_time_us, f"{laptop_verify_time_us:.2f}", is_valid])
-
-        if chunk_id % 100 == 0:
-            print(f"Chunk #{chunk_id:<5} | Sign: {device_sign_time_us:<4}us | Verify: {laptop_verify_time_us:<6.2f}us")
+        if chains:
+            # Chain continuity per chunk, the signature only at checkpoints and breaks.
+            # A chunk is held (not written) until a signature vouches for it.
+            item = [payload, frame, video_data, 0]
+            settled = chains.check(frame, item)
+            item[3] = time.perf_counter_ns() - v_start
+            lap.mark("chain")
+            record_settled(settled, lap)
+        else:
+            verifier = prepare(pub_key_bytes)
+            lap.mark("key_decode")
+            is_valid = scheme.verify_prepared(verifier, chunk_data, signature)
+            lap.mark("verify")
+            record_chunk(payload, frame, video_data, is_valid, True, time.perf_counter_ns() - v_start, lap)
+        lap.total("on_message")
 
+    except UntrustedKey:
+        metrics.observe_untrusted(len(payload))  # counted in trust.rejected; no crypto spent
+    except CodecError as e:
+        malformed += 1
+        metrics.observe_malformed(len(payload))
+        print(f"Malformed payload: {e}")
     except Exception as e:
         print(f"Error: {e}")
 
 def finalize_benchmark():
     print(f"\n{'='*20} RUN {RUN_ID} COMPLETE {'='*20}")
+    if chains:
+        record_settled(chains.finish(), stages.lap())  # the held tail goes to the video too
     video_file.close()
     
+    if archive:
+        archive.close()
+        archive.report()
+    if chains:
+        chains.report()
+
     if not metrics_buffer:
         print("No data collected.")
         return
@@ -108,15 +225,27 @@ def finalize_benchmark():
     success_rate = ((total_chunks - failures)/total_chunks)*100
 
     # Save Detailed Raw Log
+    lap = stages.lap()
     with open(RAW_LOG_FILE, "w", newline='') as f:
         writer = csv.writer(f)
-        writer.writerow(["Chunk_ID", "Size_Bytes", "SignTime_uS", "VerifyTime_uS", "Valid"])
+        writer.writerow(["Chunk_ID", "Size_Bytes", "SignTime_uS", "VerifyTime_uS", "Valid"] + (["Chain"] if chains else []))
         writer.writerows(metrics_buffer)
+    lap.mark("csv_write")
+
+    sign_jitter.report()
+    verify_jitter.report()
+    print(f"Malformed payloads: {malformed}")
+    if replay:
+        replay.report()
+    if trust:
+        trust.report()
+    anomaly_fields = {**sign_jitter.summary_fields("Sign"), **verify_jitter.summary_fields("Verify")}
+    chain_fields = {f"Chain_{name}": n for name, n in chains.summary().items()} if chains else {}
 
     # Save Run Summary
     with open(SUMMARY_FILE, "w", newline='') as f:
         writer = csv.writer(f)
-        writer.writerow(["Run_ID", "Timestamp", "Total_Chunks", "Success_Rate", "Avg_Sign_uS", "Max_Sign_uS", "Avg_Verify_uS", "Max_Verify_uS"])
+        writer.writerow(["Run_ID", "Timestamp", "Total_Chunks", "Success_Rate", "Avg_Sign_uS", "Max_Sign_uS", "Avg_Verify_uS", "Max_Verify_uS", "Malformed", "Replays", *anomaly_fields, *chain_fields])
         writer.writerow([
             RUN_ID,
             datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
@@ -125,17 +254,30 @@ def finalize_benchmark():
             f"{avg_sign:.2f}",
             max_sign,
             f"{avg_verify:.2f}",
-            f"{max_verify:.2f}"
+            f"{max_verify:.2f}",
+            malformed,
+            replay.replays if replay else "",
+            *anomaly_fields.values(),
+            *chain_fields.values()
         ])
+    lap.mark("summary_write")
+    stages.report()
+    stages.write_csv(os.path.join(current_dir, f"stage_timings_{RUN_ID}.csv"),
+                     os.path.join(current_dir, f"stage_histograms_{RUN_ID}.csv"))
+    if resources:
+        resources.finish(current_dir, RUN_ID)
+    if exporter:
+        exporter.stop()
     
     print(f"Results saved as set #{RUN_ID} in results folder.")
-    os.startfile(current_dir) # Automatically open the results folder
+    if hasattr(os, "startfile"):
+        os.startfile(current_dir) # Automatically open the results folder
 
 client = mqtt.Client(mqtt.CallbackAPIVersion.VERSION2)
 client.on_message = on_message
 
 try:
-    client.connect(MQTT_BROKER, 1883)
+    client.connect(args.broker, args.port)
     client.subscribe(TOPIC)
     client.loop_forever()
 except KeyboardInterrupt:
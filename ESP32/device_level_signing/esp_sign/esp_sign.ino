@@ -3,6 +3,7 @@
 #include <Ed25519.h>
 #include <SPI.h>
 #include <Adafruit_BME280.h>
+#include <Preferences.h>
 #include <wifi_secrets.h>
 
 #define DEBUG 0 
@@ -21,6 +22,21 @@
 #define STRESS_ENABLED 1  // Set to 0 to disable
 #define STRESS_CORE 0     // Core 0 handles WiFi, Core 1 handles Arduino loop
 
+// --- BATCH CONFIG ---
+// 0 = one ASCII reading per signed message (legacy footer layout).
+// K > 0 = K fixed-point readings per signed message, framed with FLAG_RECORD_BATCH
+// (see iotbench/therm_batch.py); a partial batch is sent after FLUSH_MS.
+#define BATCH_K 0
+#define FLUSH_MS 200
+
+// --- IDENTITY CONFIG ---
+// 0 = a fresh key every boot, as in the original runs.
+// 1 = keep the Ed25519 key in NVS across reboots and print its public key at boot.
+// To enroll the board: set 1, flash, copy the "Public Key:" hex from the serial
+// monitor, run `python -m iotbench.identity enroll esp32 <hex>`, then start the
+// broker with --trust-store keys/trust.json.
+#define PERSIST_KEY 0
+
 const char* ssid = SECRET_SSID;
 const char* password = SECRET_PASS;
 const char* mqtt_server = "laptop.local"; 
@@ -39,12 +55,79 @@ Adafruit_BME280 bme(BME_CS);
 uint8_t privateKey[ED25519_PRIVATE_KEY_SIZE];
 uint8_t publicKey[ED25519_PUBLIC_KEY_SIZE];
 
+Preferences identity;
+
 WiFiClient espClient;
 PubSubClient client(espClient);
 unsigned long lastPublish = 0;
 
 void reconnectMQTT(); 
 
+#if BATCH_K
+// Codec header (iotbench/codec.py) and batch layout (iotbench/therm_batch.py), little-endian
+#define FRAME_MAGIC 0xA7
+#define FRAME_VERSION 1
+#define SCHEME_ED25519 1
+#define FLAG_RECORD_BATCH 0x80
+#define FRAME_HEADER_SIZE 16
+#define BATCH_HEADER_SIZE 8
+#define RECORD_SIZE 10
+
+uint8_t batchData[BATCH_HEADER_SIZE + BATCH_K * RECORD_SIZE];
+uint16_t batchCount = 0;
+uint32_t batchBase = 0;
+
+void putLE(uint8_t* p, uint32_t v, int n) {
+  for (int i = 0; i < n; i++) p[i] = (v >> (8 * i)) & 0xFF;
+}
+
+void publishBatch() {
+  size_t dataLen = BATCH_HEADER_SIZE + batchCount * RECORD_SIZE;
+  batchData[0] = 1;  // batch format version
+  batchData[1] = 0;
+  putLE(batchData + 2, batchCount, 2);
+  putLE(batchData + 4, batchBase, 4);
+
+  uint8_t signature[ED25519_SIGNATURE_SIZE];
+  uint32_t startMicros = micros();
+  Ed25519::sign(signature, privateKey, publicKey, batchData, dataLen);
+  uint32_t signTime = micros() - startMicros;
+
+  size_t payloadLen = FRAME_HEADER_SIZE + dataLen + ED25519_SIGNATURE_SIZE + ED25519_PUBLIC_KEY_SIZE;
+  uint8_t payload[payloadLen];
+  payload[0] = FRAME_MAGIC;
+  payload[1] = FRAME_VERSION;
+  payload[2] = SCHEME_ED25519;
+  payload[3] = FLAG_RECORD_BATCH;
+  putLE(payload + 4, signTime, 4);
+  putLE(payload + 8, dataLen, 4);
+  putLE(payload + 12, ED25519_SIGNATURE_SIZE, 2);
+  putLE(payload + 14, ED25519_PUBLIC_KEY_SIZE, 2);
+  memcpy(payload + FRAME_HEADER_SIZE, batchData, dataLen);
+  memcpy(payload + FRAME_HEADER_SIZE + dataLen, signature, ED25519_SIGNATURE_SIZE);
+  memcpy(payload + FRAME_HEADER_SIZE + dataLen + ED25519_SIGNATURE_SIZE, publicKey, ED25519_PUBLIC_KEY_SIZE);
+
+  if (!client.publish(topic, payload, payloadLen)) {
+    DEBUG_PRINTLN("Batch publish failed");
+  }
+  batchCount = 0;
+}
+
+void addReading(float temp, float hum, float pres) {
+  uint32_t now = millis();
+  if (batchCount == 0) batchBase = now;
+  uint8_t* r = batchData + BATCH_HEADER_SIZE + batchCount * RECORD_SIZE;
+  putLE(r, (uint16_t)(now - batchBase), 2);
+  putLE(r + 2, (uint16_t)(int16_t)lroundf(temp * 100), 2);
+  putLE(r + 4, (uint16_t)lroundf(hum * 100), 2);
+  putLE(r + 6, (uint32_t)lroundf(pres * 100), 4);
+  batchCount++;
+  if (batchCount >= BATCH_K || now - batchBase >= FLUSH_MS) {
+    publishBatch();
+  }
+}
+#endif
+
 // --- STRESS TASK ---
 void stressTask(void * pvParameters) {
     volatile float x = 1.5; 
@@ -83,10 +166,30 @@ void setup() {
   SPI.begin(BME_SCK, BME_MISO, BME_MOSI, BME_CS);
   if (!bme.begin()) { while (1); }
 
-  Ed25519::generatePrivateKey(privateKey);
+  #if PERSIST_KEY
+    // First boot generates the key; later boots reuse it
+    identity.begin("iotbench", false);
+    if (identity.getBytes("ed25519", privateKey, ED25519_PRIVATE_KEY_SIZE) != ED25519_PRIVATE_KEY_SIZE) {
+      Ed25519::generatePrivateKey(privateKey);
+      identity.putBytes("ed25519", privateKey, ED25519_PRIVATE_KEY_SIZE);
+    }
+    identity.end();
+  #else
+    Ed25519::generatePrivateKey(privateKey);
+  #endif
   Ed25519::derivePublicKey(publicKey, privateKey);
+  Serial.print("Public Key: ");
+  for (int i = 0; i < ED25519_PUBLIC_KEY_SIZE; i++) {
+    if (publicKey[i] < 0x10) Serial.print('0');
+    Serial.print(publicKey[i], HEX);
+  }
+  Serial.println();
 
   client.setServer(mqtt_server, mqtt_port);
+  #if BATCH_K
+    // PubSubClient's default 256-byte buffer fits only ~16 readings
+    client.setBufferSize(FRAME_HEADER_SIZE + sizeof(batchData) + ED25519_SIGNATURE_SIZE + ED25519_PUBLIC_KEY_SIZE + 64);
+  #endif
 
   // --- START STRESSER ---
   #if STRESS_ENABLED
@@ -108,6 +211,9 @@ void loop() {
     float hum  = bme.readHumidity();
     float pres = bme.readPressure() / 100.0F;
 
+#if BATCH_K
+    addReading(temp, hum, pres);
+#else
     char msgBuffer[64];
     size_t msgLen = snprintf(msgBuffer, sizeof(msgBuffer), "t=%.2f,h=%.2f,p=%.2f", temp, hum, pres);
 
@@ -126,6 +232,7 @@ void loop() {
     memcpy(payload + msgLen + ED25519_SIGNATURE_SIZE + ED25519_PUBLIC_KEY_SIZE, &signTime, sizeof(signTime));
 
     client.publish(topic, payload, payloadLen);
+#endif
   }
 }
 
@@ -4,10 +4,24 @@
 
 import time
 import argparse
+import os
 import struct
+import sys
 import paho.mqtt.client as mqtt
-from rpi_ws281x import *
-from nacl.signing import SigningKey
+
+# Shared helpers (iotbench/) live at the repo root
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+from iotbench.codec import FLAG_FRAME_META, FRAME_META
+from iotbench.compression import Compressor, add_compression_args, compressor_from_args
+from iotbench.identity import add_identity_args, sequence_from_args, signing_key_from_args
+from iotbench.pacing import FramePacer, add_pacing_args, pacer_from_args
+from iotbench.profiling import StageTimer, add_profiling_args, stages_from_args
+from iotbench.resources import add_resource_args, resources_from_args
+from iotbench.schemes import add_scheme_args, get_scheme, scheme_from_args
+try:
+    from rpi_ws281x import *
+except ImportError:  # no LED library here: drive the mock strip
+    from iotbench.ledstrip import Adafruit_NeoPixel, Color
 
 # --- CONFIGURATION ---
 MQTT_BROKER = "laptop.local"  # <--- CHANGE THIS TO YOUR LAPTOP IP
@@ -21,10 +35,12 @@ LED_INVERT = False
 LED_CHANNEL = 0
 
 # --- CRYPTO & MQTT SETUP ---
-# Generate a fresh key pair for this session
-signing_key = SigningKey.generate()
-verify_key = signing_key.verify_key
-pub_key_bytes = verify_key.encode()
+# Generate a fresh key pair for this session (--scheme or --device-key swaps it at startup)
+scheme = get_scheme("ed25519", generate=True)
+stages = StageTimer(enabled=False)  # --stage-timers enables it at startup
+compressor = Compressor("none")  # --compress picks a codec at startup
+pacer = FramePacer()  # --pacing picks the frame timing at startup
+sequence = None  # --sequence: SequenceLease numbering each payload
 
 # Initialize MQTT
 client = mqtt.Client()
@@ -44,33 +60,44 @@ def sign_and_show(strip):
     """
     Captures LED state, signs it, sends it to MQTT, then updates physical LEDs.
     """
+    lap = stages.lap()
+
     # 1. CAPTURE: Get the current color of all 60 pixels
     # Returns a list of integers (e.g., [16711680, 0, 255...])
     pixel_data = [strip.getPixelColor(i) for i in range(strip.numPixels())]
+    lap.mark("capture")
     
     # 2. PACK: Convert list of integers to binary data
     # '<' = Little Endian, 'I' = Unsigned Int
     msg_bytes = struct.pack(f'<{strip.numPixels()}I', *pixel_data)
+    lap.mark("pack")
 
-    # 3. SIGN & BENCHMARK
-    start_time = time.perf_counter()
-    
-    # Cryptographic signing
-    signed_obj = signing_key.sign(msg_bytes)
-    signature = signed_obj.signature
-    
-    # Calculate duration in Microseconds
-    sign_time_us = int((time.perf_counter() - start_time) * 1_000_000)
+    # 2b. COMPRESS (pass-through unless --compress); the tag covers the compressed bytes
+    msg_bytes = compressor.compress(msg_bytes)
+    lap.mark("compress")
+
+    # 2c. SEQUENCE (--sequence): a signed (timestamp, counter) so the broker can tell
+    # a replayed frame from the animation repeating itself
+    flags = compressor.flags
+    if sequence is not None:
+        msg_bytes = FRAME_META.pack(time.time_ns() // 1000, sequence.take()) + msg_bytes
+        flags |= FLAG_FRAME_META
+
+    # 3. SIGN & BENCHMARK (duration in Microseconds)
+    signature, sign_time_us = scheme.timed_tag(msg_bytes)
+    lap.mark("sign")
 
     # 4. CONSTRUCT PAYLOAD: [Data] [Sig] [Pub] [Time]
-    time_bytes = struct.pack('<I', sign_time_us)
-    full_payload = msg_bytes + signature + pub_key_bytes + time_bytes
+    full_payload = scheme.encode(msg_bytes, signature, sign_time_us, flags)
+    lap.mark("encode")
 
     # 5. PUBLISH
     client.publish(MQTT_TOPIC, full_payload)
+    lap.mark("publish")
 
     # 6. PHYSICAL UPDATE
     strip.show()
+    lap.mark("show")
 
 
 # --- ANIMATION FUNCTIONS (Updated to use sign_and_show) ---
@@ -79,7 +106,7 @@ def colorWipe(strip, color, wait_ms=50):
     for i in range(strip.numPixels()):
         strip.setPixelColor(i, color)
         sign_and_show(strip) # <--- INTERCEPTED
-        time.sleep(wait_ms/1000.0)
+        pacer.wait("colorWipe", wait_ms)
 
 def theaterChase(strip, color, wait_ms=50, iterations=10):
     """Movie theater light style chaser animation."""
@@ -88,7 +115,7 @@ def theaterChase(strip, color, wait_ms=50, iterations=10):
             for i in range(0, strip.numPixels(), 3):
                 strip.setPixelColor(i+q, color)
             sign_and_show(strip) # <--- INTERCEPTED
-            time.sleep(wait_ms/1000.0)
+            pacer.wait("theaterChase", wait_ms)
             for i in range(0, strip.numPixels(), 3):
                 strip.setPixelColor(i+q, 0)
 
@@ -109,7 +136,7 @@ def rainbow(strip, wait_ms=20, iterations=1):
         for i in range(strip.numPixels()):
             strip.setPixelColor(i, wheel((i+j) & 255))
         sign_and_show(strip) # <--- INTERCEPTED
-        time.sleep(wait_ms/1000.0)
+        pacer.wait("rainbow", wait_ms)
 
 def rainbowCycle(strip, wait_ms=20, iterations=5):
     """Draw rainbow that uniformly distributes itself across all pixels."""
@@ -117,7 +144,7 @@ def rainbowCycle(strip, wait_ms=20, iterations=5):
         for i in range(strip.numPixels()):
             strip.setPixelColor(i, wheel((int(i * 256 / strip.numPixels()) + j) & 255))
         sign_and_show(strip) # <--- INTERCEPTED
-        time.sleep(wait_ms/1000.0)
+        pacer.wait("rainbowCycle", wait_ms)
 
 def theaterChaseRainbow(strip, wait_ms=50):
     """Rainbow movie theater light style chaser animation."""
@@ -126,7 +153,7 @@ def theaterChaseRainbow(strip, wait_ms=50):
             for i in range(0, strip.numPixels(), 3):
                 strip.setPixelColor(i+q, wheel((i+j) % 255))
             sign_and_show(strip) # <--- INTERCEPTED
-            time.sleep(wait_ms/1000.0)
+            pacer.wait("theaterChaseRainbow", wait_ms)
             for i in range(0, strip.numPixels(), 3):
                 strip.setPixelColor(i+q, 0)
 
@@ -134,7 +161,23 @@ def theaterChaseRainbow(strip, wait_ms=50):
 if __name__ == '__main__':
     parser = argparse.ArgumentParser()
     parser.add_argument('-c', '--clear', action='store_true', help='clear the display on exit')
+    add_scheme_args(parser)
+    add_profiling_args(parser)
+    add_resource_args(parser)
+    add_compression_args(parser)
+    add_pacing_args(parser)
+    add_identity_args(parser)
+    parser.add_argument('--sequence', action='store_true', help='sign a timestamp and counter into each frame')
     args = parser.parse_args()
+    scheme = scheme_from_args(args, generate=True, signing_key=signing_key_from_args(args))
+    compressor = compressor_from_args(args)
+    pacer = pacer_from_args(args)
+    if args.mock_leds:
+        from iotbench.ledstrip import Adafruit_NeoPixel
+    sequence = sequence_from_args(args)
+    out_dir = os.path.dirname(os.path.abspath(__file__))
+    stages = stages_from_args(args, out_dir, prefix="profile_producer")
+    resources = resources_from_args(args, progress=lambda: pacer.frames)
 
     # Create NeoPixel object with appropriate configuration.
     strip = Adafruit_NeoPixel(LED_COUNT, LED_PIN, LED_FREQ_HZ, LED_DMA, LED_INVERT, LED_BRIGHTNESS, LED_CHANNEL)
@@ -161,5 +204,11 @@ if __name__ == '__main__':
             theaterChaseRainbow(strip)
 
     except KeyboardInterrupt:
+        stages.report()
+        stages.write_csv(os.path.join(out_dir, "stage_timings_producer.csv"))
+        pacer.report()
+        pacer.write_csv(os.path.join(out_dir, "frame_pacing_producer.csv"))
+        if resources:
+            resources.finish(out_dir, "producer")
         if args.clear:
             colorWipe(strip, Color(0,0,0), 10)
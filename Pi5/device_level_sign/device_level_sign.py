@@ -1,12 +1,23 @@
 import time
+import argparse
 import os
-import struct
+import sys
 import threading
 import paho.mqtt.client as mqtt
 from picamera2 import Picamera2
 from picamera2.encoders import H264Encoder
 from picamera2.outputs import PyavOutput
-from nacl.signing import SigningKey
+
+# Shared helpers (iotbench/) live at the repo root
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "..")))
+from iotbench.camera_output import SigningOutput
+from iotbench.chain import add_chain_args, chain_from_args
+from iotbench.identity import add_identity_args, sequence_from_args, signing_key_from_args
+from iotbench.profiling import add_profiling_args, stages_from_args
+from iotbench.resources import add_resource_args, resources_from_args
+from iotbench.schemes import add_scheme_args, scheme_from_args
+from iotbench.signpool import SigningPool, add_pool_args
+from iotbench.stress import start_stress_test, stop_stress_test
 
 # --- CONFIGURATION ---
 MQTT_BROKER = "laptop.local"  # <--- CHANGE TO LAPTOP IP
@@ -14,60 +25,96 @@ TOPIC = "cam"
 RECORD_SECONDS = 60
 CHUNK_SIZE = 4096  # Size of data chunks to read/sign
 
+parser = argparse.ArgumentParser()
+parser.add_argument('-s', '--stress', type=int, default=0, help='CPU load percentage (0-100)')
+parser.add_argument('--broker', default=MQTT_BROKER)
+parser.add_argument('--seconds', type=int, default=RECORD_SECONDS, help='recording length')
+parser.add_argument('--chunk-size', type=int, default=CHUNK_SIZE, help='bytes per signed chunk (--output pipe)')
+add_scheme_args(parser)
+add_profiling_args(parser)
+add_resource_args(parser)
+add_pool_args(parser)
+add_identity_args(parser)
+add_chain_args(parser)
+parser.add_argument('--output', choices=['pipe', 'frames'], default='pipe',
+                    help='pipe: os.pipe + --chunk-size chunks (the wire format existing brokers expect); '
+                         'frames: sign each encoded frame in-process with its timestamp and keyframe flag')
+args = parser.parse_args()
+if args.output == 'frames' and args.legacy_footer:
+    parser.error("--legacy-footer cannot carry frame timestamps; use --output pipe")
+if args.chain and args.legacy_footer:
+    parser.error("--legacy-footer has no flags to mark chained chunks")
+RECORD_SECONDS = args.seconds
+CHUNK_SIZE = args.chunk_size
+out_dir = os.path.dirname(os.path.abspath(__file__))
+stages = stages_from_args(args, out_dir, prefix="profile_producer")
+resources = resources_from_args(args, progress=lambda: frame_count)
+
+# Pi 5 has 4 cores; stress-ng spreads the load across all of them
+stress_process = None
+if args.stress > 0:
+    stress_process = start_stress_test(cpu_load=args.stress)
+
 # --- 1. SETUP CRYPTO & MQTT ---
-print("Generating Keys...")
-signing_key = SigningKey.generate()
-verify_key_bytes = signing_key.verify_key.encode()
+print("Loading key..." if args.device_key else "Generating Keys...")
+scheme = scheme_from_args(args, generate=True, signing_key=signing_key_from_args(args))
+chain = chain_from_args(args)  # links chunks in submission order, before the pool signs them
 
 print("Connecting to MQTT...")
 client = mqtt.Client(mqtt.CallbackAPIVersion.VERSION2)
-client.connect(MQTT_BROKER, 1883)
+client.connect(args.broker, 1883)
 client.loop_start()
 
-# --- 2. CREATE A PIPE ---
-# r_fd is for reading (Python), w_fd is for writing (Camera)
-r_fd, w_fd = os.pipe()
+# --- 2. THE SIGNING POOL ---
+# Signs on --sign-workers threads/processes and publishes
+# [Header] [Data] [Sig] [Pub] payloads in the order they were handed in.
+frame_count = 0
+
+def publish_chunk(full_payload):
+    global frame_count
+    client.publish(TOPIC, full_payload)
+    frame_count += 1
+    if frame_count % 50 == 0:
+        print(f"Sent Chunk #{frame_count} | Size: {len(full_payload)} | In flight: {pool.in_flight}")
 
-# --- 3. THE SIGNING WORKER ---
-# This runs in the background, reading video from the pipe, signing it, and sending it.
+pool = SigningPool(scheme, publish_chunk, workers=args.sign_workers, mode=args.sign_mode, stages=stages)
+
+# --- 3. THE PIPE WORKER (--output pipe only) ---
+# Reads the muxed stream back from an os.pipe() in CHUNK_SIZE pieces.
 def signing_worker(read_file_descriptor):
-    frame_count = 0
-    print("Worker: Started listening for video data...")
+    print(f"Worker: Started listening for video data ({args.sign_workers} {args.sign_mode} signer(s))...")
     
     # Wrap the file descriptor in a Python file object for easier reading
     with os.fdopen(read_file_descriptor, 'rb') as pipe_reader:
         while True:
             try:
                 # Read a chunk of raw video data
+                lap = stages.lap()
                 buf = pipe_reader.read(CHUNK_SIZE)
                 if not buf:
                     break # End of stream
-
-                # A. Sign
-                start = time.perf_counter()
-                signature = signing_key.sign(buf).signature
-                duration_us = int((time.perf_counter() - start) * 1_000_000)
-
-                # B. Pack [Data] [Sig] [Pub] [Time]
-                time_bytes = struct.pack('<I', duration_us)
-                full_payload = buf + signature + verify_key_bytes + time_bytes
-
-                # C. Send
-                client.publish(TOPIC, full_payload)
-                
-                frame_count += 1
-                if frame_count % 50 == 0:
-                    print(f"Sent Chunk #{frame_count} | Size: {len(buf)} | SignTime: {duration_us}us")
+                lap.mark("read")
+
+                # Sign + publish happen in the pool; this only blocks when
+                # the pool is max_inflight chunks behind
+                if chain:
+                    pool.submit(*chain.link(buf))
+                else:
+                    pool.submit(buf)
+                lap.mark("submit")
             
             except Exception as e:
                 print(f"Worker Error: {e}")
                 break
     
-    print("Worker: Stopped.")
+    pool.close()
+    print(f"Worker: Stopped after {pool.published} chunks.")
 
-# Start the worker thread
-t = threading.Thread(target=signing_worker, args=(r_fd,))
-t.start()
+if args.output == 'pipe':
+    # r_fd is for reading (Python), w_fd is for writing (Camera)
+    r_fd, w_fd = os.pipe()
+    t = threading.Thread(target=signing_worker, args=(r_fd,))
+    t.start()
 
 # --- 4. SETUP CAMERA ---
 print("Configuring Camera...")
@@ -81,10 +128,15 @@ picam2.start()
 
 encoder = H264Encoder(bitrate=2000000)
 
-# --- 5. SETUP PYAV OUTPUT ---
-# We point PyavOutput to our pipe's write end using "pipe:"
-# format="h264" keeps it as raw video, which is easier to append together on the receiver
-output = PyavOutput(f"pipe:{w_fd}", format="h264")
+# --- 5. SETUP OUTPUT ---
+if args.output == 'frames':
+    # Each encoded frame goes straight to the pool with its timestamp and
+    # keyframe flag: no pipe, no muxer, frame boundaries preserved
+    output = SigningOutput(pool, seqs=sequence_from_args(args, enabled=True), chain=chain)
+else:
+    # We point PyavOutput to our pipe's write end using "pipe:"
+    # format="h264" keeps it as raw video, which is easier to append together on the receiver
+    output = PyavOutput(f"pipe:{w_fd}", format="h264")
 
 print(f"Recording for {RECORD_SECONDS} seconds...")
 picam2.start_recording(encoder, output)
@@ -98,8 +150,18 @@ except KeyboardInterrupt:
 picam2.stop_recording()
 picam2.stop()
 
-# Close the write end of the pipe to signal the worker to stop
-os.close(w_fd)
-t.join() # Wait for worker to finish
+if args.output == 'pipe':
+    # Close the write end of the pipe to signal the worker to stop
+    os.close(w_fd)
+    t.join() # Wait for worker to finish
+else:
+    pool.close()
+    print(f"Signed {output.seq} frames ({output.keyframes} keyframes).")
 client.disconnect()
+if resources:
+    resources.finish(out_dir, "producer")  # before the stress load stops
+stop_stress_test(stress_process)
+stages.report()
+stages.write_csv(os.path.join(out_dir, "stage_timings_producer.csv"),
+                 os.path.join(out_dir, "stage_histograms_producer.csv"))
 print("Done.")
@@ -0,0 +1,6 @@
+"""
+Shared helpers for the IoT data integrity benchmark scripts.
+
+The device and broker scripts stay runnable on their own; they put the repo
+root on sys.path and import what they need from here.
+"""
@@ -0,0 +1,266 @@
+"""
+Streaming anomaly and jitter detection for SignTime_uS / VerifyTime_uS.
+
+Every update is O(1): a ring buffer keeps running sums for the rolling
+baseline, a two-sided CUSUM catches level shifts, and spike spacing is tracked
+with Welford's method so periodic stalls (GC, scheduler, thermal) show up as a
+low-variance interval between spikes.
+
+Live use (inside on_message):
+    sign_jitter = JitterDetector("SignTime_uS")
+    sign_jitter.update(sign_time_us)
+
+Offline use over the results folders:
+    python -m iotbench.anomaly Broker/Pi5/device_level_signing/results/stress99/raw_packet_data_1.csv
+"""
+import argparse
+import csv
+import math
+from collections import namedtuple
+
+# Columns the broker scripts write timings into (IPFS runs call it HashTime)
+TIMING_COLUMNS = ("SignTime_uS", "HashTime_uS", "VerifyTime_uS")
+
+Event = namedtuple("Event", ["kind", "index", "value", "detail"])
+
+
+class RollingStats:
+    """Mean and standard deviation over the last `size` samples."""
+
+    __slots__ = ("size", "_buf", "_pos", "count", "_sum", "_sumsq")
+
+    def __init__(self, size):
+        self.size = size
+        self._buf = [0.0] * size
+        self._pos = 0
+        self.count = 0
+        self._sum = 0.0
+        self._sumsq = 0.0
+
+    def push(self, x):
+        if self.count == self.size:
+            old = self._buf[self._pos]
+            self._sum -= old
+            self._sumsq -= old * old
+        else:
+            self.count += 1
+        self._buf[self._pos] = x
+        self._pos = (self._pos + 1) % self.size
+        self._sum += x
+        self._sumsq += x * x
+
+    def clear(self):
+        self._pos = 0
+        self.count = 0
+        self._sum = 0.0
+        self._sumsq = 0.0
+
+    @property
+    def mean(self):
+        return self._sum / self.count if self.count else 0.0
+
+    @property
+    def std(self):
+        if self.count < 2:
+            return 0.0
+        var = (self._sumsq - self._sum * self._sum / self.count) / (self.count - 1)
+        return math.sqrt(var) if var > 0 else 0.0
+
+
+class JitterDetector:
+    """
+    Flags warm-up outliers, spikes/stalls and changepoints in one timing series.
+
+    - warm-up: the first `warmup` samples are held back and compared against
+      the baseline formed by the samples that follow them.
+    - spike: a sample more than `spike_sigma` deviations above the rolling
+      baseline. Spikes are kept out of the baseline so tails do not hide.
+    - stall period: when the gap between spikes is regular (coefficient of
+      variation below `period_cv`) the stalls are reported as periodic.
+    - changepoint: a two-sided CUSUM on the standardised value crossing
+      `cusum_h`; the baseline is then rebuilt from the new level.
+    """
+
+    def __init__(self, name, window=200, warmup=50, spike_sigma=4.0,
+                 cusum_k=1.0, cusum_h=10.0, min_spikes=4, period_cv=0.25,
+                 max_events=1000):
+        self.name = name
+        self.warmup = warmup
+        self.spike_sigma = spike_sigma
+        self.cusum_k = cusum_k
+        self.cusum_h = cusum_h
+        self.min_spikes = min_spikes
+        self.period_cv = period_cv
+        self.max_events = max_events
+
+        self.baseline = RollingStats(window)
+        self.count = 0
+        self.events = []
+
+        self._warmup_samples = []
+        self._warmup_done = warmup == 0
+        self.warmup_outliers = 0
+        self.warmup_excess = 0.0
+
+        self._cusum_hi = 0.0
+        self._cusum_lo = 0.0
+        self.changepoints = 0
+
+        self.spikes = 0
+        self.max_z = 0.0
+        self._last_spike = None
+        self._gap_n = 0
+        self._gap_mean = 0.0
+        self._gap_m2 = 0.0
+
+    def _record(self, kind, index, value, detail):
+        event = Event(kind, index, value, detail)
+        if len(self.events) < self.max_events:
+            self.events.append(event)
+        return event
+
+    def _close_warmup(self, found):
+        mean, std = self.baseline.mean, self.baseline.std
+        limit = mean + self.spike_sigma * std
+        for index, value in self._warmup_samples:
+            if value > limit:
+                self.warmup_outliers += 1
+                found.append(self._record("warmup", index, value, f"baseline {mean:.1f}"))
+        warm_mean = sum(v for _, v in self._warmup_samples) / len(self._warmup_samples)
+        self.warmup_excess = warm_mean - mean
+        self._warmup_samples = []
+        self._warmup_done = True
+
+    def _note_spike(self, position):
+        if self._last_spike is not None:
+            gap = position - self._last_spike
+            self._gap_n += 1
+            delta = gap - self._gap_mean
+            self._gap_mean += delta / self._gap_n
+            self._gap_m2 += delta * (gap - self._gap_mean)
+        self._last_spike = position
+
+    def update(self, value, t=None):
+        """
+        Feeds one sample and returns the list of events it triggered.
+        `t` (seconds) is optional; when given, stall periods are in seconds
+        instead of message counts.
+        """
+        index = self.count
+        self.count += 1
+        found = []
+
+        if not self._warmup_done and index < self.warmup:
+            self._warmup_samples.append((index, value))
+            return found
+
+        stats = self.baseline
+        if stats.count < max(self.warmup, 2):
+            stats.push(value)
+            if not self._warmup_done and stats.count >= self.warmup:
+                self._close_warmup(found)
+            return found
+
+        mean, std = stats.mean, stats.std
+        z = (value - mean) / std if std > 0 else 0.0
+
+        if z > self.spike_sigma:
+            self.spikes += 1
+            self.max_z = max(self.max_z, z)
+            self._note_spike(t if t is not None else index)
+            found.append(self._record("spike", index, value, f"z={z:.1f}"))
+        else:
+            stats.push(value)
+
+        # Clip so one huge stall cannot raise a changepoint on its own
+        zc = max(-self.spike_sigma, min(self.spike_sigma, z))
+        self._cusum_hi = max(0.0, self._cusum_hi + zc - self.cusum_k)
+        self._cusum_lo = max(0.0, self._cusum_lo - zc - self.cusum_k)
+        if self._cusum_hi > self.cusum_h or self._cusum_lo > self.cusum_h:
+            direction = "up" if self._cusum_hi > self.cusum_h else "down"
+            self.changepoints += 1
+            found.append(self._record("changepoint", index, value, f"{direction} from {mean:.1f}"))
+            self._cusum_hi = 0.0
+            self._cusum_lo = 0.0
+            stats.clear()
+            stats.push(value)
+
+        return found
+
+    def stall_period(self):
+        """Mean gap between spikes if the spikes look periodic, else None."""
+        if self.spikes < self.min_spikes or self._gap_n < 2 or self._gap_mean <= 0:
+            return None
+        cv = math.sqrt(self._gap_m2 / (self._gap_n - 1)) / self._gap_mean
+        return self._gap_mean if cv < self.period_cv else None
+
+    def summary(self):
+        """Fixed set of fields suitable for a benchmark_summary row."""
+        # Short runs never build a full baseline; judge warm-up on what we have
+        if not self._warmup_done and self.baseline.count >= 2:
+            self._close_warmup([])
+        period = self.stall_period()
+        return {
+            "Warmup_Outliers": self.warmup_outliers,
+            "Warmup_Excess_uS": f"{self.warmup_excess:.2f}",
+            "Spikes": self.spikes,
+            "Spike_Rate_pct": f"{(self.spikes / self.count * 100) if self.count else 0:.2f}",
+            "Max_Spike_Z": f"{self.max_z:.1f}",
+            "Changepoints": self.changepoints,
+            "Stall_Period": f"{period:.1f}" if period is not None else "",
+        }
+
+    def summary_fields(self, prefix):
+        """summary() with every key prefixed, e.g. Sign_Spikes."""
+        return {f"{prefix}_{k}": v for k, v in self.summary().items()}
+
+    def report(self):
+        """Prints a short human-readable block, matching the finalize output."""
+        s = self.summary()
+        print(f"{self.name} anomalies ({self.count} samples):")
+        print(f"  Warm-up:      {s['Warmup_Outliers']} outliers, {s['Warmup_Excess_uS']} us vs baseline")
+        print(f"  Spikes:       {s['Spikes']} ({s['Spike_Rate_pct']}%), max z {s['Max_Spike_Z']}")
+        print(f"  Changepoints: {s['Changepoints']}")
+        if s["Stall_Period"]:
+            print(f"  Periodic stalls every ~{s['Stall_Period']} samples")
+
+
+def analyze_csv(path, columns=TIMING_COLUMNS, **kwargs):
+    """Runs a detector over each timing column present in a raw CSV."""
+    with open(path, newline="") as f:
+        reader = csv.DictReader(f)
+        present = [c for c in columns if c in (reader.fieldnames or [])]
+        detectors = {c: JitterDetector(c, **kwargs) for c in present}
+        for row in reader:
+            # Batched therm CSVs repeat the batch's timings on every reading
+            if row.get("Reading") not in (None, "", "0"):
+                continue
+            for column, detector in detectors.items():
+                try:
+                    detector.update(float(row[column]))
+                except (TypeError, ValueError):
+                    continue
+    return detectors
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Flag warm-up, stalls and changepoints in raw timing CSVs.")
+    parser.add_argument("files", nargs="+", help="raw_packet_data / benchmark_results CSV files")
+    parser.add_argument("--window", type=int, default=200)
+    parser.add_argument("--warmup", type=int, default=50)
+    parser.add_argument("--sigma", type=float, default=4.0, help="spike threshold in standard deviations")
+    parser.add_argument("--events", action="store_true", help="list every event, not just the summary")
+    args = parser.parse_args()
+
+    for path in args.files:
+        print(f"=== {path} ===")
+        detectors = analyze_csv(path, window=args.window, warmup=args.warmup, spike_sigma=args.sigma)
+        for detector in detectors.values():
+            detector.report()
+            if args.events:
+                for e in detector.events:
+                    print(f"    #{e.index:<6} {e.kind:<11} {e.value:>10.1f}  {e.detail}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,559 @@
+"""
+Hash-chained, segmented archive of raw broker payloads, audited lazily.
+
+    archive = ArchiveWriter("archive/pi5", scheme)   # or Archive(root).writer("pi5", scheme)
+    archive.append(payload)                          # hot path: one deque append
+    archive.close()
+
+    python -m iotbench.archive info archive/
+    python -m iotbench.archive audit archive/ --stream pi5 [--start-us ..] [--device 1a2b..] [--workers 4]
+
+With --archive DIR the broker verifiers append every payload exactly as
+received, before any parsing. --archive-only also skips inline
+verification: the message is counted as unverified and proof is deferred
+to `audit`.
+
+Layout, one directory per stream (the verifier's device name):
+
+    <root>/<stream>/stream.json                  scheme name and chain genesis
+    <root>/<stream>/<first_seq:016d>.log         records: [Len(4)][Time_us(8)][Payload]
+    <root>/<stream>/<first_seq:016d>.idx         one IDX entry per record
+    <root>/<stream>/<first_seq:016d>.seal.json   count, time range, chain ends; written at roll
+    <root>/<stream>/<first_seq:016d>.audit-<scheme>.json   cached audit of the segment
+
+An IDX entry is (time_us, offset, length, device, frame_seq, chain):
+device is an 8-byte BLAKE2b of the signer key (zeros for shared-key
+schemes), frame_seq the FRAME_META counter of --sequence producers (-1
+without), and chain the running hash
+
+    chain[n] = BLAKE2b-256(chain[n-1] || Len || Time_us || Payload)
+
+starting from BLAKE2b-256 of the stream name. Editing, dropping or
+reordering any record breaks every later link, and the seal pins the
+chain across segments. The flush thread does the parsing, hashing and
+the two sequential writes every flush_ms.
+
+`audit` selects records by archive sequence, receive time or device from
+the index. It then recomputes the chain and verifies every signature or CID of each
+segment touched, on a process pool, one segment per task. The result is
+cached per segment, keyed by its record count, last chain hash and log
+size and mtime, so re-auditing an untouched sealed segment is a file read. A crash loses at most
+the last flush: on reopen the active segment is trimmed to its last whole
+index entry.
+"""
+import argparse
+import atexit
+import collections
+import hashlib
+import json
+import os
+import struct
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+from iotbench.codec import CodecError, split_frame_meta
+from iotbench.schemes import SCHEMES, get_scheme
+
+SEGMENT_BYTES = 64 << 20
+FLUSH_RECORDS = 8192
+FLUSH_MS = 200
+
+RECORD = struct.Struct("<Iq")              # payload length, receive time (us)
+IDX = struct.Struct("<qQI8sq32s")          # time_us, offset, length, device, frame_seq, chain
+NO_DEVICE = bytes(8)
+
+Entry = collections.namedtuple("Entry", "seq time_us offset length device frame_seq chain")
+
+
+def genesis(stream):
+    return hashlib.blake2b(f"iotbench-archive:{stream}".encode(), digest_size=32).digest()
+
+
+def link(prev, header, payload):
+    h = hashlib.blake2b(prev, digest_size=32)
+    h.update(header)
+    h.update(payload)
+    return h.digest()
+
+
+def device_id(key):
+    return hashlib.blake2b(bytes(key), digest_size=8).digest() if key else NO_DEVICE
+
+
+def _read_json(path):
+    with open(path) as f:
+        return json.load(f)
+
+
+def _write_json(path, obj):
+    tmp = path + ".tmp"
+    with open(tmp, "w") as f:
+        json.dump(obj, f)
+    os.replace(tmp, path)
+
+
+def list_segments(path):
+    """[(first_seq, path prefix)] in order."""
+    return sorted((int(name[:-4]), os.path.join(path, name[:-4]))
+                  for name in os.listdir(path) if name.endswith(".idx") and name[:-4].isdigit())
+
+
+def read_index(prefix, first_seq):
+    with open(prefix + ".idx", "rb") as f:
+        buf = f.read()
+    buf = buf[:len(buf) - len(buf) % IDX.size]
+    return [Entry(first_seq + i, *fields) for i, fields in enumerate(IDX.iter_unpack(buf))]
+
+
+def _last_entry(prefix):
+    """(count, last chain) of a segment from the end of its index."""
+    size = os.path.getsize(prefix + ".idx") // IDX.size
+    if not size:
+        return 0, None
+    with open(prefix + ".idx", "rb") as f:
+        f.seek((size - 1) * IDX.size)
+        return size, IDX.unpack(f.read(IDX.size))[5]
+
+
+# --- WRITER ---
+class ArchiveWriter:
+    """
+    Appends one stream's raw payloads. append() only queues; a flush thread
+    parses the header (device, frame seq), extends the chain and writes the
+    log and index every flush_ms (or every FLUSH_RECORDS payloads).
+    """
+
+    def __init__(self, path, scheme, segment_bytes=SEGMENT_BYTES, flush_ms=FLUSH_MS, deferred=False):
+        self.path = path
+        self.stream = os.path.basename(os.path.normpath(path))
+        self.scheme = scheme
+        self.segment_bytes = segment_bytes
+        self.flush_ms = flush_ms
+        self.deferred = deferred  # the caller skips inline verification
+        self.appended = 0
+        self.written = 0
+        self.bytes_written = 0
+        self.errors = 0
+        self._pending = collections.deque()
+        self._wake = threading.Event()
+        self._closing = False
+        self._closed = False
+        self._log = self._idx = None
+        self._segment = None
+        self._seg_first = self._seg_count = self._seg_bytes = 0
+        self._seg_min = self._seg_max = None
+        self._open_stream()
+        self._thread = threading.Thread(target=self._run, name=f"archive-{self.stream}", daemon=True)
+        self._thread.start()
+
+    @property
+    def backlog(self):
+        return len(self._pending)
+
+    def append(self, payload, time_us=None):
+        """Queues one payload as received; nothing is parsed or verified here."""
+        self._pending.append((time.time_ns() // 1000 if time_us is None else time_us, payload))
+        self.appended += 1
+        if len(self._pending) >= FLUSH_RECORDS:
+            self._wake.set()
+
+    def close(self):
+        """Writes everything still queued; the active segment stays open for the next run."""
+        if self._closed:
+            return
+        self._closed = True
+        self._closing = True
+        self._wake.set()
+        self._thread.join()
+        self._close_files()
+
+    def report(self):
+        print(f"Archived:        {self.written} payloads ({self.bytes_written / 1e6:.1f} MB) in {self.path}, "
+              f"next seq {self.next_seq}" + (f", {self.errors} write errors" if self.errors else ""))
+
+    # --- flush thread ---
+    def _run(self):
+        while True:
+            self._wake.wait(self.flush_ms / 1000)
+            self._wake.clear()
+            closing = self._closing
+            while self._pending:
+                items = []
+                while self._pending and len(items) < FLUSH_RECORDS:
+                    items.append(self._pending.popleft())
+                try:
+                    self._write(items)
+                except Exception as e:
+                    self.errors += 1
+                    print(f"Archive write failed ({len(items)} payloads dropped): {e}")
+            if closing:
+                break
+
+    def _describe(self, payload):
+        """(device, frame_seq) from the payload's header; a malformed one is archived all the same."""
+        try:
+            frame = self.scheme.decode_frame(payload)
+            seq = split_frame_meta(frame)[1]
+            return device_id(frame.key), -1 if seq is None else seq
+        except CodecError:
+            return NO_DEVICE, -1
+
+    def _write(self, items):
+        log, idx = bytearray(), bytearray()
+        for time_us, payload in items:
+            if self._log is None or self._seg_bytes + len(log) >= self.segment_bytes:
+                self._flush(log, idx)
+                log, idx = bytearray(), bytearray()
+                self._roll()
+            header = RECORD.pack(len(payload), time_us)
+            self._chain = link(self._chain, header, payload)
+            device, frame_seq = self._describe(payload)
+            offset = self._seg_bytes + len(log) + RECORD.size
+            log += header
+            log += payload
+            idx += IDX.pack(time_us, offset, len(payload), device, frame_seq, self._chain)
+            if self._seg_min is None:
+                self._seg_min = time_us
+            self._seg_max = max(self._seg_max or time_us, time_us)
+        self._flush(log, idx)
+
+    def _flush(self, log, idx):
+        if not idx:
+            return
+        n = len(idx) // IDX.size
+        self._log.write(log)
+        self._log.flush()
+        self._idx.write(idx)  # after the log, so an index entry never points past the data
+        self._idx.flush()
+        self._seg_bytes += len(log)
+        self._seg_count += n
+        self.next_seq += n
+        self.written += n
+        self.bytes_written += len(log)
+
+    # --- segments ---
+    def _open_stream(self):
+        os.makedirs(self.path, exist_ok=True)
+        stream_path = os.path.join(self.path, "stream.json")
+        if os.path.exists(stream_path):
+            stream = _read_json(stream_path)
+            if stream["scheme"] != self.scheme.name:
+                raise ValueError(f"{self.path} archives '{stream['scheme']}' payloads, not '{self.scheme.name}'")
+        else:
+            _write_json(stream_path, {"scheme": self.scheme.name, "genesis": genesis(self.stream).hex()})
+        self.next_seq = 0
+        self._chain = genesis(self.stream)
+        segments = list_segments(self.path)
+        if not segments:
+            return
+        first_seq, prefix = segments[-1]
+        if os.path.exists(prefix + ".seal.json"):
+            seal = _read_json(prefix + ".seal.json")
+            self.next_seq = seal["first_seq"] + seal["count"]
+            self._chain = bytes.fromhex(seal["last_chain"])
+            return
+        # Resume the unsealed segment, trimming a partially written flush
+        entries = read_index(prefix, first_seq)
+        os.truncate(prefix + ".idx", len(entries) * IDX.size)
+        end = entries[-1].offset + entries[-1].length if entries else 0
+        os.truncate(prefix + ".log", end)
+        if entries:
+            self._chain = entries[-1].chain
+            self._seg_min = min(e.time_us for e in entries)
+            self._seg_max = max(e.time_us for e in entries)
+        elif len(segments) > 1:
+            self._chain = bytes.fromhex(_read_json(segments[-2][1] + ".seal.json")["last_chain"])
+        self._segment, self._seg_first = prefix, first_seq
+        self._seg_count, self._seg_bytes = len(entries), end
+        self.next_seq = first_seq + len(entries)
+        self._open_files()
+
+    def _roll(self):
+        if self._log is not None:
+            self._close_files()
+            if self._seg_count:
+                _write_json(self._segment + ".seal.json", {
+                    "first_seq": self._seg_first, "count": self._seg_count, "bytes": self._seg_bytes,
+                    "min_time_us": self._seg_min, "max_time_us": self._seg_max,
+                    "last_chain": self._chain.hex()})
+            else:
+                os.remove(self._segment + ".log")
+                os.remove(self._segment + ".idx")
+        self._seg_first = self.next_seq
+        self._segment = os.path.join(self.path, f"{self.next_seq:016d}")
+        self._seg_count = self._seg_bytes = 0
+        self._seg_min = self._seg_max = None
+        self._open_files()
+
+    def _open_files(self):
+        self._log = open(self._segment + ".log", "ab")
+        self._idx = open(self._segment + ".idx", "ab")
+
+    def _close_files(self):
+        if self._log is not None:
+            self._log.close()
+            self._idx.close()
+        self._log = self._idx = None
+
+
+# --- READER ---
+class Archive:
+    """Opens writers and reads the index of every stream under `root`."""
+
+    def __init__(self, root):
+        self.root = root
+
+    def writer(self, stream, scheme, **kwargs):
+        return ArchiveWriter(os.path.join(self.root, stream), scheme, **kwargs)
+
+    def streams(self):
+        if not os.path.isdir(self.root):
+            return []
+        return sorted(d for d in os.listdir(self.root) if os.path.exists(os.path.join(self.root, d, "stream.json")))
+
+    def stream(self, name):
+        return _read_json(os.path.join(self.root, name, "stream.json"))
+
+    def segments(self, stream):
+        """[{first_seq, prefix, sealed, count, min/max_time_us?, prev_chain}] in order."""
+        out = []
+        prev = genesis(stream)
+        for first_seq, prefix in list_segments(os.path.join(self.root, stream)):
+            seg = {"first_seq": first_seq, "prefix": prefix, "prev_chain": prev}
+            if os.path.exists(prefix + ".seal.json"):
+                seal = _read_json(prefix + ".seal.json")
+                seg.update(sealed=True, count=seal["count"], bytes=seal["bytes"], min_time_us=seal["min_time_us"],
+                           max_time_us=seal["max_time_us"], last_chain=bytes.fromhex(seal["last_chain"]))
+            else:
+                count, last = _last_entry(prefix)
+                seg.update(sealed=False, count=count, bytes=os.path.getsize(prefix + ".log"), last_chain=last)
+            prev = seg["last_chain"] or prev
+            out.append(seg)
+        return out
+
+    def select(self, stream, start_seq=None, end_seq=None, start_us=None, end_us=None, device=None):
+        """{segment first_seq: [Entry]} for records in the (inclusive) ranges, device an 8-byte id."""
+        out = {}
+        for seg in self.segments(stream):
+            first, last = seg["first_seq"], seg["first_seq"] + seg["count"] - 1
+            if (start_seq is not None and last < start_seq) or (end_seq is not None and first > end_seq):
+                continue
+            if seg["sealed"] and ((start_us is not None and seg["max_time_us"] < start_us) or
+                                  (end_us is not None and seg["min_time_us"] > end_us)):
+                continue
+            entries = [e for e in read_index(seg["prefix"], first)
+                       if (start_seq is None or e.seq >= start_seq) and (end_seq is None or e.seq <= end_seq)
+                       and (start_us is None or e.time_us >= start_us) and (end_us is None or e.time_us <= end_us)
+                       and (device is None or e.device == device)]
+            if entries:
+                out[first] = entries
+        return out
+
+    def read(self, stream, entry):
+        """The payload of one Entry."""
+        for first_seq, prefix in reversed(list_segments(os.path.join(self.root, stream))):
+            if first_seq <= entry.seq:
+                with open(prefix + ".log", "rb") as f:
+                    f.seek(entry.offset)
+                    return f.read(entry.length)
+        raise KeyError(entry.seq)
+
+
+# --- AUDIT ---
+def audit_config(scheme_name, secret=None, ipfs_exe=None):
+    """Picklable recipe for the scheme a worker verifies with."""
+    return {"name": scheme_name, "secret": secret, "ipfs_exe": ipfs_exe}
+
+
+def audit_segment(prefix, first_seq, prev_chain, config):
+    """
+    Re-hashes and verifies one whole segment. Returns counts, the archive
+    seqs that failed to verify or parse, and where the chain first broke.
+    """
+    start = time.perf_counter()
+    scheme = get_scheme(config["name"], secret=config["secret"], ipfs_exe=config["ipfs_exe"])
+    entries = read_index(prefix, first_seq)
+    log_mtime_ns = os.stat(prefix + ".log").st_mtime_ns
+    with open(prefix + ".log", "rb") as f:
+        log = f.read()
+    view = memoryview(log)
+    prepared = {}
+    invalid, malformed, chain_break = [], [], None
+    chain = prev_chain
+    for e in entries:
+        header = view[e.offset - RECORD.size:e.offset]
+        payload = view[e.offset:e.offset + e.length]
+        chain = link(chain, header, payload)
+        if chain_break is None and (chain != e.chain or RECORD.unpack(header) != (e.length, e.time_us)):
+            chain_break = e.seq
+        try:
+            frame = scheme.decode_frame(payload)
+        except CodecError:
+            malformed.append(e.seq)
+            continue
+        key = bytes(frame.key)
+        verifier = prepared.get(key)
+        if verifier is None:
+            verifier = prepared[key] = scheme.prepare(key)
+        if not scheme.verify_prepared(verifier, frame.data, frame.tag):
+            invalid.append(e.seq)
+    return {"first_seq": first_seq, "count": len(entries), "bytes": len(log), "log_mtime_ns": log_mtime_ns,
+            "last_chain": entries[-1].chain.hex() if entries else None, "scheme": config["name"],
+            "chain_break": chain_break, "invalid": invalid, "malformed": malformed,
+            "seconds": round(time.perf_counter() - start, 4)}
+
+
+def _cache_path(prefix, scheme_name):
+    return f"{prefix}.audit-{scheme_name}.json"
+
+
+def _cached(seg, scheme_name):
+    path = _cache_path(seg["prefix"], scheme_name)
+    if not os.path.exists(path):
+        return None
+    result = _read_json(path)
+    last = seg["last_chain"].hex() if seg["last_chain"] else None
+    log = os.stat(seg["prefix"] + ".log")
+    if (result["count"], result["last_chain"], result["bytes"], result["log_mtime_ns"]) != \
+            (seg["count"], last, log.st_size, log.st_mtime_ns):
+        return None  # the segment grew, or was touched, since
+    return result
+
+
+AuditReport = collections.namedtuple(
+    "AuditReport", "records valid invalid malformed chain_ok chain_breaks segments cached seconds bytes bad_seqs")
+
+
+def audit(root, stream, scheme=None, secret=None, ipfs_exe=None, start_seq=None, end_seq=None, start_us=None,
+          end_us=None, device=None, workers=None, mode="process", use_cache=True):
+    """
+    Audits the selected records of `stream`: every segment holding one of
+    them is re-hashed and verified whole (or read from its cache), then
+    the counts are narrowed to the selection. A chain break anywhere in a
+    touched segment fails the audit, selected or not.
+    """
+    archive = Archive(root)
+    scheme = scheme or archive.stream(stream)["scheme"]
+    selected = archive.select(stream, start_seq, end_seq, start_us, end_us, device)
+    segments = {seg["first_seq"]: seg for seg in archive.segments(stream)}
+    config = audit_config(scheme, secret, ipfs_exe)
+    start = time.perf_counter()
+    results, todo = {}, []
+    for first in selected:
+        cached = _cached(segments[first], scheme) if use_cache else None
+        if cached:
+            results[first] = cached
+        else:
+            todo.append(segments[first])
+    workers = min(workers or os.cpu_count() or 1, len(todo)) or 1
+    if workers == 1 or mode == "inline":
+        fresh = [audit_segment(s["prefix"], s["first_seq"], s["prev_chain"], config) for s in todo]
+    else:
+        pool = ProcessPoolExecutor if mode == "process" else ThreadPoolExecutor
+        with pool(workers) as executor:
+            fresh = list(executor.map(audit_segment, [s["prefix"] for s in todo], [s["first_seq"] for s in todo],
+                                      [s["prev_chain"] for s in todo], [config] * len(todo)))
+    for seg, result in zip(todo, fresh):
+        results[seg["first_seq"]] = result
+        _write_json(_cache_path(seg["prefix"], scheme), result)
+
+    records = invalid = malformed = nbytes = 0
+    bad_seqs, chain_breaks = [], []
+    for first, entries in selected.items():
+        result = results[first]
+        bad, unparsed = set(result["invalid"]), set(result["malformed"])
+        seqs = [e.seq for e in entries]
+        records += len(seqs)
+        invalid += sum(s in bad for s in seqs)
+        malformed += sum(s in unparsed for s in seqs)
+        bad_seqs += [s for s in seqs if s in bad or s in unparsed]
+        nbytes += sum(e.length for e in entries)
+        if result["chain_break"] is not None:
+            chain_breaks.append(result["chain_break"])
+        elif segments[first]["sealed"] and result["last_chain"] != segments[first]["last_chain"].hex():
+            chain_breaks.append(first + result["count"] - 1)  # the seal no longer matches the records
+    # Segments must follow on: a missing one leaves a gap in the archive seqs
+    ordered = list(segments.values())
+    for prev, seg in zip(ordered, ordered[1:]):
+        if seg["first_seq"] in selected and prev["first_seq"] + prev["count"] != seg["first_seq"]:
+            chain_breaks.append(seg["first_seq"])
+    return AuditReport(records, records - invalid - malformed, invalid, malformed, not chain_breaks,
+                       sorted(chain_breaks), len(selected), len(selected) - len(todo),
+                       time.perf_counter() - start, nbytes, bad_seqs)
+
+
+# --- BROKER ARGS ---
+def add_archive_args(parser):
+    parser.add_argument("--archive", default=None, help="append every raw payload to the hash-chained archive in DIR")
+    parser.add_argument("--archive-only", action="store_true",
+                        help="with --archive: skip inline verification (audit later with iotbench.archive)")
+    parser.add_argument("--archive-segment-mb", type=int, default=SEGMENT_BYTES >> 20, help="MB per archive segment")
+
+
+def archive_from_args(args, stream, scheme):
+    """ArchiveWriter for this broker's stream, or None without --archive. Closed at exit."""
+    if not args.archive:
+        if args.archive_only:
+            raise SystemExit("--archive-only needs --archive DIR")
+        return None
+    writer = Archive(args.archive).writer(stream, scheme, segment_bytes=args.archive_segment_mb << 20,
+                                          deferred=args.archive_only)
+    atexit.register(writer.close)
+    print(f"Archiving raw {stream} payloads in {writer.path} (next seq {writer.next_seq})"
+          + ("; inline verification off" if writer.deferred else ""))
+    return writer
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Inspect or audit a hash-chained payload archive.")
+    sub = parser.add_subparsers(dest="command", required=True)
+    i = sub.add_parser("info", help="streams, segments and record counts")
+    i.add_argument("root")
+    a = sub.add_parser("audit", help="re-hash and verify a range of records")
+    a.add_argument("root")
+    a.add_argument("--stream", required=True)
+    a.add_argument("--scheme", choices=sorted(SCHEMES), default=None, help="default: the stream's scheme")
+    a.add_argument("--secret-hex", default=None, help="shared key for hmac-sha256/blake2b (hex)")
+    a.add_argument("--ipfs-exe", default=None, help="kubo binary for cid (default: in-process CIDs)")
+    a.add_argument("--start-seq", type=int, default=None)
+    a.add_argument("--end-seq", type=int, default=None)
+    a.add_argument("--start-us", type=int, default=None)
+    a.add_argument("--end-us", type=int, default=None)
+    a.add_argument("--device", default=None, help="8-byte device id in hex (see info --devices)")
+    a.add_argument("--workers", type=int, default=None, help="parallel segment audits (default: CPU count)")
+    a.add_argument("--no-cache", action="store_true", help="re-verify even segments with a cached result")
+    i.add_argument("--devices", action="store_true", help="also count records per device id")
+    args = parser.parse_args()
+
+    archive = Archive(args.root)
+    if args.command == "info":
+        for stream in archive.streams():
+            segments = archive.segments(stream)
+            records = sum(s["count"] for s in segments)
+            size = sum(s["bytes"] for s in segments)
+            sealed = sum(s["sealed"] for s in segments)
+            print(f"{stream:<8} {archive.stream(stream)['scheme']:<12} {records:>10} records {size / 1e6:>9.1f} MB "
+                  f"in {len(segments)} segments ({sealed} sealed)")
+            if args.devices:
+                counts = collections.Counter(e.device for entries in archive.select(stream).values() for e in entries)
+                for device, n in counts.most_common():
+                    print(f"    {device.hex()} {n:>10}")
+        return
+
+    secret = bytes.fromhex(args.secret_hex) if args.secret_hex else None
+    device = bytes.fromhex(args.device) if args.device else None
+    r = audit(args.root, args.stream, args.scheme, secret, args.ipfs_exe, args.start_seq, args.end_seq,
+              args.start_us, args.end_us, device, args.workers, use_cache=not args.no_cache)
+    rate = r.records / r.seconds if r.seconds else 0
+    print(f"Audited {r.records} records ({r.bytes / 1e6:.1f} MB) in {r.segments} segments "
+          f"({r.cached} cached) in {r.seconds:.2f}s ({rate:,.0f} records/s)")
+    print(f"Valid: {r.valid}  Invalid: {r.invalid}  Malformed: {r.malformed}  "
+          f"Chain: {'intact' if r.chain_ok else f'BROKEN at seq {r.chain_breaks}'}")
+    if r.bad_seqs:
+        print(f"Failed seqs: {r.bad_seqs[:20]}{' ...' if len(r.bad_seqs) > 20 else ''}")
+    raise SystemExit(0 if r.chain_ok and not r.invalid and not r.malformed else 1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,143 @@
+"""
+Archive-then-audit against inline verification, per payload shape.
+
+    python -m iotbench.bench_archive
+    python -m iotbench.bench_archive --scheme hmac-sha256 --count 20000 --devices 8 --workers 4 --csv archive_bench.csv
+
+For each payload shape (therm, led240, chunk4k) it signs --count frames
+from --devices device keys, round-robin, then measures four things:
+
+  inline    decode + prepare + verify per message, as the verifiers do
+            without --archive-only (keys prepared once per device)
+  ingest    ArchiveWriter.append() on the caller's thread (Append_uS), and
+            end to end until close() has written and chained everything
+            (Ingest_Msgs_s, Ingest_MB_s)
+  audit     cold audit of the whole stream, first with one worker, then
+            with --workers processes (one segment per task)
+  cached    the same audit again, answered from the per-segment caches
+
+Segments are --segment-kb so the parallel audit has work to spread. The
+archive is written to a temporary directory unless --dir is given.
+"""
+import argparse
+import csv
+import os
+import shutil
+import tempfile
+import time
+
+from iotbench.archive import Archive, audit
+from iotbench.codec import FLAG_FRAME_META, FRAME_META
+from iotbench.histogram import Histogram
+from iotbench.microbench import payloads
+from iotbench.schemes import SCHEMES, get_scheme
+
+CSV_FIELDS = ["Shape", "Scheme", "Payload_Bytes", "Messages", "Segments", "Inline_Msgs_s", "Append_Mean_uS",
+              "Append_P99_uS", "Ingest_Msgs_s", "Ingest_MB_s", "Audit_1_Msgs_s", "Audit_N_Msgs_s", "Workers",
+              "Audit_Cached_Msgs_s", "Audit_Valid"]
+
+
+def sign_frames(scheme_name, body, count, devices, secret=None):
+    """`count` framed payloads from `devices` signers, round-robin."""
+    signers = [get_scheme(scheme_name, secret=secret, generate=True) for _ in range(devices)]
+    frames = []
+    for seq in range(count):
+        scheme = signers[seq % devices]
+        data = FRAME_META.pack(time.time_ns() // 1000, seq) + body
+        tag, sign_time_us = scheme.timed_tag(data)
+        frames.append(scheme.encode(data, tag, sign_time_us, FLAG_FRAME_META))
+    return frames
+
+
+def inline_rate(scheme, frames):
+    prepared = {}
+    start = time.perf_counter()
+    for payload in frames:
+        frame = scheme.decode_frame(payload)
+        key = bytes(frame.key)
+        verifier = prepared.get(key)
+        if verifier is None:
+            verifier = prepared[key] = scheme.prepare(key)
+        scheme.verify_prepared(verifier, frame.data, frame.tag)
+    return len(frames) / (time.perf_counter() - start)
+
+
+def run_shape(root, shape, body, args, secret):
+    frames = sign_frames(args.scheme, body, args.count, args.devices, secret)
+    scheme = get_scheme(args.scheme, secret=secret)
+    inline = inline_rate(scheme, frames)
+
+    writer = Archive(root).writer(shape, scheme, segment_bytes=args.segment_kb << 10)
+    appends = Histogram()
+    start = time.perf_counter()
+    for payload in frames:
+        t0 = time.perf_counter_ns()
+        writer.append(payload)
+        appends.record((time.perf_counter_ns() - t0) / 1000)
+    writer.close()
+    ingest_s = time.perf_counter() - start
+
+    one = audit(root, shape, secret=secret, workers=1, use_cache=False)
+    many = audit(root, shape, secret=secret, workers=args.workers, use_cache=False)
+    cached = audit(root, shape, secret=secret, workers=args.workers)
+    a = appends.summary()
+    return {
+        "Shape": shape,
+        "Scheme": args.scheme,
+        "Payload_Bytes": len(frames[0]),
+        "Messages": len(frames),
+        "Segments": one.segments,
+        "Inline_Msgs_s": round(inline),
+        "Append_Mean_uS": a["Mean_uS"],
+        "Append_P99_uS": a["P99_uS"],
+        "Ingest_Msgs_s": round(len(frames) / ingest_s),
+        "Ingest_MB_s": round(writer.bytes_written / ingest_s / 1e6, 1),
+        "Audit_1_Msgs_s": round(one.records / one.seconds),
+        "Audit_N_Msgs_s": round(many.records / many.seconds),
+        "Workers": args.workers,
+        "Audit_Cached_Msgs_s": round(cached.records / cached.seconds),
+        "Audit_Valid": many.valid == len(frames) and many.chain_ok,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Archive ingest and lazy audit vs inline verification.")
+    parser.add_argument("--scheme", choices=sorted(SCHEMES), default="ed25519")
+    parser.add_argument("--secret-hex", default=None, help="shared key for hmac-sha256/blake2b (hex)")
+    parser.add_argument("--count", type=int, default=5000, help="messages per shape")
+    parser.add_argument("--devices", type=int, default=4, help="signing keys, round-robin")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1, help="processes for the parallel audit")
+    parser.add_argument("--segment-kb", type=int, default=1024, help="archive segment size")
+    parser.add_argument("--shapes", nargs="+", default=["therm", "led240", "chunk4k"])
+    parser.add_argument("--dir", default=None, help="archive here (kept) instead of a temporary directory")
+    parser.add_argument("--csv", default=None)
+    args = parser.parse_args()
+
+    secret = bytes.fromhex(args.secret_hex) if args.secret_hex else None
+    shapes = payloads()
+    root = args.dir or tempfile.mkdtemp(prefix="archive-bench-")
+    print(f"Scheme {args.scheme}, {args.count} msgs per shape from {args.devices} devices, "
+          f"{args.segment_kb} KB segments, {args.workers} audit workers, archive in {root}")
+    print(f"{'Shape':<8} {'Bytes':>6} {'Inline/s':>10} {'Append us':>10} {'Ingest/s':>10} {'MB/s':>7} "
+          f"{'Audit1/s':>10} {'AuditN/s':>10} {'Cached/s':>12} {'Valid':>6}")
+    rows = []
+    try:
+        for shape in args.shapes:
+            r = run_shape(root, shape, shapes[shape], args, secret)
+            rows.append(r)
+            print(f"{shape:<8} {r['Payload_Bytes']:>6} {r['Inline_Msgs_s']:>10,} {r['Append_Mean_uS']:>10} "
+                  f"{r['Ingest_Msgs_s']:>10,} {r['Ingest_MB_s']:>7} {r['Audit_1_Msgs_s']:>10,} "
+                  f"{r['Audit_N_Msgs_s']:>10,} {r['Audit_Cached_Msgs_s']:>12,} {str(r['Audit_Valid']):>6}")
+    finally:
+        if not args.dir:
+            shutil.rmtree(root, ignore_errors=True)
+    if args.csv:
+        with open(args.csv, "w", newline="") as f:
+            writer = csv.DictWriter(f, fieldnames=CSV_FIELDS)
+            writer.writeheader()
+            writer.writerows(rows)
+        print(f"Wrote {args.csv}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,100 @@
+"""
+Ingest throughput and dedupe savings of iotbench.blockstore on the LED and
+video streams, plus a CAR round trip.
+
+    python -m iotbench.bench_blockstore
+    python -m iotbench.bench_blockstore --seconds 600 --cam-bitrate 8000000 --dir /data/blocks --keep
+
+Streams come from the synthetic producers: --seconds of LED frames at 50 Hz
+and of the camera, both as 4 KiB pipe chunks and as whole encoded frames.
+Each is fed through BlockStore.put() as the IPFS verifiers would after the
+CID checks out, backing off while the flush thread is more than
+BACKLOG_LIMIT blocks behind, so "MB/s" is what hashing + appending
+sustains, "put" is the cost on_message pays and "CAR s" is building the DAG
+and exporting it. The LED stream is then ingested a second time as a new
+run into the same store, which is where cross-run dedupe shows. Every CAR
+is re-hashed and reassembled by check_car() and compared with the input.
+"""
+import argparse
+import os
+import shutil
+import statistics
+import tempfile
+import time
+
+from iotbench.blockstore import FLUSH_BLOCKS, BlockStore, check_car, export_stream
+from iotbench.producers import CAM_BITRATE, CAM_FPS, cam_source, h264_frames, light_source, rate_for
+
+BACKLOG_LIMIT = 4 * FLUSH_BLOCKS
+
+
+def streams(seconds, cam_bitrate):
+    led = light_source()
+    n_led = int(seconds * rate_for("pi3"))
+    chunks = cam_source(bitrate=cam_bitrate, seed=1)
+    n_chunks = int(seconds * cam_bitrate / 8 / 4096)
+    frames = h264_frames(cam_bitrate, CAM_FPS, seed=1)
+    return {
+        "light": [next(led) for _ in range(n_led)],
+        "cam chunks": [next(chunks) for _ in range(n_chunks)],
+        "cam frames": [next(frames)[0] for _ in range(int(seconds * CAM_FPS))],
+    }
+
+
+def ingest(root, name, blocks):
+    store = BlockStore(root, name)
+    put_ns = []
+    start = time.perf_counter()
+    for data in blocks:
+        while store.backlog > BACKLOG_LIMIT:
+            time.sleep(0.001)
+        t0 = time.perf_counter_ns()
+        store.put(data)
+        put_ns.append(time.perf_counter_ns() - t0)
+    store.close(car=False)
+    ingest_s = time.perf_counter() - start
+    t0 = time.perf_counter()
+    root_cid = export_stream(root, name, store.index)
+    return store, root_cid, put_ns, ingest_s, time.perf_counter() - t0
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Blockstore ingest rate, dedupe and CAR export.")
+    parser.add_argument("--seconds", type=float, default=120, help="simulated seconds of each stream")
+    parser.add_argument("--cam-bitrate", type=int, default=CAM_BITRATE)
+    parser.add_argument("--dir", default=None, help="blockstore directory (default: a temporary one)")
+    parser.add_argument("--keep", action="store_true", help="keep the blockstore and CARs")
+    args = parser.parse_args()
+
+    root = args.dir or tempfile.mkdtemp(prefix="blocks-")
+    data = streams(args.seconds, args.cam_bitrate)
+    runs = [("light", "light"), ("cam chunks", "cam chunks"), ("cam frames", "cam frames"), ("light rerun", "light")]
+    print(f"{'Stream':<12} {'blocks':>7} {'MiB in':>8} {'stored':>8} {'dedupe':>7} {'MB/s':>7} "
+          f"{'put p50':>8} {'put p99':>8} {'CAR s':>6} {'CAR check'}")
+    try:
+        for run, source in runs:
+            blocks = data[source]
+            name = run.replace(" ", "_")
+            store, root_cid, put_ns, ingest_s, car_s = ingest(root, name, blocks)
+            stream = b"".join(blocks)
+            cat_path = os.path.join(root, f"{name}.out")
+            check = check_car(os.path.join(root, f"{name}.car"), cat_path)
+            with open(cat_path, "rb") as f:
+                same = f.read() == stream
+            os.remove(cat_path)
+            ok = "ok" if same and not check["bad_blocks"] and check["root"] == root_cid else "MISMATCH"
+            saved = 100 * (1 - store.bytes_stored / store.bytes_in)
+            print(f"{run:<12} {store.puts:>7} {store.bytes_in / 2**20:>8.2f} {store.bytes_stored / 2**20:>8.2f} "
+                  f"{saved:>6.1f}% {store.bytes_in / 1e6 / ingest_s:>7.1f} "
+                  f"{statistics.median(put_ns) / 1000:>6.2f}us "
+                  f"{statistics.quantiles(put_ns, n=100)[98] / 1000:>6.2f}us {car_s:>6.2f} {ok} "
+                  f"({check['blocks']} blocks, root {root_cid[:16]}...)")
+    finally:
+        if args.keep:
+            print(f"Kept {root}")
+        else:
+            shutil.rmtree(root, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,197 @@
+"""
+Chained verification against a full signature check on every chunk.
+
+    python -m iotbench.bench_chain
+    python -m iotbench.bench_chain --scheme ed25519ph --checkpoints 1 4 16 64 --count 5000 --csv chain_bench.csv
+
+Over the video shapes (chunk4k: the pipe path's 4 KiB pieces; frame: one
+encoded H.264 frame at the camera's bitrate and frame rate), signed by one
+camera key with every chunk linked by ChunkChain:
+
+  link      producer side: ChunkChain.link() per chunk, next to the
+            signature it is added to
+  full      decode + prepare + verify on every chunk (no --chain-checkpoint)
+  chain/K   decode + StreamChains.check() with a checkpoint every K chunks
+
+Each mode runs --rounds times, interleaved, and the best pass is kept.
+
+Then the chained stream is damaged: --loss chunks dropped in bursts, pairs
+swapped, single bytes flipped, and --forgeries chunks whose CHAIN_LINK
+index is flipped plus as many forged genesis chunks (index 0, zero prev,
+the camera's key, no valid signature) slipped in. One StreamChains pass
+must report each kind of damage separately, with gaps, missing chunks,
+reorders and tampering counted as injected, and every tamper blamed on
+the chunk that was altered or forged (Blamed). A flipped index takes the
+chunk out of its slot, so it also counts as a gap of one; a forgery must
+not move or restart the stream.
+"""
+import argparse
+import csv
+import random
+import time
+
+from iotbench.chain import GENESIS, ChunkChain, StreamChains
+from iotbench.codec import CHAIN_LINK, FLAG_FRAME_META, FRAME_META, HEADER_SIZE
+from iotbench.microbench import payloads
+from iotbench.producers import CAM_BITRATE, CAM_FPS, h264_frames
+from iotbench.schemes import get_scheme
+
+CSV_FIELDS = ["Shape", "Scheme", "Payload_Bytes", "Mode", "Checkpoint", "Chunk_uS", "Speedup", "Signature_Checks"]
+
+
+def chained_frames(signer, bodies):
+    """(payloads, mean link us, mean sign us) for `bodies` linked in order."""
+    chain = ChunkChain()
+    link_ns = sign_ns = 0
+    frames = []
+    for seq, body in enumerate(bodies):
+        t0 = time.perf_counter_ns()
+        data, flags = chain.link(FRAME_META.pack(seq, seq) + body, FLAG_FRAME_META)
+        t1 = time.perf_counter_ns()
+        tag, sign_time_us = signer.timed_tag(data)
+        sign_ns += time.perf_counter_ns() - t1
+        link_ns += t1 - t0
+        frames.append(signer.encode(data, tag, sign_time_us, flags))
+    return frames, link_ns / 1000 / len(bodies), sign_ns / 1000 / len(bodies)
+
+
+def full_us(scheme, frames):
+    start = time.perf_counter_ns()
+    for payload in frames:
+        frame = scheme.decode_frame(payload)
+        scheme.verify_prepared(scheme.prepare(frame.key), frame.data, frame.tag)
+    return (time.perf_counter_ns() - start) / 1000 / len(frames), len(frames)
+
+
+def chain_us(scheme, frames, checkpoint_every):
+    chains = StreamChains(scheme, checkpoint_every=checkpoint_every)
+    start = time.perf_counter_ns()
+    for payload in frames:
+        chains.check(scheme.decode_frame(payload))
+    chains.finish()
+    return (time.perf_counter_ns() - start) / 1000 / len(frames), chains.signature_checks
+
+
+def damage(frames, rng, losses, swaps, flips, forgeries):
+    """
+    (damaged stream of (chunk index, payload), injected counts, altered
+    chunk indices). Damage sites never touch each other. A forged genesis
+    chunk goes in before chunk i, as ("forged", i).
+    """
+    sites = rng.sample(range(2, len(frames) - 4, 4), losses + swaps + flips + 2 * forgeries)
+    lost, swapped = set(sites[:losses]), set(sites[losses:losses + swaps])
+    sites = sites[losses + swaps:]
+    flipped, reindexed, forged = set(sites[:flips]), set(sites[flips:flips + forgeries]), set(sites[flips + forgeries:])
+    out, missing, i = [], forgeries, 0
+    while i < len(frames):
+        if i in forged:
+            payload = bytearray(frames[i])
+            payload[HEADER_SIZE:HEADER_SIZE + CHAIN_LINK.size] = CHAIN_LINK.pack(0, GENESIS)
+            out += [(("forged", i), bytes(payload)), (i, frames[i])]
+            i += 1
+        elif i in lost:
+            burst = rng.randint(1, 3)
+            missing += burst
+            i += burst
+        elif i in swapped:
+            out += [(i + 1, frames[i + 1]), (i, frames[i])]
+            i += 2
+        elif i in flipped:
+            payload = bytearray(frames[i])
+            payload[len(payload) // 2] ^= 0x01  # inside the video data
+            out.append((i, bytes(payload)))
+            i += 1
+        elif i in reindexed:
+            payload = bytearray(frames[i])
+            payload[HEADER_SIZE + 2] ^= 0x01  # the index jumps 65536 ahead
+            out.append((i, bytes(payload)))
+            i += 1
+        else:
+            out.append((i, frames[i]))
+            i += 1
+    injected = {"Gap": losses + forgeries, "Missing": missing, "Reorder": swaps, "Tamper": flips + 2 * forgeries}
+    return out, injected, flipped | reindexed | {("forged", i) for i in forged}
+
+
+def detection(scheme, frames, checkpoint_every, rng, args):
+    stream, injected, altered = damage(frames, rng, args.loss, args.swaps, args.flips, args.forgeries)
+    chains = StreamChains(scheme, checkpoint_every=checkpoint_every)
+    settled = []
+    for index, payload in stream:
+        settled += chains.check(scheme.decode_frame(payload), index)
+    settled += chains.finish()
+    # Every tamper must land on a chunk that was altered, not on its successor
+    blamed = {index for index, check in settled if check.status == "tamper"}
+    return injected, chains.summary(), blamed == altered
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Hash-chained chunks vs full signature checks per chunk.")
+    parser.add_argument("--scheme", choices=["ed25519", "ed25519ph"], default="ed25519")
+    parser.add_argument("--count", type=int, default=2000, help="chunks per shape")
+    parser.add_argument("--checkpoints", type=int, nargs="+", default=[1, 8, 32, 128],
+                        help="K: verify a signature every K chunks")
+    parser.add_argument("--rounds", type=int, default=3, help="best of N passes per mode")
+    parser.add_argument("--loss", type=int, default=5, help="bursts of 1-3 lost chunks to inject")
+    parser.add_argument("--swaps", type=int, default=5, help="adjacent pairs to swap")
+    parser.add_argument("--flips", type=int, default=5, help="chunks to alter by one bit")
+    parser.add_argument("--forgeries", type=int, default=2,
+                        help="chunks with a flipped index, and forged genesis chunks, to inject (each)")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--csv", default=None)
+    args = parser.parse_args()
+
+    signer = get_scheme(args.scheme, generate=True)
+    scheme = get_scheme(args.scheme)
+    video = h264_frames(CAM_BITRATE, CAM_FPS, seed=args.seed)
+    shapes = {"chunk4k": [payloads()["chunk4k"]] * args.count,
+              "frame": [next(video)[0] for _ in range(args.count)]}
+
+    print(f"Scheme {args.scheme}, {args.count} chunks per shape, best of {args.rounds}")
+    print(f"{'Shape':<8} {'Bytes':>6} {'Mode':<9} {'us/chunk':>9} {'Speedup':>8} {'Sig checks':>11}")
+    rows = []
+    for shape, bodies in shapes.items():
+        frames, link, sign = chained_frames(signer, bodies)
+        size = sum(map(len, frames)) // len(frames)
+        print(f"{shape:<8} {size:>6} {'link':<9} {link:>9.2f} {'':>8} {'':>11}  (sign {sign:.1f} us)")
+        rows.append({"Shape": shape, "Scheme": args.scheme, "Payload_Bytes": size, "Mode": "link",
+                     "Checkpoint": "", "Chunk_uS": round(link, 2), "Speedup": "", "Signature_Checks": 0})
+        best = {}
+        for _ in range(args.rounds):  # interleaved, so a noisy stretch hits every mode
+            best["full"] = min(best.get("full", (float("inf"),)), full_us(scheme, frames))
+            for k in args.checkpoints:
+                best[k] = min(best.get(k, (float("inf"),)), chain_us(scheme, frames, k))
+        full = best["full"][0]
+        for mode in ["full", *args.checkpoints]:
+            us, checks = best[mode]
+            label = "full" if mode == "full" else f"chain/{mode}"
+            print(f"{shape:<8} {size:>6} {label:<9} {us:>9.2f} {full / us:>7.1f}x {checks:>11}")
+            rows.append({"Shape": shape, "Scheme": args.scheme, "Payload_Bytes": size,
+                         "Mode": "full" if mode == "full" else "chain",
+                         "Checkpoint": "" if mode == "full" else mode, "Chunk_uS": round(us, 2),
+                         "Speedup": round(full / us, 2), "Signature_Checks": checks})
+
+    print(f"\n--- Detection ({args.loss} loss bursts, {args.swaps} swaps, {args.flips} flips, "
+          f"{args.forgeries} index flips, {args.forgeries} forged genesis) ---")
+    print(f"{'K':>5} {'Gaps':>9} {'Missing':>9} {'Reorders':>9} {'Tampered':>9} {'Blamed':>7}")
+    frames, _, _ = chained_frames(signer, shapes["chunk4k"])
+    exact = True
+    for k in args.checkpoints:
+        injected, found, blamed = detection(scheme, frames, k, random.Random(args.seed), args)
+        cells = [f"{found[name]}/{injected[name]}" for name in ("Gap", "Missing", "Reorder", "Tamper")]
+        print(f"{k:>5} " + " ".join(f"{cell:>9}" for cell in cells) + f" {'right' if blamed else 'WRONG':>7}")
+        exact &= blamed and all(found[name] == injected[name] for name in injected)
+    print("found/injected" + ("" if exact else "  -- MISMATCH"))
+
+    if args.csv:
+        with open(args.csv, "w", newline="") as f:
+            writer = csv.DictWriter(f, fieldnames=CSV_FIELDS)
+            writer.writeheader()
+            writer.writerows(rows)
+        print(f"Wrote {args.csv}")
+    if not exact:
+        raise SystemExit("Chain verification missed or miscounted injected damage")
+
+
+if __name__ == "__main__":
+    main()
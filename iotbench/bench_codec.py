@@ -0,0 +1,216 @@
+"""
+Parse throughput and fuzzing for iotbench.codec.
+
+    python -m iotbench.bench_codec                 # throughput table
+    python -m iotbench.bench_codec --fuzz 200000   # randomized property checks
+
+Throughput compares the framed memoryview decoder against the legacy footer
+slicing the broker scripts used to do by hand (payload[-100:-36] etc.).
+
+The fuzz mode checks, over random payloads:
+  - encode -> decode round-trips exactly for every scheme id and size
+  - any truncation, extension or byte flip of a frame either decodes to a
+    frame whose lengths add up, or raises CodecError; nothing else escapes
+  - random garbage never raises anything but CodecError
+  - through a scheme's decode_frame(), a signed frame verifies; a frame
+    truncated or padded by one byte raises CodecError rather than being
+    read as a legacy payload; and any other mutant either raises
+    CodecError or fails verify(), unless only the unsigned flags or sign
+    time changed
+  - chain links, FRAME_META and (dictionary) compression stack in any
+    combination: split_frame_meta() + decompress() return the original
+    body and counter
+"""
+import argparse
+import os
+import random
+import struct
+import sys
+import time
+
+from iotbench import codec
+from iotbench.chain import ChunkChain
+from iotbench.compression import Compressor, Decompressor
+from iotbench.producers import cam_source, light_source, therm_source
+from iotbench.schemes import get_scheme
+
+
+def legacy_slice(payload):
+    """What every broker did before the codec (copies each piece)."""
+    sign_time_us = struct.unpack('<I', payload[-4:])[0]
+    pub_key_bytes = payload[-36:-4]
+    signature = payload[-100:-36]
+    return payload[:-100], signature, pub_key_bytes, sign_time_us
+
+
+def throughput(fn, payload, seconds):
+    n = 0
+    start = time.perf_counter()
+    end = start + seconds
+    while time.perf_counter() < end:
+        for _ in range(1000):
+            fn(payload)
+        n += 1000
+    elapsed = time.perf_counter() - start
+    return n / elapsed, n * len(payload) / elapsed / 1e6
+
+
+def run_throughput(seconds):
+    shapes = {
+        "therm": next(therm_source(seed=1)),
+        "led240": next(light_source()),
+        "chunk4k": next(cam_source(4096, seed=1)),
+    }
+    tag, key = os.urandom(64), os.urandom(32)
+    print(f"{'Payload':<8} {'Decoder':<16} {'msgs/s':>12} {'MB/s':>10}")
+    for shape, data in shapes.items():
+        framed = codec.encode(codec.SCHEME_IDS["ed25519"], data, tag, key, 123)
+        legacy = codec.encode_legacy(data, tag, key, 123)
+        decoders = {
+            "legacy slicing": (legacy_slice, legacy),
+            "decode_legacy": (lambda p: codec.decode_legacy(p, 1, 64, 32), legacy),
+            "decode (framed)": (codec.decode, framed),
+        }
+        for label, (fn, payload) in decoders.items():
+            rate, mbps = throughput(fn, payload, seconds)
+            print(f"{shape:<8} {label:<16} {rate:>12,.0f} {mbps:>10.1f}")
+
+
+# --- FUZZING ---
+def check_frame(frame, payload):
+    total = codec.HEADER_SIZE + len(frame.data) + len(frame.tag) + len(frame.key)
+    if total != len(payload):
+        raise AssertionError("decoded lengths do not add up")
+    if frame.data.obj is not payload:
+        raise AssertionError("decode copied the buffer")
+
+
+def mutate(rng, payload):
+    choice = rng.randrange(4)
+    buf = bytearray(payload)
+    if choice == 0 and buf:
+        del buf[rng.randrange(len(buf)):]
+    elif choice == 1:
+        buf += rng.randbytes(rng.randint(1, 16))
+    elif choice == 2 and buf:
+        buf[rng.randrange(len(buf))] ^= 1 << rng.randrange(8)
+    else:
+        # Corrupt a header length field specifically
+        if len(buf) >= codec.HEADER_SIZE:
+            buf[rng.randrange(8, codec.HEADER_SIZE)] = rng.randrange(256)
+    return bytes(buf)
+
+
+def check_signed(rng, signer, verifier):
+    """A signed frame and its mutants through decode_frame(); returns the outcome of the mutant."""
+    data = rng.randbytes(rng.choice([0, 1, 25, 240, rng.randint(0, 4096)]))
+    payload = signer.encode(data, flags=rng.randrange(256))
+    frame = verifier.decode_frame(payload)
+    if bytes(frame.data) != data or not verifier.verify(frame.data, frame.tag, frame.key):
+        raise AssertionError("signed frame did not round trip through decode_frame()")
+    for edited in (payload[:-1], payload + b"\0"):
+        try:
+            verifier.decode_frame(edited)
+        except codec.CodecError:
+            continue
+        raise AssertionError(f"a {len(payload)}-byte frame cut or padded to {len(edited)} bytes was accepted")
+
+    mutant = mutate(rng, payload)
+    try:
+        frame = verifier.decode_frame(mutant)
+    except codec.CodecError:
+        return "rejected"
+    if not verifier.verify(frame.data, frame.tag, frame.key):
+        return "unverified"
+    unsigned = range(3, 8)  # flags and sign time
+    if len(mutant) != len(payload) or any(a != b for i, (a, b) in enumerate(zip(mutant, payload))
+                                          if i not in unsigned):
+        raise AssertionError("a mutated signed frame still verified")
+    return "unsigned"
+
+
+def check_layers(rng, compressors, decompressor, chain):
+    """One body through every flag layer the producers stack, and back."""
+    body = rng.randbytes(rng.randint(0, 64)) * rng.randint(1, 8)
+    compressor = rng.choice(compressors)
+    data, flags = compressor.compress(body), compressor.flags
+    seq = rng.randrange(2 ** 32) if rng.random() < 0.5 else None
+    if seq is not None:
+        data, flags = codec.FRAME_META.pack(0, seq) + data, flags | codec.FLAG_FRAME_META
+    if rng.random() < 0.5:
+        data, flags = chain.link(data, flags)
+    frame = codec.decode(codec.encode(codec.SCHEME_IDS["ed25519"], data, b"t" * 64, b"k" * 32, 0, flags))
+    _, got_seq, rest = codec.split_frame_meta(frame)
+    if (got_seq, decompressor.decompress(frame.flags, bytes(rest))) != (seq, body):
+        raise AssertionError(f"layer round trip mismatch (flags 0x{flags:02x}, {compressor.name})")
+
+
+def run_fuzz(iterations, seed):
+    rng = random.Random(seed)
+    dictionary = rng.randbytes(256)
+    compressors = [Compressor("none"), Compressor("zlib"), Compressor("zlib", dictionary=dictionary)]
+    decompressor = Decompressor(dictionary)
+    chain = ChunkChain()
+    scheme_ids = list(codec.SCHEME_IDS.values())
+    signer, verifier = get_scheme("ed25519", generate=True), get_scheme("ed25519")
+    counts = {"roundtrip": 0, "rejected": 0, "accepted_mutant": 0, "garbage": 0, "layers": 0}
+    signed = {"rejected": 0, "unverified": 0, "unsigned": 0}
+    for i in range(iterations):
+        data = rng.randbytes(rng.choice([0, 1, 25, 240, 4096, rng.randint(0, 9000)]))
+        tag = rng.randbytes(rng.choice([32, 59, 64]))
+        key = rng.randbytes(rng.choice([0, 32]))
+        sign_time_us = rng.randrange(2 ** 32)
+        scheme_id = rng.choice(scheme_ids)
+
+        payload = codec.encode(scheme_id, data, tag, key, sign_time_us)
+        frame = codec.decode(payload)
+        if (bytes(frame.data), bytes(frame.tag), bytes(frame.key), frame.sign_time_us, frame.scheme_id) != \
+                (data, tag, key, sign_time_us, scheme_id):
+            raise AssertionError(f"round trip mismatch at iteration {i}")
+        check_frame(frame, payload)
+        counts["roundtrip"] += 1
+
+        mutant = mutate(rng, payload)
+        try:
+            check_frame(codec.decode(mutant), mutant)
+            counts["accepted_mutant"] += 1
+        except codec.CodecError:
+            counts["rejected"] += 1
+
+        garbage = rng.randbytes(rng.randint(0, 64))
+        for fn in (codec.decode, codec.decode_legacy_cid, lambda p: codec.decode_legacy(p, 1, 64, 32)):
+            try:
+                fn(garbage)
+            except codec.CodecError:
+                pass
+        counts["garbage"] += 1
+
+        check_layers(rng, compressors, decompressor, chain)
+        counts["layers"] += 1
+
+        signed[check_signed(rng, signer, verifier)] += 1
+
+    print(f"Fuzzed {iterations} payloads (seed {seed}): {counts}")
+    print(f"Signed mutants through decode_frame(): {signed}")
+    print("Accepted mutants are bit flips inside data/tag/key; the scheme's verify() catches those.")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Codec parse throughput and fuzz checks.")
+    parser.add_argument("--seconds", type=float, default=0.5, help="per decoder and payload")
+    parser.add_argument("--fuzz", type=int, default=0, help="run N randomized property checks instead")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    if args.fuzz:
+        try:
+            run_fuzz(args.fuzz, args.seed)
+        except AssertionError as e:
+            print(f"FUZZ FAILURE: {e}")
+            sys.exit(1)
+    else:
+        run_throughput(args.seconds)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,117 @@
+"""
+Where does compression pay off? End-to-end bytes, CPU and latency per topic
+and codec, with and without a per-topic dictionary.
+
+    python -m iotbench.bench_compression --scheme ed25519 --messages 2000
+
+For each message the pipeline is compress -> tag -> encode on the producer and
+decode -> verify -> decompress on the broker, timed as a whole. Dictionaries
+are trained on a separate window of the same synthetic source, so the
+measured messages were not seen during training.
+"""
+import argparse
+import csv
+import statistics
+import time
+
+from iotbench.compression import Compressor, Decompressor, available, train_dictionary
+from iotbench.producers import cam_source, light_source, therm_source
+from iotbench.schemes import SCHEMES, get_scheme
+
+CSV_FIELDS = ["Topic", "Codec", "Dict", "Raw_Bytes", "Wire_Bytes", "Saved_Pct", "Compress_uS", "Decompress_uS",
+              "Tag_uS", "Verify_uS", "End_to_End_uS", "Baseline_uS"]
+
+
+def topic_samples(n, train_n):
+    """(train, measure) sample lists per topic."""
+    sources = {"therm": therm_source(seed=1), "light": light_source(), "cam": cam_source(4096, seed=1)}
+    out = {}
+    for topic, source in sources.items():
+        samples = [next(source) for _ in range(train_n + n)]
+        out[topic] = (samples[:train_n], samples[train_n:])
+    return out
+
+
+def run_cell(scheme, compressor, decompressor, messages):
+    wire = compress_t = decompress_t = tag_t = verify_t = 0
+    e2e = []
+    key = scheme.key_bytes()
+    for msg in messages:
+        t0 = time.perf_counter_ns()
+        data = compressor.compress(msg)
+        t1 = time.perf_counter_ns()
+        tag = scheme.tag(data)
+        t2 = time.perf_counter_ns()
+        payload = scheme.encode(data, tag, 0, compressor.flags)
+        t3 = time.perf_counter_ns()
+        frame = scheme.decode_frame(payload)
+        if not scheme.verify(frame.data, frame.tag, key):
+            raise AssertionError("tag did not verify")
+        t4 = time.perf_counter_ns()
+        restored = decompressor.decompress(frame.flags, frame.data)
+        t5 = time.perf_counter_ns()
+        if bytes(restored) != msg:
+            raise AssertionError(f"{compressor.name} round trip mismatch")
+        wire += len(payload)
+        compress_t += t1 - t0
+        tag_t += t2 - t1
+        verify_t += t4 - t3
+        decompress_t += t5 - t4
+        e2e.append((t5 - t0) / 1000)
+    n = len(messages)
+    return {
+        "Wire_Bytes": wire / n,
+        "Compress_uS": compress_t / n / 1000,
+        "Decompress_uS": decompress_t / n / 1000,
+        "Tag_uS": tag_t / n / 1000,
+        "Verify_uS": verify_t / n / 1000,
+        "End_to_End_uS": statistics.median(e2e),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compression cost/benefit per topic and codec.")
+    parser.add_argument("--scheme", choices=sorted(SCHEMES), default="ed25519")
+    parser.add_argument("--messages", type=int, default=1000, help="measured messages per topic")
+    parser.add_argument("--train", type=int, default=2000, help="messages used to train each dictionary")
+    parser.add_argument("--dict-size", type=int, default=4096)
+    parser.add_argument("--csv", default=None, help="also write the table to this CSV")
+    args = parser.parse_args()
+
+    scheme = get_scheme(args.scheme, generate=True)
+    rows = []
+    print(f"Codecs available: {', '.join(available())}")
+    print(f"{'Topic':<6} {'Codec':<5} {'Dict':<4} {'Raw B':>7} {'Wire B':>8} {'Saved':>7} {'Comp us':>8} "
+          f"{'Decomp us':>9} {'Tag us':>8} {'Verify us':>9} {'E2E us':>8} {'vs none':>8}")
+    for topic, (train, measure) in topic_samples(args.messages, args.train).items():
+        raw = sum(len(m) for m in measure) / len(measure)
+        dictionary = train_dictionary(train, args.dict_size) if topic != "cam" else None
+        baseline = None
+        for name in available():
+            for use_dict in (False, True):
+                if use_dict and (name == "none" or not dictionary):
+                    continue
+                d = dictionary if use_dict else None
+                r = run_cell(scheme, Compressor(name, dictionary=d), Decompressor(d), measure)
+                if baseline is None:
+                    baseline = r
+                row = {"Topic": topic, "Codec": name, "Dict": use_dict, "Raw_Bytes": raw,
+                       "Saved_Pct": 100 * (1 - r["Wire_Bytes"] / baseline["Wire_Bytes"]),
+                       "Baseline_uS": baseline["End_to_End_uS"], **r}
+                rows.append(row)
+                print(f"{topic:<6} {name:<5} {'yes' if use_dict else 'no':<4} {raw:>7.0f} {r['Wire_Bytes']:>8.1f} "
+                      f"{row['Saved_Pct']:>6.1f}% {r['Compress_uS']:>8.1f} {r['Decompress_uS']:>9.1f} "
+                      f"{r['Tag_uS']:>8.1f} {r['Verify_uS']:>9.1f} {r['End_to_End_uS']:>8.1f} "
+                      f"{r['End_to_End_uS'] - baseline['End_to_End_uS']:>+8.1f}")
+
+    if args.csv:
+        with open(args.csv, "w", newline="") as f:
+            writer = csv.DictWriter(f, fieldnames=CSV_FIELDS)
+            writer.writeheader()
+            for row in rows:
+                writer.writerow({k: (f"{v:.2f}" if isinstance(v, float) else v) for k, v in row.items()})
+        print(f"Wrote {args.csv}")
+
+
+if __name__ == "__main__":
+    main()
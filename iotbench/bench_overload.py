@@ -0,0 +1,104 @@
+"""
+What the overload controller buys when the camera outruns the verifier.
+
+    python -m iotbench.bench_overload --seconds 3 --cam-bitrate 500000000 --tamper 0.01
+
+Replays the bench_scheduler traffic (therm, light, bursty cam) with the
+camera's bitrate set above what one verification worker sustains, and
+corrupts a known fraction of cam payloads after signing. Each mode runs
+the same traffic:
+
+    off     every payload verified; the backlog grows for as long as the burst lasts
+    sample  past --depth queued payloads only --sample-fraction are verified
+    shed    sampling, then light (lowest priority) is dropped at admission
+
+and reports the worst backlog, therm latency, how long the queue took to
+drain after the last arrival, and whether the sampled failure-rate interval
+covers the injected tamper rate.
+"""
+import argparse
+import random
+import time
+
+from iotbench.bench_scheduler import arrivals
+from iotbench.compression import Decompressor
+from iotbench.metrics import MetricsRegistry
+from iotbench.mixed_broker import TOPICS, MixedVerifier
+from iotbench.overload import MODES, OverloadController
+from iotbench.scheduler import FairScheduler
+from iotbench.schemes import SCHEMES, get_scheme
+
+
+def tamper(scheme, traffic, rate, seed=1):
+    """Flips one data byte in `rate` of the cam payloads; returns (traffic, tampered count)."""
+    rng = random.Random(seed)
+    out = []
+    tampered = 0
+    for t, topic, payload in traffic:
+        if topic == "cam" and rng.random() < rate:
+            frame = scheme.decode_frame(payload)
+            data = bytearray(frame.data)
+            data[len(data) // 2] ^= 0xFF
+            payload = scheme.encode(bytes(data), bytes(frame.tag), frame.sign_time_us)
+            tampered += 1
+        out.append((t, topic, payload))
+    return out, tampered
+
+
+def run_mode(scheme, traffic, mode, depth, fraction):
+    registry = MetricsRegistry()
+    metrics = {topic: registry.topic(topic, device) for topic, (device, _, _) in TOPICS.items()}
+    controller = OverloadController(mode, high_depth=depth, low_depth=depth // 10, sample_fraction=fraction,
+                                    hold=0.5, seed=1)
+    sched = FairScheduler(MixedVerifier(scheme, Decompressor(), metrics, None, controller), 1, "drr",
+                          controller=controller)
+    for topic, (_, weight, slo_us) in TOPICS.items():
+        sched.add_queue(topic, weight, slo_us)
+    start = time.perf_counter()
+    for t, topic, payload in traffic:
+        delay = start + t - time.perf_counter()
+        if delay > 0:
+            time.sleep(delay)
+        sched.submit(topic, payload)
+    last_arrival = time.perf_counter()
+    sched.close()
+    drain = time.perf_counter() - last_arrival
+    return sched, controller, metrics, drain
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Overload control: sampling and shedding under a camera flood.")
+    parser.add_argument("--scheme", choices=sorted(SCHEMES), default="ed25519")
+    parser.add_argument("--seconds", type=float, default=3.0)
+    parser.add_argument("--cam-bitrate", type=int, default=500_000_000, help="above one worker's capacity")
+    parser.add_argument("--tamper", type=float, default=0.01, help="fraction of cam payloads corrupted")
+    parser.add_argument("--depth", type=int, default=200, help="queue depth that triggers sampling")
+    parser.add_argument("--sample-fraction", type=float, default=0.1)
+    parser.add_argument("--modes", nargs="+", choices=MODES, default=list(MODES))
+    args = parser.parse_args()
+
+    scheme = get_scheme(args.scheme, generate=True)
+    traffic, tampered = tamper(scheme, arrivals(scheme, args.seconds, args.cam_bitrate), args.tamper)
+    n_cam = sum(topic == "cam" for _, topic, _ in traffic)
+    print(f"{len(traffic)} payloads over {args.seconds:.0f}s, {n_cam} cam "
+          f"({tampered} tampered = {100 * tampered / n_cam:.2f}%)")
+    for mode in args.modes:
+        sched, controller, metrics, drain = run_mode(scheme, traffic, mode, args.depth, args.sample_fraction)
+        queues = {row["Queue"]: row for row in sched.summary()}
+        print(f"=== {mode} ===")
+        print(f"Cam backlog max:  {queues['cam']['Max_Depth']} | drain after last arrival: {drain:.2f}s")
+        print(f"therm latency:    p50 {queues['therm']['Latency_P50_uS']} us, p99 {queues['therm']['Latency_P99_uS']} us")
+        for topic, tm in metrics.items():
+            print(f"{topic:<6} verified {tm.messages:>6}  failed {tm.failures:>4}  unverified {tm.unverified:>6}")
+        if mode != "off":
+            controller.report()
+            cam = next((r for r in controller.summary() if r["Topic"] == "cam"), None)
+            if cam and cam["Sampled"]:
+                low, high = float(cam["Fail_Rate_Low95_Pct"]), float(cam["Fail_Rate_High95_Pct"])
+                true_rate = 100 * tampered / n_cam
+                print(f"Injected {true_rate:.2f}% {'inside' if low <= true_rate <= high else 'OUTSIDE'} "
+                      f"the sampled interval {low:.2f}-{high:.2f}%")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,78 @@
+"""
+Achieved FPS and jitter of the Pi3 LED producer under sleep vs deadline pacing.
+
+    python -m iotbench.bench_pacing
+    python -m iotbench.bench_pacing --frames 1000 --extra-ms 0 5 10 19 30 --scheme hmac-sha256
+
+Runs the rainbow animation of Pi3/timing.py on iotbench.ledstrip.MockStrip:
+draw, capture, pack, sign, encode and show each frame, then hand the frame
+to FramePacer in each mode. Nothing is published. --extra-ms busy-waits that
+much longer per frame to stand in for a slower CPU or a loaded one (the Pi
+3B+ signs several times slower than a laptop); 30 ms at a 20 ms period
+cannot keep up in either mode and shows how misses are counted. --stress
+adds real stress-ng load instead, where it is installed.
+
+With sleep pacing the achieved rate is 1000 / (wait_ms + work); with
+deadline pacing it should hold the target until the work no longer fits.
+"""
+import argparse
+import struct
+import time
+
+from iotbench.ledstrip import MockStrip
+from iotbench.pacing import MODES, FramePacer
+from iotbench.producers import LED_COUNT, wheel
+from iotbench.schemes import SCHEMES, get_scheme
+from iotbench.stress import start_stress_test, stop_stress_test, stress_ng_available
+
+
+def run(mode, scheme, frames, wait_ms, extra_ms):
+    strip = MockStrip(LED_COUNT)
+    pacer = FramePacer(mode)
+    n = strip.numPixels()
+    for j in range(frames):
+        for i in range(n):
+            strip.setPixelColor(i, wheel((i + j) & 255))
+        data = struct.pack(f"<{n}I", *[strip.getPixelColor(i) for i in range(n)])
+        tag, sign_time_us = scheme.timed_tag(data)
+        scheme.encode(data, tag, sign_time_us, 0)
+        strip.show()
+        spin_until = time.perf_counter() + extra_ms / 1000
+        while time.perf_counter() < spin_until:
+            pass
+        pacer.wait("rainbow", wait_ms)
+    return pacer.summary()[0]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="LED frame pacing: sleep vs monotonic deadlines.")
+    parser.add_argument("--scheme", choices=sorted(SCHEMES), default="ed25519")
+    parser.add_argument("--frames", type=int, default=250, help="frames per run")
+    parser.add_argument("--wait-ms", type=float, default=20)
+    parser.add_argument("--extra-ms", type=float, nargs="+", default=[0, 5, 15, 30],
+                        help="busy work added to every frame")
+    parser.add_argument("--stress", type=int, nargs="+", default=[0], help="stress-ng CPU load percentages")
+    args = parser.parse_args()
+
+    stress_levels = args.stress
+    if any(stress_levels) and not stress_ng_available():
+        print("stress-ng not found; running without CPU load")
+        stress_levels = [0]
+    scheme = get_scheme(args.scheme, generate=True)
+    print(f"{'Stress':>6} {'Extra':>6} {'Pacing':<9} {'Target':>7} {'FPS':>6} {'Missed':>7} "
+          f"{'Work p99':>9} {'Jitter p50':>11} {'p99':>8}")
+    for stress in stress_levels:
+        stress_process = start_stress_test(cpu_load=stress) if stress else None
+        try:
+            for extra_ms in args.extra_ms:
+                for mode in MODES:
+                    r = run(mode, scheme, args.frames, args.wait_ms, extra_ms)
+                    print(f"{stress:>5}% {extra_ms:>4.0f}ms {mode:<9} {r['Target_FPS']:>7} {r['Achieved_FPS']:>6} "
+                          f"{r['Missed_Pct']:>6}% {r['Work_P99_uS']:>7}us {r['Jitter_P50_uS']:>9}us "
+                          f"{r['Jitter_P99_uS']:>6}us")
+        finally:
+            stop_stress_test(stress_process)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,150 @@
+"""
+Cost and accuracy of iotbench.replay.
+
+    python -m iotbench.bench_replay
+    python -m iotbench.bench_replay --messages 2000000 --rate 5000 --window 60 --fp 1e-4
+
+Overhead: signs each topic's payload shape (therm reading, LED frame with
+and without --sequence, 4 KiB pipe chunk, per-frame camera payload), then
+times verify and ReplayDetector.seen() per message on the decoded frames.
+"repeats" counts payloads byte-identical to an earlier one, which the digest
+path cannot tell from a replay: two-decimal therm readings often repeat and
+the LED animation cycles every 256 frames.
+
+Accuracy: streams --messages fresh digest-path frames (random tags, no
+signing) through a detector on a simulated clock at --rate messages/s,
+re-sending one earlier frame from inside the window every --replay-every
+messages. Every replay should be caught; fresh frames reported as replays
+are false positives and should stay under --fp. The sequence path gets the
+same treatment with duplicates and reordering inside SEQ_WINDOW.
+"""
+import argparse
+import os
+import random
+import statistics
+import time
+
+from iotbench import codec
+from iotbench.producers import CHUNK_SIZE, h264_frames, light_source, therm_source
+from iotbench.replay import SEQ_WINDOW, ReplayDetector
+from iotbench.schemes import SCHEMES, get_scheme
+
+
+def signed_frames(scheme, n):
+    """{kind: [Frame]} with n real signed payloads per topic shape."""
+    therm, light, video = therm_source(seed=1), light_source(), h264_frames(seed=1)
+    shapes = {
+        "therm": lambda i: (next(therm), 0),
+        "light": lambda i: (next(light), 0),
+        "light seq": lambda i: (codec.FRAME_META.pack(i * 20_000, i) + next(light), codec.FLAG_FRAME_META),
+        "cam chunk": lambda i: (os.urandom(CHUNK_SIZE), 0),
+        "cam frame": lambda i: (codec.FRAME_META.pack(i * 33_333, i) + next(video)[0], codec.FLAG_FRAME_META),
+    }
+    out = {}
+    for kind, make in shapes.items():
+        frames = []
+        for i in range(n):
+            data, flags = make(i)
+            frames.append(scheme.decode_frame(scheme.encode(data, scheme.tag(data), 0, flags)))
+        out[kind] = frames
+    return out
+
+
+def overhead(scheme, n):
+    print(f"{'Payload':<10} {'verify us':>10} {'seen us':>9} {'overhead':>9} {'repeats':>8}")
+    for kind, frames in signed_frames(scheme, n).items():
+        prepared = scheme.prepare(frames[0].key)
+        t0 = time.perf_counter_ns()
+        for f in frames:
+            scheme.verify_prepared(prepared, f.data, f.tag)
+        verify_us = (time.perf_counter_ns() - t0) / 1000 / n
+        detector = ReplayDetector()
+        t0 = time.perf_counter_ns()
+        for f in frames:
+            detector.seen(f)
+        seen_us = (time.perf_counter_ns() - t0) / 1000 / n
+        # Identical bytes under a deterministic tag: indistinguishable from a replay
+        print(f"{kind:<10} {verify_us:>10.2f} {seen_us:>9.2f} {100 * seen_us / verify_us:>8.1f}% "
+              f"{detector.replays:>8}")
+
+
+def digest_accuracy(args):
+    rng = random.Random(1)
+    key = os.urandom(32)
+    detector = ReplayDetector(args.window, args.capacity, args.fp)
+    recent = []  # tags sent within the last window
+    # Fresh messages sent within one window (the rest of the window is replays)
+    per_window = int(args.rate * args.window * (1 - 1 / args.replay_every))
+    false_pos = caught = replays = 0
+    seen_ns = []
+    for i in range(args.messages):
+        now = i / args.rate
+        if i and i % args.replay_every == 0:
+            tag = recent[-rng.randrange(1, min(len(recent), per_window) + 1)]
+            replays += 1
+            caught += detector.seen(codec.Frame(1, 0, 0, b"", tag, key, 1), now)
+            continue
+        tag = rng.randbytes(64)
+        recent.append(tag)
+        if len(recent) > 2 * per_window:
+            del recent[:per_window]
+        t0 = time.perf_counter_ns()
+        hit = detector.seen(codec.Frame(1, 0, 0, b"", tag, key, 1), now)
+        if i % 64 == 0:
+            seen_ns.append(time.perf_counter_ns() - t0)
+        false_pos += hit
+    fresh = args.messages - replays
+    s = detector.summary()
+    print(f"Digest path: {args.messages} messages at {args.rate:.0f}/s, window {args.window:.0f}s, "
+          f"capacity {args.capacity}, target fp {args.fp:g}")
+    print(f"  replays caught   {caught}/{replays}")
+    print(f"  false positives  {false_pos}/{fresh} = {false_pos / fresh:.2e} (estimate at exit {s['Est_FP_Pct']}%)")
+    print(f"  filters          {s['Filter_KiB']} KiB, {s['Rotations']} rotations ({s['Capacity_Rotations']} at capacity)")
+    print(f"  seen() p50/p99   {statistics.median(seen_ns) / 1000:.2f} / "
+          f"{statistics.quantiles(seen_ns, n=100)[98] / 1000:.2f} us")
+    if caught != replays:
+        print(f"  NOTE: {replays - caught} replays missed; capacity rotations shorten the window "
+              f"below {args.window:.0f}s when rate x window > capacity")
+
+
+def seq_accuracy(n):
+    rng = random.Random(2)
+    key = os.urandom(32)
+    detector = ReplayDetector()
+    frame = lambda seq: codec.Frame(1, codec.FLAG_FRAME_META, 0, codec.FRAME_META.pack(0, seq), b"", key, 1)
+    wrong = dups = 0
+    highest = -1
+    for seq in range(n):
+        # Deliver slightly out of order: hold some numbers back a few places
+        late = seq - rng.randrange(1, 8) if seq > 8 and rng.random() < 0.05 else None
+        wrong += detector.seen(frame(seq))
+        highest = seq
+        if late is not None and rng.random() < 0.5:
+            dups += 1
+            wrong += not detector.seen(frame(late))  # already delivered: must be a replay
+    stale = detector.seen(frame(highest - SEQ_WINDOW))
+    print(f"Sequence path: {n} frames, {dups} duplicates inside the window -> "
+          f"{detector.seq_replays} caught, {wrong} misclassified; "
+          f"seq older than the window is {'stale' if stale else 'ACCEPTED'}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Replay detection overhead and accuracy.")
+    parser.add_argument("--scheme", choices=sorted(SCHEMES), default="ed25519")
+    parser.add_argument("--per-kind", type=int, default=2000, help="signed payloads per shape for the overhead table")
+    parser.add_argument("--messages", type=int, default=500_000)
+    parser.add_argument("--rate", type=float, default=2000, help="simulated messages/s")
+    parser.add_argument("--window", type=float, default=60)
+    parser.add_argument("--capacity", type=int, default=200_000)
+    parser.add_argument("--fp", type=float, default=1e-4)
+    parser.add_argument("--replay-every", type=int, default=100)
+    args = parser.parse_args()
+
+    overhead(get_scheme(args.scheme, generate=True), args.per_kind)
+    print()
+    digest_accuracy(args)
+    seq_accuracy(100_000)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,96 @@
+"""
+Tag and verify latency/throughput for every integrity scheme over the
+project's payload shapes: therm text, 240 B LED frame, 4 KiB video chunk.
+
+    python -m iotbench.bench_schemes --iterations 5000 --csv scheme_bench.csv
+"""
+import argparse
+import csv
+import statistics
+import time
+
+from iotbench.producers import cam_source, light_source, therm_source
+from iotbench.schemes import SCHEMES, get_scheme
+
+CSV_FIELDS = ["Scheme", "Payload", "Size_Bytes", "Footer_Bytes", "Op", "Mean_uS", "P50_uS", "P99_uS",
+              "Ops_per_s", "MB_per_s"]
+
+
+def payload_shapes():
+    return {
+        "therm": next(therm_source(seed=1)),
+        "led240": next(light_source()),
+        "chunk4k": next(cam_source(4096, seed=1)),
+    }
+
+
+def percentile(sorted_values, q):
+    return sorted_values[min(len(sorted_values) - 1, int(len(sorted_values) * q))]
+
+
+def time_op(fn, iterations):
+    """Per-call latencies in microseconds."""
+    samples = []
+    for _ in range(iterations):
+        start = time.perf_counter_ns()
+        fn()
+        samples.append((time.perf_counter_ns() - start) / 1000)
+    return samples
+
+
+def bench(scheme, data, iterations, warmup=100):
+    tag = scheme.tag(data)
+    key = scheme.key_bytes()
+    ops = {
+        "tag": lambda: scheme.tag(data),
+        "verify": lambda: scheme.verify(data, tag, key),
+    }
+    results = {}
+    for op, fn in ops.items():
+        time_op(fn, warmup)
+        samples = sorted(time_op(fn, iterations))
+        mean = statistics.mean(samples)
+        results[op] = {
+            "Mean_uS": mean,
+            "P50_uS": percentile(samples, 0.50),
+            "P99_uS": percentile(samples, 0.99),
+            "Ops_per_s": 1e6 / mean,
+            "MB_per_s": len(data) / mean,  # bytes per us == MB per s
+        }
+    return tag, results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark every integrity scheme over the project payloads.")
+    parser.add_argument("--schemes", nargs="+", choices=sorted(SCHEMES), default=list(SCHEMES))
+    parser.add_argument("--iterations", type=int, default=2000)
+    parser.add_argument("--ipfs-exe", default=None, help="benchmark CIDs through kubo instead of in-process")
+    parser.add_argument("--csv", default=None, help="also write the table to this CSV")
+    args = parser.parse_args()
+
+    rows = []
+    shapes = payload_shapes()
+    print(f"{'Scheme':<12} {'Payload':<8} {'Op':<7} {'Mean us':>9} {'p50 us':>9} {'p99 us':>9} {'ops/s':>10} {'MB/s':>8}")
+    for name in args.schemes:
+        scheme = get_scheme(name, generate=True, ipfs_exe=args.ipfs_exe)
+        # A kubo subprocess per call is ~ms; keep the run short
+        iterations = max(20, args.iterations // 100) if args.ipfs_exe and name == "cid" else args.iterations
+        for shape, data in shapes.items():
+            tag, results = bench(scheme, data, iterations)
+            for op, r in results.items():
+                print(f"{name:<12} {shape:<8} {op:<7} {r['Mean_uS']:>9.2f} {r['P50_uS']:>9.2f} "
+                      f"{r['P99_uS']:>9.2f} {r['Ops_per_s']:>10.0f} {r['MB_per_s']:>8.2f}")
+                rows.append([name, shape, len(data), scheme.footer_size(tag), op,
+                             f"{r['Mean_uS']:.2f}", f"{r['P50_uS']:.2f}", f"{r['P99_uS']:.2f}",
+                             f"{r['Ops_per_s']:.0f}", f"{r['MB_per_s']:.2f}"])
+
+    if args.csv:
+        with open(args.csv, "w", newline="") as f:
+            writer = csv.writer(f)
+            writer.writerow(CSV_FIELDS)
+            writer.writerows(rows)
+        print(f"Saved -> {args.csv}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,124 @@
+"""
+Sustained bitrate and sign-latency tails of iotbench.signpool at different
+worker counts and stress levels, fed by the synthetic H.264 source.
+
+    python -m iotbench.bench_signpool --workers 1 2 4 --stress 0 50 99 --seconds 10
+
+Two passes per cell:
+  saturate  chunks are submitted as fast as the pool accepts them -> Mbit/s
+  paced     chunks arrive at the camera bitrate (--bitrate)       -> latency tails
+
+Publishing goes to an in-process sink that checks every payload arrives in
+submission order, so the numbers exclude MQTT but cover the reorder buffer.
+"""
+import argparse
+import csv
+import time
+
+from iotbench.producers import CAM_BITRATE, CHUNK_SIZE, cam_source
+from iotbench.profiling import StageTimer
+from iotbench.schemes import SCHEMES, get_scheme
+from iotbench.signpool import SigningPool
+from iotbench.stress import start_stress_test, stop_stress_test, stress_ng_available
+
+CSV_FIELDS = ["Stress", "Mode", "Workers", "Pass", "Chunks", "Mbit_per_s", "Sign_P50_uS", "Sign_P99_uS",
+              "Sign_Max_uS", "Pipeline_P50_uS", "Pipeline_P99_uS", "Pipeline_Max_uS", "In_Order"]
+
+
+class OrderedSink:
+    """Publish target that checks payloads come out in submission order."""
+
+    def __init__(self, scheme, chunks):
+        self.scheme = scheme
+        self.chunks = chunks
+        self.n = 0
+        self.in_order = True
+
+    def __call__(self, payload):
+        data = self.scheme.decode(payload)[0]
+        if data != self.chunks[self.n % len(self.chunks)]:
+            self.in_order = False
+        self.n += 1
+
+
+def run_pass(scheme, chunks, workers, mode, seconds, rate=None):
+    stages = StageTimer()
+    sink = OrderedSink(scheme, chunks)
+    pool = SigningPool(scheme, sink, workers=workers, mode=mode, stages=stages)
+    period = 1.0 / rate if rate else 0.0
+    submitted = 0
+    start = time.monotonic()
+    deadline = start
+    end = start + seconds
+    while time.monotonic() < end:
+        pool.submit(chunks[submitted % len(chunks)])
+        submitted += 1
+        if period:
+            deadline += period
+            delay = deadline - time.monotonic()
+            if delay > 0:
+                time.sleep(delay)
+    pool.close()
+    elapsed = time.monotonic() - start
+    sign = stages.stages["sign"]
+    pipeline = stages.stages["pipeline"]
+    return {
+        "Chunks": pool.published,
+        "Mbit_per_s": f"{pool.bytes_published * 8 / elapsed / 1e6:.2f}",
+        "Sign_P50_uS": f"{sign.percentile(0.50):.1f}",
+        "Sign_P99_uS": f"{sign.percentile(0.99):.1f}",
+        "Sign_Max_uS": f"{sign.max:.1f}",
+        "Pipeline_P50_uS": f"{pipeline.percentile(0.50):.1f}",
+        "Pipeline_P99_uS": f"{pipeline.percentile(0.99):.1f}",
+        "Pipeline_Max_uS": f"{pipeline.max:.1f}",
+        "In_Order": sink.in_order and sink.n == pool.published == submitted,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Parallel signing pool: throughput and latency tails.")
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 2, 4])
+    parser.add_argument("--modes", nargs="+", choices=["thread", "process"], default=["thread"])
+    parser.add_argument("--stress", type=int, nargs="+", default=[0], help="stress-ng CPU load levels")
+    parser.add_argument("--scheme", choices=sorted(SCHEMES), default="ed25519")
+    parser.add_argument("--seconds", type=float, default=5.0, help="per pass")
+    parser.add_argument("--chunk-size", type=int, default=CHUNK_SIZE)
+    parser.add_argument("--bitrate", type=int, default=CAM_BITRATE, help="paced pass input rate, bit/s")
+    parser.add_argument("--csv", default=None, help="also write the table to this CSV")
+    args = parser.parse_args()
+
+    scheme = get_scheme(args.scheme, generate=True)
+    source = cam_source(args.chunk_size, bitrate=args.bitrate, seed=1)
+    chunks = [next(source) for _ in range(1024)]
+    rate = args.bitrate / 8 / args.chunk_size
+
+    rows = []
+    print(f"{'Stress':>6} {'Mode':<8} {'W':>2} {'Pass':<9} {'Chunks':>7} {'Mbit/s':>9} "
+          f"{'sign p99':>9} {'sign max':>9} {'pipe p99':>9} {'pipe max':>9} {'Order':>6}")
+    for stress in args.stress:
+        if stress and not stress_ng_available():
+            print(f"Skipping stress {stress}%: stress-ng not installed.")
+            continue
+        stress_process = start_stress_test(cpu_load=stress) if stress else None
+        try:
+            for mode in args.modes:
+                for workers in args.workers:
+                    for label, pass_rate in (("saturate", None), ("paced", rate)):
+                        r = run_pass(scheme, chunks, workers, mode, args.seconds, pass_rate)
+                        rows.append({"Stress": stress, "Mode": mode, "Workers": workers, "Pass": label, **r})
+                        print(f"{stress:>6} {mode:<8} {workers:>2} {label:<9} {r['Chunks']:>7} {r['Mbit_per_s']:>9} "
+                              f"{r['Sign_P99_uS']:>9} {r['Sign_Max_uS']:>9} {r['Pipeline_P99_uS']:>9} "
+                              f"{r['Pipeline_Max_uS']:>9} {str(r['In_Order']):>6}")
+        finally:
+            stop_stress_test(stress_process)
+
+    if args.csv:
+        with open(args.csv, "w", newline="") as f:
+            writer = csv.DictWriter(f, fieldnames=CSV_FIELDS)
+            writer.writeheader()
+            writer.writerows(rows)
+        print(f"Wrote {args.csv}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,136 @@
+"""
+Bytes per reading and broker verify throughput for the thermometer topic:
+one signed ASCII reading per message (today) against iotbench.therm_batch
+binary batches of K readings.
+
+    python -m iotbench.bench_therm_batch --readings 20000 --batch 1 4 16 64
+
+Every row runs the broker's path end to end: decode_frame -> verify ->
+expand to per-reading "t=..,h=..,p=.." text. The decode columns compare the
+NumPy structured-array decoder with the struct fallback on the same batches.
+"""
+import argparse
+import csv
+import time
+
+from iotbench import therm_batch
+from iotbench.codec import FLAG_RECORD_BATCH
+from iotbench.producers import therm_readings
+from iotbench.schemes import SCHEMES, get_scheme
+
+CSV_FIELDS = ["Format", "K", "Messages", "Bytes_per_Reading", "Verify_uS_per_Reading", "Expand_uS_per_Reading",
+              "Readings_per_s", "Decode_NumPy_uS", "Decode_Struct_uS"]
+
+
+def ascii_messages(scheme, readings):
+    out = []
+    for t, h, p in readings:
+        data = f"t={t:.2f},h={h:.2f},p={p:.2f}".encode("ascii")
+        out.append(scheme.encode(data, scheme.tag(data), 0))
+    return out
+
+
+def batch_messages(scheme, readings, k):
+    out = []
+    batcher = therm_batch.ThermBatcher(k=k, flush_ms=0xFFFF)
+    for i, (t, h, p) in enumerate(readings):
+        data = batcher.add(t, h, p, i * 10)
+        if data:
+            out.append(scheme.encode(data, scheme.tag(data), 0, FLAG_RECORD_BATCH))
+    data = batcher.flush()
+    if data:
+        out.append(scheme.encode(data, scheme.tag(data), 0, FLAG_RECORD_BATCH))
+    return out
+
+
+def run_broker(scheme, payloads):
+    """Returns (readings, verify_ns, expand_ns) over the whole list."""
+    readings = verify_t = expand_t = 0
+    for payload in payloads:
+        t0 = time.perf_counter_ns()
+        frame = scheme.decode_frame(payload)
+        if not scheme.verify_prepared(scheme.prepare(frame.key), frame.data, frame.tag):
+            raise AssertionError("tag did not verify")
+        t1 = time.perf_counter_ns()
+        if frame.flags & FLAG_RECORD_BATCH:
+            rows = [reading for _, reading in therm_batch.batch_rows(frame.data)]
+        else:
+            rows = [bytes(frame.data).decode("ascii")]
+        t2 = time.perf_counter_ns()
+        readings += len(rows)
+        verify_t += t1 - t0
+        expand_t += t2 - t1
+    return readings, verify_t, expand_t
+
+
+def decode_cost(payloads, scheme):
+    """Mean decode_batch() cost per message (us) with and without NumPy."""
+    datas = [bytes(scheme.decode_frame(p).data) for p in payloads]
+    costs = []
+    for vectorize in (True, False):
+        if vectorize and therm_batch.np is None:
+            costs.append(None)
+            continue
+        t0 = time.perf_counter_ns()
+        for data in datas:
+            therm_batch.decode_batch(data, vectorize)
+        costs.append((time.perf_counter_ns() - t0) / len(datas) / 1000)
+    return costs
+
+
+def check_round_trip(readings):
+    """Batches must expand to exactly the text the ASCII producer would have sent."""
+    data = therm_batch.encode_batch(1000, [(i, t, h, p) for i, (t, h, p) in enumerate(readings)])
+    expected = [f"t={t:.2f},h={h:.2f},p={p:.2f}" for t, h, p in readings]
+    for vectorize in ((True, False) if therm_batch.np is not None else (False,)):
+        rows = therm_batch.batch_rows(data, vectorize)
+        if [text for _, text in rows] != expected or [ms for ms, _ in rows] != list(range(1000, 1000 + len(readings))):
+            raise SystemExit(f"Batch round trip mismatch ({'numpy' if vectorize else 'struct'} decoder)")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Batched binary therm records vs one ASCII reading per message.")
+    parser.add_argument("--scheme", choices=sorted(SCHEMES), default="ed25519")
+    parser.add_argument("--readings", type=int, default=20000)
+    parser.add_argument("--batch", type=int, nargs="+", default=[1, 4, 16, 64])
+    parser.add_argument("--csv", default=None, help="also write the table to this CSV")
+    args = parser.parse_args()
+
+    scheme = get_scheme(args.scheme, generate=True)
+    source = therm_readings(seed=1)
+    readings = [next(source) for _ in range(args.readings)]
+    check_round_trip(readings[:1000])
+
+    cells = [("ascii", 1, ascii_messages(scheme, readings))]
+    cells += [("batch", k, batch_messages(scheme, readings, k)) for k in args.batch]
+
+    rows = []
+    decoder = f"K >= {therm_batch.NUMPY_MIN_K}" if therm_batch.np is not None else "no (struct fallback)"
+    print(f"NumPy decoder: {decoder}")
+    print(f"{'Format':<6} {'K':>4} {'Msgs':>7} {'B/reading':>9} {'verify us':>9} {'expand us':>9} "
+          f"{'readings/s':>11} {'dec np us':>9} {'dec st us':>9}")
+    for fmt, k, payloads in cells:
+        n, verify_t, expand_t = run_broker(scheme, payloads)
+        np_us, struct_us = decode_cost(payloads, scheme) if fmt == "batch" else (None, None)
+        row = {"Format": fmt, "K": k, "Messages": len(payloads),
+               "Bytes_per_Reading": sum(len(p) for p in payloads) / n,
+               "Verify_uS_per_Reading": verify_t / n / 1000, "Expand_uS_per_Reading": expand_t / n / 1000,
+               "Readings_per_s": n / ((verify_t + expand_t) / 1e9),
+               "Decode_NumPy_uS": np_us, "Decode_Struct_uS": struct_us}
+        rows.append(row)
+        dec = lambda v: f"{v:>9.2f}" if v is not None else f"{'-':>9}"
+        print(f"{fmt:<6} {k:>4} {len(payloads):>7} {row['Bytes_per_Reading']:>9.1f} "
+              f"{row['Verify_uS_per_Reading']:>9.2f} {row['Expand_uS_per_Reading']:>9.2f} "
+              f"{row['Readings_per_s']:>11.0f} {dec(np_us)} {dec(struct_us)}")
+
+    if args.csv:
+        with open(args.csv, "w", newline="") as f:
+            writer = csv.DictWriter(f, fieldnames=CSV_FIELDS)
+            writer.writeheader()
+            for row in rows:
+                writer.writerow({k: (f"{v:.2f}" if isinstance(v, float) else v) for k, v in row.items()})
+        print(f"Wrote {args.csv}")
+
+
+if __name__ == "__main__":
+    main()
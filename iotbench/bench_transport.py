@@ -0,0 +1,199 @@
+"""
+Publish -> deliver latency through a local broker, with and without the
+integrity footer, to split broker/transport cost from crypto cost.
+
+    python -m iotbench.bench_transport
+    python -m iotbench.bench_transport --sizes 24 240 4096 --rates 50 500 --count 1000 --scheme ed25519 --qos 1
+    python -m iotbench.bench_transport --broker-kind python --csv transport_bench.csv
+
+Starts a broker with iotbench.testbroker (Mosquitto if installed, else the
+Python broker, in its own process) on an ephemeral port, or uses
+--port/--host if one is already listening there. For every size x rate it
+sends --count messages twice:
+
+  raw     the bytes alone, tagged with a 4-byte counter
+  signed  the producers' path: FRAME_META (time, counter) + bytes, signed
+          and framed with the scheme's footer; the subscriber decodes and
+          verifies as the broker scripts do
+
+Publisher and subscriber are paho clients in this process, so one
+perf_counter clock times everything. Transport is publish() -> on_message,
+after signing and before verifying, so the signed/raw difference is the
+footer's bytes on the wire. End-to-end is sign start -> verify end.
+Messages still missing --drain seconds after the last publish count as lost.
+"""
+import argparse
+import csv
+import os
+import struct
+import threading
+import time
+
+import paho.mqtt.client as mqtt
+
+from iotbench.codec import FLAG_FRAME_META, FRAME_META, CodecError, split_frame_meta
+from iotbench.histogram import Histogram
+from iotbench.schemes import SCHEMES, get_scheme
+from iotbench.testbroker import KINDS, broker_reachable, start_broker
+
+TOPIC = "bench/transport"
+COUNTER = struct.Struct("<I")
+CSV_FIELDS = ["Mode", "Size_Bytes", "Wire_Bytes", "Rate_Hz", "Sent", "Received", "Lost", "Invalid",
+              "Transport_P50_uS", "Transport_P99_uS", "Transport_Max_uS", "Sign_Mean_uS", "Verify_Mean_uS",
+              "E2E_P50_uS", "E2E_P99_uS"]
+
+
+class Receiver:
+    """Subscriber side: stamps arrival, then (signed mode) decodes and verifies."""
+
+    def __init__(self, scheme=None):
+        self.scheme = scheme
+        self.arrivals = {}  # seq -> (arrival ns, verify end ns, valid)
+        self.lock = threading.Lock()
+
+    def on_message(self, client, userdata, msg):
+        arrived = time.perf_counter_ns()
+        payload = msg.payload
+        if self.scheme is None:
+            seq, valid = COUNTER.unpack_from(payload)[0], True
+        else:
+            try:
+                frame = self.scheme.decode_frame(payload)
+                valid = self.scheme.verify_prepared(self.scheme.prepare(frame.key), frame.data, frame.tag)
+                seq = split_frame_meta(frame)[1]
+            except CodecError:
+                return
+        done = time.perf_counter_ns()
+        with self.lock:
+            self.arrivals[seq] = (arrived, done, valid)
+
+    def count(self):
+        with self.lock:
+            return len(self.arrivals)
+
+
+def run_cell(host, port, scheme, size, rate, count, qos, drain):
+    """One size/rate/mode: (row dict). `scheme` None sends raw bytes."""
+    body = os.urandom(size)
+    receiver = Receiver(get_scheme(scheme.name) if scheme else None)
+    sub = mqtt.Client(mqtt.CallbackAPIVersion.VERSION2)
+    sub.on_message = receiver.on_message
+    subscribed = threading.Event()
+    sub.on_subscribe = lambda *a: subscribed.set()
+    sub.connect(host, port)
+    sub.subscribe(TOPIC, qos=qos)
+    sub.loop_start()
+    pub = mqtt.Client(mqtt.CallbackAPIVersion.VERSION2)
+    pub.connect(host, port)
+    pub.loop_start()
+    subscribed.wait(5)
+
+    started, published, sign_us = [], [], Histogram()
+    wire_bytes = 0
+    period = 1.0 / rate
+    deadline = time.monotonic()
+    for seq in range(count):
+        t0 = time.perf_counter_ns()
+        if scheme is None:
+            payload = COUNTER.pack(seq) + body
+        else:
+            data = FRAME_META.pack(time.time_ns() // 1000, seq) + body
+            tag, sign_time_us = scheme.timed_tag(data)
+            payload = scheme.encode(data, tag, sign_time_us, FLAG_FRAME_META)
+            sign_us.record(sign_time_us)
+        t1 = time.perf_counter_ns()
+        pub.publish(TOPIC, payload, qos=qos)
+        started.append(t0)
+        published.append(t1)
+        wire_bytes = len(payload)
+        deadline += period
+        delay = deadline - time.monotonic()
+        if delay > 0:
+            time.sleep(delay)
+
+    last, idle_since = -1, time.monotonic()
+    while receiver.count() < count and time.monotonic() - idle_since < drain:
+        n = receiver.count()
+        if n != last:
+            last, idle_since = n, time.monotonic()
+        time.sleep(0.01)
+    for client in (pub, sub):
+        client.loop_stop()
+        client.disconnect()
+
+    transport, verify_us, e2e = Histogram(), Histogram(), Histogram()
+    invalid = 0
+    for seq, (arrived, done, valid) in receiver.arrivals.items():
+        if seq >= count:
+            continue
+        transport.record((arrived - published[seq]) / 1000)
+        verify_us.record((done - arrived) / 1000)
+        e2e.record((done - started[seq]) / 1000)
+        invalid += not valid
+    t = transport.summary()
+    return {
+        "Mode": "signed" if scheme else "raw",
+        "Size_Bytes": size,
+        "Wire_Bytes": wire_bytes,
+        "Rate_Hz": rate,
+        "Sent": count,
+        "Received": transport.count,
+        "Lost": count - transport.count,
+        "Invalid": invalid,
+        "Transport_P50_uS": t["P50_uS"],
+        "Transport_P99_uS": t["P99_uS"],
+        "Transport_Max_uS": t["Max_uS"],
+        "Sign_Mean_uS": sign_us.summary()["Mean_uS"] if scheme else "",
+        "Verify_Mean_uS": verify_us.summary()["Mean_uS"] if scheme else "",
+        "E2E_P50_uS": e2e.summary()["P50_uS"],
+        "E2E_P99_uS": e2e.summary()["P99_uS"],
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Broker/transport latency with and without the integrity footer.")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[24, 240, 4096], help="payload bytes before framing")
+    parser.add_argument("--rates", type=float, nargs="+", default=[50, 500], help="messages per second")
+    parser.add_argument("--count", type=int, default=500, help="messages per cell")
+    parser.add_argument("--scheme", choices=sorted(n for n in SCHEMES if n != "cid"), default="ed25519")
+    parser.add_argument("--qos", type=int, choices=[0, 1], default=0)
+    parser.add_argument("--drain", type=float, default=2.0, help="seconds without arrivals before giving up")
+    parser.add_argument("--broker-kind", choices=KINDS, default="auto")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=None, help="use the broker already listening here")
+    parser.add_argument("--csv", default=None)
+    args = parser.parse_args()
+
+    local = None
+    if args.port and broker_reachable(args.host, args.port):
+        host, port, kind = args.host, args.port, "external"
+    else:
+        local = start_broker(args.broker_kind, args.port)
+        host, port, kind = local.host, local.port, local.kind
+    scheme = get_scheme(args.scheme, generate=True)
+    print(f"Broker: {kind} on {host}:{port}, scheme {args.scheme}, QoS {args.qos}, {args.count} msgs per cell")
+    print(f"{'Mode':<7} {'Size':>6} {'Wire':>6} {'Rate':>6} {'Lost':>5} {'Transport p50':>14} {'p99':>9} "
+          f"{'Sign us':>8} {'Verify us':>9} {'E2E p50':>9} {'p99':>9}")
+    rows = []
+    try:
+        for size in args.sizes:
+            for rate in args.rates:
+                for mode_scheme in (None, scheme):
+                    r = run_cell(host, port, mode_scheme, size, rate, args.count, args.qos, args.drain)
+                    rows.append(r)
+                    print(f"{r['Mode']:<7} {size:>6} {r['Wire_Bytes']:>6} {rate:>6g} {r['Lost']:>5} "
+                          f"{r['Transport_P50_uS']:>12}us {r['Transport_P99_uS']:>7}us {r['Sign_Mean_uS']:>8} "
+                          f"{r['Verify_Mean_uS']:>9} {r['E2E_P50_uS']:>7}us {r['E2E_P99_uS']:>7}us")
+    finally:
+        if local:
+            local.stop()
+    if args.csv:
+        with open(args.csv, "w", newline="") as f:
+            writer = csv.DictWriter(f, fieldnames=CSV_FIELDS)
+            writer.writeheader()
+            writer.writerows(rows)
+        print(f"Wrote {args.csv}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,100 @@
+"""
+Trust store vs embedded keys: verifier startup and per-message cost.
+
+    python -m iotbench.bench_trust
+    python -m iotbench.bench_trust --scheme ed25519ph --sizes 1 100 10000 --count 5000 --devices 8
+
+Startup: a trust.json with N enrolled keys is written to a temporary
+directory, then loaded and decoded into VerifyKeys, as trust_from_args does
+(median of --repeat loads).
+
+Per message, over the three payload shapes, signed by --devices keys
+round-robin:
+
+  embedded  decode + VerifyKey from the payload's key + verify (no --trust-store)
+  trusted   decode + trust-store lookup + verify
+  untrusted decode + trust-store lookup that fails: the cost of rejecting
+            an unknown key before any crypto
+"""
+import argparse
+import os
+import statistics
+import tempfile
+import time
+
+from nacl.signing import SigningKey
+
+from iotbench.identity import TrustedKeys, TrustStore, UntrustedKey
+from iotbench.microbench import payloads
+from iotbench.schemes import get_scheme
+
+
+def startup_ms(scheme, n, repeat):
+    """(median ms to load and decode a store of n keys, its size in bytes)."""
+    store = TrustStore()
+    for i in range(n):
+        store.enroll(f"dev{i:05d}", SigningKey.generate().verify_key.encode())
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "trust.json")
+        store.save(path)
+        times = []
+        for _ in range(repeat):
+            start = time.perf_counter()
+            TrustedKeys(TrustStore.load(path), scheme)
+            times.append((time.perf_counter() - start) * 1000)
+        return statistics.median(times), os.path.getsize(path)
+
+
+def per_message_us(scheme, frames, prepare):
+    """Mean us per message for decode + prepare + verify; rejections count as done."""
+    start = time.perf_counter_ns()
+    for payload in frames:
+        try:
+            frame = scheme.decode_frame(payload)
+            scheme.verify_prepared(prepare(frame.key), frame.data, frame.tag)
+        except UntrustedKey:
+            pass
+    return (time.perf_counter_ns() - start) / 1000 / len(frames)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Trust store vs embedded keys: startup and verify cost.")
+    parser.add_argument("--scheme", choices=["ed25519", "ed25519ph"], default="ed25519")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1, 10, 100, 1000, 10000],
+                        help="enrolled keys for the startup test")
+    parser.add_argument("--repeat", type=int, default=5, help="loads per startup size")
+    parser.add_argument("--count", type=int, default=3000, help="messages per shape")
+    parser.add_argument("--devices", type=int, default=4, help="signing keys, round-robin")
+    parser.add_argument("--rounds", type=int, default=5, help="best of N passes per mode")
+    args = parser.parse_args()
+
+    scheme = get_scheme(args.scheme)
+    print(f"--- Startup ({args.scheme}, median of {args.repeat}) ---")
+    print(f"{'Keys':>7} {'File KB':>8} {'Load ms':>9} {'us/key':>7}")
+    for n in args.sizes:
+        ms, size = startup_ms(scheme, n, args.repeat)
+        print(f"{n:>7} {size / 1024:>8.1f} {ms:>9.2f} {ms * 1000 / n:>7.1f}")
+
+    signers = [get_scheme(args.scheme, generate=True) for _ in range(args.devices)]
+    store = TrustStore()
+    for i, signer in enumerate(signers):
+        store.enroll(f"dev{i}", signer.key_bytes())
+    trusted = TrustedKeys(store, scheme)
+    strangers = TrustedKeys(TrustStore(), scheme)  # nobody enrolled: every key is unknown
+
+    print(f"\n--- Per message ({args.count} msgs from {args.devices} devices, best of {args.rounds}) ---")
+    print(f"{'Shape':<8} {'Bytes':>6} {'Embedded us':>12} {'Trusted us':>11} {'Saved':>7} {'Untrusted us':>13}")
+    for shape, body in payloads().items():
+        frames = [signers[i % args.devices].encode(body) for i in range(args.count)]
+        best = {}
+        for _ in range(args.rounds):  # interleaved, so a noisy stretch hits every mode
+            for mode, prepare in (("embedded", scheme.prepare), ("trusted", trusted.prepare),
+                                  ("untrusted", strangers.prepare)):
+                best[mode] = min(best.get(mode, float("inf")), per_message_us(scheme, frames, prepare))
+        embedded, pinned, rejected = best["embedded"], best["trusted"], best["untrusted"]
+        print(f"{shape:<8} {len(frames[0]):>6} {embedded:>12.2f} {pinned:>11.2f} "
+              f"{100 * (embedded - pinned) / embedded:>6.1f}% {rejected:>13.2f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,154 @@
+"""
+Ingest rate and range-query latency of iotbench.tsstore over millions of
+records.
+
+    python -m iotbench.bench_tsstore --therm 2000000 --light 200000
+    python -m iotbench.bench_tsstore --therm 2000000 --batch 16 --dir /data/store --keep
+
+Payloads come from the synthetic producers (therm every 10 ms, LED frames
+every 20 ms of simulated time) and are fed through StoreWriter.append() as
+a broker would after verifying them. The feeder backs off while the writer's
+backlog is above BACKLOG_LIMIT, so the ingest rate is what the flush thread
+sustains, and "append" is the cost the broker's on_message pays per payload
+(on a single core that includes the flush thread's turns on the GIL).
+
+Queries use a fresh TimeSeriesStore, so the first one per window width
+includes mapping the column files. Each query also reduces one column (mean
+temperature / red level) to show the cost of actually touching the data.
+"""
+import argparse
+import os
+import random
+import shutil
+import statistics
+import tempfile
+import time
+
+from iotbench import tsstore
+from iotbench.codec import FLAG_RECORD_BATCH
+from iotbench.producers import light_source, therm_readings
+from iotbench.therm_batch import ThermBatcher
+
+BACKLOG_LIMIT = 4 * tsstore.FLUSH_RECORDS
+START_US = 1_700_000_000_000_000  # simulated receive time of the first record
+POOL = 4096  # distinct payloads, reused round-robin
+WINDOWS_S = [1, 60, 3600]
+
+
+def therm_payloads(batch):
+    """(payloads, flags, readings per payload)."""
+    readings = therm_readings(seed=1)
+    if not batch:
+        return [f"t={t:.2f},h={h:.2f},p={p:.2f}".encode("ascii") for t, h, p in
+                (next(readings) for _ in range(POOL))], 0, 1
+    batcher = ThermBatcher(k=batch, flush_ms=0xFFFF)
+    payloads = []
+    i = 0
+    while len(payloads) < POOL // batch + 1:
+        data = batcher.add(*next(readings), i * 10)
+        i += 1
+        if data:
+            payloads.append(data)
+    return payloads, FLAG_RECORD_BATCH, batch
+
+
+def ingest(store, device, kind, payloads, flags, per_payload, records, period_us):
+    writer = store.writer(device, kind)
+    append_ns = 0
+    sent = 0
+    t_us = START_US
+    start = time.perf_counter()
+    while sent * per_payload < records:
+        burst = min(tsstore.FLUSH_RECORDS, -(-(records - sent * per_payload) // per_payload))
+        t0 = time.perf_counter_ns()
+        for i in range(sent, sent + burst):
+            t_us += period_us * per_payload
+            writer.append(t_us, payloads[i % len(payloads)], flags)
+        append_ns += time.perf_counter_ns() - t0
+        sent += burst
+        while writer.backlog > BACKLOG_LIMIT:
+            time.sleep(0.001)
+    writer.close()
+    elapsed = time.perf_counter() - start
+    size = sum(os.path.getsize(os.path.join(d, f)) for d, _, files in os.walk(writer.path) for f in files)
+    return {"written": writer.written, "rejected": writer.rejected, "elapsed": elapsed,
+            "expected": sent * per_payload, "append_ns": append_ns / sent, "bytes": size,
+            "first_us": START_US, "last_us": t_us, "period_us": period_us}
+
+
+def query_latency(root, device, field, r, queries, seed=1):
+    rng = random.Random(seed)
+    out = []
+    store = tsstore.TimeSeriesStore(root)
+    span = r["last_us"] - r["first_us"]
+    for window_s in WINDOWS_S:
+        window_us = window_s * 1_000_000
+        if window_us > span:
+            continue
+        lat = []
+        rows = 0
+        for _ in range(queries):
+            start_us = r["first_us"] + rng.randrange(span - window_us + 1)
+            t0 = time.perf_counter_ns()
+            cols = store.query(device, start_us, start_us + window_us)
+            values = cols[field]
+            if tsstore.np is not None:
+                values.sum()
+            else:
+                sum(values.cast("B") if values.ndim > 1 else values)
+            lat.append((time.perf_counter_ns() - t0) / 1000)
+            rows += len(cols["seq"])
+        expected = window_us // r["period_us"]
+        out.append({"window_s": window_s, "rows": rows / queries, "expected": expected,
+                    "first_us": lat[0], "p50_us": statistics.median(lat),
+                    "p99_us": sorted(lat)[int(0.99 * (len(lat) - 1))]})
+    return out
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Time-series store ingest and query benchmark.")
+    parser.add_argument("--therm", type=int, default=2_000_000, help="therm records to ingest")
+    parser.add_argument("--light", type=int, default=200_000, help="LED frames to ingest")
+    parser.add_argument("--batch", type=int, default=0, help="feed therm as K-reading binary batches (0 = ASCII)")
+    parser.add_argument("--queries", type=int, default=200, help="random queries per window width")
+    parser.add_argument("--dir", default=None, help="store directory (default: a temporary one)")
+    parser.add_argument("--keep", action="store_true", help="leave the store on disk")
+    args = parser.parse_args()
+
+    root = args.dir or tempfile.mkdtemp(prefix="tsstore-")
+    if os.path.exists(root) and os.listdir(root):
+        raise SystemExit(f"{root} is not empty; the benchmark needs a fresh store")
+    store = tsstore.TimeSeriesStore(root)
+    light = light_source()
+    cells = [
+        ("esp32", "therm", "temp", *therm_payloads(args.batch), args.therm, 10_000),
+        ("pi3", "light", "r", [next(light) for _ in range(POOL)], 0, 1, args.light, 20_000),
+    ]
+    print(f"Store: {root}  (NumPy: {'yes' if tsstore.np is not None else 'no'})")
+    try:
+        for device, kind, field, payloads, flags, per_payload, records, period_us in cells:
+            if not records:
+                continue
+            r = ingest(store, device, kind, payloads, flags, per_payload, records, period_us)
+            label = f"{kind}" + (f" (batch {args.batch})" if kind == "therm" and args.batch else "")
+            print(f"--- {label} ---")
+            print(f"Ingested:     {r['written']} records in {r['elapsed']:.1f}s "
+                  f"({r['written'] / r['elapsed']:,.0f} records/s, {r['rejected']} rejected)")
+            print(f"append():     {r['append_ns']:.0f} ns per payload on the caller's thread")
+            print(f"On disk:      {r['bytes'] / 1e6:.1f} MB ({r['bytes'] / r['written']:.1f} B per record)")
+            if r["written"] != r["expected"]:
+                raise SystemExit(f"Expected {r['expected']} records, store has {r['written']}")
+            print(f"{'Window':>8} {'Rows':>9} {'first us':>9} {'p50 us':>9} {'p99 us':>9}")
+            for q in query_latency(root, device, field, r, args.queries):
+                if abs(q["rows"] - q["expected"]) > 1:
+                    raise SystemExit(f"{q['window_s']} s window returned {q['rows']:.0f} rows, "
+                                     f"expected {q['expected']}")
+                print(f"{q['window_s']:>7}s {q['rows']:>9.0f} {q['first_us']:>9.1f} {q['p50_us']:>9.1f} "
+                      f"{q['p99_us']:>9.1f}")
+    finally:
+        if not args.keep:
+            shutil.rmtree(root, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,473 @@
+"""
+Content-addressed block store for the IPFS verifiers, with CAR export.
+
+    blocks = blockstore_from_args(args, stream=f"ipfs_stream_{RUN_ID}")  # None without --blockstore
+    ...after the CID verifies...
+    blocks.put(video_bytes)             # queued; never blocks
+    ...at exit...
+    root = blocks.close()               # flush, build the UnixFS DAG, write DIR/<stream>.car
+
+Layout under DIR (shared by every stream written there, so repeats dedupe
+across runs too):
+
+    blocks.pack            unique raw blocks, appended
+    blocks.idx             one INDEX record (sha256, offset, length) per unique block
+    streams/<name>.leaves  sha256 of every put() block in stream order, repeats included
+    <name>.car             CARv1: the stream as a UnixFS file DAG, root CID in the header
+
+put() only appends to a deque. A flush thread hashes each block (raw-codec
+sha2-256 CIDs, the same as iotbench.cid), skips digests already stored and
+appends the rest with one write per file per batch of FLUSH_BLOCKS (or
+every FLUSH_MS).
+
+close() turns the stream's leaves into a balanced UnixFS file DAG (dag-pb
+nodes of at most MAX_LINKS links over raw leaves, the layout of `ipfs add
+--raw-leaves --cid-version=1`) and exports every reachable block once, in
+depth-first order. `ipfs dag import x.car` then `ipfs cat <root>` gives back
+the verified stream byte for byte. The root differs from `ipfs add` on the
+.h264 itself because the leaves are the verified chunks, not kubo's 256 KiB
+pieces. Only one writer per DIR at a time.
+
+    python -m iotbench.blockstore DIR                        # blocks, streams, dedupe
+    python -m iotbench.blockstore DIR --export NAME          # rebuild NAME.car from the leaves
+    python -m iotbench.blockstore --check x.car [--cat out]  # re-hash a CAR, reassemble the file
+"""
+import argparse
+import base64
+import collections
+import hashlib
+import os
+import struct
+import threading
+
+from iotbench.cid import CID_PREFIX as RAW_PREFIX, MAX_RAW_BLOCK
+
+FLUSH_BLOCKS = 1024
+FLUSH_MS = 200
+MAX_LINKS = 174  # kubo's balanced layout
+INDEX = struct.Struct("<32sQI")
+DAG_PB_PREFIX = bytes([0x01, 0x70, 0x12, 0x20])  # CIDv1, dag-pb, sha2-256 of 32 bytes
+UNIXFS_FILE = 2
+
+
+def cid_str(cid):
+    """Binary CIDv1 -> base32 text ("bafk..." raw, "bafy..." dag-pb)."""
+    return "b" + base64.b32encode(cid).decode("ascii").lower().rstrip("=")
+
+
+def cid_bytes(text):
+    if not text.startswith("b"):
+        raise ValueError(f"Only base32 CIDv1 is supported: {text}")
+    body = text[1:].upper()
+    return base64.b32decode(body + "=" * (-len(body) % 8))
+
+
+# --- protobuf / dag-pb ---
+def _varint(n):
+    out = bytearray()
+    while n >= 0x80:
+        out.append(n & 0x7F | 0x80)
+        n >>= 7
+    out.append(n)
+    return bytes(out)
+
+
+def _read_varint(buf, pos):
+    n = shift = 0
+    while True:
+        b = buf[pos]
+        pos += 1
+        n |= (b & 0x7F) << shift
+        if b < 0x80:
+            return n, pos
+        shift += 7
+
+
+def _pb_bytes(field, data):
+    return _varint(field << 3 | 2) + _varint(len(data)) + data
+
+
+def _pb_uint(field, n):
+    return _varint(field << 3) + _varint(n)
+
+
+def _pb_fields(buf):
+    """(field, value) pairs of one protobuf message; length-delimited values as memoryviews."""
+    buf = memoryview(buf)
+    pos = 0
+    while pos < len(buf):
+        key, pos = _read_varint(buf, pos)
+        field, wire = key >> 3, key & 7
+        if wire == 0:
+            value, pos = _read_varint(buf, pos)
+        elif wire == 2:
+            length, pos = _read_varint(buf, pos)
+            value, pos = buf[pos:pos + length], pos + length
+        else:
+            raise ValueError(f"Unsupported protobuf wire type {wire}")
+        yield field, value
+
+
+def file_node(children):
+    """dag-pb UnixFS file node over [(cid, file_bytes, tsize)] children."""
+    unixfs = _pb_uint(1, UNIXFS_FILE) + _pb_uint(3, sum(c[1] for c in children))
+    unixfs += b"".join(_pb_uint(4, c[1]) for c in children)
+    # dag-pb canonical order: Links (2) before Data (1); each link is Hash, Name, Tsize
+    links = b"".join(_pb_bytes(2, _pb_bytes(1, cid) + _pb_bytes(2, b"") + _pb_uint(3, tsize))
+                     for cid, _, tsize in children)
+    return links + _pb_bytes(1, unixfs)
+
+
+def node_links(block):
+    """Child CIDs of a dag-pb node, in order."""
+    return [bytes(next(v for f, v in _pb_fields(link) if f == 1))
+            for field, link in _pb_fields(block) if field == 2]
+
+
+def build_file_dag(leaves):
+    """
+    Balanced UnixFS file over raw leaves [(cid, size)] ->
+    (root cid, {cid: (block, child cids)}) for the dag-pb nodes.
+    """
+    nodes = {}
+    level = [(cid, size, size) for cid, size in leaves]
+    if not level:
+        # An empty file is the empty raw block; it goes in the CAR like a node
+        root = RAW_PREFIX + hashlib.sha256(b"").digest()
+        nodes[root] = (b"", [])
+        return root, nodes
+    while len(level) > 1:
+        parents = []
+        for i in range(0, len(level), MAX_LINKS):
+            group = level[i:i + MAX_LINKS]
+            block = file_node(group)
+            cid = DAG_PB_PREFIX + hashlib.sha256(block).digest()
+            nodes[cid] = (block, [c[0] for c in group])
+            parents.append((cid, sum(c[1] for c in group), len(block) + sum(c[2] for c in group)))
+        level = parents
+    return level[0][0], nodes
+
+
+# --- CAR ---
+def _car_header(root):
+    # DAG-CBOR {"roots": [CID(root)], "version": 1}; keys sorted by length. CIDs are
+    # tag 42 over a byte string starting with the identity-multibase 0x00
+    cid = b"\x00" + root
+    return (b"\xa2" + b"\x65roots" + b"\x81\xd8\x2a" + _cbor_bytes_head(len(cid)) + cid
+            + b"\x67version\x01")
+
+
+def _cbor_bytes_head(n):
+    if n < 24:
+        return bytes([0x40 | n])
+    if n < 256:
+        return bytes([0x58, n])
+    return bytes([0x59]) + struct.pack(">H", n)
+
+
+def write_car(path, root, nodes, read_raw):
+    """Writes every block reachable from `root` once, depth-first; read_raw(cid) -> raw leaf bytes."""
+    header = _car_header(root)
+    blocks = bytes_out = 0
+    seen = set()
+    stack = [root]
+    with open(path, "wb") as f:
+        f.write(_varint(len(header)) + header)
+        while stack:
+            cid = stack.pop()
+            if cid in seen:
+                continue
+            seen.add(cid)
+            if cid in nodes:
+                data, children = nodes[cid]
+                stack.extend(reversed(children))
+            else:
+                data = read_raw(cid)
+            f.write(_varint(len(cid) + len(data)) + cid)
+            f.write(data)
+            blocks += 1
+            bytes_out += len(data)
+    return blocks, bytes_out
+
+
+def _cbor(buf, pos):
+    """(value, next pos) for the DAG-CBOR subset a CAR header uses; tag 42 -> CID bytes."""
+    head = buf[pos]
+    major, info = head >> 5, head & 0x1F
+    pos += 1
+    if info < 24:
+        n = info
+    elif info <= 27:
+        size = 1 << (info - 24)
+        n, pos = int.from_bytes(buf[pos:pos + size], "big"), pos + size
+    else:
+        raise ValueError(f"Unsupported CBOR item 0x{head:02x}")
+    if major == 0:
+        return n, pos
+    if major in (2, 3):
+        value = bytes(buf[pos:pos + n])
+        return (value.decode("utf-8") if major == 3 else value), pos + n
+    if major == 4:
+        items = []
+        for _ in range(n):
+            item, pos = _cbor(buf, pos)
+            items.append(item)
+        return items, pos
+    if major == 5:
+        out = {}
+        for _ in range(n):
+            key, pos = _cbor(buf, pos)
+            out[key], pos = _cbor(buf, pos)
+        return out, pos
+    if major == 6 and n == 42:
+        value, pos = _cbor(buf, pos)
+        return value[1:], pos  # drop the identity-multibase 0x00
+    raise ValueError(f"Unsupported CBOR major type {major}")
+
+
+def _cid_len(buf, pos):
+    """Length of the binary CIDv1 starting at pos."""
+    start = pos
+    for _ in range(3):  # version, codec, multihash code
+        _, pos = _read_varint(buf, pos)
+    digest_len, pos = _read_varint(buf, pos)
+    return pos + digest_len - start
+
+
+def read_car(path):
+    """(roots, {cid: (offset, length)}) for a CARv1."""
+    with open(path, "rb") as f:
+        data = f.read()
+    header_len, pos = _read_varint(data, 0)
+    header, _ = _cbor(data, pos)
+    if header.get("version") != 1:
+        raise ValueError(f"Not a CARv1 file: {path}")
+    pos += header_len
+    blocks = {}
+    while pos < len(data):
+        length, pos = _read_varint(data, pos)
+        n = _cid_len(data, pos)
+        blocks[bytes(data[pos:pos + n])] = (pos + n, length - n)
+        pos += length
+    return header["roots"], blocks
+
+
+def check_car(path, cat_path=None):
+    """Re-hashes every block and walks the DAG from the root; optionally writes the file's bytes."""
+    roots, blocks = read_car(path)
+    if len(roots) != 1:
+        raise ValueError(f"Expected one root, found {len(roots)}")
+    bad = 0
+    with open(path, "rb") as f:
+        def block(cid):
+            offset, length = blocks[cid]
+            f.seek(offset)
+            return f.read(length)
+
+        for cid in blocks:
+            if hashlib.sha256(block(cid)).digest() != cid[-32:]:
+                bad += 1
+        out = open(cat_path, "wb") if cat_path else None
+        size = 0
+        stack = [roots[0]]
+        try:
+            while stack:
+                cid = stack.pop()
+                data = block(cid)
+                if cid.startswith(DAG_PB_PREFIX):
+                    stack.extend(reversed(node_links(data)))
+                    continue
+                size += len(data)
+                if out:
+                    out.write(data)
+        finally:
+            if out:
+                out.close()
+    return {"root": cid_str(roots[0]), "blocks": len(blocks), "bad_blocks": bad, "file_bytes": size}
+
+
+# --- WRITER ---
+class BlockStore:
+    """
+    Stores one stream's verified blocks under DIR. put() only queues; a flush
+    thread hashes, deduplicates and appends them.
+    """
+
+    def __init__(self, path, stream, flush_ms=FLUSH_MS):
+        self.path = path
+        self.stream = stream
+        self.flush_ms = flush_ms
+        os.makedirs(os.path.join(path, "streams"), exist_ok=True)
+        self.index = load_index(path)  # sha256 -> (offset, length) of every stored block
+        self.puts = 0
+        self.duplicates = 0
+        self.stored = 0
+        self.bytes_in = 0
+        self.bytes_stored = 0
+        self.errors = 0
+        self._pack = open(os.path.join(path, "blocks.pack"), "ab")
+        self._idx = open(os.path.join(path, "blocks.idx"), "ab")
+        self._leaves = open(self.leaves_path, "ab")
+        self._pending = collections.deque()
+        self._wake = threading.Event()
+        self._closing = False
+        self._thread = threading.Thread(target=self._run, name=f"blocks-{stream}", daemon=True)
+        self._thread.start()
+
+    @property
+    def leaves_path(self):
+        return os.path.join(self.path, "streams", f"{self.stream}.leaves")
+
+    @property
+    def backlog(self):
+        return len(self._pending)
+
+    def put(self, data):
+        """Queues one verified block (split at MAX_RAW_BLOCK); hashing and I/O happen on the flush thread."""
+        for start in range(0, max(len(data), 1), MAX_RAW_BLOCK):
+            self._pending.append(data[start:start + MAX_RAW_BLOCK])
+        if len(self._pending) >= FLUSH_BLOCKS:
+            self._wake.set()
+
+    def close(self, car=True):
+        """Flushes, closes the files and (with car=True) exports <stream>.car; returns the root CID text."""
+        self._closing = True
+        self._wake.set()
+        self._thread.join()
+        for f in (self._pack, self._idx, self._leaves):
+            f.close()
+        if not car:
+            return None
+        return export_stream(self.path, self.stream, self.index)
+
+    # --- flush thread ---
+    def _run(self):
+        while True:
+            self._wake.wait(self.flush_ms / 1000)
+            self._wake.clear()
+            closing = self._closing
+            while self._pending:
+                items = []
+                while self._pending and len(items) < FLUSH_BLOCKS:
+                    items.append(self._pending.popleft())
+                try:
+                    self._write(items)
+                except Exception as e:
+                    self.errors += 1
+                    print(f"Blockstore write failed ({len(items)} blocks dropped): {e}")
+            if closing:
+                break
+
+    def _write(self, items):
+        offset = self._pack.tell()
+        pack, idx, leaves = [], [], []
+        for data in items:
+            digest = hashlib.sha256(data).digest()
+            leaves.append(digest)
+            self.puts += 1
+            self.bytes_in += len(data)
+            if digest in self.index:
+                self.duplicates += 1
+                continue
+            self.index[digest] = (offset, len(data))
+            idx.append(INDEX.pack(digest, offset, len(data)))
+            pack.append(data)
+            offset += len(data)
+            self.stored += 1
+            self.bytes_stored += len(data)
+        # Blocks land before the index and leaves that point at them
+        self._pack.write(b"".join(pack))
+        self._pack.flush()
+        self._idx.write(b"".join(idx))
+        self._idx.flush()
+        self._leaves.write(b"".join(leaves))
+        self._leaves.flush()
+
+    def report(self, root=None):
+        saved = 100 * (1 - self.bytes_stored / self.bytes_in) if self.bytes_in else 0.0
+        print(f"Blockstore:      {self.puts} blocks ({self.duplicates} repeats), {self.bytes_stored} of "
+              f"{self.bytes_in} bytes stored ({saved:.1f}% deduplicated) in {self.path}")
+        if root:
+            print(f"CAR:             {os.path.join(self.path, self.stream + '.car')} root {root}")
+
+
+def load_index(path):
+    index = {}
+    idx_path = os.path.join(path, "blocks.idx")
+    if os.path.exists(idx_path):
+        with open(idx_path, "rb") as f:
+            data = f.read()
+        usable = len(data) - len(data) % INDEX.size  # ignore a torn last record
+        for digest, offset, length in INDEX.iter_unpack(data[:usable]):
+            index[digest] = (offset, length)
+    return index
+
+
+def read_leaves(path, stream):
+    with open(os.path.join(path, "streams", f"{stream}.leaves"), "rb") as f:
+        data = f.read()
+    return [data[i:i + 32] for i in range(0, len(data) - len(data) % 32, 32)]
+
+
+def export_stream(path, stream, index=None, car_path=None):
+    """Builds the stream's file DAG from its leaves and writes the CAR; returns the root CID text."""
+    index = load_index(path) if index is None else index
+    leaves = [(RAW_PREFIX + d, index[d][1]) for d in read_leaves(path, stream)]
+    root, nodes = build_file_dag(leaves)
+    with open(os.path.join(path, "blocks.pack"), "rb") as pack:
+        def read_raw(cid):
+            offset, length = index[cid[4:]]
+            pack.seek(offset)
+            return pack.read(length)
+
+        write_car(car_path or os.path.join(path, f"{stream}.car"), root, nodes, read_raw)
+    return cid_str(root)
+
+
+def add_blockstore_args(parser):
+    parser.add_argument("--blockstore", default=None,
+                        help="store verified blocks under their CIDs in DIR and export a .car at exit")
+
+
+def blockstore_from_args(args, stream):
+    if not args.blockstore:
+        return None
+    store = BlockStore(args.blockstore, stream)
+    print(f"Storing verified blocks in {args.blockstore} as stream '{stream}' ({len(store.index)} blocks already)")
+    return store
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Summarize a blockstore, export a stream as CAR, or check a CAR.")
+    parser.add_argument("root", nargs="?")
+    parser.add_argument("--export", default=None, metavar="STREAM", help="rebuild STREAM.car from its leaves")
+    parser.add_argument("--car", default=None, help="output path for --export")
+    parser.add_argument("--check", default=None, metavar="CAR", help="re-hash a CAR and walk its DAG")
+    parser.add_argument("--cat", default=None, help="with --check, write the reassembled file here")
+    args = parser.parse_args()
+
+    if args.check:
+        result = check_car(args.check, args.cat)
+        print(f"{args.check}: root {result['root']}, {result['blocks']} blocks, {result['bad_blocks']} bad, "
+              f"{result['file_bytes']} file bytes")
+        raise SystemExit(1 if result["bad_blocks"] else 0)
+    if not args.root:
+        parser.error("a blockstore DIR or --check CAR is required")
+    if args.export:
+        print(export_stream(args.root, args.export, car_path=args.car))
+        return
+    index = load_index(args.root)
+    stored = sum(length for _, length in index.values())
+    print(f"{args.root}: {len(index)} unique blocks, {stored} bytes")
+    streams_dir = os.path.join(args.root, "streams")
+    for name in sorted(os.listdir(streams_dir)) if os.path.isdir(streams_dir) else []:
+        stream = name[:-len(".leaves")]
+        leaves = read_leaves(args.root, stream)
+        total = sum(index[d][1] for d in leaves if d in index)
+        unique = sum(index[d][1] for d in set(leaves) if d in index)
+        print(f"  {stream:<28} {len(leaves):>8} blocks  {total:>12} bytes  {len(set(leaves)):>8} unique "
+              f"({100 * (1 - unique / total) if total else 0:.1f}% repeated)")
+
+
+if __name__ == "__main__":
+    main()
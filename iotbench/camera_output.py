@@ -0,0 +1,211 @@
+"""
+picamera2 Output that signs encoded H.264 frames in-process.
+
+The original Pi5 producer muxed the encoder output through PyavOutput into
+an os.pipe() and read it back in 4 KiB pieces, losing frame boundaries and
+encoder timestamps. SigningOutput receives each encoded frame directly:
+
+    output = SigningOutput(pool)
+    picam2.start_recording(H264Encoder(bitrate=2000000), output)
+
+Every frame becomes one payload: FRAME_META (timestamp_us, seq) + the frame,
+flagged FLAG_FRAME_META and, for IDR frames, FLAG_KEYFRAME, so the broker can
+rebuild the .h264 stream and knows where each GOP starts.
+
+Without a camera, FakeEncoder drives any Output with the synthetic stream
+from iotbench.producers at the camera's frame rate:
+
+    python -m iotbench.camera_output --seconds 10 --workers 2
+    python -m iotbench.camera_output --compare-pipe --fast
+"""
+import argparse
+import os
+import threading
+import time
+
+from iotbench import codec
+from iotbench.producers import CAM_BITRATE, CAM_FPS, CHUNK_SIZE, h264_frames
+from iotbench.profiling import StageTimer
+from iotbench.schemes import SCHEMES, get_scheme
+from iotbench.signpool import SigningPool
+
+try:
+    from picamera2.outputs import Output
+except ImportError:
+    class Output:
+        """Same surface as picamera2.outputs.Output, for hosts without picamera2."""
+
+        def __init__(self, pts=None):
+            self.recording = False
+
+        def start(self):
+            self.recording = True
+
+        def stop(self):
+            self.recording = False
+
+        def outputframe(self, frame, keyframe=True, timestamp=None, packet=None, audio=False):
+            pass
+
+
+class SigningOutput(Output):
+    """
+    Hands every encoded frame (with timestamp and keyframe flag) to a
+    SigningPool. `seqs` (an iotbench.identity.SequenceLease) numbers the
+    frames when the key persists across runs; otherwise they count from 0.
+    `chain` (an iotbench.chain.ChunkChain) links each frame to the previous one.
+    """
+
+    def __init__(self, pool, pts=None, seqs=None, chain=None):
+        super().__init__(pts=pts)
+        self.pool = pool
+        self.seqs = seqs
+        self.chain = chain
+        self.seq = 0
+        self.keyframes = 0
+
+    def outputframe(self, frame, keyframe=True, timestamp=None, packet=None, audio=False):
+        if audio or not self.recording:
+            return
+        # One copy: the encoder reuses its buffer once this returns
+        seq = self.seqs.take() if self.seqs else self.seq
+        data = codec.FRAME_META.pack(timestamp or 0, seq) + bytes(frame)
+        flags = codec.FLAG_FRAME_META | (codec.FLAG_KEYFRAME if keyframe else 0)
+        if self.chain:
+            data, flags = self.chain.link(data, flags)
+        self.pool.submit(data, flags)
+        self.seq += 1
+        self.keyframes += bool(keyframe)
+
+
+class PipeOutput(Output):
+    """The old path: raw stream into a pipe, for comparison runs only."""
+
+    def __init__(self, fd):
+        super().__init__()
+        self.pipe = os.fdopen(fd, "wb", buffering=0)
+
+    def outputframe(self, frame, keyframe=True, timestamp=None, packet=None, audio=False):
+        if self.recording:
+            self.pipe.write(frame)
+
+    def stop(self):
+        super().stop()
+        self.pipe.close()
+
+
+# --- FAKE ENCODER ---
+class FakeEncoder:
+    """Calls output.outputframe() like picamera2's H264Encoder, from a thread."""
+
+    def __init__(self, bitrate=CAM_BITRATE, fps=CAM_FPS, gop=30, paced=True, seed=1):
+        self.bitrate = bitrate
+        self.fps = fps
+        self.gop = gop
+        self.paced = paced
+        self.seed = seed
+        self.frames = 0
+        self._stop = threading.Event()
+
+    def run(self, output, seconds):
+        output.start()
+        period = 1.0 / self.fps
+        start = time.monotonic()
+        deadline = start
+        for frame, keyframe in h264_frames(self.bitrate, self.fps, self.gop, self.seed):
+            now = time.monotonic()
+            if now - start >= seconds or self._stop.is_set():
+                break
+            output.outputframe(frame, keyframe, int((now - start) * 1_000_000))
+            self.frames += 1
+            if self.paced:
+                deadline += period
+                delay = deadline - time.monotonic()
+                if delay > 0:
+                    time.sleep(delay)
+        output.stop()
+
+
+def run_frames(scheme, workers, seconds, paced, bitrate):
+    stages = StageTimer()
+    received = []
+
+    def sink(payload):
+        frame = scheme.decode_frame(payload)
+        timestamp_us, seq, video = codec.split_frame_meta(frame)
+        received.append((seq, bool(frame.flags & codec.FLAG_KEYFRAME), len(video)))
+
+    pool = SigningPool(scheme, sink, workers=workers, stages=stages)
+    output = SigningOutput(pool)
+    encoder = FakeEncoder(bitrate=bitrate, paced=paced)
+    start = time.monotonic()
+    encoder.run(output, seconds)
+    pool.close()
+    elapsed = time.monotonic() - start
+    in_order = [seq for seq, _, _ in received] == list(range(len(received)))
+    video_bytes = sum(n for _, _, n in received)
+    return {"messages": len(received), "frames": encoder.frames, "keyframes": output.keyframes,
+            "video_bytes": video_bytes, "elapsed": elapsed, "in_order": in_order, "stages": stages}
+
+
+def run_pipe(scheme, workers, seconds, paced, bitrate, chunk_size=CHUNK_SIZE):
+    stages = StageTimer()
+    received = []
+    pool = SigningPool(scheme, lambda payload: received.append(len(scheme.decode(payload)[0])),
+                       workers=workers, stages=stages)
+    r_fd, w_fd = os.pipe()
+
+    def reader():
+        with os.fdopen(r_fd, "rb") as pipe_reader:
+            while True:
+                buf = pipe_reader.read(chunk_size)
+                if not buf:
+                    break
+                pool.submit(buf)
+
+    t = threading.Thread(target=reader)
+    t.start()
+    encoder = FakeEncoder(bitrate=bitrate, paced=paced)
+    start = time.monotonic()
+    encoder.run(PipeOutput(w_fd), seconds)
+    t.join()
+    pool.close()
+    elapsed = time.monotonic() - start
+    return {"messages": len(received), "frames": encoder.frames, "keyframes": None,
+            "video_bytes": sum(received), "elapsed": elapsed, "in_order": None, "stages": stages}
+
+
+def report(label, r):
+    pipeline = r["stages"].stages.get("pipeline")
+    print(f"--- {label} ---")
+    print(f"Frames encoded:   {r['frames']} ({r['keyframes'] if r['keyframes'] is not None else '?'} keyframes)")
+    print(f"Messages:         {r['messages']}")
+    print(f"Video throughput: {r['video_bytes'] * 8 / r['elapsed'] / 1e6:.2f} Mbit/s")
+    if pipeline:
+        print(f"Submit->publish:  p50 {pipeline.percentile(0.5):.0f} us, p99 {pipeline.percentile(0.99):.0f} us, "
+              f"max {pipeline.max:.0f} us")
+    if r["in_order"] is not None:
+        print(f"In order:         {r['in_order']}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Drive SigningOutput with a fake H.264 encoder.")
+    parser.add_argument("--scheme", choices=sorted(SCHEMES), default="ed25519")
+    parser.add_argument("--workers", type=int, default=1)
+    parser.add_argument("--seconds", type=float, default=5.0)
+    parser.add_argument("--bitrate", type=int, default=CAM_BITRATE)
+    parser.add_argument("--fast", action="store_true", help="emit frames as fast as possible instead of at 30 fps")
+    parser.add_argument("--compare-pipe", action="store_true", help="also run the old os.pipe + 4 KiB chunk path")
+    args = parser.parse_args()
+
+    scheme = get_scheme(args.scheme, generate=True)
+    r = run_frames(scheme, args.workers, args.seconds, not args.fast, args.bitrate)
+    report("SigningOutput (per frame)", r)
+    if args.compare_pipe:
+        report("os.pipe + 4 KiB chunks", run_pipe(scheme, args.workers, args.seconds, not args.fast, args.bitrate))
+    if r["in_order"] is False or r["messages"] != r["frames"]:
+        raise SystemExit("SigningOutput lost or reordered frames")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,320 @@
+"""
+SQLite catalog of benchmark runs: metadata, summary stats, latency
+histograms and every per-message row, queryable across hundreds of runs.
+
+    python -m iotbench.catalog import runs/ Broker/        # walks for raw CSVs
+    python -m iotbench.catalog runs --device pi5
+    python -m iotbench.catalog query --by stress --metric verify --device pi5
+    python -m iotbench.catalog sql "SELECT stress, count(*) FROM runs GROUP BY stress"
+
+One run is one raw per-message CSV written by a broker verifier
+(raw_packet_data_N.csv, benchmark_pi_results_N.csv, benchmark_results.csv).
+The layout is recognised from the header. Metadata comes from the run.json
+that iotbench.orchestrate leaves next to the CSV. For loose result folders
+it is inferred from the path instead: "stress50" / "(stress-50)" / "no stress"
+give the stress level, "IPFS" means the cid scheme. Re-importing a CSV that
+has not changed is a no-op; a changed one replaces its run.
+
+Tables (default database: runs/catalog.sqlite):
+
+    runs        one row per run: device, scheme, stress, chunk_size, host,
+                git_rev, session, status, message/failure counts and
+                mean/p50/p99/max of sign and verify time
+    histograms  (run_id, metric) -> zlib'd JSON of an iotbench.histogram
+                Histogram, so percentiles over any group of runs come from
+                merged buckets instead of averaged percentiles
+    messages    (run_id, seq) -> size_bytes, sign_us, verify_us, valid,
+                WITHOUT ROWID so the primary key is the run's clustered index
+
+`query` only reads runs and histograms, which is what keeps "p99 verify by
+stress level" in the millisecond range however many message rows there are.
+"""
+import argparse
+import csv
+import json
+import os
+import re
+import sqlite3
+import time
+import zlib
+
+from iotbench.histogram import Histogram
+
+DEFAULT_DB = os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "runs", "catalog.sqlite"))
+GROUP_COLUMNS = ("device", "scheme", "stress", "chunk_size", "host", "git_rev", "session", "status")
+METRICS = ("sign", "verify")
+INSERT_BATCH = 50_000
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS runs (
+    id INTEGER PRIMARY KEY,
+    source TEXT UNIQUE NOT NULL,
+    source_size INTEGER,
+    source_mtime REAL,
+    imported REAL,
+    session TEXT,
+    cell TEXT,
+    device TEXT,
+    scheme TEXT,
+    stress INTEGER,
+    chunk_size INTEGER,
+    host TEXT,
+    git_rev TEXT,
+    started TEXT,
+    status TEXT,
+    messages INTEGER,
+    failures INTEGER,
+    malformed INTEGER,
+    replays INTEGER,
+    sign_mean_us REAL, sign_p50_us REAL, sign_p99_us REAL, sign_max_us REAL,
+    verify_mean_us REAL, verify_p50_us REAL, verify_p99_us REAL, verify_max_us REAL
+);
+CREATE INDEX IF NOT EXISTS runs_matrix ON runs (device, scheme, stress, chunk_size);
+CREATE TABLE IF NOT EXISTS histograms (
+    run_id INTEGER NOT NULL REFERENCES runs (id) ON DELETE CASCADE,
+    metric TEXT NOT NULL,
+    hist BLOB NOT NULL,
+    PRIMARY KEY (run_id, metric)
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS messages (
+    run_id INTEGER NOT NULL REFERENCES runs (id) ON DELETE CASCADE,
+    seq INTEGER NOT NULL,
+    size_bytes INTEGER,
+    sign_us REAL,
+    verify_us REAL,
+    valid INTEGER,
+    PRIMARY KEY (run_id, seq)
+) WITHOUT ROWID;
+"""
+
+
+def connect(path=DEFAULT_DB):
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    db = sqlite3.connect(path)
+    db.execute("PRAGMA journal_mode = WAL")
+    db.execute("PRAGMA foreign_keys = ON")
+    db.executescript(SCHEMA)
+    return db
+
+
+# --- RAW CSV LAYOUTS ---
+def _size_hex(value):
+    return None if value.endswith("...") else len(value) // 2  # pi3 logs truncate long frames
+
+
+# first three header columns -> (device, size in bytes from column 1, sign/hash time column)
+LAYOUTS = {
+    ("Chunk_ID", "Size_Bytes", "SignTime_uS"): ("pi5", int, 2),
+    ("Chunk_ID", "Size_Bytes", "HashTime_uS"): ("pi5", int, 2),
+    ("Entry", "MessageHex", "SignTime_uS"): ("pi3", _size_hex, 2),
+    ("Entry", "Message", "SignTime_uS"): ("esp32", len, 2),
+}
+
+
+def layout_for(header):
+    return LAYOUTS.get(tuple(header[:3]))
+
+
+def read_rows(path, layout):
+    """(seq, size_bytes, sign_us, verify_us, valid) per message."""
+    _, size_of, sign_col = layout
+    with open(path, newline="") as f:
+        reader = csv.reader(f)
+        header = next(reader)
+        verify_col = header.index("VerifyTime_uS") if "VerifyTime_uS" in header else None
+        valid_col = header.index("Valid") if "Valid" in header else None
+        reading_col = header.index("Reading") if "Reading" in header else None
+        for n, row in enumerate(reader):
+            if len(row) < 3:
+                continue
+            # Batched therm CSVs repeat the batch's timings on every reading; keep one per message
+            if reading_col is not None and row[reading_col] not in ("", "0"):
+                continue
+            yield (n, size_of(row[1]), float(row[sign_col]),
+                   float(row[verify_col]) if verify_col is not None and row[verify_col] else None,
+                   None if valid_col is None else int(row[valid_col] == "True"))
+
+
+def _from_path(path):
+    """Metadata for runs not written by the orchestrator, from the folder names."""
+    lowered = path.lower()
+    m = re.search(r"stress[-_ ]?(\d+)", lowered)
+    stress = int(m.group(1)) if m else 0 if "no stress" in lowered else None
+    return {"stress": stress, "scheme": "cid" if "ipfs" in lowered else None}
+
+
+def _summary_counts(path):
+    """Malformed/Replays from the Pi5 benchmark_summary_N.csv next to raw_packet_data_N.csv."""
+    summary = re.sub(r"raw_packet_data_(\d+)\.csv$", r"benchmark_summary_\1.csv", path)
+    if summary == path or not os.path.exists(summary):
+        return {}
+    with open(summary, newline="") as f:
+        row = next(csv.DictReader(f), {})
+    return {k.lower(): int(row[k]) for k in ("Malformed", "Replays") if row.get(k, "").isdigit()}
+
+
+def run_metadata(path, device):
+    meta = {"device": device, **_from_path(path), **_summary_counts(path)}
+    run_json = os.path.join(os.path.dirname(path), "run.json")
+    if os.path.exists(run_json):
+        with open(run_json) as f:
+            run = json.load(f)
+        host = run.get("host", {})
+        meta.update(session=os.path.basename(os.path.dirname(os.path.dirname(os.path.abspath(path)))),
+                    cell=os.path.basename(os.path.dirname(os.path.abspath(path))), device=run.get("device", device),
+                    scheme=run.get("scheme"), stress=run.get("stress"), chunk_size=run.get("chunk_size"),
+                    host=host.get("hostname"), git_rev=host.get("git_rev"), started=run.get("started"),
+                    status=run.get("status"))
+    return meta
+
+
+# --- IMPORT ---
+def _stats(prefix, hist):
+    if not hist.count:
+        return {}
+    return {f"{prefix}_mean_us": hist.mean, f"{prefix}_p50_us": hist.percentile(0.50),
+            f"{prefix}_p99_us": hist.percentile(0.99), f"{prefix}_max_us": hist.max}
+
+
+def import_csv(db, path):
+    """Imports one raw CSV. Returns the run id, or None if it is not a raw layout or is unchanged."""
+    path = os.path.abspath(path)
+    with open(path, newline="") as f:
+        layout = layout_for(next(csv.reader(f), []))
+    if layout is None:
+        return None
+    st = os.stat(path)
+    old = db.execute("SELECT id, source_size, source_mtime FROM runs WHERE source = ?", (path,)).fetchone()
+    if old and old[1] == st.st_size and old[2] == st.st_mtime:
+        return None
+    meta = run_metadata(path, layout[0])
+    hists = {m: Histogram() for m in METRICS}
+    messages = failures = 0
+    with db:
+        if old:
+            db.execute("DELETE FROM runs WHERE id = ?", (old[0],))
+        cols = ["source", "source_size", "source_mtime", "imported", *meta]
+        run_id = db.execute(f"INSERT INTO runs ({', '.join(cols)}) VALUES ({', '.join('?' * len(cols))})",
+                            (path, st.st_size, st.st_mtime, time.time(), *meta.values())).lastrowid
+        batch = []
+        for seq, size, sign_us, verify_us, valid in read_rows(path, layout):
+            batch.append((run_id, seq, size, sign_us, verify_us, valid))
+            hists["sign"].record(sign_us)
+            if verify_us is not None:
+                hists["verify"].record(verify_us)
+            messages += 1
+            failures += valid == 0
+            if len(batch) >= INSERT_BATCH:
+                db.executemany("INSERT INTO messages VALUES (?, ?, ?, ?, ?, ?)", batch)
+                batch.clear()
+        db.executemany("INSERT INTO messages VALUES (?, ?, ?, ?, ?, ?)", batch)
+        stats = {"messages": messages, "failures": failures, **_stats("sign", hists["sign"]),
+                 **_stats("verify", hists["verify"])}
+        db.execute(f"UPDATE runs SET {', '.join(f'{k} = ?' for k in stats)} WHERE id = ?", (*stats.values(), run_id))
+        db.executemany("INSERT INTO histograms VALUES (?, ?, ?)",
+                       [(run_id, m, zlib.compress(json.dumps(h.to_dict()).encode())) for m, h in hists.items()
+                        if h.count])
+    return run_id
+
+
+def import_paths(db, paths):
+    """Walks files and directories for raw CSVs; returns (imported, unchanged or skipped)."""
+    imported = skipped = 0
+    for top in paths:
+        files = [top] if os.path.isfile(top) else [os.path.join(d, name) for d, _, names in sorted(os.walk(top))
+                                                   for name in sorted(names)]
+        for path in files:
+            if not path.endswith(".csv"):
+                continue
+            try:
+                run_id = import_csv(db, path)
+            except (ValueError, IndexError, UnicodeDecodeError) as e:
+                print(f"Skipped {path}: {e}")
+                skipped += 1
+                continue
+            if run_id is None:
+                skipped += 1
+            else:
+                imported += 1
+    return imported, skipped
+
+
+# --- QUERIES ---
+def load_histogram(blob):
+    return Histogram.from_dict(json.loads(zlib.decompress(blob)))
+
+
+def percentiles_by(db, by, metric="verify", where=None):
+    """[(group values, runs, Histogram)] with every run's histogram of `metric` merged per group."""
+    for col in by:
+        if col not in GROUP_COLUMNS:
+            raise ValueError(f"Cannot group by {col!r} (choose from {', '.join(GROUP_COLUMNS)})")
+    where = {k: v for k, v in (where or {}).items() if v is not None}
+    sql = (f"SELECT {', '.join(f'r.{c}' for c in by)}, h.hist FROM runs r JOIN histograms h ON h.run_id = r.id "
+           f"WHERE h.metric = ?" + "".join(f" AND r.{k} = ?" for k in where))
+    groups = {}
+    for *key, blob in db.execute(sql, (metric, *where.values())):
+        entry = groups.setdefault(tuple(key), [0, Histogram()])
+        entry[0] += 1
+        entry[1].merge(load_histogram(blob))
+    return [(key, runs, hist) for (key, (runs, hist)) in
+            sorted(groups.items(), key=lambda kv: tuple((v is None, v) for v in kv[0]))]
+
+
+def _print_table(header, rows):
+    widths = [max(len(str(x)) for x in col) for col in zip(header, *rows)]
+    for row in [header, *rows]:
+        print("  ".join(f"{str(x):>{w}}" for x, w in zip(row, widths)))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Catalog of benchmark runs in SQLite.")
+    parser.add_argument("--db", default=DEFAULT_DB)
+    sub = parser.add_subparsers(dest="command", required=True)
+    sub.add_parser("import", help="import raw per-message CSVs (directories are walked)").add_argument(
+        "paths", nargs="+")
+    runs = sub.add_parser("runs", help="list runs")
+    query = sub.add_parser("query", help="merged percentiles of sign or verify time per group")
+    query.add_argument("--by", nargs="+", default=["stress"], choices=GROUP_COLUMNS)
+    query.add_argument("--metric", choices=METRICS, default="verify")
+    for p in (runs, query):
+        p.add_argument("--device")
+        p.add_argument("--scheme")
+        p.add_argument("--stress", type=int)
+    s = sub.add_parser("sql", help="run a read-only SQL statement")
+    s.add_argument("statement")
+    args = parser.parse_args()
+
+    db = connect(args.db)
+    start = time.perf_counter()
+    if args.command == "import":
+        imported, skipped = import_paths(db, args.paths)
+        print(f"Imported {imported} runs ({skipped} files skipped or unchanged) into {args.db}")
+    elif args.command == "runs":
+        where = {k: v for k, v in (("device", args.device), ("scheme", args.scheme), ("stress", args.stress))
+                 if v is not None}
+        cols = ["id", "device", "scheme", "stress", "chunk_size", "messages", "failures", "sign_p99_us",
+                "verify_p99_us", "source"]
+        rows = db.execute(f"SELECT {', '.join(cols)} FROM runs" + (" WHERE " if where else "")
+                          + " AND ".join(f"{k} = ?" for k in where) + " ORDER BY device, scheme, stress, id",
+                          tuple(where.values())).fetchall()
+        cwd = os.getcwd()
+        _print_table(cols, [(*("" if x is None else x for x in r[:-3]),
+                             *("" if x is None else f"{x:.1f}" for x in r[-3:-1]), os.path.relpath(r[-1], cwd))
+                            for r in rows])
+    elif args.command == "query":
+        groups = percentiles_by(db, args.by, args.metric,
+                                {"device": args.device, "scheme": args.scheme, "stress": args.stress})
+        rows = [(*("" if v is None else v for v in key), runs, hist.count, f"{hist.mean:.1f}",
+                 f"{hist.percentile(0.50):.1f}", f"{hist.percentile(0.99):.1f}", f"{hist.max:.1f}")
+                for key, runs, hist in groups]
+        _print_table([*args.by, "runs", "messages", f"{args.metric}_mean_us", "p50_us", "p99_us", "max_us"], rows)
+    else:
+        db.execute("PRAGMA query_only = ON")
+        cur = db.execute(args.statement)
+        _print_table([d[0] for d in cur.description or []], cur.fetchall())
+    print(f"({(time.perf_counter() - start) * 1000:.1f} ms)")
+
+
+if __name__ == "__main__":
+    main()
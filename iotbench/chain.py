@@ -0,0 +1,283 @@
+"""
+Hash-chained video chunks: loss, reordering and tampering found in O(1) per
+chunk, with full signature checks only at checkpoints.
+
+Producer (Pi5 --chain), in submission order, before signing:
+
+    chain = ChunkChain()
+    data, flags = chain.link(data, flags)      # [CHAIN_LINK][FRAME_META?][video]
+    pool.submit(data, flags)
+
+Broker (device_level_sign.py --chain-checkpoint K):
+
+    chains = chains_from_args(args, scheme, prepare)
+    for item, check in chains.check(frame, item):  # .status, .valid, .verified, .in_order, .missing
+        ...write and record item...
+    ...at exit...
+    for item, check in chains.finish():            # settles the chunks still held
+        ...
+    chains.report()
+
+Every chained chunk carries CHAIN_LINK = (index, prev): its position in
+the chain and the BLAKE2b-128 of the previous chunk's data, CHAIN_LINK
+included. Both sit inside the signed data, so a signature over chunk n
+authenticates chunks 0..n-1 transitively. Per camera key the verifier
+remembers the next index and the last chunk's hash:
+
+  ok          index == next and prev matches: continuity holds, and a
+              later signature vouched for the chunk without checking its own
+  checkpoint  its signature was checked: every K-th chunk, or the first
+              after a break
+  gap         index > next: index - next chunks were lost
+  reorder     index < next: late or duplicated; it is verified but not
+              written into the stream. A late chunk that fills a gap
+              takes itself out of Missing, and once a gap is filled it no
+              longer counts as one, so a swapped pair is one reorder only
+  tamper      the chunk that was altered: its signature fails, or an
+              authentic successor's prev does not match it
+  start       index 0 with a zero prev, or a key not seen before
+  unchained   no FLAG_CHAIN: verified in full as before
+
+check() takes the caller's item with each frame. It returns the (item,
+ChainCheck) pairs that the frame settled, in stream order. A chunk that
+only passed the link check is held back rather than returned, so nothing
+reaches the .h264 before a signature vouches for it. A stream holds at
+most K - 1 chunks, and the next verified chunk settles them:
+
+- A valid checkpoint releases them as ok.
+- On a broken link, the authentic successor's prev must match the newest
+  held chunk's hash. If it does not, that chunk is the altered one.
+- Otherwise, signatures are checked from the newest held chunk backwards
+  until one verifies, and that one vouches for the chunks before it.
+
+Either way, the tamper is reported on the chunk that was altered. The
+hash is unkeyed: it proves order and completeness, and the signatures
+prove origin. With K=1 every chunk is verified as before, and continuity
+is checked on top.
+
+Only a chunk whose signature verifies can move a stream forward, open a
+gap or restart it at index 0. So a flipped index or a forged genesis
+chunk is reported as tamper, and the authentic chunks after it carry on.
+A tampered chunk that sits in its own slot still takes it, so its
+successor is verified rather than reported as a gap.
+"""
+import collections
+import hashlib
+
+from iotbench.codec import CHAIN_LINK, FLAG_CHAIN, CodecError
+
+GENESIS = bytes(16)
+CHECKPOINT_EVERY = 32
+OPEN_GAPS = 64  # per stream; older gaps can no longer be filled by late chunks
+REORDER_WINDOW = 1024  # a longer gap is an outage: its chunks are not expected late
+STATUSES = ("ok", "checkpoint", "start", "gap", "reorder", "tamper", "unchained")
+
+ChainCheck = collections.namedtuple("ChainCheck", "status valid verified in_order missing")
+
+
+def link_hash(data):
+    return hashlib.blake2b(data, digest_size=16).digest()
+
+
+class ChunkChain:
+    """Producer side: prefixes each chunk with its CHAIN_LINK."""
+
+    def __init__(self):
+        self.index = 0
+        self.prev = GENESIS
+
+    def link(self, data, flags=0):
+        data = CHAIN_LINK.pack(self.index, self.prev) + data
+        self.prev = link_hash(data)
+        self.index += 1
+        return data, flags | FLAG_CHAIN
+
+
+class _Stream:
+    """Chain state for one camera key."""
+
+    def __init__(self):
+        self.next = 0
+        self.last = None   # hash of the newest accepted chunk; None when nothing vouches for it
+        self.held = []     # (frame, item, hash) that passed the link check only, oldest first
+        self.gaps = collections.OrderedDict()  # first missing index -> set of indices still missing
+
+    def fill(self, index):
+        """Removes a late index from its open gap; (filled, gap closed)."""
+        for start, missing in self.gaps.items():
+            if index in missing:
+                missing.discard(index)
+                if not missing:
+                    del self.gaps[start]
+                return True, not missing
+            if start > index:
+                break
+        return False, False
+
+
+class StreamChains:
+    """
+    Broker side: per-key chain state for one verifier thread. prepare(key)
+    is scheme.prepare or a trust store's.
+    """
+
+    def __init__(self, scheme, prepare=None, checkpoint_every=CHECKPOINT_EVERY):
+        self.scheme = scheme
+        self.prepare = prepare or scheme.prepare
+        self.checkpoint_every = max(1, checkpoint_every)
+        self.counts = collections.Counter()
+        self.missing = 0        # chunks lost in gaps
+        self.signature_checks = 0
+        self._streams = {}      # key -> _Stream
+
+    @property
+    def held(self):
+        return sum(len(stream.held) for stream in self._streams.values())
+
+    def _verify(self, frame):
+        self.signature_checks += 1
+        return self.scheme.verify_prepared(self.prepare(frame.key), frame.data, frame.tag)
+
+    def _release(self, out, item, status, valid, verified=True, in_order=True, missing=0):
+        self.counts[status] += 1
+        out.append((item, ChainCheck(status, valid, verified, in_order, missing)))
+
+    def _settle(self, stream, out, expected=None):
+        """
+        Releases every held chunk. `expected` is the prev held by an
+        authentic successor. Without it, held chunks are verified from the
+        newest back until one passes; the ones after it were tampered with.
+        """
+        tampered = []
+        while stream.held:
+            frame, item, digest = stream.held[-1]
+            if expected is not None:
+                authentic = digest == expected
+            else:
+                authentic = self._verify(frame)
+            if authentic:
+                break
+            tampered.append(stream.held.pop())
+            expected = None  # an altered chunk's prev vouches for nothing
+        for _, item, _ in stream.held:
+            self._release(out, item, "ok", True, verified=False)
+        for _, item, _ in reversed(tampered):
+            self._release(out, item, "tamper", False)
+        stream.held = []
+
+    def check(self, frame, item=None):
+        """Adds one chunk; returns the (item, ChainCheck) pairs it settled."""
+        out = []
+        if not frame.flags & FLAG_CHAIN:
+            self._release(out, item, "unchained", self._verify(frame))
+            return out
+        if len(frame.data) < CHAIN_LINK.size:
+            raise CodecError("Chained frame is shorter than its chain link.")
+        index, prev = CHAIN_LINK.unpack_from(frame.data)
+        key = bytes(frame.key)
+        stream = self._streams.get(key)
+        if stream is None or (index == 0 and prev == GENESIS):
+            status = "start"
+        elif index == stream.next:
+            status = "ok" if stream.last is not None and prev == stream.last else "break"
+        elif index > stream.next:
+            status = "gap"
+        else:
+            status = "reorder"
+
+        digest = link_hash(frame.data)
+        if status == "ok" and len(stream.held) + 1 < self.checkpoint_every:
+            # Continuity only: held until a signature vouches for it
+            stream.held.append((frame, item, digest))
+            stream.next, stream.last = index + 1, digest
+            return out
+
+        if not self._verify(frame):
+            # A forged or altered chunk never moves or resets the stream. In its
+            # own slot it still takes that slot, and its successor is verified
+            if stream is not None and status in ("ok", "break"):
+                self._settle(stream, out)
+                stream.next, stream.last = index + 1, None
+            self._release(out, item, "tamper", False)
+            return out
+        if status == "reorder":
+            filled, closed = stream.fill(index)
+            self.missing -= filled
+            self.counts["gap"] -= closed  # every chunk it was missing turned up late
+            self._release(out, item, "reorder", True, in_order=False)
+            return out
+        if status == "start":
+            if stream is not None:
+                self._settle(stream, out)
+            stream = self._streams[key] = _Stream()
+        elif status == "ok":
+            self._settle(stream, out, expected=prev)
+            status = "checkpoint"
+        elif status == "break":
+            # An authentic chunk whose prev fails: the newest held chunk was altered.
+            # With nothing held, the producer broke its own chain.
+            status = "checkpoint" if stream.held or stream.last is None else "tamper"
+            self._settle(stream, out, expected=prev)
+        else:
+            self._settle(stream, out)
+        missing = index - stream.next if status == "gap" else 0
+        if missing:
+            self.missing += missing
+            if missing <= REORDER_WINDOW:
+                stream.gaps[stream.next] = set(range(stream.next, index))
+            if len(stream.gaps) > OPEN_GAPS:
+                stream.gaps.popitem(last=False)
+        self._release(out, item, status, True, missing=missing)
+        # Resynchronise on this verified chunk
+        stream.next, stream.last = index + 1, digest
+        return out
+
+    def finish(self):
+        """Settles the chunks each stream still holds; returns them like check()."""
+        out = []
+        for stream in self._streams.values():
+            self._settle(stream, out)
+        return out
+
+    def summary(self):
+        chained = sum(n for status, n in self.counts.items() if status != "unchained")
+        return {
+            "Chunks": sum(self.counts.values()),
+            "Chained": chained,
+            **{status.capitalize(): self.counts[status] for status in STATUSES},
+            "Missing": self.missing,
+            "Signature_Checks": self.signature_checks,
+        }
+
+    def report(self):
+        s = self.summary()
+        print(f"Chain:           {s['Chained']} chained chunks, {s['Signature_Checks']} signature checks "
+              f"(checkpoint every {self.checkpoint_every})")
+        print(f"  Gaps: {s['Gap']} ({s['Missing']} chunks missing) | Reorders: {s['Reorder']} | "
+              f"Tampered: {s['Tamper']} | Restarts: {s['Start']}"
+              + (f" | Unchained: {s['Unchained']}" if s["Unchained"] else ""))
+
+
+def add_chain_args(parser):
+    """--chain for producers."""
+    parser.add_argument("--chain", action="store_true",
+                        help="link every chunk to the previous one's hash (loss/reorder/tamper detection)")
+
+
+def chain_from_args(args):
+    """A ChunkChain with --chain, else None."""
+    return ChunkChain() if args.chain else None
+
+
+def add_chain_check_args(parser):
+    """--chain-checkpoint for verifiers."""
+    parser.add_argument("--chain-checkpoint", type=int, default=0, metavar="K",
+                        help="check chained chunks' continuity and verify the signature on every Kth "
+                             "(1 = every chunk; 0 = off, verify each chunk on its own)")
+
+
+def chains_from_args(args, scheme, prepare=None):
+    """StreamChains for --chain-checkpoint K, or None."""
+    if args.chain_checkpoint <= 0:
+        return None
+    return StreamChains(scheme, prepare, args.chain_checkpoint)
@@ -0,0 +1,55 @@
+"""
+Content identifiers for the IPFS variants of the benchmark.
+
+The devices and brokers use `ipfs add -q --only-hash --cid-version=1
+--raw-leaves`. For any payload that fits in one block (all of ours: 4 KiB
+chunks, 240 B LED frames) that CID is just a multihash of the bytes, so it can
+be computed in-process when kubo is not installed.
+"""
+import base64
+import hashlib
+import os
+import shutil
+import subprocess
+
+# CIDv1, raw codec, sha2-256 multihash of 32 bytes
+CID_PREFIX = bytes([0x01, 0x55, 0x12, 0x20])
+# kubo's default chunker; anything larger becomes a UnixFS DAG, not a raw block
+MAX_RAW_BLOCK = 256 * 1024
+
+
+def cid_v1_raw(data_bytes: bytes) -> str:
+    """CIDv1 (base32, raw leaves) identical to kubo's output for one block."""
+    if len(data_bytes) > MAX_RAW_BLOCK:
+        raise ValueError("Payload spans several blocks; use kubo for a DAG CID.")
+    digest = hashlib.sha256(data_bytes).digest()
+    return "b" + base64.b32encode(CID_PREFIX + digest).decode("ascii").lower().rstrip("=")
+
+
+def find_ipfs_exe(preferred=None):
+    """Returns a usable kubo binary path, or None to fall back to cid_v1_raw."""
+    for candidate in (preferred, shutil.which("ipfs")):
+        if candidate and os.path.exists(candidate):
+            return candidate
+    return None
+
+
+def ipfs_only_hash(data_bytes: bytes, ipfs_exe=None) -> str:
+    """
+    Returns CID (v1) for data_bytes without storing it.
+    Uses the kubo CLI when ipfs_exe is given, otherwise hashes in-process.
+    """
+    if not ipfs_exe:
+        return cid_v1_raw(data_bytes)
+    try:
+        result = subprocess.run(
+            [ipfs_exe, "add", "-q", "--only-hash", "--cid-version=1", "--raw-leaves", "-"],
+            input=data_bytes,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.PIPE,
+            check=True
+        )
+        return result.stdout.decode("utf-8").strip()
+    except subprocess.CalledProcessError as e:
+        print(f"[IPFS ERROR] {e.stderr.decode('utf-8', errors='ignore').strip()}")
+        return ""
@@ -0,0 +1,157 @@
+"""
+One payload codec for every producer and broker verifier.
+
+Framed format (version 1), all little-endian:
+
+    offset size
+    0      1    MAGIC 0xA7
+    1      1    version
+    2      1    scheme id (see SCHEME_IDS)
+    3      1    flags (FLAG_*)
+    4      4    sign time in microseconds
+    8      4    data length
+    12     2    tag length
+    14     2    key length
+    16     ...  [Data][Tag][Key]
+
+A payload that starts with MAGIC and VERSION is a frame (is_framed()).
+Its lengths must add up to the payload size exactly, or decode() rejects
+it as truncated or padded; it never falls back to the legacy layouts.
+decode() returns memoryview slices of the original buffer; nothing is copied.
+
+With FLAG_FRAME_META the data starts with FRAME_META (timestamp in
+microseconds, sequence number), so both are covered by the tag: the
+camera's encoder timestamp and frame number, or a per-message counter from
+producers run with --sequence (used by iotbench.replay); anything after it is
+compressed separately. FLAG_KEYFRAME marks H.264 IDR frames.
+split_frame_meta() separates them. FLAG_RECORD_BATCH marks
+iotbench.therm_batch binary readings instead of one ASCII reading.
+FLAG_CHAIN puts CHAIN_LINK (chain index, BLAKE2b-128 of the previous
+chunk's data) in front of everything else in the data, so each signed
+chunk commits to its predecessor (iotbench.chain); split_frame_meta()
+skips it. The low three bits are the compression codec and FLAG_DICT
+marks its per-topic dictionary (iotbench.compression). Every flag owns its
+own bits; this is asserted at import.
+
+The ESP32 firmware (unless BATCH_K is set) and all recorded runs use the
+older footer-only layouts ([Data][Tag][Key][Time(4)] and
+[Data][CID][CID_LEN(2)][Time(4)]); those are still decoded through
+decode_legacy().
+"""
+import struct
+from collections import namedtuple
+
+MAGIC = 0xA7
+VERSION = 1
+HEADER = struct.Struct('<BBBBIIHH')
+HEADER_SIZE = HEADER.size
+TIME = struct.Struct('<I')
+CID_TRAILER = struct.Struct('<HI')
+FRAME_META = struct.Struct('<QI')
+CHAIN_LINK = struct.Struct('<I16s')
+
+CODEC_MASK = 0x07
+FLAG_CHAIN = 0x08
+FLAG_KEYFRAME = 0x10
+FLAG_FRAME_META = 0x20
+FLAG_DICT = 0x40
+FLAG_RECORD_BATCH = 0x80
+
+_bits = 0
+for _flag in (CODEC_MASK, FLAG_CHAIN, FLAG_KEYFRAME, FLAG_FRAME_META, FLAG_DICT, FLAG_RECORD_BATCH):
+    assert not _bits & _flag, f"flag 0x{_flag:02x} overlaps another flag"
+    _bits |= _flag
+del _bits, _flag
+
+SCHEME_IDS = {
+    "ed25519": 1,
+    "ed25519ph": 2,
+    "hmac-sha256": 3,
+    "blake2b": 4,
+    "cid": 5,
+}
+SCHEME_NAMES = {v: k for k, v in SCHEME_IDS.items()}
+
+Frame = namedtuple("Frame", ["scheme_id", "flags", "sign_time_us", "data", "tag", "key", "version"])
+
+
+class CodecError(ValueError):
+    """Payload is not a well-formed frame (bad magic, version or lengths)."""
+
+
+def encode(scheme_id, data, tag, key=b"", sign_time_us=0, flags=0):
+    header = HEADER.pack(MAGIC, VERSION, scheme_id, flags, sign_time_us, len(data), len(tag), len(key))
+    return b"".join((header, data, tag, key))
+
+
+def is_framed(payload):
+    """Magic and version; decode() checks the lengths. Legacy footers have no magic."""
+    return len(payload) >= HEADER_SIZE and payload[0] == MAGIC and payload[1] == VERSION
+
+
+def decode(payload):
+    """Parses a framed payload into a Frame of memoryview slices."""
+    if len(payload) < HEADER_SIZE:
+        raise CodecError(f"Payload too short for header ({len(payload)} < {HEADER_SIZE} bytes).")
+    magic, version, scheme_id, flags, sign_time_us, data_len, tag_len, key_len = HEADER.unpack_from(payload)
+    if magic != MAGIC:
+        raise CodecError(f"Bad magic byte 0x{magic:02x}.")
+    if version != VERSION:
+        raise CodecError(f"Unsupported frame version {version}.")
+    expected = HEADER_SIZE + data_len + tag_len + key_len
+    if expected != len(payload):
+        raise CodecError(f"Length mismatch: header says {expected} bytes, got {len(payload)}.")
+
+    mv = memoryview(payload)
+    tag_start = HEADER_SIZE + data_len
+    key_start = tag_start + tag_len
+    return Frame(scheme_id, flags, sign_time_us, mv[HEADER_SIZE:tag_start], mv[tag_start:key_start],
+                 mv[key_start:], version)
+
+
+def split_frame_meta(frame):
+    """(timestamp_us, seq, video_bytes) for a frame; (None, None, data) without FLAG_FRAME_META."""
+    data = frame.data
+    if frame.flags & FLAG_CHAIN:
+        if len(data) < CHAIN_LINK.size:
+            raise CodecError("Chained frame is shorter than its chain link.")
+        data = data[CHAIN_LINK.size:]
+    if not frame.flags & FLAG_FRAME_META:
+        return None, None, data
+    if len(data) < FRAME_META.size:
+        raise CodecError("Frame flagged with metadata is shorter than the metadata.")
+    timestamp_us, seq = FRAME_META.unpack_from(data)
+    return timestamp_us, seq, data[FRAME_META.size:]
+
+
+def decode_legacy(payload, scheme_id, tag_size, key_size):
+    """[Data][Tag(tag_size)][Key(key_size)][Time(4)], as sent by esp_sign.ino."""
+    footer = tag_size + key_size + TIME.size
+    if len(payload) < footer:
+        raise CodecError(f"Payload too short for legacy footer ({len(payload)} < {footer} bytes).")
+    mv = memoryview(payload)
+    end = len(payload) - TIME.size
+    key_start = end - key_size
+    tag_start = key_start - tag_size
+    sign_time_us = TIME.unpack_from(payload, end)[0]
+    return Frame(scheme_id, 0, sign_time_us, mv[:tag_start], mv[tag_start:key_start], mv[key_start:end], 0)
+
+
+def decode_legacy_cid(payload, scheme_id=SCHEME_IDS["cid"]):
+    """[Data][CID][CID_LEN(2)][Time(4)], the original IPFS layout."""
+    if len(payload) < CID_TRAILER.size:
+        raise CodecError("Payload too short to contain CID_LEN + Time.")
+    cid_len, sign_time_us = CID_TRAILER.unpack_from(payload, len(payload) - CID_TRAILER.size)
+    if cid_len <= 0:
+        raise CodecError("CID length invalid.")
+    cid_start = len(payload) - CID_TRAILER.size - cid_len
+    if cid_start < 0:
+        raise CodecError("CID length exceeds payload size.")
+    mv = memoryview(payload)
+    return Frame(scheme_id, 0, sign_time_us, mv[:cid_start], mv[cid_start:cid_start + cid_len], mv[0:0], 0)
+
+
+def encode_legacy(data, tag, key=b"", sign_time_us=0, cid=False):
+    if cid:
+        return b"".join((data, tag, CID_TRAILER.pack(len(tag), sign_time_us)))
+    return b"".join((data, tag, key, TIME.pack(sign_time_us)))
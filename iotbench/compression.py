@@ -0,0 +1,216 @@
+"""
+Optional compression stage ahead of signing.
+
+    compressor = Compressor("zstd", dictionary=load_dictionary("therm.dict"))
+    data = compressor.compress(msg_bytes)
+    payload = scheme.encode(data, scheme.tag(data), flags=compressor.flags)
+
+    # broker, after verify():
+    msg_bytes = decompressor.decompress(frame.flags, frame.data)
+
+The tag covers the compressed bytes, so the broker verifies before it spends
+anything on decompression. The codec id sits in the low bits of the codec
+header's flags byte (CODEC_MASK); FLAG_DICT says the per-topic dictionary
+was used, which the broker must be given too (--compress-dict).
+
+    none  0  pass-through
+    zlib  1  raw deflate (no zlib header: therm readings are ~25 bytes)
+    zstd  2  needs `zstandard`
+    lz4   3  needs `lz4`, block format with the size prefix
+
+    python -m iotbench.compression train --topic light --out light.dict
+"""
+import argparse
+import zlib
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+try:
+    import lz4.block
+except ImportError:
+    lz4 = None
+
+from iotbench import codec
+
+CODEC_IDS = {"none": 0, "zlib": 1, "zstd": 2, "lz4": 3}
+CODEC_NAMES = {v: k for k, v in CODEC_IDS.items()}
+CODEC_MASK = codec.CODEC_MASK
+FLAG_DICT = codec.FLAG_DICT
+
+DEFAULT_LEVELS = {"zlib": 6, "zstd": 3, "lz4": 0}
+MAX_DECOMPRESSED = 16 * 1024 * 1024
+
+
+def is_compressed(flags):
+    return bool(flags & CODEC_MASK)
+
+
+def available():
+    names = ["none", "zlib"]
+    if zstandard:
+        names.append("zstd")
+    if lz4:
+        names.append("lz4")
+    return names
+
+
+class Compressor:
+    """One codec (and optional dictionary) for the life of a producer."""
+
+    def __init__(self, name="zlib", level=None, dictionary=None):
+        if name not in CODEC_IDS:
+            raise ValueError(f"Unknown codec '{name}' (choose from {', '.join(CODEC_IDS)})")
+        if name not in available():
+            raise ValueError(f"Codec '{name}' needs the {'zstandard' if name == 'zstd' else name} package")
+        self.name = name
+        self.level = DEFAULT_LEVELS.get(name, 0) if level is None else level
+        self.dictionary = dictionary if name != "none" else None
+        self.flags = CODEC_IDS[name] | (FLAG_DICT if self.dictionary else 0)
+        if name == "zstd":
+            dict_data = zstandard.ZstdCompressionDict(dictionary) if dictionary else None
+            self._zstd = zstandard.ZstdCompressor(level=self.level, dict_data=dict_data, write_checksum=False,
+                                                  write_content_size=True, write_dict_id=False)
+
+    def compress(self, data):
+        if self.name == "none":
+            return data
+        if self.name == "zlib":
+            if self.dictionary:
+                c = zlib.compressobj(self.level, zlib.DEFLATED, -15, zdict=self.dictionary)
+            else:
+                c = zlib.compressobj(self.level, zlib.DEFLATED, -15)
+            return c.compress(data) + c.flush()
+        if self.name == "zstd":
+            return self._zstd.compress(data)
+        if self.dictionary:
+            return lz4.block.compress(data, compression=self.level, dict=self.dictionary)
+        return lz4.block.compress(data, compression=self.level)
+
+
+class Decompressor:
+    """Broker side: undoes whatever the flags say, with the shared dictionary."""
+
+    def __init__(self, dictionary=None, max_size=MAX_DECOMPRESSED):
+        self.dictionary = dictionary
+        self.max_size = max_size
+        self._zstd = {}
+
+    def decompress(self, flags, data):
+        codec_id = flags & CODEC_MASK
+        if not codec_id:
+            return data
+        dictionary = None
+        if flags & FLAG_DICT:
+            if not self.dictionary:
+                raise codec.CodecError("Payload was compressed with a dictionary; pass --compress-dict.")
+            dictionary = self.dictionary
+        name = CODEC_NAMES.get(codec_id)
+        if name not in available():
+            raise codec.CodecError(f"Unsupported compression codec id {codec_id}.")
+        try:
+            return self._decompress(name, data, dictionary)
+        except Exception as e:
+            raise codec.CodecError(f"{name} decompression failed: {e}") from e
+
+    def decompress_verified(self, flags, data, valid):
+        """Only verified payloads are decompressed; anything else comes back as sent."""
+        return self.decompress(flags, data) if valid else data
+
+    def _decompress(self, name, data, dictionary):
+        if name == "zlib":
+            d = zlib.decompressobj(-15, zdict=dictionary) if dictionary else zlib.decompressobj(-15)
+            out = d.decompress(data, self.max_size)
+            if d.unconsumed_tail:
+                raise ValueError(f"output exceeds {self.max_size} bytes")
+            return out
+        if name == "zstd":
+            return self._zstd_decompressor(dictionary).decompress(data, max_output_size=self.max_size)
+        if dictionary:
+            return lz4.block.decompress(data, dict=dictionary)
+        return lz4.block.decompress(data)
+
+    def _zstd_decompressor(self, dictionary):
+        d = self._zstd.get(bool(dictionary))
+        if d is None:
+            dict_data = zstandard.ZstdCompressionDict(dictionary) if dictionary else None
+            d = self._zstd[bool(dictionary)] = zstandard.ZstdDecompressor(dict_data=dict_data)
+        return d
+
+
+# --- DICTIONARIES ---
+def train_dictionary(samples, size=4096):
+    """
+    zstd's trainer when available; otherwise the most recent samples packed
+    into `size` bytes, which is what a deflate preset dictionary wants.
+    """
+    if zstandard:
+        try:
+            return zstandard.train_dictionary(size, samples).as_bytes()
+        except zstandard.ZstdError:
+            pass  # too few / too uniform samples; fall through
+    out = bytearray()
+    for sample in reversed(samples):
+        if len(out) + len(sample) > size:
+            break
+        out[:0] = sample
+    return bytes(out)
+
+
+def load_dictionary(path):
+    if not path:
+        return None
+    with open(path, "rb") as f:
+        return f.read()
+
+
+def add_compression_args(parser):
+    """Producer options."""
+    parser.add_argument("--compress", choices=list(CODEC_IDS), default="none", help="compress before signing")
+    parser.add_argument("--compress-level", type=int, default=None)
+    parser.add_argument("--compress-dict", default=None, help="per-topic dictionary (see `compression train`)")
+
+
+def compressor_from_args(args):
+    return Compressor(args.compress, args.compress_level, load_dictionary(args.compress_dict))
+
+
+def add_decompression_args(parser):
+    """Broker options."""
+    parser.add_argument("--compress-dict", default=None, help="dictionary the producer compressed with")
+
+
+def decompressor_from_args(args):
+    return Decompressor(load_dictionary(args.compress_dict))
+
+
+def main():
+    from iotbench.producers import source_for
+
+    parser = argparse.ArgumentParser(description="Train a per-topic compression dictionary.")
+    sub = parser.add_subparsers(dest="cmd", required=True)
+    train = sub.add_parser("train", help="train from the synthetic source (or ESP32 CSV messages)")
+    train.add_argument("--topic", choices=["therm", "light"], required=True)
+    train.add_argument("--out", required=True)
+    train.add_argument("--samples", type=int, default=2000)
+    train.add_argument("--size", type=int, default=4096, help="dictionary bytes")
+    train.add_argument("--csv", default=None, help="benchmark_results.csv to take therm messages from")
+    args = parser.parse_args()
+
+    if args.csv:
+        import csv
+        with open(args.csv, newline="") as f:
+            samples = [row["Message"].encode("ascii") for row in csv.DictReader(f)][:args.samples]
+    else:
+        source = source_for("esp32" if args.topic == "therm" else "pi3", seed=1)
+        samples = [next(source) for _ in range(args.samples)]
+    dictionary = train_dictionary(samples, args.size)
+    with open(args.out, "wb") as f:
+        f.write(dictionary)
+    print(f"Wrote {len(dictionary)}-byte {args.topic} dictionary from {len(samples)} samples to {args.out}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,110 @@
+"""
+Log-bucketed latency histogram (HDR-style, ~9% relative precision).
+
+Values are recorded in microseconds. Buckets split every power of two into
+SUB equal parts, stored sparsely in a dict so histograms stay small, merge
+by adding counts, and round-trip through JSON (to_dict/from_dict).
+"""
+import math
+
+SUB = 8            # sub-buckets per power of two
+ZERO_KEY = -10000  # bucket for values <= 0
+
+
+def bucket_key(value):
+    if value <= 0:
+        return ZERO_KEY
+    m, e = math.frexp(value)  # value = m * 2**e, 0.5 <= m < 1
+    return e * SUB + int((m * 2 - 1) * SUB)
+
+
+def bucket_bounds(key):
+    """(low, high) in the recorded unit for a bucket key."""
+    if key == ZERO_KEY:
+        return 0.0, 0.0
+    e, sub = divmod(key, SUB)
+    base = math.ldexp(1.0, e - 1)
+    return base * (1 + sub / SUB), base * (1 + (sub + 1) / SUB)
+
+
+class Histogram:
+    __slots__ = ("counts", "count", "total", "min", "max")
+
+    def __init__(self):
+        self.counts = {}
+        self.count = 0
+        self.total = 0.0
+        self.min = math.inf
+        self.max = 0.0
+
+    def record(self, value):
+        key = bucket_key(value)
+        counts = self.counts
+        counts[key] = counts.get(key, 0) + 1
+        self.count += 1
+        self.total += value
+        if value < self.min:
+            self.min = value
+        if value > self.max:
+            self.max = value
+
+    def merge(self, other):
+        for key, n in other.counts.items():
+            self.counts[key] = self.counts.get(key, 0) + n
+        self.count += other.count
+        self.total += other.total
+        self.min = min(self.min, other.min)
+        self.max = max(self.max, other.max)
+        return self
+
+    def copy(self):
+        """Consistent snapshot, safe to take from another thread while record() runs."""
+        h = Histogram()
+        h.counts = dict(self.counts)  # single C-level copy under the GIL
+        h.count = sum(h.counts.values())
+        h.total, h.min, h.max = self.total, self.min, self.max
+        return h
+
+    @property
+    def mean(self):
+        return self.total / self.count if self.count else 0.0
+
+    def percentile(self, q):
+        """Upper bound of the bucket holding the q-quantile (0 <= q <= 1), clamped to max."""
+        if not self.count:
+            return 0.0
+        target = max(1, math.ceil(q * self.count))
+        seen = 0
+        for key in sorted(self.counts):
+            seen += self.counts[key]
+            if seen >= target:
+                return min(bucket_bounds(key)[1], self.max)
+        return self.max
+
+    def buckets(self):
+        """[(low, high, count), ...] in ascending order."""
+        return [(*bucket_bounds(k), self.counts[k]) for k in sorted(self.counts)]
+
+    def summary(self):
+        return {
+            "Count": self.count,
+            "Mean_uS": f"{self.mean:.2f}",
+            "P50_uS": f"{self.percentile(0.50):.2f}",
+            "P90_uS": f"{self.percentile(0.90):.2f}",
+            "P99_uS": f"{self.percentile(0.99):.2f}",
+            "Max_uS": f"{self.max:.2f}",
+        }
+
+    def to_dict(self):
+        return {"counts": {str(k): n for k, n in self.counts.items()}, "count": self.count,
+                "total": self.total, "min": self.min if self.count else 0.0, "max": self.max}
+
+    @classmethod
+    def from_dict(cls, d):
+        h = cls()
+        h.counts = {int(k): n for k, n in d["counts"].items()}
+        h.count = d["count"]
+        h.total = d["total"]
+        h.min = d["min"] if h.count else math.inf
+        h.max = d["max"]
+        return h
@@ -0,0 +1,302 @@
+"""
+Persistent device keys and the broker's trust store.
+
+    python -m iotbench.identity provision pi3 pi5          # keys/pi3.key, keys/pi5.key + keys/trust.json
+    python -m iotbench.identity enroll esp32 <pubkey hex>  # a key generated on the device (esp_sign.ino)
+    python -m iotbench.identity list | revoke pi3
+
+    python Pi3/timing.py --device-key keys/pi3.key --sequence
+    python Broker/Pi3/device_level_signing/pi3sign.py --trust-store keys/trust.json
+
+Without these options every producer signs with a fresh key per run and
+the verifiers trust whatever public key a payload carries. With
+--device-key a producer signs with a provisioned Ed25519 seed instead (hex,
+mode 0600; copy it to the device). With --trust-store a verifier decodes
+every enrolled public key into a VerifyKey once at startup. Each message
+then costs one dict lookup instead of a VerifyKey construction. A key that
+is not enrolled raises UntrustedKey before any crypto, and the message is
+counted as untrusted.
+
+trust.json maps device name -> {key_type, public_key, enrolled}; only public
+keys are in it. The ESP32 keeps its key in NVS and prints the public key at
+boot, so `enroll` pins it without the private key ever leaving the board.
+
+A persistent key outlives a run, but iotbench.replay keeps one sequence
+window per key. So FRAME_META counters must not restart at 0. A
+SequenceLease stores the next counter beside the key (<key>.seq). It
+reserves SEQ_BLOCK numbers ahead at a time, and a crash skips at most one
+block instead of reusing numbers.
+"""
+import argparse
+import atexit
+import datetime
+import json
+import os
+import time
+
+from nacl.signing import SigningKey
+
+from iotbench.codec import CodecError
+
+KEYS_DIR = "keys"
+TRUST_STORE = os.path.join(KEYS_DIR, "trust.json")
+KEY_TYPE = "ed25519"  # ed25519 and ed25519ph share the key
+SEQ_BLOCK = 4096
+SEQ_MAX = (1 << 32) - 1  # FRAME_META's counter is a uint32
+
+
+class UntrustedKey(CodecError):
+    """The payload's public key is not in the trust store."""
+
+
+def _write_private(path, text):
+    """Writes a file only its owner can read, replacing it atomically."""
+    tmp = path + ".tmp"
+    fd = os.open(tmp, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+    with os.fdopen(fd, "w") as f:
+        f.write(text)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp, path)
+
+
+# --- KEYS ---
+def key_path(device, keys_dir=KEYS_DIR):
+    return os.path.join(keys_dir, f"{device}.key")
+
+
+def seq_path(key_file):
+    """Where a key's SequenceLease lives."""
+    return os.path.splitext(key_file)[0] + ".seq"
+
+
+def load_signing_key(path):
+    with open(path) as f:
+        seed = bytes.fromhex(f.read().strip())
+    if len(seed) != 32:
+        raise ValueError(f"{path} does not hold a 32-byte Ed25519 seed")
+    return SigningKey(seed)
+
+
+def provision(device, keys_dir=KEYS_DIR, trust_path=TRUST_STORE, force=False):
+    """Generates and saves `device`'s signing key and enrolls its public key. Returns the public key."""
+    path = key_path(device, keys_dir)
+    if os.path.exists(path) and not force:
+        raise FileExistsError(f"{path} exists; pass --force to replace the key")
+    os.makedirs(keys_dir, exist_ok=True)
+    signing_key = SigningKey.generate()
+    _write_private(path, bytes(signing_key).hex() + "\n")
+    if force and os.path.exists(seq_path(path)):
+        os.remove(seq_path(path))  # a new key starts a new replay window
+    public_key = signing_key.verify_key.encode()
+    store = TrustStore.load(trust_path)
+    store.enroll(device, public_key)
+    store.save(trust_path)
+    return public_key
+
+
+class SequenceLease:
+    """
+    FRAME_META counters that keep increasing across runs of one key. With
+    path=None it is a plain in-memory counter from 0.
+    """
+
+    def __init__(self, path=None, block=SEQ_BLOCK):
+        self.path = path
+        self.block = block
+        self.next = 0
+        if path and os.path.exists(path):
+            with open(path) as f:
+                self.next = int(f.read().strip() or 0)
+        self.start = self.next
+        self.limit = self.next if path else SEQ_MAX + 1
+
+    def take(self):
+        seq = self.next
+        if seq >= self.limit:
+            self._reserve(seq)
+        self.next = seq + 1
+        return seq
+
+    def _reserve(self, seq):
+        if seq > SEQ_MAX:
+            raise OverflowError(f"Sequence numbers for {self.path} are used up; provision a new key")
+        self.limit = min(seq + self.block, SEQ_MAX + 1)
+        _write_private(self.path, f"{self.limit}\n")
+
+    def close(self):
+        """Hands back the unused part of the reservation."""
+        if self.path and self.next < self.limit:
+            self.limit = self.next
+            _write_private(self.path, f"{self.next}\n")
+
+
+# --- TRUST STORE ---
+class TrustStore:
+    """Device name -> enrolled public key, kept in one JSON file."""
+
+    def __init__(self, devices=None):
+        self.devices = devices or {}
+
+    @classmethod
+    def load(cls, path):
+        if not os.path.exists(path):
+            return cls()
+        with open(path) as f:
+            return cls(json.load(f)["devices"])
+
+    def save(self, path):
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        tmp = path + ".tmp"
+        with open(tmp, "w") as f:
+            json.dump({"version": 1, "devices": self.devices}, f, indent=2, sort_keys=True)
+        os.replace(tmp, path)
+
+    def enroll(self, device, public_key, key_type=KEY_TYPE):
+        if len(public_key) != 32:
+            raise ValueError("An Ed25519 public key is 32 bytes")
+        for other, entry in self.devices.items():
+            if other != device and entry["public_key"] == public_key.hex():
+                raise ValueError(f"That key is already enrolled as {other}")
+        self.devices[device] = {"key_type": key_type, "public_key": public_key.hex(),
+                                "enrolled": datetime.datetime.now().isoformat(timespec="seconds")}
+
+    def revoke(self, device):
+        del self.devices[device]
+
+
+class TrustedKeys:
+    """
+    The trust store decoded for one verifier: prepare(key) returns the
+    VerifyKey built at startup, or raises UntrustedKey without touching
+    any crypto.
+    """
+
+    def __init__(self, store, scheme):
+        self.scheme = scheme
+        self.prepared = {}
+        self.device_of = {}
+        for device, entry in store.devices.items():
+            if entry["key_type"] != KEY_TYPE:
+                continue
+            public_key = bytes.fromhex(entry["public_key"])
+            self.prepared[public_key] = scheme.prepare(public_key)
+            self.device_of[public_key] = device
+        self.rejected = 0
+
+    def __len__(self):
+        return len(self.prepared)
+
+    def prepare(self, key):
+        prepared = self.prepared.get(bytes(key))
+        if prepared is None:
+            self.rejected += 1
+            raise UntrustedKey(f"Key {bytes(key[:8]).hex()}... is not in the trust store.")
+        return prepared
+
+    def report(self):
+        print(f"Untrusted keys:  {self.rejected} messages rejected ({len(self)} keys trusted)")
+
+
+# --- ARGS ---
+def add_identity_args(parser):
+    """--device-key for producers."""
+    parser.add_argument("--device-key", default=None,
+                        help="sign with this provisioned key (python -m iotbench.identity provision) "
+                             "instead of a fresh one per run")
+
+
+def signing_key_from_args(args):
+    """The provisioned SigningKey, or None for a fresh key per run."""
+    if not args.device_key:
+        return None
+    if not args.scheme.startswith("ed25519"):
+        raise SystemExit(f"--device-key holds an Ed25519 key; --scheme {args.scheme} has no use for it")
+    signing_key = load_signing_key(args.device_key)
+    print(f"Signing with {args.device_key} (public key {signing_key.verify_key.encode().hex()[:16]}...)")
+    return signing_key
+
+
+def sequence_from_args(args, enabled=None):
+    """
+    SequenceLease for FRAME_META counters, persisted beside --device-key
+    (in memory without one), or None when counters are off (default:
+    args.sequence). Closed at exit.
+    """
+    if not (args.sequence if enabled is None else enabled):
+        return None
+    lease = SequenceLease(seq_path(args.device_key) if args.device_key else None)
+    if lease.start:
+        print(f"Frame counters continue from {lease.start}")
+    atexit.register(lease.close)
+    return lease
+
+
+def add_trust_args(parser):
+    """--trust-store for verifiers."""
+    parser.add_argument("--trust-store", default=None,
+                        help="accept only keys enrolled here (e.g. keys/trust.json), pre-decoded at startup")
+
+
+def trust_from_args(args, scheme):
+    """TrustedKeys for --trust-store, or None to trust the key in each payload."""
+    if not args.trust_store:
+        return None
+    if not scheme.key_size:
+        raise SystemExit(f"--trust-store pins public keys; {scheme.name} payloads carry none")
+    if not os.path.exists(args.trust_store):
+        raise SystemExit(f"No trust store at {args.trust_store} (python -m iotbench.identity provision ...)")
+    start = time.perf_counter()
+    trusted = TrustedKeys(TrustStore.load(args.trust_store), scheme)
+    print(f"Trusting {len(trusted)} device keys from {args.trust_store} "
+          f"(loaded in {(time.perf_counter() - start) * 1000:.2f} ms)")
+    return trusted
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Provision device keys and manage the broker trust store.")
+    parser.add_argument("--keys-dir", default=KEYS_DIR)
+    parser.add_argument("--trust-store", default=None, help="default: <keys-dir>/trust.json")
+    sub = parser.add_subparsers(dest="command", required=True)
+    p = sub.add_parser("provision", help="generate, save and enroll a key per device")
+    p.add_argument("devices", nargs="+")
+    p.add_argument("--force", action="store_true", help="replace existing keys")
+    e = sub.add_parser("enroll", help="enroll a public key generated on the device")
+    e.add_argument("device")
+    e.add_argument("public_key", help="hex, as printed by the device at boot")
+    r = sub.add_parser("revoke", help="remove a device from the trust store")
+    r.add_argument("device")
+    sub.add_parser("list", help="enrolled devices")
+    args = parser.parse_args()
+
+    trust_path = args.trust_store or os.path.join(args.keys_dir, "trust.json")
+    if args.command == "provision":
+        for device in args.devices:
+            try:
+                public_key = provision(device, args.keys_dir, trust_path, args.force)
+            except FileExistsError as e:
+                raise SystemExit(str(e))
+            print(f"{device:<8} {public_key.hex()}  -> {key_path(device, args.keys_dir)}")
+        print(f"Trust store: {trust_path}")
+        return
+    store = TrustStore.load(trust_path)
+    if args.command == "enroll":
+        try:
+            store.enroll(args.device, bytes.fromhex(args.public_key))
+        except ValueError as e:
+            raise SystemExit(str(e))
+        store.save(trust_path)
+        print(f"Enrolled {args.device} in {trust_path}")
+    elif args.command == "revoke":
+        if args.device not in store.devices:
+            raise SystemExit(f"{args.device} is not enrolled in {trust_path}")
+        store.revoke(args.device)
+        store.save(trust_path)
+        print(f"Revoked {args.device}; restart the verifiers to drop its key")
+    else:
+        for device, entry in sorted(store.devices.items()):
+            print(f"{device:<8} {entry['key_type']:<8} {entry['public_key']}  {entry['enrolled']}")
+
+
+if __name__ == "__main__":
+    main()
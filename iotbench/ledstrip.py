@@ -0,0 +1,64 @@
+"""
+Stand-in for rpi_ws281x, so the Pi3 LED animations run on any Linux box.
+
+    try:
+        from rpi_ws281x import Adafruit_NeoPixel, Color
+    except ImportError:
+        from iotbench.ledstrip import Adafruit_NeoPixel, Color
+
+MockStrip keeps the pixels in a list. show() sleeps for as long as a WS2812
+strip takes to latch a frame (30 us per pixel at 800 kHz plus the 50 us
+reset), so frame timing on the mock is close to the real strip's.
+"""
+import time
+
+US_PER_PIXEL = 30
+RESET_US = 50
+
+
+def Color(red, green, blue, white=0):
+    """Same packing as rpi_ws281x.Color."""
+    return (white << 24) | (red << 16) | (green << 8) | blue
+
+
+class MockStrip:
+    """The parts of rpi_ws281x.Adafruit_NeoPixel the animations use."""
+
+    def __init__(self, num, pin=18, freq_hz=800000, dma=10, invert=False, brightness=255, channel=0,
+                 strip_type=None):
+        self.pixels = [0] * num
+        self.brightness = brightness
+        self.show_s = (num * US_PER_PIXEL * 800000 / freq_hz + RESET_US) / 1e6
+        self.shows = 0
+
+    def begin(self):
+        pass
+
+    def show(self):
+        time.sleep(self.show_s)
+        self.shows += 1
+
+    def numPixels(self):
+        return len(self.pixels)
+
+    def setPixelColor(self, n, color):
+        if 0 <= n < len(self.pixels):
+            self.pixels[n] = color
+
+    def setPixelColorRGB(self, n, red, green, blue, white=0):
+        self.setPixelColor(n, Color(red, green, blue, white))
+
+    def getPixelColor(self, n):
+        return self.pixels[n]
+
+    def getPixels(self):
+        return list(self.pixels)
+
+    def setBrightness(self, brightness):
+        self.brightness = brightness
+
+    def getBrightness(self):
+        return self.brightness
+
+
+Adafruit_NeoPixel = MockStrip
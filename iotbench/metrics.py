@@ -0,0 +1,271 @@
+"""
+Live metrics for the broker verifiers: an OpenMetrics (Prometheus) endpoint
+on localhost and an optional JSON-lines snapshot file.
+
+    registry, metrics, exporter = metrics_from_args(args, topic="therm", device="esp32")
+    ...in on_message...
+    metrics.observe(len(payload), verify_time_us, sign_time_us, is_valid)
+    ...at exit...
+    if exporter:
+        exporter.stop()
+
+    curl http://127.0.0.1:9108/metrics
+
+The hot path only bumps plain integers and a Histogram owned by the MQTT
+thread; nothing takes a lock. Scrapes and snapshots read copies, so a
+value can be one message stale but a scrape never blocks on_message.
+"""
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from iotbench.histogram import Histogram
+
+CONTENT_TYPE = "application/openmetrics-text; version=1.0.0; charset=utf-8"
+
+# Histogram "le" bounds in microseconds. Powers of two and 1.5x powers of two
+# are exact bucket edges in iotbench.histogram, so the cumulative counts are exact.
+LE_BOUNDS = sorted({float(m << k) for k in range(1, 21) for m in (2, 3)})
+
+
+class TopicMetrics:
+    """Counters for one topic/device pair. Written by one thread only."""
+
+    def __init__(self, topic, device):
+        self.topic = topic
+        self.device = device
+        self.messages = 0
+        self.failures = 0
+        self.malformed = 0
+        self.unverified = 0  # passed without verifying (overload sampling)
+        self.replays = 0     # verified, but already seen (iotbench.replay)
+        self.untrusted = 0   # signer key not in the trust store (iotbench.identity)
+        self.bytes_received = 0
+        self.bytes_written = 0
+        self.verify_us = Histogram()
+        self.sign_us = Histogram()
+        self.rate = 0.0  # messages/sec over the last tick, set by the exporter
+        self._last = (time.monotonic(), 0)
+
+    def observe(self, nbytes, verify_us, sign_us, valid, written=0):
+        self.messages += 1
+        self.bytes_received += nbytes
+        self.bytes_written += written
+        self.verify_us.record(verify_us)
+        self.sign_us.record(sign_us)
+        if not valid:
+            self.failures += 1
+
+    def observe_unverified(self, nbytes, written=0):
+        self.unverified += 1
+        self.bytes_received += nbytes
+        self.bytes_written += written
+
+    def observe_replay(self, nbytes):
+        self.replays += 1
+        self.bytes_received += nbytes
+
+    def observe_untrusted(self, nbytes):
+        self.untrusted += 1
+        self.bytes_received += nbytes
+
+    def observe_malformed(self, nbytes):
+        self.malformed += 1
+        self.bytes_received += nbytes
+
+    def tick(self):
+        now, n = time.monotonic(), self.messages
+        last_t, last_n = self._last
+        if now > last_t:
+            self.rate = (n - last_n) / (now - last_t)
+        self._last = (now, n)
+
+    def snapshot(self):
+        return {
+            "topic": self.topic,
+            "device": self.device,
+            "messages": self.messages,
+            "failures": self.failures,
+            "malformed": self.malformed,
+            "unverified": self.unverified,
+            "replays": self.replays,
+            "untrusted": self.untrusted,
+            "bytes_received": self.bytes_received,
+            "bytes_written": self.bytes_written,
+            "messages_per_sec": round(self.rate, 2),
+            "verify_us": self.verify_us.copy().to_dict(),
+            "sign_us": self.sign_us.copy().to_dict(),
+        }
+
+
+class MetricsRegistry:
+    def __init__(self):
+        self.topics = []
+        self.gauges = {}  # name -> (help, fn)
+        self.started = time.time()
+
+    def topic(self, topic, device):
+        tm = TopicMetrics(topic, device)
+        self.topics.append(tm)
+        return tm
+
+    def gauge(self, name, fn, help=""):
+        """Registers a gauge read at scrape time, e.g. queue depth."""
+        self.gauges[name] = (help, fn)
+
+    def tick(self):
+        for tm in self.topics:
+            tm.tick()
+
+    def snapshot(self):
+        return {
+            "ts": round(time.time(), 3),
+            "uptime_s": round(time.time() - self.started, 3),
+            "topics": [tm.snapshot() for tm in self.topics],
+            "gauges": {name: fn() for name, (_, fn) in self.gauges.items()},
+        }
+
+    def render(self):
+        """OpenMetrics text exposition."""
+        snap = self.snapshot()
+        lines = []
+
+        def family(name, kind, help):
+            lines.append(f"# TYPE {name} {kind}")
+            lines.append(f"# HELP {name} {help}")
+
+        counters = [
+            ("messages", "Messages verified."),
+            ("failures", "Messages whose tag did not verify."),
+            ("malformed", "Payloads the codec rejected."),
+            ("unverified", "Messages passed without verifying while overloaded."),
+            ("replays", "Verified messages rejected as replays."),
+            ("untrusted", "Messages rejected before verifying: signer key not in the trust store."),
+            ("bytes_received", "Payload bytes received."),
+            ("bytes_written", "Verified bytes written to disk."),
+        ]
+        for key, help in counters:
+            family(f"iotbench_{key}", "counter", help)
+            for t in snap["topics"]:
+                lines.append(f"iotbench_{key}_total{_labels(t)} {t[key]}")
+
+        family("iotbench_messages_per_second", "gauge", "Message rate over the last tick.")
+        for t in snap["topics"]:
+            lines.append(f"iotbench_messages_per_second{_labels(t)} {t['messages_per_sec']}")
+
+        for key, help in (("verify_us", "Broker verify latency in microseconds."),
+                          ("sign_us", "Device-reported sign latency in microseconds.")):
+            name = f"iotbench_{key.replace('_us', '')}_latency_microseconds"
+            family(name, "histogram", help)
+            for t in snap["topics"]:
+                lines.extend(_histogram_lines(name, t, Histogram.from_dict(t[key])))
+
+        for gname, (help, _) in self.gauges.items():
+            family(f"iotbench_{gname}", "gauge", help or gname)
+            lines.append(f"iotbench_{gname} {snap['gauges'][gname]}")
+
+        lines.append("# EOF")
+        return "\n".join(lines) + "\n"
+
+
+def _labels(t, **extra):
+    pairs = {"topic": t["topic"], "device": t["device"], **extra}
+    return "{" + ",".join(f'{k}="{v}"' for k, v in pairs.items()) + "}"
+
+
+def _histogram_lines(name, t, hist):
+    buckets = hist.buckets()
+    lines = []
+    i = cumulative = 0
+    for le in LE_BOUNDS:
+        while i < len(buckets) and buckets[i][1] <= le:
+            cumulative += buckets[i][2]
+            i += 1
+        lines.append(f"{name}_bucket{_labels(t, le=le)} {cumulative}")
+    lines.append(f"{name}_bucket{_labels(t, le='+Inf')} {hist.count}")
+    lines.append(f"{name}_count{_labels(t)} {hist.count}")
+    lines.append(f"{name}_sum{_labels(t)} {hist.total:.3f}")
+    return lines
+
+
+# --- EXPORTER ---
+class MetricsExporter:
+    """HTTP endpoint plus a ticker thread for rates and JSON-lines snapshots."""
+
+    def __init__(self, registry, port=0, host="127.0.0.1", jsonl_path=None, interval=5.0):
+        self.registry = registry
+        self.port = port
+        self.host = host
+        self.jsonl_path = jsonl_path
+        self.interval = interval
+        self._stop = threading.Event()
+        self._server = None
+
+    def start(self):
+        if self.port:
+            registry = self.registry
+
+            class Handler(BaseHTTPRequestHandler):
+                def do_GET(self):
+                    if self.path.split("?")[0] not in ("/", "/metrics"):
+                        self.send_error(404)
+                        return
+                    body = registry.render().encode("utf-8")
+                    self.send_response(200)
+                    self.send_header("Content-Type", CONTENT_TYPE)
+                    self.send_header("Content-Length", str(len(body)))
+                    self.end_headers()
+                    self.wfile.write(body)
+
+                def log_message(self, *args):
+                    pass
+
+            self._server = ThreadingHTTPServer((self.host, self.port), Handler)
+            self._server.daemon_threads = True
+            self.port = self._server.server_address[1]
+            threading.Thread(target=self._server.serve_forever, name="metrics-http", daemon=True).start()
+            print(f"Metrics: http://{self.host}:{self.port}/metrics")
+        threading.Thread(target=self._ticker, name="metrics-tick", daemon=True).start()
+        return self
+
+    def _ticker(self):
+        next_snapshot = time.monotonic() + self.interval
+        while not self._stop.wait(1.0):
+            self.registry.tick()
+            if self.jsonl_path and time.monotonic() >= next_snapshot:
+                self.write_snapshot()
+                next_snapshot += self.interval
+
+    def write_snapshot(self):
+        with open(self.jsonl_path, "a") as f:
+            f.write(json.dumps(self.registry.snapshot()) + "\n")
+
+    def stop(self):
+        self._stop.set()
+        if self.jsonl_path:
+            self.registry.tick()
+            self.write_snapshot()
+        if self._server:
+            self._server.shutdown()
+
+
+def add_metrics_args(parser):
+    parser.add_argument("--metrics-port", type=int, default=0,
+                        help="serve OpenMetrics on 127.0.0.1:PORT (0 = off)")
+    parser.add_argument("--metrics-jsonl", default=None, help="append a JSON snapshot here every interval")
+    parser.add_argument("--metrics-interval", type=float, default=5.0, help="seconds between JSON snapshots")
+
+
+def metrics_from_args(args, topic, device):
+    """
+    Returns (registry, topic_metrics, exporter). The counters are always
+    kept; the exporter is None unless --metrics-port or --metrics-jsonl is set.
+    """
+    registry = MetricsRegistry()
+    tm = registry.topic(topic, device)
+    exporter = None
+    if args.metrics_port or args.metrics_jsonl:
+        exporter = MetricsExporter(registry, args.metrics_port, jsonl_path=args.metrics_jsonl,
+                                   interval=args.metrics_interval).start()
+    return registry, tm, exporter
@@ -0,0 +1,327 @@
+"""
+Offline microbenchmarks for every crypto and encoding primitive on the
+message path, saved as JSON so machines and commits can be compared.
+
+    python -m iotbench.microbench                      # everything -> runs/microbench/<host>-<rev>-<time>.json
+    python -m iotbench.microbench -k ed25519 -k cid --fast
+    python -m iotbench.microbench --list
+    python -m iotbench.microbench compare old.json new.json [--threshold 5]
+
+Payloads are the project's real shapes: the therm reading string, the
+240 B LED frame and a 4 KiB video chunk. Covered: tag and verify for every
+keyed scheme, Ed25519 verify with the VerifyKey built per message (as the
+verifiers used to do) and the VerifyKey construction on its own, the
+legacy footer and the framed codec (pack and parse), CIDs in-process and
+through a kubo subprocess (skipped without kubo), the compression codecs,
+broker CSV row formatting and a 4 KiB append to the .h264 file.
+
+Timing follows pyperf. Each benchmark is calibrated to a loop count whose
+run lasts at least --min-time. After --warmups discarded runs, --samples
+runs are kept, each one the mean time per call over `loops` calls, with
+the garbage collector off. The JSON keeps every sample plus the host
+(iotbench.orchestrate.host_info: CPU count, Python, git rev). `compare`
+reports the median ratio per benchmark and a Mann-Whitney test over the
+two sample sets (iotbench.regression). It exits non-zero when something got
+significantly slower by more than --threshold percent.
+"""
+import argparse
+import csv
+import datetime
+import gc
+import json
+import os
+import statistics
+import tempfile
+import time
+
+from iotbench import codec
+from iotbench.cid import cid_v1_raw, find_ipfs_exe, ipfs_only_hash
+from iotbench.compression import Compressor, Decompressor, available
+from iotbench.orchestrate import REPO_ROOT, host_info
+from iotbench.producers import cam_source, light_source, therm_source
+from iotbench.regression import mann_whitney
+from iotbench.schemes import get_scheme
+
+KEYED_SCHEMES = ("ed25519", "ed25519ph", "hmac-sha256", "blake2b")
+VIDEO_WRAP = 64 << 20  # rewind the scratch .h264 file past this size
+BENCHMARKS = {}        # name -> (factory, payload size in bytes or None)
+
+
+class Skip(Exception):
+    """Raised by a factory when the primitive is not available here."""
+
+
+def payloads():
+    return {
+        "therm": next(therm_source(seed=1)),
+        "led240": next(light_source()),
+        "chunk4k": next(cam_source(4096, seed=1)),
+    }
+
+
+def register(name, factory, nbytes=None):
+    BENCHMARKS[name] = (factory, nbytes)
+
+
+def _register_all():
+    shapes = payloads()
+    for label, data in shapes.items():
+        n = len(data)
+        for name in KEYED_SCHEMES:
+            def tag(name=name, data=data):
+                scheme = get_scheme(name, generate=True)
+                return lambda: scheme.tag(data)
+
+            def verify(name=name, data=data):
+                scheme = get_scheme(name, generate=True)
+                tag_, prepared = scheme.tag(data), scheme.prepare(scheme.key_bytes())
+                return lambda: scheme.verify_prepared(prepared, data, tag_)
+
+            register(f"{name}.tag[{label}]", tag, n)
+            register(f"{name}.verify[{label}]", verify, n)
+
+        def verify_with_key(data=data):
+            scheme = get_scheme("ed25519", generate=True)
+            tag_, key = scheme.tag(data), scheme.key_bytes()
+            return lambda: scheme.verify(data, tag_, key)
+
+        def footer_pack(data=data):
+            scheme = get_scheme("ed25519", generate=True)
+            tag_, key = scheme.tag(data), scheme.key_bytes()
+            return lambda: codec.encode_legacy(data, tag_, key, 1234)
+
+        def footer_parse(data=data):
+            scheme = get_scheme("ed25519", generate=True, legacy=True)
+            payload = scheme.encode(data)
+            return lambda: scheme.decode_frame(payload)
+
+        def frame_pack(data=data):
+            scheme = get_scheme("ed25519", generate=True)
+            tag_ = scheme.tag(data)
+            return lambda: scheme.encode(data, tag_, 1234)
+
+        def frame_parse(data=data):
+            scheme = get_scheme("ed25519", generate=True)
+            payload = scheme.encode(data)
+            return lambda: scheme.decode_frame(payload)
+
+        def cid_inprocess(data=data):
+            return lambda: cid_v1_raw(data)
+
+        def csv_row(label=label, data=data):
+            if label == "therm":
+                row = [1234, data.decode(), 46308, 206.5, True]
+            elif label == "led240":
+                row = [1234, data.hex(), 560, 297.2, True]
+            else:
+                row = [1234, len(data), 186, 192.0, True]
+            writer = csv.writer(_Discard())
+            return lambda: writer.writerow([row[0], row[1], row[2], f"{row[3]:.2f}", row[4]])
+
+        register(f"ed25519.verify_with_key[{label}]", verify_with_key, n)
+        register(f"footer.pack[{label}]", footer_pack, n)
+        register(f"footer.parse[{label}]", footer_parse, n)
+        register(f"frame.pack[{label}]", frame_pack, n)
+        register(f"frame.parse[{label}]", frame_parse, n)
+        register(f"cid.inprocess[{label}]", cid_inprocess, n)
+        register(f"csv.row[{label}]", csv_row)
+
+        if label == "therm":
+            continue  # compressing a 24-byte reading is not something the producers do by default
+        for name in available():
+            if name == "none":
+                continue
+
+            def make_compress(name=name, data=data):
+                compressor = Compressor(name)
+                return lambda: compressor.compress(data)
+
+            def make_decompress(name=name, data=data):
+                compressor, decompressor = Compressor(name), Decompressor()
+                packed = compressor.compress(data)
+                return lambda: decompressor.decompress(compressor.flags, packed)
+
+            register(f"{name}.compress[{label}]", make_compress, n)
+            register(f"{name}.decompress[{label}]", make_decompress, n)
+
+    def verify_key():
+        scheme = get_scheme("ed25519", generate=True)
+        key = scheme.key_bytes()
+        return lambda: scheme.prepare(key)
+
+    def cid_kubo(data=shapes["chunk4k"]):
+        exe = find_ipfs_exe()
+        if not exe:
+            raise Skip("kubo (ipfs) not installed")
+        return lambda: ipfs_only_hash(data, exe)
+
+    def video_write(data=shapes["chunk4k"]):
+        f = tempfile.TemporaryFile()
+
+        def write():
+            f.write(data)
+            if f.tell() > VIDEO_WRAP:
+                f.seek(0)
+        return write
+
+    register("ed25519.verify_key", verify_key)
+    register("cid.kubo[chunk4k]", cid_kubo, len(shapes["chunk4k"]))
+    register("video.write[chunk4k]", video_write, len(shapes["chunk4k"]))
+
+
+class _Discard:
+    """File-like sink, so csv.writer's cost is the formatting alone."""
+
+    def write(self, s):
+        return len(s)
+
+
+# --- RUNNER ---
+def time_loops(fn, loops):
+    """Nanoseconds per call over `loops` calls, GC off."""
+    gc_was_enabled = gc.isenabled()
+    gc.disable()
+    try:
+        start = time.perf_counter_ns()
+        for _ in range(loops):
+            fn()
+        return (time.perf_counter_ns() - start) / loops
+    finally:
+        if gc_was_enabled:
+            gc.enable()
+
+
+def calibrate(fn, min_time):
+    loops = 1
+    while True:
+        if time_loops(fn, loops) * loops >= min_time * 1e9 or loops >= 1 << 24:
+            return loops
+        loops *= 2
+
+
+def run_one(fn, samples, warmups, min_time):
+    loops = calibrate(fn, min_time)
+    for _ in range(warmups):
+        time_loops(fn, loops)
+    values = [time_loops(fn, loops) for _ in range(samples)]
+    return {
+        "loops": loops,
+        "samples_ns": [round(v, 2) for v in values],
+        "median_ns": statistics.median(values),
+        "mean_ns": statistics.fmean(values),
+        "stdev_ns": statistics.stdev(values) if len(values) > 1 else 0.0,
+    }
+
+
+def run(patterns=(), samples=20, warmups=2, min_time=0.02, verbose=True):
+    """Runs the registered benchmarks whose name contains any of `patterns` (all if empty)."""
+    if not BENCHMARKS:
+        _register_all()
+    results = {"created": datetime.datetime.now().isoformat(timespec="seconds"), "host": host_info(),
+               "config": {"samples": samples, "warmups": warmups, "min_time_s": min_time},
+               "benchmarks": {}, "skipped": {}}
+    for name, (factory, nbytes) in BENCHMARKS.items():
+        if patterns and not any(p in name for p in patterns):
+            continue
+        try:
+            fn = factory()
+        except Skip as e:
+            results["skipped"][name] = str(e)
+            if verbose:
+                print(f"{name:<34} skipped: {e}")
+            continue
+        r = run_one(fn, samples, warmups, min_time)
+        r["bytes"] = nbytes
+        results["benchmarks"][name] = r
+        if verbose:
+            print(_row(name, r))
+    return results
+
+
+def _fmt_ns(ns):
+    return f"{ns / 1000:.2f} us" if ns < 1e6 else f"{ns / 1e6:.2f} ms"
+
+
+def _row(name, r):
+    rsd = 100 * r["stdev_ns"] / r["mean_ns"] if r["mean_ns"] else 0.0
+    rate = f"{r['bytes'] / r['median_ns'] * 1e3:>9.1f} MB/s" if r.get("bytes") else ""
+    return f"{name:<34} {_fmt_ns(r['median_ns']):>11} +- {rsd:>4.1f}%  {1e9 / r['median_ns']:>11,.0f}/s {rate}"
+
+
+def compare(old, new, threshold=0.05, alpha=0.01):
+    """[(name, ratio, p, verdict)] for benchmarks present in both result dicts."""
+    rows = []
+    for name, b in new["benchmarks"].items():
+        a = old["benchmarks"].get(name)
+        if a is None:
+            continue
+        ratio = b["median_ns"] / a["median_ns"]
+        p_slower, _ = mann_whitney(a["samples_ns"], b["samples_ns"])
+        p_faster, _ = mann_whitney(b["samples_ns"], a["samples_ns"])
+        verdict = "ok"
+        if ratio > 1 + threshold and p_slower < alpha:
+            verdict = "SLOWER"
+        elif ratio < 1 - threshold and p_faster < alpha:
+            verdict = "faster"
+        rows.append((name, ratio, min(p_slower, p_faster), verdict))
+    return rows
+
+
+def default_path(results):
+    host = results["host"]
+    stamp = datetime.datetime.now().strftime("%Y%m%d-%H%M%S")
+    return os.path.join(REPO_ROOT, "runs", "microbench",
+                        f"{host['hostname'] or 'host'}-{(host['git_rev'] or 'norev')[:8]}-{stamp}.json")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Microbenchmarks of the crypto and encoding primitives.")
+    sub = parser.add_subparsers(dest="command")
+    cmp_parser = sub.add_parser("compare", help="compare two result files")
+    cmp_parser.add_argument("old")
+    cmp_parser.add_argument("new")
+    cmp_parser.add_argument("--threshold", type=float, default=5.0, help="median change that counts, in %%")
+    cmp_parser.add_argument("--alpha", type=float, default=0.01)
+    parser.add_argument("-k", dest="patterns", action="append", default=[], help="run names containing this")
+    parser.add_argument("--samples", type=int, default=20)
+    parser.add_argument("--warmups", type=int, default=2)
+    parser.add_argument("--min-time", type=float, default=0.02, help="seconds per sample")
+    parser.add_argument("--fast", action="store_true", help="5 samples of 5 ms: a quick look, not a baseline")
+    parser.add_argument("--json", default=None, help="result file (default: runs/microbench/<host>-<rev>-<time>.json)")
+    parser.add_argument("--list", action="store_true", help="list benchmark names and exit")
+    args = parser.parse_args()
+
+    if args.command == "compare":
+        with open(args.old) as f:
+            old = json.load(f)
+        with open(args.new) as f:
+            new = json.load(f)
+        if old["host"].get("hostname") != new["host"].get("hostname"):
+            print(f"NOTE: different hosts ({old['host'].get('hostname')} vs {new['host'].get('hostname')})")
+        rows = compare(old, new, args.threshold / 100, args.alpha)
+        print(f"{'Benchmark':<34} {'old':>11} {'new':>11} {'change':>8} {'p':>9}")
+        for name, ratio, p, verdict in rows:
+            print(f"{name:<34} {_fmt_ns(old['benchmarks'][name]['median_ns']):>11} "
+                  f"{_fmt_ns(new['benchmarks'][name]['median_ns']):>11} {100 * (ratio - 1):>+7.1f}% {p:>9.1e} "
+                  f"{verdict if verdict != 'ok' else ''}")
+        slower = [r[0] for r in rows if r[3] == "SLOWER"]
+        print(f"{len(rows)} compared, {len(slower)} slower" + (f": {', '.join(slower)}" if slower else ""))
+        raise SystemExit(1 if slower else 0)
+
+    if not BENCHMARKS:
+        _register_all()
+    if args.list:
+        print("\n".join(BENCHMARKS))
+        return
+    if args.fast:
+        args.samples, args.warmups, args.min_time = 5, 1, 0.005
+    results = run(args.patterns, args.samples, args.warmups, args.min_time)
+    path = args.json or default_path(results)
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    with open(path, "w") as f:
+        json.dump(results, f, indent=1)
+    print(f"{len(results['benchmarks'])} benchmarks ({len(results['skipped'])} skipped) -> {path}")
+
+
+if __name__ == "__main__":
+    main()
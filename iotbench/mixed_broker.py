@@ -0,0 +1,285 @@
+"""
+One verifier process for all three topics, with fair scheduling between them.
+
+    python -m iotbench.mixed_broker --policy drr --workers 2 --duration 60
+    python -m iotbench.mixed_broker --queue therm:1:1000 --queue cam:8:50000
+
+The MQTT callback only hands each payload to iotbench.scheduler; worker
+threads decode, verify, drop replays (--replay-window, iotbench.replay),
+decompress and (for cam) append the video to one .h264 file per camera key.
+--queue TOPIC:WEIGHT:SLO_US overrides the per-topic defaults in TOPICS. At
+exit the scheduler's per-queue wait/latency/SLO table is printed and written
+to scheduler_summary_<policy>.csv under --out-dir.
+
+With --overload sample|shed an iotbench.overload controller bounds the
+backlog: past --overload-depth queued payloads only --sample-fraction of them
+are verified, and in "shed" mode low-priority topics are then dropped. Its
+failure-rate bounds go to overload_summary_<policy>.csv and every level change
+to overload_events_<policy>.csv.
+
+With --shard I/N the process is one of N verifiers splitting the topics
+between them (shared subscriptions or consistent hashing by device, see
+iotbench.shards) and also writes shard.json for
+`python -m iotbench.shards merge`.
+
+With --archive DIR the MQTT callback appends each admitted payload to the
+topic's device stream in iotbench.archive before scheduling it;
+--archive-only counts it as unverified and schedules nothing.
+"""
+import argparse
+import csv
+import os
+import threading
+import time
+
+import paho.mqtt.client as mqtt
+
+from iotbench.archive import add_archive_args, archive_from_args
+from iotbench.codec import CodecError, split_frame_meta
+from iotbench.compression import add_decompression_args, decompressor_from_args
+from iotbench.identity import UntrustedKey, add_trust_args, trust_from_args
+from iotbench.metrics import add_metrics_args, metrics_from_args
+from iotbench.overload import EVENT_FIELDS, OVERLOAD_FIELDS, add_overload_args, overload_from_args
+from iotbench.replay import add_replay_args, replay_from_args
+from iotbench.resources import add_resource_args, resources_from_args
+from iotbench.scheduler import POLICIES, FairScheduler, parse_queue_spec
+from iotbench.schemes import add_scheme_args, scheme_from_args
+from iotbench.shards import add_shard_args, shard_from_args
+
+# topic -> (device, weight, latency SLO in us)
+TOPICS = {
+    "therm": ("esp32", 1, 2000),
+    "light": ("pi3", 1, 2000),
+    "cam": ("pi5", 1, 50000),
+}
+SUMMARY_FIELDS = ["Queue", "Weight", "Done", "Max_Depth", "Wait_P50_uS", "Wait_P99_uS", "Latency_P50_uS",
+                  "Latency_P99_uS", "Latency_Max_uS", "SLO_uS", "SLO_Miss_Pct"]
+
+
+class VideoFiles:
+    """One .h264 per camera (signer key), so several cameras on `cam` are not interleaved."""
+
+    def __init__(self, out_dir, prefix):
+        self.out_dir = out_dir
+        self.prefix = prefix
+        self.files = {}  # key bytes -> open file
+        self.paths = []
+
+    def write(self, key, data):
+        key = bytes(key)
+        f = self.files.get(key)
+        if f is None:
+            name = f"{self.prefix}_{key.hex()[:12]}.h264" if key else f"{self.prefix}.h264"
+            path = os.path.join(self.out_dir, name)
+            f = self.files[key] = open(path, "wb")
+            self.paths.append(path)
+        f.write(data)
+
+    def close(self):
+        for f in self.files.values():
+            f.close()
+
+
+class MixedVerifier:
+    """handler(topic, payload) for the scheduler's workers."""
+
+    def __init__(self, scheme, decompressor, metrics, videos=None, controller=None, replay=None, trust=None):
+        self.scheme = scheme
+        self.prepare = trust.prepare if trust else scheme.prepare  # --trust-store: pinned, pre-decoded keys
+        self.decompressor = decompressor
+        self.metrics = metrics  # topic -> TopicMetrics
+        self.videos = videos    # VideoFiles
+        self.controller = controller
+        self.replay = replay
+        self._lock = threading.Lock()  # TopicMetrics, the video files and the replay filter are shared
+
+    def observe_unverified(self, topic, nbytes):
+        with self._lock:
+            self.metrics[topic].observe_unverified(nbytes)
+
+    def __call__(self, topic, payload):
+        tm = self.metrics[topic]
+        try:
+            frame = self.scheme.decode_frame(payload)
+            sampled = bool(self.controller and self.controller.level)
+            if self.controller and not self.controller.should_verify(topic):
+                valid = verify_us = None  # overloaded: passed through unverified
+            else:
+                v_start = time.perf_counter_ns()
+                valid = self.scheme.verify_prepared(self.prepare(frame.key), frame.data, frame.tag)
+                verify_us = (time.perf_counter_ns() - v_start) / 1000
+            if valid and self.replay:
+                with self._lock:
+                    if self.replay.seen(frame, source=topic):  # keyless schemes: one window per device
+                        tm.observe_replay(len(payload))
+                        return
+            written = 0
+            # Per-frame and --sequence payloads carry (timestamp, seq) ahead of the message
+            _, _, body = split_frame_meta(frame)
+            if valid is not False and topic == "cam":
+                video = self.decompressor.decompress(frame.flags, body)
+                if self.videos:
+                    with self._lock:
+                        self.videos.write(frame.key, video)
+                    written = len(video)
+            else:
+                self.decompressor.decompress_verified(frame.flags, body, valid is not False)
+        except UntrustedKey:
+            with self._lock:
+                tm.observe_untrusted(len(payload))
+            return
+        except CodecError:
+            with self._lock:
+                tm.observe_malformed(len(payload))
+            return
+        if self.controller:
+            if valid is None:
+                self.controller.record_unverified(topic)
+            else:
+                self.controller.record(topic, valid, sampled)
+        with self._lock:
+            if valid is None:
+                tm.observe_unverified(len(payload), written)
+            else:
+                tm.observe(len(payload), verify_us, frame.sign_time_us, valid, written)
+
+
+def write_summary(path, rows):
+    with open(path, "w", newline="") as f:
+        writer = csv.DictWriter(f, fieldnames=SUMMARY_FIELDS)
+        writer.writeheader()
+        writer.writerows(rows)
+
+
+def write_overload(out_dir, suffix, controller):
+    """overload_summary (per-topic counts and failure-rate bounds) and overload_events (every level change)."""
+    summary_path = os.path.join(out_dir, f"overload_summary_{suffix}.csv")
+    with open(summary_path, "w", newline="") as f:
+        writer = csv.DictWriter(f, fieldnames=OVERLOAD_FIELDS)
+        writer.writeheader()
+        writer.writerows(controller.summary())
+    events_path = os.path.join(out_dir, f"overload_events_{suffix}.csv")
+    with open(events_path, "w", newline="") as f:
+        writer = csv.DictWriter(f, fieldnames=EVENT_FIELDS)
+        writer.writeheader()
+        writer.writerows(controller.events)
+    print(f"Overload: {summary_path}, {events_path}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Verify therm, light and cam in one process with fair scheduling.")
+    parser.add_argument("--broker", default="localhost")
+    parser.add_argument("--port", type=int, default=1883)
+    parser.add_argument("--out-dir", default=".", help="where the .h264 and scheduler summary are written")
+    parser.add_argument("--duration", type=float, default=0, help="seconds to run (0 = until interrupted)")
+    parser.add_argument("--policy", choices=POLICIES, default="drr")
+    parser.add_argument("--workers", type=int, default=1, help="verification threads")
+    parser.add_argument("--queue", action="append", default=[], metavar="TOPIC:WEIGHT:SLO_US",
+                        help="override a topic's weight and latency SLO (repeatable)")
+    parser.add_argument("--topics", nargs="+", choices=list(TOPICS), default=list(TOPICS),
+                        help="subscribe to these topics only (e.g. just cam behind a slow verifier)")
+    add_overload_args(parser)
+    add_replay_args(parser)
+    add_scheme_args(parser)
+    add_metrics_args(parser)
+    add_decompression_args(parser)
+    add_shard_args(parser)
+    add_resource_args(parser)
+    add_archive_args(parser)
+    add_trust_args(parser)
+    args = parser.parse_args()
+
+    queues = {topic: (weight, slo_us) for topic, (_, weight, slo_us) in TOPICS.items()}
+    for spec in args.queue:
+        try:
+            topic, weight, slo_us = parse_queue_spec(spec)
+        except ValueError as e:
+            parser.error(f"--queue {spec}: {e}")
+        if topic not in TOPICS:
+            parser.error(f"unknown topic '{topic}' (choose from {', '.join(TOPICS)})")
+        queues[topic] = (weight, slo_us)
+
+    os.makedirs(args.out_dir, exist_ok=True)
+    registry, therm_metrics, exporter = metrics_from_args(args, topic="therm", device="esp32")
+    metrics = {"therm": therm_metrics}
+    metrics.update((topic, registry.topic(topic, device)) for topic, (device, _, _) in TOPICS.items()
+                   if topic != "therm")
+    videos = VideoFiles(args.out_dir, f"mixed_stream_{int(time.time())}")
+    controller = overload_from_args(args)
+    replay = replay_from_args(args)
+    scheme = scheme_from_args(args)
+    shard = shard_from_args(args, scheme)
+    archives = {topic: archive_from_args(args, TOPICS[topic][0], scheme) for topic in args.topics}
+    archives = {topic: archive for topic, archive in archives.items() if archive}
+    trust = trust_from_args(args, scheme)
+    verifier = MixedVerifier(scheme, decompressor_from_args(args), metrics, videos, controller, replay, trust)
+    sched = FairScheduler(verifier, workers=args.workers, policy=args.policy, controller=controller)
+    for topic in args.topics:
+        sched.add_queue(topic, *queues[topic])
+    registry.gauge("scheduler_depth", lambda: sched.depth, "Payloads waiting for a verification worker.")
+    resources = resources_from_args(args, progress=lambda: sum(tm.messages for tm in metrics.values()))
+
+    def on_message(client, userdata, msg):
+        if shard is not None and not shard.admit(msg.topic, msg.payload):
+            return
+        archive = archives.get(msg.topic)
+        if archive:
+            archive.append(msg.payload)
+            if archive.deferred:
+                verifier.observe_unverified(msg.topic, len(msg.payload))
+                return
+        sched.submit(msg.topic, msg.payload)
+
+    # Shared subscriptions ($share/...) are an MQTT v5 feature
+    client = mqtt.Client(mqtt.CallbackAPIVersion.VERSION2, protocol=mqtt.MQTTv5 if shard else mqtt.MQTTv311)
+    client.on_message = on_message
+    try:
+        client.connect(args.broker, args.port)
+    except ConnectionRefusedError:
+        raise SystemExit("Error: Could not connect to MQTT Broker. Is Mosquitto running?")
+    for topic in args.topics:
+        client.subscribe(shard.subscription(topic) if shard else topic)
+    print(f"Verifying {', '.join(args.topics)} with {args.workers} worker(s), policy {args.policy}"
+          f"{f', shard {shard.index}/{shard.count} ({shard.mode})' if shard else ''}...")
+    client.loop_start()
+    try:
+        if args.duration:
+            time.sleep(args.duration)
+        else:
+            while True:
+                time.sleep(1)
+    except KeyboardInterrupt:
+        print("\nStopped by user.")
+    client.loop_stop()
+    client.disconnect()
+    sched.close()
+    videos.close()
+    for archive in archives.values():
+        archive.close()
+    if resources:
+        resources.stop()
+
+    sched.report()
+    summary_path = os.path.join(args.out_dir, f"scheduler_summary_{args.policy}.csv")
+    write_summary(summary_path, sched.summary())
+    for tm in metrics.values():
+        print(f"{tm.topic:<6} messages {tm.messages:>7}  failures {tm.failures:>4}  malformed {tm.malformed:>4}  "
+              f"unverified {tm.unverified:>6}  replays {tm.replays:>5}  untrusted {tm.untrusted:>5}")
+    print(f"Video: {', '.join(videos.paths) or 'none'}\nSummary: {summary_path}")
+    if shard:
+        print(f"Shard: {shard.write(args.out_dir, metrics, sched, videos.paths)}")
+    if replay:
+        replay.report()
+    for archive in archives.values():
+        archive.report()
+    if controller:
+        controller.report()
+        write_overload(args.out_dir, args.policy, controller)
+    if resources:
+        resources.finish(args.out_dir, args.policy)
+    if exporter:
+        exporter.stop()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,259 @@
+"""
+Runs a benchmark matrix (device x scheme x stress level x chunk size) on one
+Linux host: local Mosquitto, synthetic producers, the real broker verifiers.
+
+    python -m iotbench.orchestrate --devices pi3 pi5 --schemes ed25519 cid \\
+        --stress 0 25 50 75 99 --chunk-sizes 1024 4096 --duration 30
+
+Layout written under --out (default runs/):
+
+    runs/<session>/
+        matrix.json                     arguments and host info for the session
+        index.csv                       one row per cell with status and paths
+        <device>-<scheme>-stressNN[-cN]/
+            run.json                    cell metadata (host, git rev, timings)
+            producer.log, verifier.log
+            resources_producer.csv      CPU, RSS, context switches, MHz, temperature
+                                        (iotbench.resources; the verifier writes its own)
+            ...                         whatever the verifier writes
+    runs/catalog.sqlite                 every cell's raw CSV, imported as it finishes
+                                        (iotbench.catalog; --catalog to put it elsewhere)
+
+--baseline runs/<earlier session> runs iotbench.regression on every cell the
+two sessions share, writes <session>/regression.csv and exits non-zero if
+any metric regressed.
+"""
+import argparse
+import csv
+import datetime
+import itertools
+import json
+import os
+import platform
+import signal
+import subprocess
+import sys
+import time
+
+from iotbench.catalog import connect as connect_catalog, import_paths
+from iotbench.producers import CHUNK_SIZE, DEVICES, verifier_for
+from iotbench.regression import compare_sessions, write_sessions_csv
+from iotbench.schemes import SCHEMES
+from iotbench.stress import start_stress_test, stop_stress_test, stress_ng_available, stress_ng_version
+from iotbench.testbroker import KINDS as BROKER_KINDS, broker_reachable, start_broker
+
+REPO_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+INDEX_FIELDS = ["Cell", "Device", "Scheme", "Stress", "Chunk_Size", "Status", "Producer_Exit",
+                "Verifier_Exit", "Started", "Finished", "Directory"]
+
+
+# --- HOST / ENVIRONMENT ---
+def git_rev():
+    try:
+        result = subprocess.run(["git", "rev-parse", "HEAD"], cwd=REPO_ROOT,
+                                stdout=subprocess.PIPE, stderr=subprocess.DEVNULL, check=True)
+        return result.stdout.decode().strip()
+    except (OSError, subprocess.CalledProcessError):
+        return ""
+
+
+def host_info():
+    return {
+        "hostname": platform.node(),
+        "platform": platform.platform(),
+        "machine": platform.machine(),
+        "cpu_count": os.cpu_count(),
+        "python": platform.python_version(),
+        "git_rev": git_rev(),
+        "stress_ng": stress_ng_version(),
+    }
+
+
+# --- MATRIX ---
+def build_matrix(devices, schemes, stress_levels, chunk_sizes):
+    """Cells in run order. Chunk size only varies for the camera stream."""
+    cells = []
+    for device, scheme in itertools.product(devices, schemes):
+        if not verifier_for(device, scheme):
+            print(f"Skipping {device}/{scheme}: no verifier for that combination.")
+            continue
+        sizes = chunk_sizes if device == "pi5" else [None]
+        for stress, size in itertools.product(stress_levels, sizes):
+            cells.append({"device": device, "scheme": scheme, "stress": stress, "chunk_size": size})
+    return cells
+
+
+def cell_name(cell):
+    name = f"{cell['device']}-{cell['scheme']}-stress{cell['stress']:02d}"
+    if cell["chunk_size"]:
+        name += f"-c{cell['chunk_size']}"
+    return name
+
+
+def stop_verifier(proc, timeout):
+    """SIGINT makes every verifier finalize and write its CSVs."""
+    if proc.poll() is not None:
+        return proc.returncode
+    proc.send_signal(signal.SIGINT)
+    try:
+        return proc.wait(timeout=timeout)
+    except subprocess.TimeoutExpired:
+        proc.kill()
+        return proc.wait()
+
+
+def run_cell(cell, session_dir, args):
+    cell_dir = os.path.join(session_dir, cell_name(cell))
+    os.makedirs(cell_dir, exist_ok=True)
+    chunk_size = cell["chunk_size"] or CHUNK_SIZE
+    verifier_script = os.path.join(REPO_ROOT, verifier_for(cell["device"], cell["scheme"]))
+
+    verifier_cmd = [sys.executable, verifier_script, "--broker", args.broker, "--port", str(args.port),
+                    "--out-dir", cell_dir, "--scheme", cell["scheme"]]
+    if cell["device"] != "pi5":
+        verifier_cmd += ["--max-logs", "0"]
+    if cell["scheme"] == "cid" and args.ipfs_exe:
+        verifier_cmd += ["--ipfs-exe", args.ipfs_exe]
+
+    producer_cmd = [sys.executable, "-m", "iotbench.producers", "--device", cell["device"],
+                    "--scheme", cell["scheme"], "--broker", args.broker, "--port", str(args.port),
+                    "--duration", str(args.duration), "--warmup", str(args.warmup),
+                    "--chunk-size", str(chunk_size), "--out-dir", cell_dir]
+
+    meta = {
+        **cell,
+        "chunk_size": chunk_size if cell["device"] == "pi5" else None,
+        "topic": DEVICES[cell["device"]].topic,
+        "duration_s": args.duration,
+        "warmup_s": args.warmup,
+        "cooldown_s": args.cooldown,
+        "broker": f"{args.broker}:{args.port}",
+        "verifier_cmd": verifier_cmd,
+        "producer_cmd": producer_cmd,
+        "host": host_info(),
+        "started": datetime.datetime.now().isoformat(timespec="seconds"),
+    }
+    print(f"\n=== {cell_name(cell)} ===")
+
+    stress_process = None
+    verifier = None
+    status = "ok"
+    with open(os.path.join(cell_dir, "verifier.log"), "w") as vlog, \
+            open(os.path.join(cell_dir, "producer.log"), "w") as plog:
+        try:
+            if cell["stress"] > 0:
+                stress_process = start_stress_test(cpu_load=cell["stress"])
+
+            verifier = subprocess.Popen(verifier_cmd, cwd=cell_dir, stdout=vlog, stderr=subprocess.STDOUT)
+            time.sleep(args.settle)
+            if verifier.poll() is not None:
+                raise RuntimeError(f"verifier exited early ({verifier.returncode}), see verifier.log")
+
+            producer = subprocess.run(producer_cmd, cwd=REPO_ROOT, stdout=plog, stderr=subprocess.STDOUT,
+                                      timeout=args.duration + args.warmup + 60)
+            meta["producer_exit"] = producer.returncode
+            if producer.returncode != 0:
+                status = "producer_failed"
+
+            time.sleep(args.drain)
+            meta["verifier_exit"] = stop_verifier(verifier, timeout=30)
+        except (RuntimeError, subprocess.TimeoutExpired) as e:
+            status = f"error: {e}"
+            if verifier:
+                meta["verifier_exit"] = stop_verifier(verifier, timeout=10)
+        finally:
+            stop_stress_test(stress_process)
+
+    meta["status"] = status
+    meta["finished"] = datetime.datetime.now().isoformat(timespec="seconds")
+    meta["files"] = sorted(os.listdir(cell_dir)) + ["run.json"]
+    with open(os.path.join(cell_dir, "run.json"), "w") as f:
+        json.dump(meta, f, indent=2)
+
+    print(f"Status: {status} -> {cell_dir}")
+    return meta, cell_dir
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run the device x scheme x stress x chunk benchmark matrix.")
+    parser.add_argument("--devices", nargs="+", choices=sorted(DEVICES), default=sorted(DEVICES))
+    parser.add_argument("--schemes", nargs="+", choices=sorted(SCHEMES), default=["ed25519", "cid"])
+    parser.add_argument("--stress", nargs="+", type=int, default=[0, 25, 50, 75, 99], help="CPU load levels")
+    parser.add_argument("--chunk-sizes", nargs="+", type=int, default=[CHUNK_SIZE])
+    parser.add_argument("--duration", type=float, default=30.0, help="measured seconds per cell")
+    parser.add_argument("--warmup", type=float, default=5.0, help="unpublished signing before each cell")
+    parser.add_argument("--cooldown", type=float, default=10.0, help="idle seconds between cells")
+    parser.add_argument("--settle", type=float, default=1.5, help="seconds for the verifier to subscribe")
+    parser.add_argument("--drain", type=float, default=2.0, help="seconds to let the verifier catch up")
+    parser.add_argument("--broker", default="localhost")
+    parser.add_argument("--port", type=int, default=1883)
+    parser.add_argument("--start-broker", "--start-mosquitto", dest="start_broker", action="store_true",
+                        help="start a local broker on --port if none is listening (iotbench.testbroker)")
+    parser.add_argument("--broker-kind", choices=BROKER_KINDS, default="auto",
+                        help="auto = Mosquitto if installed, else the Python broker")
+    parser.add_argument("--ipfs-exe", default=None, help="kubo binary for the CID verifiers")
+    parser.add_argument("--out", default=os.path.join(REPO_ROOT, "runs"))
+    parser.add_argument("--catalog", default=None, help="SQLite run catalog (default: <out>/catalog.sqlite)")
+    parser.add_argument("--baseline", default=None,
+                        help="earlier session directory; each cell is checked against it (iotbench.regression)")
+    parser.add_argument("--dry-run", action="store_true", help="list the cells and exit")
+    args = parser.parse_args()
+
+    cells = build_matrix(args.devices, args.schemes, args.stress, args.chunk_sizes)
+    if args.dry_run:
+        for cell in cells:
+            print(cell_name(cell))
+        return
+    if any(c["stress"] > 0 for c in cells) and not stress_ng_available():
+        raise SystemExit("stress-ng not found; install it or run with --stress 0.")
+
+    local_broker = None
+    if not broker_reachable(args.broker, args.port):
+        if not args.start_broker:
+            raise SystemExit(f"No MQTT broker at {args.broker}:{args.port} (try --start-broker).")
+        local_broker = start_broker(args.broker_kind, args.port)
+        print(f"Started a local {local_broker.kind} broker on port {args.port}")
+
+    session = datetime.datetime.now().strftime("%Y%m%d-%H%M%S")
+    session_dir = os.path.join(args.out, session)
+    os.makedirs(session_dir)
+    with open(os.path.join(session_dir, "matrix.json"), "w") as f:
+        json.dump({"args": vars(args), "cells": [cell_name(c) for c in cells], "host": host_info()}, f, indent=2)
+
+    print(f"--- MATRIX: {len(cells)} cells -> {session_dir} ---")
+    index_path = os.path.join(session_dir, "index.csv")
+    catalog = connect_catalog(args.catalog or os.path.join(args.out, "catalog.sqlite"))
+    try:
+        with open(index_path, "w", newline="") as f:
+            writer = csv.writer(f)
+            writer.writerow(INDEX_FIELDS)
+            for n, cell in enumerate(cells):
+                meta, cell_dir = run_cell(cell, session_dir, args)
+                writer.writerow([cell_name(cell), cell["device"], cell["scheme"], cell["stress"],
+                                 meta["chunk_size"] or "", meta["status"], meta.get("producer_exit", ""),
+                                 meta.get("verifier_exit", ""), meta["started"], meta["finished"],
+                                 os.path.relpath(cell_dir, session_dir)])
+                f.flush()
+                imported, _ = import_paths(catalog, [cell_dir])
+                print(f"Catalog: {imported} run(s) added")
+                if n < len(cells) - 1 and args.cooldown > 0:
+                    print(f"Cool-down {args.cooldown:.0f}s...")
+                    time.sleep(args.cooldown)
+    finally:
+        catalog.close()
+        if local_broker:
+            local_broker.stop()
+
+    print(f"\nMatrix complete. Index -> {index_path}")
+    if args.baseline:
+        comparisons = compare_sessions(args.baseline, session_dir)
+        for cell, result in comparisons:
+            print(f"=== {cell} vs baseline ===\n{result.table()}")
+        write_sessions_csv(os.path.join(session_dir, "regression.csv"), comparisons)
+        failed = [cell for cell, result in comparisons if not result.passed]
+        if failed:
+            raise SystemExit(f"Regression gate failed: {', '.join(failed)}")
+
+
+if __name__ == "__main__":
+    main()
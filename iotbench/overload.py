@@ -0,0 +1,213 @@
+"""
+Overload control for a verifier that is falling behind its publishers.
+
+    controller = OverloadController(mode="shed", high_depth=500, sample_fraction=0.1)
+    sched = FairScheduler(handler, controller=controller)
+    ...in the handler...
+    sampled = controller.level > 0
+    if controller.should_verify(topic):
+        valid = scheme.verify(...)
+        controller.record(topic, valid, sampled)
+    else:
+        controller.record_unverified(topic)
+
+Levels, stepped up and down one at a time:
+
+    normal    verify everything
+    sampling  verify a random sample_fraction of messages, pass the rest unverified
+    shedding  sampling, and drop topics with priority < shed_below at admission
+
+The controller escalates when the scheduler's queue depth reaches
+high_depth (shedding: twice that) or the EWMA of verify-to-done latency
+exceeds high_latency_us, and steps back down once depth is at or below
+low_depth and latency under half the limit, after at least `hold` seconds at
+a level. Every change is kept as an event for the run summary.
+
+While degraded, the sampled messages estimate the integrity failure rate
+of the ones that were passed unverified: summary() gives a Wilson 95%
+interval per topic and the implied upper bound on bad unverified messages.
+"""
+import math
+import random
+import threading
+import time
+
+LEVELS = ("normal", "sampling", "shedding")
+MODES = ("off", "sample", "shed")
+Z95 = 1.959964
+
+# Lower numbers are shed first
+PRIORITIES = {"therm": 2, "cam": 1, "light": 0}
+
+EVENT_FIELDS = ["Time_s", "From", "To", "Reason", "Depth", "Latency_uS"]
+OVERLOAD_FIELDS = ["Topic", "Verified", "Failures", "Sampled", "Sample_Failures", "Unverified", "Shed",
+                   "Fail_Rate_Low95_Pct", "Fail_Rate_High95_Pct", "Unverified_Bad_High95"]
+
+
+def wilson_interval(failures, n, z=Z95):
+    """(low, high) of the Wilson score interval for a binomial rate."""
+    if n == 0:
+        return 0.0, 1.0
+    p = failures / n
+    denom = 1 + z * z / n
+    centre = (p + z * z / (2 * n)) / denom
+    half = z * math.sqrt(p * (1 - p) / n + z * z / (4 * n * n)) / denom
+    return max(0.0, centre - half), min(1.0, centre + half)
+
+
+class _TopicStats:
+    def __init__(self):
+        self.verified = 0
+        self.failures = 0
+        self.sampled = 0          # verified while degraded
+        self.sample_failures = 0
+        self.unverified = 0
+        self.shed = 0
+
+
+class OverloadController:
+    def __init__(self, mode="sample", high_depth=500, low_depth=50, high_latency_us=None,
+                 sample_fraction=0.1, shed_below=1, priorities=None, hold=2.0, alpha=0.05, seed=None):
+        if mode not in MODES:
+            raise ValueError(f"Unknown overload mode '{mode}' (choose from {', '.join(MODES)})")
+        if not 0 < sample_fraction <= 1:
+            raise ValueError("Sample fraction must be in (0, 1]")
+        self.mode = mode
+        self.high_depth = high_depth
+        self.low_depth = low_depth
+        self.high_latency_us = high_latency_us
+        self.sample_fraction = sample_fraction
+        self.shed_below = shed_below
+        self.priorities = dict(PRIORITIES, **(priorities or {}))
+        self.hold = hold
+        self.alpha = alpha
+        self.level = 0
+        self.latency_us = 0.0  # EWMA
+        self.events = []
+        self.topics = {}
+        self.started = time.monotonic()
+        self._changed = self.started
+        self._max_level = {"off": 0, "sample": 1, "shed": 2}[mode]
+        self._rng = random.Random(seed)
+        self._lock = threading.Lock()
+
+    @property
+    def state(self):
+        return LEVELS[self.level]
+
+    def _stats(self, topic):
+        stats = self.topics.get(topic)
+        if stats is None:
+            stats = self.topics[topic] = _TopicStats()
+        return stats
+
+    # --- decisions ---
+    def admit(self, topic):
+        """False if `topic` is being shed; called before a payload is queued."""
+        if self.level >= 2 and self.priorities.get(topic, 0) < self.shed_below:
+            with self._lock:
+                self._stats(topic).shed += 1
+            return False
+        return True
+
+    def should_verify(self, topic):
+        return self.level == 0 or self._rng.random() < self.sample_fraction
+
+    def record(self, topic, valid, sampled=False):
+        """sampled: verified as part of a degraded-period sample (decided before verifying)."""
+        with self._lock:
+            stats = self._stats(topic)
+            stats.verified += 1
+            stats.failures += not valid
+            if sampled:
+                stats.sampled += 1
+                stats.sample_failures += not valid
+
+    def record_unverified(self, topic):
+        with self._lock:
+            self._stats(topic).unverified += 1
+
+    # --- control loop ---
+    def observe(self, depth, latency_us):
+        """Feeds one completed message's queue depth and enqueue -> done latency."""
+        self.latency_us += self.alpha * (latency_us - self.latency_us)
+        if self._max_level == 0:
+            return
+        now = time.monotonic()
+        over_latency = self.high_latency_us and self.latency_us > self.high_latency_us
+        target = self.level
+        if self.level < self._max_level:
+            if self.level == 0 and (depth >= self.high_depth or over_latency):
+                target = 1
+            elif self.level == 1 and depth >= 2 * self.high_depth:
+                target = 2
+        if target == self.level and self.level and now - self._changed >= self.hold:
+            calm_latency = not self.high_latency_us or self.latency_us < self.high_latency_us / 2
+            if depth <= self.low_depth and calm_latency:
+                target = self.level - 1
+        if target != self.level:
+            if target > self.level:
+                reason = "depth" if depth >= self.high_depth else "latency"
+            else:
+                reason = "recovered"
+            self._set_level(target, reason, depth, now)
+
+    def _set_level(self, level, reason, depth, now):
+        with self._lock:
+            self.events.append({"Time_s": f"{now - self.started:.3f}", "From": LEVELS[self.level],
+                                "To": LEVELS[level], "Reason": reason, "Depth": depth,
+                                "Latency_uS": f"{self.latency_us:.1f}"})
+            self.level = level
+            self._changed = now
+        print(f"Overload: {self.events[-1]['From']} -> {self.events[-1]['To']} "
+              f"({reason}, depth {depth}, latency {self.latency_us:.0f} us)")
+
+    # --- reporting ---
+    def summary(self):
+        """Per-topic counts with the failure-rate interval from degraded-period samples."""
+        rows = []
+        with self._lock:
+            for topic, s in sorted(self.topics.items()):
+                low, high = wilson_interval(s.sample_failures, s.sampled)
+                rows.append({
+                    "Topic": topic,
+                    "Verified": s.verified,
+                    "Failures": s.failures,
+                    "Sampled": s.sampled,
+                    "Sample_Failures": s.sample_failures,
+                    "Unverified": s.unverified,
+                    "Shed": s.shed,
+                    "Fail_Rate_Low95_Pct": f"{100 * low:.3f}" if s.sampled else "",
+                    "Fail_Rate_High95_Pct": f"{100 * high:.3f}" if s.sampled else "",
+                    "Unverified_Bad_High95": math.ceil(high * s.unverified) if s.unverified else 0,
+                })
+        return rows
+
+    def report(self):
+        print(f"--- Overload ({self.mode}, now {self.state}, {len(self.events)} level changes) ---")
+        for e in self.events:
+            print(f"  {e['Time_s']:>9}s  {e['From']:>8} -> {e['To']:<8} {e['Reason']:<9} "
+                  f"depth {e['Depth']:>6}  latency {e['Latency_uS']:>9} us")
+        for r in self.summary():
+            line = (f"  {r['Topic']:<6} verified {r['Verified']:>7}  unverified {r['Unverified']:>7}  "
+                    f"shed {r['Shed']:>7}")
+            if r["Sampled"]:
+                line += (f"  failure rate {r['Fail_Rate_Low95_Pct']}-{r['Fail_Rate_High95_Pct']}% "
+                         f"(95%, {r['Sampled']} samples) -> <= {r['Unverified_Bad_High95']} bad unverified")
+            print(line)
+
+
+def add_overload_args(parser):
+    parser.add_argument("--overload", choices=MODES, default="off",
+                        help="sample verification (sample) and also shed low-priority topics (shed) when behind")
+    parser.add_argument("--overload-depth", type=int, default=500, help="queue depth that triggers sampling")
+    parser.add_argument("--overload-latency-us", type=float, default=None,
+                        help="EWMA enqueue->done latency that triggers sampling")
+    parser.add_argument("--sample-fraction", type=float, default=0.1, help="fraction verified while overloaded")
+
+
+def overload_from_args(args):
+    if args.overload == "off":
+        return None
+    return OverloadController(args.overload, high_depth=args.overload_depth, low_depth=args.overload_depth // 10,
+                              high_latency_us=args.overload_latency_us, sample_fraction=args.sample_fraction)
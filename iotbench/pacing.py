@@ -0,0 +1,146 @@
+"""
+Deadline-based frame pacing for the Pi3 LED animations.
+
+    pacer = pacer_from_args(args)          # --pacing deadline (default) | sleep
+    ...in an animation, after drawing the frame...
+    sign_and_show(strip)
+    pacer.wait("rainbow", wait_ms)         # was: time.sleep(wait_ms / 1000.0)
+    ...at exit...
+    pacer.report()
+    pacer.write_csv(path)
+
+The animations used to sleep the full wait_ms after capture, sign, publish
+and show, so every frame took wait_ms plus the work and the strip ran slower
+than asked whenever signing was slow. In "deadline" mode each frame has a
+deadline on time.monotonic(), the previous deadline plus wait_ms, and
+wait() only sleeps for what is left of it. A frame whose work runs past its
+deadline does not sleep at all and the schedule restarts from now, so one
+slow frame is not followed by a burst of rushed ones. "sleep" mode keeps the
+old behaviour for comparison.
+
+Per animation the pacer reports the target and achieved FPS, the work time
+per frame, frames that started more than MISS_SLACK_US after their
+deadline, and jitter: how far each frame-to-frame interval was from wait_ms.
+"""
+import csv
+import time
+
+from iotbench.histogram import Histogram
+
+MODES = ("deadline", "sleep")
+MISS_SLACK_US = 1000
+
+
+class AnimationStats:
+    def __init__(self, wait_ms):
+        self.wait_ms = wait_ms
+        self.frames = 0
+        self.misses = 0
+        self.elapsed_s = 0.0   # sum of frame-to-frame intervals
+        self.intervals = 0
+        self.work_us = Histogram()
+        self.jitter_us = Histogram()
+
+    def summary(self, name):
+        fps = self.intervals / self.elapsed_s if self.elapsed_s else 0.0
+        return {
+            "Animation": name,
+            "Wait_mS": self.wait_ms,
+            "Target_FPS": f"{1000 / self.wait_ms:.1f}" if self.wait_ms else "",
+            "Achieved_FPS": f"{fps:.1f}",
+            "Frames": self.frames,
+            "Missed": self.misses,
+            "Missed_Pct": f"{100 * self.misses / self.intervals:.1f}" if self.intervals else "0.0",
+            "Work_P50_uS": round(self.work_us.percentile(0.50)),
+            "Work_P99_uS": round(self.work_us.percentile(0.99)),
+            "Jitter_P50_uS": round(self.jitter_us.percentile(0.50)),
+            "Jitter_P99_uS": round(self.jitter_us.percentile(0.99)),
+            "Jitter_Max_uS": round(self.jitter_us.max),
+        }
+
+
+class FramePacer:
+    def __init__(self, mode="deadline"):
+        if mode not in MODES:
+            raise ValueError(f"Unknown pacing mode {mode!r}")
+        self.mode = mode
+        self.stats = {}
+        self.frames = 0         # all animations, for progress readers on other threads
+        self._name = None
+        self._period = None
+        self._deadline = None   # when the frame now being drawn was due to start
+        self._started = None    # when it actually started (previous wait() return)
+
+    def wait(self, name, wait_ms):
+        """Sleep until the next frame is due; call once per frame, after show()."""
+        now = time.monotonic()
+        period = wait_ms / 1000.0
+        stats = self.stats.get((name, wait_ms))
+        if stats is None:
+            stats = self.stats[name, wait_ms] = AnimationStats(wait_ms)
+        if self._started is None:
+            # First frame ever: its work started at some unknown point before now
+            self._deadline = self._started = now
+        elif name != self._name or period != self._period:
+            # New animation or speed: its first frame started when the last one ended
+            self._deadline = self._started
+        continuing = name == self._name and period == self._period
+        self._name, self._period = name, period
+        stats.frames += 1
+        self.frames += 1
+        stats.work_us.record((now - self._started) * 1e6)
+
+        if self.mode == "sleep":
+            time.sleep(period)
+        else:
+            self._deadline += period
+            if now < self._deadline:
+                time.sleep(self._deadline - now)
+            else:
+                self._deadline = now  # overran: restart the schedule, no catch-up
+
+        started = time.monotonic()
+        if continuing:
+            interval = started - self._started
+            stats.intervals += 1
+            stats.elapsed_s += interval
+            stats.jitter_us.record(abs(interval - period) * 1e6)
+            if (interval - period) * 1e6 > MISS_SLACK_US:
+                stats.misses += 1
+        self._started = started
+
+    def summary(self):
+        return [stats.summary(name) for (name, _), stats in self.stats.items()]
+
+    def report(self):
+        rows = self.summary()
+        if not rows:
+            return
+        print(f"Frame pacing ({self.mode}):")
+        print(f"  {'Animation':<20} {'Wait':>6} {'Target':>7} {'FPS':>6} {'Frames':>7} {'Missed':>7} "
+              f"{'Work p99':>9} {'Jitter p50':>11} {'p99':>8} {'max':>8}")
+        for r in rows:
+            print(f"  {r['Animation']:<20} {r['Wait_mS']:>4}ms {r['Target_FPS']:>7} {r['Achieved_FPS']:>6} {r['Frames']:>7} "
+                  f"{r['Missed_Pct']:>6}% {r['Work_P99_uS']:>7}us {r['Jitter_P50_uS']:>9}us "
+                  f"{r['Jitter_P99_uS']:>6}us {r['Jitter_Max_uS']:>6}us")
+
+    def write_csv(self, path):
+        rows = self.summary()
+        if not rows:
+            return
+        with open(path, "w", newline="") as f:
+            writer = csv.DictWriter(f, fieldnames=["Pacing", *rows[0]])
+            writer.writeheader()
+            for r in rows:
+                writer.writerow({"Pacing": self.mode, **r})
+
+
+def add_pacing_args(parser):
+    parser.add_argument("--pacing", choices=MODES, default="deadline",
+                        help="LED frame timing: monotonic deadlines, or the old sleep after every frame")
+    parser.add_argument("--mock-leds", action="store_true",
+                        help="drive iotbench.ledstrip.MockStrip instead of rpi_ws281x")
+
+
+def pacer_from_args(args):
+    return FramePacer(args.pacing)
@@ -0,0 +1,263 @@
+"""
+Synthetic producers that publish the same payloads as the real devices.
+
+    esp32 -> therm  ASCII "t=..,h=..,p=.." every 10 ms (or --batch K binary
+                    readings per message, see iotbench.therm_batch)
+    pi3   -> light  60 x uint32 LED frames (240 B) every 20 ms
+    pi5   -> cam    H.264-shaped byte stream cut into CHUNK_SIZE pieces
+
+Used by the orchestrator so a whole matrix can run on one Linux host against a
+local Mosquitto, without the sensor, LED strip or camera attached.
+
+    python -m iotbench.producers --device pi5 --scheme ed25519 --duration 30
+"""
+import argparse
+import random
+import os
+import struct
+import time
+from collections import namedtuple
+
+import paho.mqtt.client as mqtt
+
+from iotbench.chain import add_chain_args, chain_from_args
+from iotbench.codec import FLAG_FRAME_META, FLAG_RECORD_BATCH, FRAME_META
+from iotbench.compression import Compressor, add_compression_args, compressor_from_args
+from iotbench.identity import SequenceLease, add_identity_args, sequence_from_args, signing_key_from_args
+from iotbench.ledstrip import Color
+from iotbench.resources import add_resource_args, resources_from_args
+from iotbench.schemes import add_scheme_args, scheme_from_args
+from iotbench.therm_batch import ThermBatcher
+
+# Verifier scripts relative to the repo root: `signed` takes every keyed
+# scheme via --scheme, `cid` is the IPFS variant (None if there is none)
+Device = namedtuple("Device", ["topic", "rate_hz", "signed", "cid"])
+
+DEVICES = {
+    "esp32": Device("therm", 100, "Broker/ESP32/device_level_signing/signature_verification.py", None),
+    "pi3": Device("light", 50, "Broker/Pi3/device_level_signing/pi3sign.py",
+                  "Broker/Pi3/device_level_signing/broker_IPFS.py"),
+    "pi5": Device("cam", None, "Broker/Pi5/device_level_signing/device_level_sign.py",
+                  "Broker/Pi5/device_level_signing/IPFS.py"),
+}
+
+
+def verifier_for(device, scheme):
+    """Broker script that verifies `scheme` payloads from `device`, or None."""
+    return DEVICES[device].cid if scheme == "cid" else DEVICES[device].signed
+
+
+LED_COUNT = 60
+CAM_BITRATE = 2000000
+CAM_FPS = 30
+CHUNK_SIZE = 4096
+
+
+# --- SYNTHETIC SOURCES ---
+def therm_readings(seed=None):
+    """Random-walk BME280 (temp, humidity, pressure) readings."""
+    rng = random.Random(seed)
+    t, h, p = 22.5, 31.2, 1006.2
+    while True:
+        t += rng.uniform(-0.01, 0.01)
+        h += rng.uniform(-0.01, 0.01)
+        p += rng.uniform(-0.02, 0.02)
+        yield t, h, p
+
+
+def therm_source(seed=None):
+    """therm_readings() formatted like esp_sign.ino."""
+    for t, h, p in therm_readings(seed):
+        yield f"t={t:.2f},h={h:.2f},p={p:.2f}".encode("ascii")
+
+
+def wheel(pos):
+    if pos < 85:
+        return Color(pos * 3, 255 - pos * 3, 0)
+    elif pos < 170:
+        pos -= 85
+        return Color(255 - pos * 3, 0, pos * 3)
+    else:
+        pos -= 170
+        return Color(0, pos * 3, 255 - pos * 3)
+
+
+def light_source(led_count=LED_COUNT):
+    """Replays the pi3sign animation loop (wipes then rainbows) as packed frames."""
+    pixels = [0] * led_count
+    pack = struct.Struct(f'<{led_count}I').pack
+    while True:
+        for color in (Color(255, 0, 0), Color(0, 255, 0), Color(0, 0, 255)):
+            for i in range(led_count):
+                pixels[i] = color
+                yield pack(*pixels)
+        for j in range(256):
+            for i in range(led_count):
+                pixels[i] = wheel((i + j) & 255)
+            yield pack(*pixels)
+        for j in range(256 * 5):
+            for i in range(led_count):
+                pixels[i] = wheel((int(i * 256 / led_count) + j) & 255)
+            yield pack(*pixels)
+
+
+def h264_frames(bitrate=CAM_BITRATE, fps=CAM_FPS, gop=30, seed=None):
+    """
+    Yields (frame_bytes, keyframe) shaped like an Annex-B H.264 stream:
+    start code, NAL header, then incompressible payload at the target bitrate.
+    """
+    rng = random.Random(seed)
+    frame_bytes = bitrate // 8 // fps
+    n = 0
+    while True:
+        keyframe = n % gop == 0
+        size = frame_bytes * 4 if keyframe else frame_bytes
+        size = max(16, int(size * rng.uniform(0.8, 1.2)))
+        nal = b"\x00\x00\x00\x01" + (b"\x65" if keyframe else b"\x41")
+        yield nal + rng.randbytes(size), keyframe
+        n += 1
+
+
+def cam_source(chunk_size=CHUNK_SIZE, bitrate=CAM_BITRATE, fps=CAM_FPS, seed=None):
+    """Fixed-size pieces of the synthetic stream, like reading the Pi5 pipe."""
+    pending = bytearray()
+    for frame, _ in h264_frames(bitrate, fps, seed=seed):
+        pending += frame
+        while len(pending) >= chunk_size:
+            yield bytes(pending[:chunk_size])
+            del pending[:chunk_size]
+
+
+def source_for(device, chunk_size=CHUNK_SIZE, seed=None):
+    if device == "esp32":
+        return therm_source(seed)
+    if device == "pi3":
+        return light_source()
+    return cam_source(chunk_size, seed=seed)
+
+
+def rate_for(device, chunk_size=CHUNK_SIZE, bitrate=CAM_BITRATE):
+    if DEVICES[device].rate_hz:
+        return DEVICES[device].rate_hz
+    return bitrate / 8 / chunk_size
+
+
+# --- MAIN LOOP ---
+def run(device, scheme, broker="localhost", port=1883, duration=30.0, warmup=0.0,
+        chunk_size=CHUNK_SIZE, count=None, seed=None, compressor=None, batch=0, flush_ms=200, sequence=False,
+        resources=None, chain=None):
+    """
+    Publishes for `duration` seconds (or `count` messages) at the device rate.
+    `scheme` is an IntegrityScheme from iotbench.schemes; `compressor` an
+    optional iotbench.compression.Compressor applied before signing. For the
+    esp32, batch=K sends K binary readings per message (flushed after
+    flush_ms at the latest) instead of one ASCII reading. sequence=True
+    prefixes each message with a signed FRAME_META (send time, counter) so
+    the broker can tell a replay from a repeated reading; pass an
+    iotbench.identity.SequenceLease instead to continue a persistent key's
+    counters. `chain` (an iotbench.chain.ChunkChain) links every message to
+    the one before it, after compression and FRAME_META. A running
+    iotbench.resources.ResourceSampler gets the sent count as its progress.
+    """
+    compressor = compressor or Compressor("none")
+    if sequence is True:
+        sequence = SequenceLease()
+    topic = DEVICES[device].topic
+    period = 1.0 / rate_for(device, chunk_size)
+    source = source_for(device, chunk_size, seed)
+    batcher = ThermBatcher(batch, flush_ms) if batch and device == "esp32" else None
+    readings = therm_readings(seed)
+
+    client = mqtt.Client(mqtt.CallbackAPIVersion.VERSION2)
+    client.connect(broker, port)
+    client.loop_start()
+    sent = 0
+    if resources:
+        resources.progress = lambda: sent
+
+    def publish(data, flags=0):
+        data, flags = compressor.compress(data), flags | compressor.flags
+        if sequence:
+            data = FRAME_META.pack(time.time_ns() // 1000, sequence.take()) + data
+            flags |= FLAG_FRAME_META
+        if chain:
+            data, flags = chain.link(data, flags)
+        client.publish(topic, scheme.encode(data, flags=flags))
+
+    # Warm-up: sign at the real rate but publish nothing, so the verifier only
+    # records steady-state messages
+    if warmup > 0:
+        print(f"Warm-up for {warmup:.1f}s...")
+        end = time.monotonic() + warmup
+        while time.monotonic() < end:
+            scheme.encode(compressor.compress(next(source)), flags=compressor.flags)
+            time.sleep(period)
+
+    if batcher:
+        print(f"Publishing {device}/{scheme.name} on '{topic}': {1 / period:.1f} readings/s "
+              f"in batches of {batch} (flush {flush_ms} ms)...")
+    else:
+        print(f"Publishing {device}/{scheme.name} on '{topic}' at {1 / period:.1f} msg/s...")
+    start = time.monotonic()
+    deadline = start
+    end = start + duration
+    while (count is None and time.monotonic() < end) or (count is not None and sent < count):
+        if batcher:
+            data = batcher.add(*next(readings), int((time.monotonic() - start) * 1000))
+            if data is not None:
+                publish(data, FLAG_RECORD_BATCH)
+                sent += 1
+        else:
+            publish(next(source))
+            sent += 1
+        deadline += period
+        delay = deadline - time.monotonic()
+        if delay > 0:
+            time.sleep(delay)
+    data = batcher.flush() if batcher and count is None else None
+    if data is not None:
+        publish(data, FLAG_RECORD_BATCH)
+        sent += 1
+
+    elapsed = time.monotonic() - start
+    print(f"Sent {sent} messages in {elapsed:.1f}s ({sent / elapsed:.1f} msg/s)")
+    time.sleep(0.5)  # let paho flush the last publishes
+    client.loop_stop()
+    client.disconnect()
+    return sent
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Publish synthetic signed device traffic.")
+    parser.add_argument("--device", choices=sorted(DEVICES), required=True)
+    add_scheme_args(parser)
+    add_compression_args(parser)
+    parser.add_argument("--broker", default="localhost")
+    parser.add_argument("--port", type=int, default=1883)
+    parser.add_argument("--duration", type=float, default=30.0, help="seconds of measured traffic")
+    parser.add_argument("--count", type=int, default=None, help="stop after N messages instead")
+    parser.add_argument("--warmup", type=float, default=0.0, help="seconds of unpublished signing first")
+    parser.add_argument("--chunk-size", type=int, default=CHUNK_SIZE, help="pi5 chunk size in bytes")
+    parser.add_argument("--seed", type=int, default=None)
+    parser.add_argument("--batch", type=int, default=0, help="esp32: binary readings per signed message (0 = ASCII)")
+    parser.add_argument("--flush-ms", type=int, default=200, help="esp32: send a partial batch after this long")
+    parser.add_argument("--sequence", action="store_true",
+                        help="sign a send time and counter into each message (replay detection)")
+    parser.add_argument("--out-dir", default=None, help="write resources_producer.csv here (default: no samples)")
+    add_chain_args(parser)
+    add_resource_args(parser)
+    add_identity_args(parser)
+    args = parser.parse_args()
+
+    resources = resources_from_args(args) if args.out_dir else None
+    scheme = scheme_from_args(args, generate=True, signing_key=signing_key_from_args(args))
+    run(args.device, scheme, args.broker, args.port, args.duration, args.warmup,
+        args.chunk_size, args.count, args.seed, compressor_from_args(args), args.batch, args.flush_ms,
+        sequence_from_args(args), resources, chain_from_args(args))
+    if resources:
+        os.makedirs(args.out_dir, exist_ok=True)
+        resources.finish(args.out_dir, "producer")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,203 @@
+"""
+Per-stage timers and an on-demand profiler for producers and verifiers.
+
+Stage timers split one message's path into named stages:
+
+    stages = StageTimer(enabled=args.stage_timers)
+    lap = stages.lap()
+    ...capture...
+    lap.mark("capture")
+    ...sign...
+    lap.mark("sign")
+
+Each mark() charges the time since the previous mark to that stage's
+Histogram. With the timers disabled, lap() hands back a shared no-op object,
+so the cost is one method call per mark.
+
+The profiler is armed with --profile and toggled with SIGUSR1 during a run
+(POSIX only; the Windows broker laptop has no SIGUSR1):
+
+    sample    a background thread samples every thread's stack and writes
+              collapsed stacks (py-spy / flamegraph.pl "folded" format)
+    cprofile  cProfile on the main thread, written as .pstats
+"""
+import collections
+import cProfile
+import csv
+import os
+import signal
+import sys
+import threading
+import time
+
+from iotbench.histogram import Histogram
+
+
+class _Lap:
+    __slots__ = ("_timer", "_start", "_last")
+
+    def __init__(self, timer):
+        self._timer = timer
+        self._start = self._last = time.perf_counter_ns()
+
+    def mark(self, stage):
+        now = time.perf_counter_ns()
+        self._timer.record(stage, (now - self._last) / 1000)
+        self._last = now
+
+    def total(self, stage):
+        """Charges everything since lap() to `stage` (e.g. the whole on_message)."""
+        self._timer.record(stage, (time.perf_counter_ns() - self._start) / 1000)
+
+
+class _NullLap:
+    __slots__ = ()
+
+    def mark(self, stage):
+        pass
+
+    def total(self, stage):
+        pass
+
+
+NULL_LAP = _NullLap()
+
+
+class StageTimer:
+    """Named stage histograms in microseconds."""
+
+    def __init__(self, enabled=True):
+        self.enabled = enabled
+        self.stages = {}
+
+    def lap(self):
+        return _Lap(self) if self.enabled else NULL_LAP
+
+    def record(self, stage, value_us):
+        if not self.enabled:
+            return
+        hist = self.stages.get(stage)
+        if hist is None:
+            hist = self.stages[stage] = Histogram()
+        hist.record(value_us)
+
+    def report(self, title="Stage timings"):
+        if not self.stages:
+            return
+        print(f"{title}:")
+        print(f"  {'Stage':<14} {'Count':>8} {'Mean us':>10} {'p50 us':>10} {'p99 us':>10} {'Max us':>10}")
+        for stage, hist in self.stages.items():
+            s = hist.summary()
+            print(f"  {stage:<14} {s['Count']:>8} {s['Mean_uS']:>10} {s['P50_uS']:>10} {s['P99_uS']:>10} {s['Max_uS']:>10}")
+
+    def write_csv(self, summary_path, histogram_path=None):
+        """One row per stage, plus (optionally) every non-empty bucket per stage."""
+        if not self.stages:
+            return
+        with open(summary_path, "w", newline="") as f:
+            writer = csv.writer(f)
+            writer.writerow(["Stage", "Count", "Mean_uS", "P50_uS", "P90_uS", "P99_uS", "Max_uS"])
+            for stage, hist in self.stages.items():
+                writer.writerow([stage, *hist.summary().values()])
+        if histogram_path:
+            with open(histogram_path, "w", newline="") as f:
+                writer = csv.writer(f)
+                writer.writerow(["Stage", "Low_uS", "High_uS", "Count"])
+                for stage, hist in self.stages.items():
+                    for low, high, n in hist.buckets():
+                        writer.writerow([stage, f"{low:.3f}", f"{high:.3f}", n])
+
+
+# --- ON-DEMAND PROFILER ---
+class SamplingProfiler:
+    """Samples all threads' Python stacks at `interval` seconds."""
+
+    def __init__(self, interval=0.005):
+        self.interval = interval
+        self.samples = collections.Counter()
+        self._stop = threading.Event()
+        self._thread = None
+
+    def _run(self):
+        me = threading.get_ident()
+        names = {}
+        while not self._stop.wait(self.interval):
+            for t in threading.enumerate():
+                names[t.ident] = t.name
+            for ident, frame in sys._current_frames().items():
+                if ident == me:
+                    continue
+                stack = []
+                while frame is not None:
+                    code = frame.f_code
+                    stack.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})")
+                    frame = frame.f_back
+                stack.append(names.get(ident, str(ident)))
+                self.samples[";".join(reversed(stack))] += 1
+
+    def start(self):
+        self.samples.clear()
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="sampler", daemon=True)
+        self._thread.start()
+
+    def stop(self, path):
+        self._stop.set()
+        self._thread.join()
+        with open(path, "w") as f:
+            for stack, n in self.samples.most_common():
+                f.write(f"{stack} {n}\n")
+
+
+class SignalProfiler:
+    """First SIGUSR1 starts profiling, the next one stops and writes a dump."""
+
+    def __init__(self, mode, out_dir, prefix="profile"):
+        self.mode = mode
+        self.out_dir = out_dir
+        self.prefix = prefix
+        self.active = False
+        self.dumps = 0
+        self._profiler = None
+
+    def install(self):
+        if not hasattr(signal, "SIGUSR1"):
+            print("Profiler: SIGUSR1 is not available on this platform; profiling disabled.")
+            return False
+        signal.signal(signal.SIGUSR1, self._toggle)
+        print(f"Profiler armed ({self.mode}): kill -USR1 {os.getpid()} to start/stop.")
+        return True
+
+    def _toggle(self, signum, frame):
+        if not self.active:
+            self._profiler = SamplingProfiler() if self.mode == "sample" else cProfile.Profile()
+            if self.mode == "sample":
+                self._profiler.start()
+            else:
+                self._profiler.enable()
+            self.active = True
+            print("Profiler: started.")
+            return
+        self.dumps += 1
+        ext = "folded" if self.mode == "sample" else "pstats"
+        path = os.path.join(self.out_dir, f"{self.prefix}_{os.getpid()}_{self.dumps}.{ext}")
+        if self.mode == "sample":
+            self._profiler.stop(path)
+        else:
+            self._profiler.disable()
+            self._profiler.dump_stats(path)
+        self.active = False
+        print(f"Profiler: wrote {path}")
+
+
+def add_profiling_args(parser):
+    parser.add_argument("--stage-timers", action="store_true", help="record per-stage timing histograms")
+    parser.add_argument("--profile", choices=["off", "sample", "cprofile"], default="off",
+                        help="arm a SIGUSR1-triggered profiler")
+
+
+def stages_from_args(args, out_dir, prefix="profile"):
+    """StageTimer per --stage-timers; also installs the signal profiler if asked."""
+    if args.profile != "off":
+        SignalProfiler(args.profile, out_dir, prefix).install()
+    return StageTimer(enabled=args.stage_timers)
@@ -0,0 +1,367 @@
+"""
+Did a change make signing or verification slower? A statistical gate
+between two benchmark runs.
+
+    python -m iotbench.regression BASELINE CANDIDATE [--threshold 5] [--alpha 0.01]
+    python -m iotbench.regression runs/A/pi5-ed25519-stress00-c4096 runs/B/pi5-ed25519-stress00-c4096
+    python -m iotbench.regression catalog:12 catalog:31 --csv regression.csv
+    python -m iotbench.regression --sessions runs/20260101-120000 runs/20260102-120000
+
+    from iotbench.regression import assert_no_regression, compare, load_side
+    assert_no_regression(["base/raw_packet_data_1.csv"], ["new/raw_packet_data_1.csv"])   # e.g. in pytest
+    result = compare(load_side(["base/"]), load_side(["new/"]))
+    print(result.table()); result.passed
+
+Each side is one or more raw per-message CSVs (or directories holding
+them, see iotbench.catalog for the layouts) or catalog:ID runs from the run
+catalog. The first --warmup messages of every run are dropped. Three
+metrics are compared: sign, verify, and e2e. e2e is the sign + verify time
+of the same message, the integrity cost it pays end to end; transport time
+is not in the raw CSVs.
+
+  * Mann-Whitney U (normal approximation, tie-corrected) tests whether
+    candidate values tend to be larger. Cliff's delta, from the same U, is
+    the effect size: the probability a candidate value beats a baseline one,
+    minus the reverse, in -1..1. |d| < 0.147 is negligible, < 0.33 small,
+    < 0.474 medium, and large above that.
+  * A moving-block bootstrap gives confidence intervals for the relative
+    change of the median and of the p99. Latencies come in runs (stalls,
+    thermal throttling, stress-ng phases), so resampling blocks of about
+    sqrt(n) consecutive messages keeps that structure. Resampling single
+    messages, like the U test's p-value, would be overconfident.
+
+A metric REGRESSED when the U test is significant at --alpha and the whole
+median CI lies above +--threshold %, or the whole p99 CI above
++--tail-threshold %. IMPROVED is the mirror image; anything else is ok. The
+gate passes when nothing regressed. Sides whose metadata (run.json or
+catalog) disagree on device, scheme, stress or chunk size are refused,
+since stress level alone moves these distributions more than most code
+changes; --allow-mismatch compares them anyway.
+"""
+import argparse
+import csv
+import math
+import os
+import random
+from collections import namedtuple
+
+from iotbench.catalog import DEFAULT_DB, connect, layout_for, read_rows, run_metadata
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+METRICS = ("sign", "verify", "e2e")
+MATCH_KEYS = ("device", "scheme", "stress", "chunk_size")
+WARMUP = 50
+CSV_FIELDS = ["Metric", "Verdict", "N_Base", "N_Cand", "Median_Base_uS", "Median_Cand_uS", "Median_Change_Pct",
+              "Median_CI_Low_Pct", "Median_CI_High_Pct", "P99_Base_uS", "P99_Cand_uS", "P99_Change_Pct",
+              "P99_CI_Low_Pct", "P99_CI_High_Pct", "P_Value", "Cliffs_Delta", "Effect"]
+
+Side = namedtuple("Side", ["samples", "meta", "sources"])  # metric -> [values], {key: value or None}, [str]
+MetricResult = namedtuple("MetricResult", [
+    "metric", "verdict", "n_base", "n_cand", "median_base", "median_cand", "median_change", "median_ci",
+    "p99_base", "p99_cand", "p99_change", "p99_ci", "p_value", "cliffs_delta", "effect"])
+
+
+# --- LOADING ---
+def _csv_files(spec):
+    if os.path.isfile(spec):
+        return [spec]
+    files = [os.path.join(d, name) for d, _, names in sorted(os.walk(spec)) for name in sorted(names)
+             if name.endswith(".csv")]
+    out = []
+    for path in files:
+        with open(path, newline="") as f:
+            if layout_for(next(csv.reader(f), [])):
+                out.append(path)
+    return out
+
+
+def _add_run(samples, rows, warmup):
+    for _, _, sign_us, verify_us, _ in rows[warmup:]:
+        samples["sign"].append(sign_us)
+        if verify_us is not None:
+            samples["verify"].append(verify_us)
+            samples["e2e"].append(sign_us + verify_us)
+
+
+def load_side(specs, warmup=WARMUP, db_path=DEFAULT_DB):
+    """Pools the runs named by `specs` (CSV files, directories, catalog:ID) into one Side."""
+    samples = {m: [] for m in METRICS}
+    metas, sources = [], []
+    db = None
+    for spec in specs:
+        if spec.startswith("catalog:"):
+            db = db or connect(db_path)
+            run_id = int(spec.split(":", 1)[1])
+            cur = db.execute(f"SELECT {', '.join(MATCH_KEYS)} FROM runs WHERE id = ?", (run_id,))
+            row = cur.fetchone()
+            if row is None:
+                raise ValueError(f"No run {run_id} in {db_path}")
+            metas.append(dict(zip(MATCH_KEYS, row)))
+            rows = db.execute("SELECT seq, size_bytes, sign_us, verify_us, valid FROM messages "
+                              "WHERE run_id = ? ORDER BY seq", (run_id,)).fetchall()
+            _add_run(samples, rows, warmup)
+            sources.append(spec)
+            continue
+        paths = _csv_files(spec)
+        if not paths:
+            raise ValueError(f"No raw per-message CSVs in {spec}")
+        for path in paths:
+            with open(path, newline="") as f:
+                layout = layout_for(next(csv.reader(f), []))
+            metas.append({k: run_metadata(path, layout[0]).get(k) for k in MATCH_KEYS})
+            _add_run(samples, list(read_rows(path, layout)), warmup)
+            sources.append(path)
+    if db:
+        db.close()
+    meta = {k: _common(m[k] for m in metas) for k in MATCH_KEYS}
+    return Side(samples, meta, sources)
+
+
+def _common(values):
+    """The value every run agrees on (ignoring unknowns), None if unknown, "mixed" if they differ."""
+    known = {v for v in values if v is not None}
+    return known.pop() if len(known) == 1 else ("mixed" if known else None)
+
+
+def mismatches(base, cand):
+    return [f"{k}: {base.meta[k]} vs {cand.meta[k]}" for k in MATCH_KEYS
+            if base.meta[k] is not None and cand.meta[k] is not None and base.meta[k] != cand.meta[k]]
+
+
+# --- STATISTICS ---
+def mann_whitney(a, b):
+    """(one-sided p-value that b tends to be larger than a, Cliff's delta of b vs a)."""
+    n1, n2 = len(a), len(b)
+    pooled = sorted([(x, 0) for x in a] + [(x, 1) for x in b])
+    n = n1 + n2
+    rank_sum_b = ties = 0.0
+    i = 0
+    while i < n:
+        j = i
+        while j + 1 < n and pooled[j + 1][0] == pooled[i][0]:
+            j += 1
+        rank = (i + j) / 2 + 1  # average rank of the tied run
+        t = j - i + 1
+        ties += t ** 3 - t
+        rank_sum_b += rank * sum(flag for _, flag in pooled[i:j + 1])
+        i = j + 1
+    u = rank_sum_b - n2 * (n2 + 1) / 2
+    delta = 2 * u / (n1 * n2) - 1
+    sigma = math.sqrt(n1 * n2 / 12 * ((n + 1) - ties / (n * (n - 1))))
+    if sigma == 0:
+        return 1.0, delta
+    z = (u - n1 * n2 / 2 - 0.5) / sigma  # continuity correction
+    return 0.5 * math.erfc(z / math.sqrt(2)), delta
+
+
+def effect_label(delta):
+    d = abs(delta)
+    return "negligible" if d < 0.147 else "small" if d < 0.33 else "medium" if d < 0.474 else "large"
+
+
+def _quantile(sorted_values, q):
+    """Linear-interpolated quantile of an already sorted list (numpy's default method)."""
+    pos = q * (len(sorted_values) - 1)
+    lo = int(pos)
+    hi = min(lo + 1, len(sorted_values) - 1)
+    return sorted_values[lo] + (sorted_values[hi] - sorted_values[lo]) * (pos - lo)
+
+
+def block_bootstrap(values, quantiles, n_boot, seed, block=None):
+    """[n_boot x len(quantiles)] quantiles of moving-block resamples of `values`."""
+    n = len(values)
+    block = block or max(1, round(math.sqrt(n)))
+    blocks = math.ceil(n / block)
+    if np is not None:
+        x = np.asarray(values, dtype=float)
+        rng = np.random.default_rng(seed)
+        out = np.empty((n_boot, len(quantiles)))
+        batch = max(1, 2_000_000 // n)
+        offsets = np.arange(block)
+        for start in range(0, n_boot, batch):
+            m = min(batch, n_boot - start)
+            starts = rng.integers(0, n - block + 1, size=(m, blocks))
+            idx = (starts[:, :, None] + offsets).reshape(m, -1)[:, :n]
+            out[start:start + m] = np.quantile(x[idx], quantiles, axis=1).T
+        return out.tolist()
+    rng = random.Random(seed)
+    out = []
+    for _ in range(n_boot):
+        sample = []
+        for _ in range(blocks):
+            s = rng.randrange(n - block + 1)
+            sample.extend(values[s:s + block])
+        sample = sorted(sample[:n])
+        out.append([_quantile(sample, q) for q in quantiles])
+    return out
+
+
+def _change_ci(base_boot, cand_boot, col, level):
+    changes = sorted(c[col] / b[col] - 1 for b, c in zip(base_boot, cand_boot) if b[col])
+    tail = (1 - level) / 2
+    return _quantile(changes, tail), _quantile(changes, 1 - tail)
+
+
+def compare_metric(metric, base, cand, threshold=0.05, tail_threshold=0.20, alpha=0.01, level=0.95,
+                   n_boot=1000, seed=1):
+    sorted_base, sorted_cand = sorted(base), sorted(cand)
+    med_b, med_c = _quantile(sorted_base, 0.5), _quantile(sorted_cand, 0.5)
+    p99_b, p99_c = _quantile(sorted_base, 0.99), _quantile(sorted_cand, 0.99)
+    base_boot = block_bootstrap(base, (0.5, 0.99), n_boot, seed)
+    cand_boot = block_bootstrap(cand, (0.5, 0.99), n_boot, seed + 1)
+    median_ci = _change_ci(base_boot, cand_boot, 0, level)
+    p99_ci = _change_ci(base_boot, cand_boot, 1, level)
+    p_slower, delta = mann_whitney(base, cand)
+    p_faster = 1 - p_slower
+    if p_slower < alpha and (median_ci[0] > threshold or p99_ci[0] > tail_threshold):
+        verdict = "REGRESSED"
+    elif p_faster < alpha and (median_ci[1] < -threshold or p99_ci[1] < -tail_threshold):
+        verdict = "IMPROVED"
+    else:
+        verdict = "ok"
+    return MetricResult(metric, verdict, len(base), len(cand), med_b, med_c, med_c / med_b - 1 if med_b else 0.0,
+                        median_ci, p99_b, p99_c, p99_c / p99_b - 1 if p99_b else 0.0, p99_ci,
+                        min(p_slower, p_faster) * 2, delta, effect_label(delta))
+
+
+class Comparison:
+    def __init__(self, results, base, cand, warnings=()):
+        self.results = results
+        self.base = base
+        self.cand = cand
+        self.warnings = list(warnings)
+
+    @property
+    def passed(self):
+        return not any(r.verdict == "REGRESSED" for r in self.results)
+
+    def rows(self):
+        pct = lambda x: f"{100 * x:.2f}"
+        return [dict(zip(CSV_FIELDS, [
+            r.metric, r.verdict, r.n_base, r.n_cand, f"{r.median_base:.1f}", f"{r.median_cand:.1f}",
+            pct(r.median_change), pct(r.median_ci[0]), pct(r.median_ci[1]), f"{r.p99_base:.1f}",
+            f"{r.p99_cand:.1f}", pct(r.p99_change), pct(r.p99_ci[0]), pct(r.p99_ci[1]), f"{r.p_value:.2e}",
+            f"{r.cliffs_delta:.3f}", r.effect])) for r in self.results]
+
+    def table(self):
+        lines = [f"{'Metric':<7} {'Verdict':<10} {'median base':>12} {'cand':>9} {'change [CI]':>24} "
+                 f"{'p99 base':>9} {'cand':>9} {'change [CI]':>24} {'p (2-sided)':>11} {'Cliff d':>8}"]
+        for r in self.results:
+            lines.append(
+                f"{r.metric:<7} {r.verdict:<10} {r.median_base:>10.1f}us {r.median_cand:>7.1f}us "
+                f"{_fmt_change(r.median_change, r.median_ci):>24} {r.p99_base:>7.0f}us {r.p99_cand:>7.0f}us "
+                f"{_fmt_change(r.p99_change, r.p99_ci):>24} {r.p_value:>11.1e} {r.cliffs_delta:>+8.3f} {r.effect}")
+        lines += [f"WARNING: {w}" for w in self.warnings]
+        lines.append("PASS" if self.passed else "FAIL: " + ", ".join(r.metric for r in self.results
+                                                                      if r.verdict == "REGRESSED"))
+        return "\n".join(lines)
+
+    def write_csv(self, path, extra=None):
+        """One row per metric; `extra` columns (e.g. the cell name) go in front."""
+        extra = extra or {}
+        with open(path, "w", newline="") as f:
+            writer = csv.DictWriter(f, fieldnames=[*extra, *CSV_FIELDS])
+            writer.writeheader()
+            for row in self.rows():
+                writer.writerow({**extra, **row})
+
+
+def _fmt_change(change, ci):
+    return f"{100 * change:+.1f}% [{100 * ci[0]:+.1f}, {100 * ci[1]:+.1f}]"
+
+
+def compare(base, cand, metrics=METRICS, allow_mismatch=False, **kwargs):
+    """Compares two Sides (see load_side); kwargs go to compare_metric (threshold, alpha, n_boot, ...)."""
+    problems = mismatches(base, cand)
+    if problems and not allow_mismatch:
+        raise ValueError("Runs are not comparable (" + "; ".join(problems) + "); use allow_mismatch to force")
+    results = []
+    for metric in metrics:
+        a, b = base.samples[metric], cand.samples[metric]
+        if len(a) < 2 or len(b) < 2:
+            continue
+        results.append(compare_metric(metric, a, b, **kwargs))
+    return Comparison(results, base, cand, problems)
+
+
+def assert_no_regression(base_specs, cand_specs, warmup=WARMUP, **kwargs):
+    """For pytest and scripts: raises AssertionError with the table if any metric regressed."""
+    result = compare(load_side(base_specs, warmup), load_side(cand_specs, warmup), **kwargs)
+    assert result.passed, "\n" + result.table()
+    return result
+
+
+def compare_sessions(base_dir, cand_dir, warmup=WARMUP, **kwargs):
+    """[(cell, Comparison)] for every orchestrator cell present in both session directories."""
+    out = []
+    for cell in sorted(os.listdir(cand_dir)):
+        base_cell, cand_cell = os.path.join(base_dir, cell), os.path.join(cand_dir, cell)
+        if not (os.path.isdir(base_cell) and os.path.isdir(cand_cell)):
+            continue
+        try:
+            out.append((cell, compare(load_side([base_cell], warmup), load_side([cand_cell], warmup), **kwargs)))
+        except ValueError as e:
+            print(f"{cell}: skipped ({e})")
+    return out
+
+
+def write_sessions_csv(path, comparisons):
+    with open(path, "w", newline="") as f:
+        writer = csv.DictWriter(f, fieldnames=["Cell", *CSV_FIELDS])
+        writer.writeheader()
+        for cell, result in comparisons:
+            for row in result.rows():
+                writer.writerow({"Cell": cell, **row})
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Pass/fail regression gate between two benchmark runs.")
+    parser.add_argument("base", nargs="?", help="baseline: CSV, directory or catalog:ID (comma-separated for several)")
+    parser.add_argument("cand", nargs="?", help="candidate, same forms")
+    parser.add_argument("--sessions", nargs=2, metavar=("BASE_SESSION", "CAND_SESSION"),
+                        help="compare every orchestrator cell the two session directories share")
+    parser.add_argument("--metrics", nargs="+", choices=METRICS, default=list(METRICS))
+    parser.add_argument("--threshold", type=float, default=5.0, help="median change that counts, in %%")
+    parser.add_argument("--tail-threshold", type=float, default=20.0, help="p99 change that counts, in %%")
+    parser.add_argument("--alpha", type=float, default=0.01, help="Mann-Whitney significance level")
+    parser.add_argument("--level", type=float, default=0.95, help="bootstrap confidence level")
+    parser.add_argument("--boot", type=int, default=1000, help="bootstrap resamples")
+    parser.add_argument("--warmup", type=int, default=WARMUP, help="messages dropped from the start of each run")
+    parser.add_argument("--allow-mismatch", action="store_true", help="compare runs with different stress/scheme/...")
+    parser.add_argument("--db", default=DEFAULT_DB, help="run catalog for catalog:ID")
+    parser.add_argument("--csv", default=None, help="write the per-metric rows here")
+    args = parser.parse_args()
+    kwargs = dict(metrics=args.metrics, threshold=args.threshold / 100, tail_threshold=args.tail_threshold / 100,
+                  alpha=args.alpha, level=args.level, n_boot=args.boot, allow_mismatch=args.allow_mismatch)
+
+    if args.sessions:
+        comparisons = compare_sessions(*args.sessions, warmup=args.warmup, **kwargs)
+        for cell, result in comparisons:
+            print(f"=== {cell} ===\n{result.table()}")
+        if args.csv:
+            write_sessions_csv(args.csv, comparisons)
+        failed = [cell for cell, result in comparisons if not result.passed]
+        print(f"{len(comparisons) - len(failed)}/{len(comparisons)} cells pass" + (f"; FAILED: {', '.join(failed)}"
+                                                                                    if failed else ""))
+        raise SystemExit(1 if failed else 0)
+    if not (args.base and args.cand):
+        parser.error("give BASE and CAND, or --sessions")
+    try:
+        base = load_side(args.base.split(","), args.warmup, args.db)
+        cand = load_side(args.cand.split(","), args.warmup, args.db)
+        result = compare(base, cand, **kwargs)
+    except ValueError as e:
+        raise SystemExit(f"Error: {e}")
+    print(f"Baseline:  {len(base.sources)} run(s) {base.meta}\nCandidate: {len(cand.sources)} run(s) {cand.meta}")
+    print(result.table())
+    if args.csv:
+        result.write_csv(args.csv)
+    raise SystemExit(0 if result.passed else 1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,209 @@
+"""
+Replay detection for payloads whose tag already verified, in constant memory.
+
+    replay = replay_from_args(args)   # None unless --replay-window is set
+    ...after verify...
+    if is_valid and replay and replay.seen(frame):
+        metrics.observe_replay(len(payload))
+        return                        # not counted, buffered or written again
+
+A verified payload re-sent verbatim passes verify, so something other than
+the signature has to remember what was already accepted:
+
+  * Frames with FLAG_FRAME_META carry a signed sequence number: the Pi5's
+    per-frame payloads always, therm and light when the producer runs with
+    --sequence. Each (source, key) gets an exact sliding window over the last
+    SEQ_WINDOW numbers, as in IPsec/DTLS anti-replay: a number already seen,
+    or one older than the window, is a replay. A fresh key per run starts a
+    new window; a persistent key (--device-key, iotbench.identity) resumes
+    its counter from a SequenceLease instead of 0. At most MAX_KEYS
+    windows are kept (least recently used dropped). `source` is the
+    caller's name for the sender (mixed_broker passes the topic). The
+    key alone is not enough: hmac-sha256, blake2b and cid payloads carry
+    no key, so every device on those schemes would share one window.
+  * Everything else (plain therm readings, LED frames, 4 KiB pipe chunks) is
+    identified by a digest of source + key + tag and looked up in a time-rotated pair
+    of Bloom filters. The current filter takes new digests; every
+    window_s seconds (or once it holds `capacity` digests) it becomes the
+    previous one and a cleared filter takes over. A digest is remembered for
+    between one and two windows, memory is fixed at two filters, and each
+    filter is sized for fp_rate / 2 so a fresh payload is misreported as a
+    replay with probability at most about fp_rate.
+
+Without a signed counter a replay and a legitimately repeated message are
+the same bytes: identical ASCII therm readings and the LED animation's
+repeating rainbow frames (Ed25519 and HMAC tags are deterministic) count as
+replays on the digest path. Run those producers with --sequence; batched
+therm records carry a signed base time and do not repeat either.
+"""
+import collections
+import hashlib
+import math
+import time
+
+from iotbench.codec import FLAG_FRAME_META, split_frame_meta
+
+SEQ_WINDOW = 1024
+MAX_KEYS = 1024
+LN2 = math.log(2)
+
+
+class SlidingBloom:
+    """Two Bloom filters over 16-byte digests; the older one is dropped each rotation."""
+
+    def __init__(self, capacity, fp_rate, window_s):
+        if not 0 < fp_rate < 1:
+            raise ValueError("False-positive rate must be in (0, 1)")
+        self.capacity = capacity
+        self.window_s = window_s
+        per_filter = fp_rate / 2
+        self.m = max(8, math.ceil(-capacity * math.log(per_filter) / LN2 ** 2))
+        self.k = max(1, round(self.m / capacity * LN2))
+        self.current = bytearray((self.m + 7) // 8)
+        self.previous = bytearray(len(self.current))
+        self.count = 0
+        self.rotations = 0
+        self.capacity_rotations = 0
+        self._rotated = None  # first check_and_add() starts the clock
+
+    @property
+    def nbytes(self):
+        return 2 * len(self.current)
+
+    def _positions(self, digest):
+        # Kirsch-Mitzenmacher double hashing: k positions from two 64-bit halves
+        h1 = int.from_bytes(digest[:8], "little")
+        h2 = int.from_bytes(digest[8:16], "little") | 1
+        m = self.m
+        return [(h1 + i * h2) % m for i in range(self.k)]
+
+    def _rotate(self, now):
+        self.previous, self.current = self.current, self.previous
+        self.current[:] = bytes(len(self.current))
+        self.count = 0
+        self.rotations += 1
+        self._rotated = now
+
+    def check_and_add(self, digest, now=None):
+        """True if `digest` was (probably) seen within the window; adds it either way."""
+        now = time.monotonic() if now is None else now
+        if self._rotated is None:
+            self._rotated = now
+        if now - self._rotated >= self.window_s:
+            self._rotate(now)
+        elif self.count >= self.capacity:
+            self.capacity_rotations += 1
+            self._rotate(now)
+        current, previous = self.current, self.previous
+        in_current = in_previous = True
+        for pos in self._positions(digest):
+            byte, bit = pos >> 3, 1 << (pos & 7)
+            if not current[byte] & bit:
+                in_current = False
+                current[byte] |= bit
+            if in_previous and not previous[byte] & bit:
+                in_previous = False
+        if not in_current:
+            self.count += 1
+        return in_current or in_previous
+
+    def fp_estimate(self):
+        """Probability a fresh digest hits either filter at their current fill."""
+        def fill(bits):
+            return int.from_bytes(bits, "little").bit_count() / self.m
+        miss = (1 - fill(self.current) ** self.k) * (1 - fill(self.previous) ** self.k)
+        return 1 - miss
+
+
+class ReplayDetector:
+    def __init__(self, window_s=60.0, capacity=100_000, fp_rate=1e-4, seq_window=SEQ_WINDOW, max_keys=MAX_KEYS):
+        self.bloom = SlidingBloom(capacity, fp_rate, window_s)
+        self.seq_window = seq_window
+        self.max_keys = max_keys
+        self._full = (1 << seq_window) - 1
+        self._seqs = collections.OrderedDict()  # (source, key bytes) -> [highest seq, bitmask]
+        self.checked = 0
+        self.seq_replays = 0
+        self.seq_stale = 0
+        self.digest_replays = 0
+
+    @property
+    def replays(self):
+        return self.seq_replays + self.seq_stale + self.digest_replays
+
+    def seen(self, frame, now=None, source=""):
+        """
+        True if this verified frame is a replay; call once per payload,
+        after verify. `source` names the sender when one verifier serves
+        several devices.
+        """
+        self.checked += 1
+        if frame.flags & FLAG_FRAME_META:
+            _, seq, _ = split_frame_meta(frame)
+            return self._seen_seq((source, bytes(frame.key)), seq)
+        h = hashlib.blake2b(source.encode(), digest_size=16)
+        h.update(frame.key)
+        h.update(frame.tag)
+        if self.bloom.check_and_add(h.digest(), now):
+            self.digest_replays += 1
+            return True
+        return False
+
+    def _seen_seq(self, key, seq):
+        window = self._seqs.get(key)
+        if window is None:
+            if len(self._seqs) >= self.max_keys:
+                self._seqs.popitem(last=False)
+            self._seqs[key] = [seq, 1]
+            return False
+        self._seqs.move_to_end(key)
+        highest, mask = window
+        if seq > highest:
+            window[0] = seq
+            window[1] = ((mask << (seq - highest)) | 1) & self._full
+            return False
+        offset = highest - seq
+        if offset >= self.seq_window:
+            self.seq_stale += 1
+            return True
+        bit = 1 << offset
+        if mask & bit:
+            self.seq_replays += 1
+            return True
+        window[1] = mask | bit
+        return False
+
+    def summary(self):
+        return {
+            "Checked": self.checked,
+            "Replays": self.replays,
+            "Seq_Replays": self.seq_replays,
+            "Seq_Stale": self.seq_stale,
+            "Digest_Replays": self.digest_replays,
+            "Rotations": self.bloom.rotations,
+            "Capacity_Rotations": self.bloom.capacity_rotations,
+            "Filter_KiB": f"{self.bloom.nbytes / 1024:.1f}",
+            "Est_FP_Pct": f"{100 * self.bloom.fp_estimate():.4f}",
+        }
+
+    def report(self):
+        s = self.summary()
+        print(f"Replays:         {s['Replays']} of {s['Checked']} verified "
+              f"(sequence {s['Seq_Replays']}, stale {s['Seq_Stale']}, digest {s['Digest_Replays']})")
+        print(f"Replay filter:   {s['Filter_KiB']} KiB, {s['Rotations']} rotations "
+              f"({s['Capacity_Rotations']} at capacity), est. false-positive {s['Est_FP_Pct']}%")
+
+
+def add_replay_args(parser):
+    parser.add_argument("--replay-window", type=float, default=0,
+                        help="seconds a verified payload is remembered for replay detection (0 = off)")
+    parser.add_argument("--replay-capacity", type=int, default=100_000,
+                        help="digests per window before the filter rotates early")
+    parser.add_argument("--replay-fp", type=float, default=1e-4,
+                        help="target rate of fresh payloads misreported as replays")
+
+
+def replay_from_args(args):
+    if not args.replay_window:
+        return None
+    return ReplayDetector(args.replay_window, args.replay_capacity, args.replay_fp)
@@ -0,0 +1,263 @@
+"""
+Background resource sampler for producers and verifiers: process and system
+CPU, RSS, context switches, CPU frequency and SoC temperature, sampled at a
+fixed rate alongside the run.
+
+    resources = resources_from_args(args, progress=lambda: len(metrics_buffer))
+    ...run...
+    if resources:
+        resources.finish(out_dir, RUN_ID)   # resources_N.csv + resources_summary_N.csv
+
+Each sample carries the wall clock (Unix_uS) and the caller's message count
+at that moment (Messages), so a row lines up with raw_packet_data_N.csv:
+messages Messages_prev+1 .. Messages arrived during that interval. CPU
+percentages and context switches are deltas over the interval. Proc_CPU_Pct
+is per core (a busy process with two threads can show 200), Sys_CPU_Pct is
+the whole machine.
+
+Sources: getrusage (process CPU, context switches), /proc/stat (system CPU,
+iowait), /proc/self/statm (RSS), cpufreq scaling_cur_freq or /proc/cpuinfo
+(MHz), thermal_zone*/temp (hottest zone) and, on a Raspberry Pi, the
+firmware's get_throttled bits (under-voltage, frequency capped, throttled,
+soft temperature limit). Anything a platform lacks is left blank; on the
+Windows broker laptop only process CPU is recorded.
+"""
+import csv
+import glob
+import os
+import statistics
+import threading
+import time
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+PROC_STAT = "/proc/stat"
+PROC_STATM = "/proc/self/statm"
+CPUFREQ_GLOB = "/sys/devices/system/cpu/cpu[0-9]*/cpufreq/scaling_cur_freq"
+THERMAL_GLOB = "/sys/class/thermal/thermal_zone*/temp"
+PI_THROTTLED = "/sys/devices/platform/soc/soc:firmware/get_throttled"
+
+FIELDS = ["Elapsed_s", "Unix_uS", "Messages", "Proc_CPU_Pct", "Sys_CPU_Pct", "IOWait_Pct", "RSS_KB",
+          "Vol_CtxSw", "Invol_CtxSw", "CPU_MHz", "Temp_C", "Throttled", "Load_1m", "Sample_uS"]
+SUMMARY_FIELDS = ["Samples", "Duration_s", "Proc_CPU_Mean_Pct", "Proc_CPU_Max_Pct", "Sys_CPU_Mean_Pct",
+                  "Sys_CPU_Max_Pct", "IOWait_Mean_Pct", "RSS_Max_KB", "Vol_CtxSw", "Invol_CtxSw",
+                  "Invol_CtxSw_per_s", "CPU_MHz_Min", "CPU_MHz_Mean", "CPU_MHz_Max", "Temp_Max_C",
+                  "Throttled_Samples", "Sample_Mean_uS"]
+
+
+def _read(path):
+    try:
+        with open(path) as f:
+            return f.read()
+    except OSError:
+        return None
+
+
+def _system_cpu():
+    """(busy, iowait, total) jiffies from /proc/stat's aggregate line, or None."""
+    text = _read(PROC_STAT)
+    if not text:
+        return None
+    values = [int(v) for v in text.split("\n", 1)[0].split()[1:]]
+    idle, iowait = values[3], values[4] if len(values) > 4 else 0
+    total = sum(values[:8])  # guest time is already counted in user
+    return total - idle - iowait, iowait, total
+
+
+def _rss_kb():
+    text = _read(PROC_STATM)
+    if text:
+        return int(text.split()[1]) * os.sysconf("SC_PAGE_SIZE") // 1024
+    return None
+
+
+def _cpu_mhz(freq_paths):
+    if freq_paths:
+        khz = [int(v) for v in map(_read, freq_paths) if v and v.strip().isdigit()]
+        if khz:
+            return statistics.fmean(khz) / 1000
+    text = _read("/proc/cpuinfo")
+    if text:
+        mhz = [float(line.split(":")[1]) for line in text.splitlines() if line.startswith("cpu MHz")]
+        if mhz:
+            return statistics.fmean(mhz)
+    return None
+
+
+def _temp_c(zone_paths):
+    temps = [int(v) for v in map(_read, zone_paths) if v and v.strip().lstrip("-").isdigit()]
+    return max(temps) / 1000 if temps else None
+
+
+def _throttled():
+    text = _read(PI_THROTTLED)
+    return int(text.strip(), 16) if text and text.strip() else None
+
+
+def _process_times():
+    """(user + system CPU seconds, voluntary, involuntary context switches)."""
+    if resource is None:
+        t = os.times()
+        return t.user + t.system, None, None
+    r = resource.getrusage(resource.RUSAGE_SELF)
+    return r.ru_utime + r.ru_stime, r.ru_nvcsw, r.ru_nivcsw
+
+
+def _delta(new, old):
+    return new - old if new is not None and old is not None else None
+
+
+class ResourceSampler:
+    """Samples every 1/hz seconds on a daemon thread until stop()."""
+
+    def __init__(self, hz=1.0, progress=None):
+        self.interval = 1.0 / hz
+        self.progress = progress
+        self.rows = []
+        self._freq_paths = sorted(glob.glob(CPUFREQ_GLOB))
+        self._zone_paths = sorted(glob.glob(THERMAL_GLOB))
+        self._stop = threading.Event()
+        self._thread = None
+
+    def _snapshot(self):
+        return time.monotonic(), _process_times(), _system_cpu()
+
+    def _sample(self, start, prev):
+        t0 = time.perf_counter_ns()
+        now, (cpu_s, vol, invol), system = current = self._snapshot()
+        last, (last_cpu_s, last_vol, last_invol), last_system = prev
+        wall = now - last
+        sys_pct = iowait_pct = None
+        if system and last_system and system[2] > last_system[2]:
+            jiffies = system[2] - last_system[2]
+            sys_pct = 100 * (system[0] - last_system[0]) / jiffies
+            iowait_pct = 100 * (system[1] - last_system[1]) / jiffies
+        temp, mhz, throttled = _temp_c(self._zone_paths), _cpu_mhz(self._freq_paths), _throttled()
+        self.rows.append([
+            round(now - start, 3),
+            time.time_ns() // 1000,
+            self.progress() if self.progress else "",
+            round(100 * (cpu_s - last_cpu_s) / wall, 1) if wall > 0 else "",
+            "" if sys_pct is None else round(sys_pct, 1),
+            "" if iowait_pct is None else round(iowait_pct, 1),
+            _rss_kb() or "",
+            _delta(vol, last_vol) if vol is not None else "",
+            _delta(invol, last_invol) if invol is not None else "",
+            "" if mhz is None else round(mhz),
+            "" if temp is None else round(temp, 1),
+            "" if throttled is None else f"0x{throttled:x}",
+            round(os.getloadavg()[0], 2) if hasattr(os, "getloadavg") else "",
+            round((time.perf_counter_ns() - t0) / 1000, 1),
+        ])
+        return current
+
+    def _run(self):
+        start = time.monotonic()
+        prev = self._snapshot()
+        deadline = start
+        while True:
+            deadline += self.interval
+            if self._stop.wait(max(0.0, deadline - time.monotonic())):
+                break
+            prev = self._sample(start, prev)
+        self._sample(start, prev)  # the tail since the last tick
+
+    def start(self):
+        self.rows.clear()
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="resources", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        if self._thread:
+            self._stop.set()
+            self._thread.join()
+            self._thread = None
+
+    def summary(self):
+        def column(name):
+            i = FIELDS.index(name)
+            return [row[i] for row in self.rows if row[i] != ""]
+
+        def stat(fn, name, digits=1):
+            values = column(name)
+            if not values:
+                return ""
+            return round(fn(values), digits) if digits else round(fn(values))
+
+        duration = self.rows[-1][0] if self.rows else 0
+        invol = column("Invol_CtxSw")
+        return dict(zip(SUMMARY_FIELDS, [
+            len(self.rows),
+            duration,
+            stat(statistics.fmean, "Proc_CPU_Pct"),
+            stat(max, "Proc_CPU_Pct"),
+            stat(statistics.fmean, "Sys_CPU_Pct"),
+            stat(max, "Sys_CPU_Pct"),
+            stat(statistics.fmean, "IOWait_Pct"),
+            stat(max, "RSS_KB", 0),
+            stat(sum, "Vol_CtxSw", 0),
+            stat(sum, "Invol_CtxSw", 0),
+            round(sum(invol) / duration, 1) if invol and duration else "",
+            stat(min, "CPU_MHz", 0),
+            stat(statistics.fmean, "CPU_MHz", 0),
+            stat(max, "CPU_MHz", 0),
+            stat(max, "Temp_C"),
+            sum(1 for v in column("Throttled") if int(v, 16)) if column("Throttled") else "",
+            stat(statistics.fmean, "Sample_uS"),
+        ]))
+
+    def report(self, title="Resources"):
+        s = self.summary()
+        if not s["Samples"]:
+            return
+        print(f"{title} ({s['Samples']} samples over {s['Duration_s']}s):")
+        print(f"  Process CPU {s['Proc_CPU_Mean_Pct']}% mean, {s['Proc_CPU_Max_Pct']}% max | "
+              f"System CPU {s['Sys_CPU_Mean_Pct']}% mean, {s['Sys_CPU_Max_Pct']}% max | RSS {s['RSS_Max_KB']} KB max")
+        print(f"  Context switches: {s['Vol_CtxSw']} voluntary, {s['Invol_CtxSw']} involuntary "
+              f"({s['Invol_CtxSw_per_s']}/s)")
+        thermal = []
+        if s["CPU_MHz_Mean"] != "":
+            thermal.append(f"CPU {s['CPU_MHz_Min']}-{s['CPU_MHz_Max']} MHz")
+        if s["Temp_Max_C"] != "":
+            thermal.append(f"Temp {s['Temp_Max_C']} C max")
+        if s["Throttled_Samples"] != "":
+            thermal.append(f"Throttled samples: {s['Throttled_Samples']}")
+        if thermal:
+            print(f"  {' | '.join(thermal)}")
+
+    def write_csv(self, path, summary_path=None):
+        with open(path, "w", newline="") as f:
+            writer = csv.writer(f)
+            writer.writerow(FIELDS)
+            writer.writerows(self.rows)
+        if summary_path:
+            with open(summary_path, "w", newline="") as f:
+                writer = csv.writer(f)
+                writer.writerow(SUMMARY_FIELDS)
+                writer.writerow(self.summary().values())
+
+    def finish(self, out_dir, suffix=None):
+        """Stops, prints the summary and writes resources[_<suffix>].csv and resources_summary[_<suffix>].csv."""
+        self.stop()
+        self.report()
+        tail = f"_{suffix}" if suffix is not None else ""
+        path = os.path.join(out_dir, f"resources{tail}.csv")
+        self.write_csv(path, os.path.join(out_dir, f"resources_summary{tail}.csv"))
+        return path
+
+
+def add_resource_args(parser):
+    parser.add_argument("--resource-hz", type=float, default=1.0,
+                        help="resource samples per second: CPU, RSS, context switches, MHz, temperature (0 = off)")
+
+
+def resources_from_args(args, progress=None):
+    """A started ResourceSampler, or None with --resource-hz 0."""
+    if args.resource_hz <= 0:
+        return None
+    return ResourceSampler(args.resource_hz, progress).start()
@@ -0,0 +1,241 @@
+"""
+Per-device queues with deficit round-robin dispatch to verification workers.
+
+    sched = FairScheduler(handler, workers=2)
+    sched.add_queue("therm", weight=1, slo_us=2000)
+    sched.add_queue("cam", weight=1, slo_us=50000)
+    ...in on_message...
+    sched.submit(msg.topic, payload)
+    ...
+    sched.close()
+    sched.report()
+
+handler(name, item) runs on a worker thread. With policy="drr" every
+non-empty queue gets quantum * weight cost units per round, so a burst of
+camera chunks can only delay a thermometer reading by about one round
+instead of the whole burst. Weights start at 1: a weight-0 queue would never
+build up credit. policy="fifo" serves everything in arrival order (the old
+single-callback behaviour) for comparison.
+
+A queue is handed to one worker at a time: while a worker runs one of its
+items the others skip it, so each queue's items are handled in the order
+they were submitted (mixed_broker appends camera chunks to the .h264 as
+they are verified). More workers spread different queues, not one queue.
+
+Cost defaults to the payload size plus BASE_COST, which stands in for the
+fixed part of a verify (key decode, point arithmetic), so many tiny
+messages are not treated as free.
+
+Each queue keeps wait (enqueue -> handler start) and latency (enqueue ->
+handler done) histograms and counts latencies over its SLO. An optional
+iotbench.overload.OverloadController sees every completion (queue depth and
+latency) and can refuse payloads at submit() while it is shedding.
+"""
+import collections
+import threading
+import time
+
+from iotbench.histogram import Histogram
+
+BASE_COST = 256
+QUANTUM = 4096 + BASE_COST  # one 4 KiB camera chunk per round at weight 1
+POLICIES = ("drr", "fifo")
+
+
+class _Queue:
+    def __init__(self, name, weight, slo_us):
+        self.name = name
+        self.weight = weight
+        self.slo_us = slo_us
+        self.items = collections.deque()
+        self.deficit = 0
+        self.topped_up = False
+        self.busy = False  # a worker is running one of its items
+        self.enqueued = 0
+        self.done = 0
+        self.slo_misses = 0
+        self.max_depth = 0
+        self.wait_us = Histogram()
+        self.latency_us = Histogram()
+
+    def summary(self):
+        return {
+            "Queue": self.name,
+            "Weight": self.weight,
+            "Done": self.done,
+            "Max_Depth": self.max_depth,
+            "Wait_P50_uS": f"{self.wait_us.percentile(0.50):.1f}",
+            "Wait_P99_uS": f"{self.wait_us.percentile(0.99):.1f}",
+            "Latency_P50_uS": f"{self.latency_us.percentile(0.50):.1f}",
+            "Latency_P99_uS": f"{self.latency_us.percentile(0.99):.1f}",
+            "Latency_Max_uS": f"{self.latency_us.max:.1f}",
+            "SLO_uS": self.slo_us or "",
+            "SLO_Miss_Pct": f"{100 * self.slo_misses / self.done:.2f}" if self.slo_us and self.done else "",
+        }
+
+    def to_dict(self):
+        return {"name": self.name, "weight": self.weight, "slo_us": self.slo_us, "done": self.done,
+                "slo_misses": self.slo_misses, "max_depth": self.max_depth,
+                "wait_us": self.wait_us.to_dict(), "latency_us": self.latency_us.to_dict()}
+
+
+class FairScheduler:
+    """Named queues drained by `workers` threads in deficit round-robin (or FIFO) order."""
+
+    def __init__(self, handler, workers=1, policy="drr", quantum=QUANTUM, controller=None):
+        if policy not in POLICIES:
+            raise ValueError(f"Unknown scheduling policy '{policy}' (choose from {', '.join(POLICIES)})")
+        self.handler = handler
+        self.policy = policy
+        self.quantum = quantum
+        self.controller = controller
+        self.queues = {}
+        self._queued = 0
+        self._active = collections.deque()  # drr: queues with items, in round order
+        self._fifo = collections.deque()    # fifo: (queue, item, cost, t_enqueue)
+        self._cond = threading.Condition()
+        self._closing = False
+        self._threads = [threading.Thread(target=self._worker, name=f"verify-{i}", daemon=True)
+                         for i in range(workers)]
+        for t in self._threads:
+            t.start()
+
+    def add_queue(self, name, weight=1, slo_us=None):
+        if weight < 1:
+            raise ValueError(f"Queue '{name}' needs a weight of at least 1, got {weight}")
+        with self._cond:
+            self.queues[name] = _Queue(name, weight, slo_us)
+        return self.queues[name]
+
+    @property
+    def depth(self):
+        return self._queued
+
+    def submit(self, name, item, cost=None):
+        """Queues `item` for handler(name, item); never blocks. False if the controller shed it."""
+        if self.controller and not self.controller.admit(name):
+            return False
+        q = self.queues.get(name) or self.add_queue(name)
+        cost = BASE_COST + len(item) if cost is None else cost
+        entry = (item, cost, time.perf_counter_ns())
+        with self._cond:
+            q.enqueued += 1
+            self._queued += 1
+            if self.policy == "fifo":
+                self._fifo.append((q,) + entry)
+                q.max_depth = max(q.max_depth, q.enqueued - q.done)
+            else:
+                if not q.items:
+                    self._active.append(q)
+                q.items.append(entry)
+                q.max_depth = max(q.max_depth, len(q.items))
+            self._cond.notify()
+        return True
+
+    def close(self):
+        """Lets the workers drain every queue, then stops them."""
+        with self._cond:
+            self._closing = True
+            self._cond.notify_all()
+        for t in self._threads:
+            t.join()
+
+    # --- dispatch ---
+    def _next(self):
+        """(queue, item, cost, t_enqueue) or None; called with the lock held."""
+        if self.policy == "fifo":
+            for i, job in enumerate(self._fifo):
+                if not job[0].busy:
+                    del self._fifo[i]
+                    self._queued -= 1
+                    job[0].busy = True
+                    return job
+            return None
+        busy = 0
+        while len(self._active) > busy:
+            q = self._active[0]
+            if q.busy:
+                # Its turn waits until the worker holding it is done
+                self._active.rotate(-1)
+                busy += 1
+                continue
+            busy = 0
+            if not q.topped_up:
+                q.deficit += self.quantum * q.weight
+                q.topped_up = True
+            item, cost, t_enqueue = q.items[0]
+            if cost <= q.deficit:
+                q.items.popleft()
+                q.deficit -= cost
+                if not q.items:
+                    # An idle queue does not bank credit for its next burst
+                    q.deficit = 0
+                    q.topped_up = False
+                    self._active.popleft()
+                self._queued -= 1
+                q.busy = True
+                return q, item, cost, t_enqueue
+            # Round over for this queue; keep its remaining deficit
+            q.topped_up = False
+            self._active.rotate(-1)
+        return None
+
+    def _worker(self):
+        while True:
+            with self._cond:
+                job = self._next()
+                while job is None:
+                    if self._closing and not self._queued:
+                        return
+                    self._cond.wait()
+                    job = self._next()
+            q, item, _, t_enqueue = job
+            t_start = time.perf_counter_ns()
+            try:
+                self.handler(q.name, item)
+            except Exception as e:
+                print(f"Handler error on '{q.name}': {e}")
+            t_done = time.perf_counter_ns()
+            latency_us = (t_done - t_enqueue) / 1000
+            with self._cond:
+                q.busy = False
+                if self._queued or self._closing:
+                    self._cond.notify_all()  # its next item may be waiting for it
+                q.done += 1
+                q.wait_us.record((t_start - t_enqueue) / 1000)
+                q.latency_us.record(latency_us)
+                if q.slo_us and latency_us > q.slo_us:
+                    q.slo_misses += 1
+                if self.controller:
+                    self.controller.observe(self._queued, latency_us)
+
+    # --- reporting ---
+    def summary(self):
+        with self._cond:
+            return [q.summary() for q in self.queues.values()]
+
+    def snapshot(self):
+        """Raw counters and histograms per queue, for merging across processes."""
+        with self._cond:
+            return [q.to_dict() for q in self.queues.values()]
+
+    def report(self, title=None):
+        rows = self.summary()
+        print(f"--- {title or f'Scheduler ({self.policy})'} ---")
+        print(f"{'Queue':<8} {'W':>2} {'Done':>7} {'Depth':>6} {'wait p50':>9} {'wait p99':>9} "
+              f"{'lat p50':>9} {'lat p99':>9} {'SLO us':>8} {'miss %':>7}")
+        for r in rows:
+            print(f"{r['Queue']:<8} {r['Weight']:>2} {r['Done']:>7} {r['Max_Depth']:>6} {r['Wait_P50_uS']:>9} "
+                  f"{r['Wait_P99_uS']:>9} {r['Latency_P50_uS']:>9} {r['Latency_P99_uS']:>9} "
+                  f"{str(r['SLO_uS']):>8} {r['SLO_Miss_Pct']:>7}")
+
+
+def parse_queue_spec(spec):
+    """'therm:1:2000' -> ('therm', weight 1, slo_us 2000); weight and SLO are optional."""
+    parts = spec.split(":")
+    name = parts[0]
+    weight = int(parts[1]) if len(parts) > 1 and parts[1] else 1
+    slo_us = float(parts[2]) if len(parts) > 2 and parts[2] else None
+    if weight < 1:
+        raise ValueError(f"Queue '{name}' needs a weight of at least 1, got {weight}")
+    return name, weight, slo_us
@@ -0,0 +1,253 @@
+"""
+Integrity schemes behind one interface, selected by name.
+
+Payloads are framed by iotbench.codec ([Header][Data][Tag][Key]). With
+legacy=True (or --legacy-footer) a scheme writes the original footer-only
+layout instead, which is also what the ESP32 firmware still sends:
+
+    ed25519     [Data][Sig(64)][Pub(32)][Time(4)]    (esp_sign.ino, pi3sign, Pi5)
+    ed25519ph   [Data][Sig(64)][Pub(32)][Time(4)]    signature over SHA-512(Data)
+    hmac-sha256 [Data][Tag(32)][Time(4)]             shared secret
+    blake2b     [Data][Tag(32)][Time(4)]             keyed BLAKE2b-256, shared secret
+    cid         [Data][CID][CID_LEN(2)][Time(4)]     IPFS CIDv1, no key
+
+decode() accepts both layouts.
+
+    scheme = get_scheme("hmac-sha256", secret=key)
+    payload = scheme.encode(msg_bytes)
+    data, tag, pub, sign_time_us = scheme.decode(payload)
+    scheme.verify(data, tag, pub)
+"""
+import hashlib
+import hmac
+import time
+
+from nacl.exceptions import BadSignatureError
+from nacl.signing import SigningKey, VerifyKey
+
+from iotbench import codec
+from iotbench.cid import ipfs_only_hash
+from iotbench.codec import CodecError
+
+# Benchmark-only default for the symmetric schemes; pass --secret-hex in real use
+DEV_SECRET = b"iot-integrity-benchmark-dev-key!"
+
+
+class IntegrityScheme:
+    """
+    Base class. Subclasses set the sizes and implement tag() and verify();
+    encode()/decode() go through iotbench.codec.
+    """
+
+    name = ""
+    tag_size = 0   # bytes of signature/MAC, 0 if variable (CID)
+    key_size = 0   # bytes of public key carried in the payload
+    legacy = False  # write the pre-codec footer layout
+
+    @property
+    def scheme_id(self):
+        return codec.SCHEME_IDS[self.name]
+
+    def tag(self, data):
+        raise NotImplementedError
+
+    def prepare(self, key=b""):
+        """Decodes per-message key material once (Ed25519 builds a VerifyKey)."""
+        return key
+
+    def verify_prepared(self, prepared, data, tag):
+        """True if `tag` is valid for `data`; never raises on a bad tag."""
+        raise NotImplementedError
+
+    def verify(self, data, tag, key=b""):
+        return self.verify_prepared(self.prepare(key), data, tag)
+
+    def footer_size(self, tag=b""):
+        """Bytes added on top of the data."""
+        if self.legacy:
+            return len(tag) + self.key_size + codec.TIME.size
+        return codec.HEADER_SIZE + len(tag) + self.key_size
+
+    def key_bytes(self):
+        """Public material appended after the tag (Ed25519 public key)."""
+        return b""
+
+    def timed_tag(self, data):
+        """tag() plus its duration in whole microseconds, as the devices report it."""
+        start_time = time.perf_counter()
+        tag = self.tag(data)
+        return tag, int((time.perf_counter() - start_time) * 1_000_000)
+
+    def encode(self, data, tag=None, sign_time_us=None, flags=0):
+        if tag is None:
+            tag, sign_time_us = self.timed_tag(data)
+        if self.legacy:
+            if flags:
+                raise ValueError("The legacy footer layout cannot carry frame flags.")
+            return codec.encode_legacy(data, tag, self.key_bytes(), sign_time_us or 0)
+        return codec.encode(self.scheme_id, data, tag, self.key_bytes(), sign_time_us or 0, flags)
+
+    def decode_legacy(self, payload):
+        return codec.decode_legacy(payload, self.scheme_id, self.tag_size, self.key_size)
+
+    def decode_frame(self, payload):
+        """Framed or legacy payload -> codec.Frame. Raises CodecError if malformed."""
+        if not codec.is_framed(payload):
+            return self.decode_legacy(payload)
+        frame = codec.decode(payload)
+        if frame.scheme_id != self.scheme_id:
+            sent = codec.SCHEME_NAMES.get(frame.scheme_id, frame.scheme_id)
+            raise CodecError(f"Frame uses scheme {sent}, verifier expects {self.name}.")
+        if (self.tag_size and len(frame.tag) != self.tag_size) or len(frame.key) != self.key_size:
+            raise CodecError(f"Tag/key lengths {len(frame.tag)}/{len(frame.key)} do not fit {self.name}.")
+        return frame
+
+    def decode(self, payload):
+        """Returns (data, tag, key, sign_time_us) as memoryviews into payload."""
+        frame = self.decode_frame(payload)
+        return frame.data, frame.tag, frame.key, frame.sign_time_us
+
+
+class Ed25519Scheme(IntegrityScheme):
+    name = "ed25519"
+    tag_size = 64
+    key_size = 32
+
+    def __init__(self, signing_key=None, **_):
+        self.signing_key = signing_key
+        self._pub = signing_key.verify_key.encode() if signing_key else b""
+
+    def key_bytes(self):
+        return self._pub
+
+    def tag(self, data):
+        return self.signing_key.sign(bytes(data)).signature
+
+    def prepare(self, key=b""):
+        return VerifyKey(bytes(key or self._pub))
+
+    def verify_prepared(self, prepared, data, tag):
+        try:
+            prepared.verify(bytes(data), bytes(tag))
+            return True
+        except BadSignatureError:
+            return False
+
+
+class Ed25519phScheme(Ed25519Scheme):
+    """
+    Hash-then-sign: Ed25519 over SHA-512(data). Lets a producer hash a long
+    message incrementally (hasher()/tag_digest()) before a single signature.
+    PyNaCl does not expose RFC 8032 Ed25519ph's dom2 prefix, so tags are not
+    interoperable with other Ed25519ph implementations.
+    """
+
+    name = "ed25519ph"
+
+    @staticmethod
+    def hasher():
+        return hashlib.sha512()
+
+    def tag_digest(self, digest):
+        return self.signing_key.sign(digest).signature
+
+    def tag(self, data):
+        return self.tag_digest(hashlib.sha512(data).digest())
+
+    def verify_prepared(self, prepared, data, tag):
+        return super().verify_prepared(prepared, hashlib.sha512(data).digest(), tag)
+
+
+class HmacSha256Scheme(IntegrityScheme):
+    name = "hmac-sha256"
+    tag_size = 32
+
+    def __init__(self, secret=DEV_SECRET, **_):
+        self.secret = secret
+
+    def tag(self, data):
+        return hmac.digest(self.secret, data, "sha256")
+
+    def verify_prepared(self, prepared, data, tag):
+        return hmac.compare_digest(self.tag(data), bytes(tag))
+
+
+class Blake2bScheme(IntegrityScheme):
+    name = "blake2b"
+    tag_size = 32
+
+    def __init__(self, secret=DEV_SECRET, **_):
+        self.secret = secret
+
+    def tag(self, data):
+        return hashlib.blake2b(data, digest_size=self.tag_size, key=self.secret).digest()
+
+    def verify_prepared(self, prepared, data, tag):
+        return hmac.compare_digest(self.tag(data), bytes(tag))
+
+
+class CidScheme(IntegrityScheme):
+    """IPFS CIDv1 (raw leaves). Uses kubo when ipfs_exe is set, else in-process."""
+
+    name = "cid"
+
+    def __init__(self, ipfs_exe=None, **_):
+        self.ipfs_exe = ipfs_exe
+
+    def tag(self, data):
+        return ipfs_only_hash(bytes(data), self.ipfs_exe).encode("utf-8")
+
+    def verify_prepared(self, prepared, data, tag):
+        computed_cid = self.tag(data)
+        return bool(computed_cid) and computed_cid == bytes(tag)
+
+    def footer_size(self, tag=b""):
+        if self.legacy:
+            return len(tag) + codec.CID_TRAILER.size
+        return codec.HEADER_SIZE + len(tag)
+
+    def encode(self, data, tag=None, sign_time_us=None, flags=0):
+        if tag is None:
+            tag, sign_time_us = self.timed_tag(data)
+        if self.legacy:
+            if flags:
+                raise ValueError("The legacy footer layout cannot carry frame flags.")
+            return codec.encode_legacy(data, tag, sign_time_us=sign_time_us or 0, cid=True)
+        return codec.encode(self.scheme_id, data, tag, b"", sign_time_us or 0, flags)
+
+    def decode_legacy(self, payload):
+        return codec.decode_legacy_cid(payload, self.scheme_id)
+
+
+SCHEMES = {cls.name: cls for cls in (Ed25519Scheme, Ed25519phScheme, HmacSha256Scheme, Blake2bScheme, CidScheme)}
+
+
+def get_scheme(name, signing_key=None, secret=None, ipfs_exe=None, generate=False, legacy=False):
+    """
+    Builds a scheme by name. Producers pass generate=True (or a signing_key)
+    for the Ed25519 variants; verifiers need only the name and, for the
+    symmetric schemes, the shared secret.
+    """
+    try:
+        cls = SCHEMES[name]
+    except KeyError:
+        raise ValueError(f"Unknown scheme '{name}' (choose from {', '.join(SCHEMES)})")
+    if issubclass(cls, Ed25519Scheme) and signing_key is None and generate:
+        signing_key = SigningKey.generate()
+    scheme = cls(signing_key=signing_key, secret=secret or DEV_SECRET, ipfs_exe=ipfs_exe)
+    scheme.legacy = legacy
+    return scheme
+
+
+def add_scheme_args(parser, default="ed25519"):
+    """Common --scheme/--secret-hex/--legacy-footer options for producers and verifiers."""
+    parser.add_argument("--scheme", choices=sorted(SCHEMES), default=default, help="integrity scheme")
+    parser.add_argument("--secret-hex", default=None, help="shared key for hmac-sha256/blake2b (hex)")
+    parser.add_argument("--legacy-footer", action="store_true",
+                        help="send the pre-codec footer layout (verifiers accept both regardless)")
+
+
+def scheme_from_args(args, generate=False, ipfs_exe=None, signing_key=None):
+    secret = bytes.fromhex(args.secret_hex) if args.secret_hex else None
+    return get_scheme(args.scheme, signing_key=signing_key, secret=secret, ipfs_exe=ipfs_exe, generate=generate,
+                      legacy=args.legacy_footer)
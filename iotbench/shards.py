@@ -0,0 +1,434 @@
+"""
+Several mixed_broker verifiers sharing the load, and one summary from them.
+
+    python -m iotbench.mixed_broker --shard 0/3 --out-dir run/shard-0   # ... one per shard
+    python -m iotbench.shards merge run/shard-*                          # -> run/cluster_*.csv
+    python -m iotbench.shards test --shards 3 --cameras 4 --duration 10
+
+Each shard is one mixed_broker process (`--shard I/N`, on any host that can
+reach the broker) and --shard-mode says how a topic's messages are split:
+
+  * shared: subscribe to $share/<group>/<topic> (MQTT v5 shared
+    subscription). The broker hands every message to one member of the
+    group, so the shards share the load without seeing each other's
+    traffic, but consecutive messages of one device land on different
+    shards. Fine for therm and light, where each message stands alone.
+  * hash: every shard subscribes to the plain topic and keeps only the
+    devices a consistent-hash ring assigns to it, by signer key (by topic
+    for shared-key schemes, which carry none). A device's messages all reach
+    one shard in publish order, which is what reassembling its video needs.
+    The price is that each shard receives, and discards at the cost of a
+    header parse, the other shards' traffic. Adding a shard moves only about
+    1/N of the devices.
+  * auto (default): shared for therm and light, hash for cam.
+
+Each shard writes shard.json next to its usual CSVs: counters and verify /
+sign / queue-latency histograms per topic, plus the devices it saw and how
+many of their sequence numbers (--sequence producers, Pi5 frames) arrived
+out of order. `merge` adds the histograms up, so cluster percentiles are
+computed from the raw buckets rather than averaged from per-shard
+percentiles. It flags any hashed device that showed up on more than one
+shard.
+"""
+import argparse
+import bisect
+import csv
+import glob
+import hashlib
+import json
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+
+from iotbench.codec import FLAG_FRAME_META, CodecError, split_frame_meta
+from iotbench.histogram import Histogram
+from iotbench.testbroker import KINDS as BROKER_KINDS, broker_reachable, start_broker
+
+MODES = ("auto", "shared", "hash")
+ORDERED_TOPICS = {"cam"}  # hashed in auto mode
+VNODES = 64               # ring points per shard
+SHARD_FILE = "shard.json"
+CLUSTER_FIELDS = ["Topic", "Shards", "Messages", "Failures", "Malformed", "Unverified", "Replays", "MB_Received",
+                  "Verify_P50_uS", "Verify_P99_uS", "Latency_P50_uS", "Latency_P99_uS", "SLO_Miss_Pct"]
+SHARD_FIELDS = ["Shard", "Topic", "Messages", "Share_Pct", "Skipped", "Devices", "Verify_P99_uS", "Latency_P99_uS"]
+
+
+def _point(data):
+    return int.from_bytes(hashlib.blake2b(data, digest_size=8).digest(), "big")
+
+
+class HashRing:
+    """Consistent hashing of device ids onto shards 0..n-1."""
+
+    def __init__(self, shards, vnodes=VNODES):
+        points = sorted((_point(f"shard-{s}-{v}".encode()), s) for s in range(shards) for v in range(vnodes))
+        self._points = [p for p, _ in points]
+        self._shards = [s for _, s in points]
+
+    def shard_for(self, device_id):
+        i = bisect.bisect(self._points, _point(device_id)) % len(self._points)
+        return self._shards[i]
+
+
+class Shard:
+    """Subscription filters and the per-message keep/skip decision for one shard."""
+
+    def __init__(self, index, count, mode="auto", group="verifiers", scheme=None):
+        if not 0 <= index < count:
+            raise ValueError(f"Shard {index} is outside 0..{count - 1}")
+        if mode not in MODES:
+            raise ValueError(f"Unknown shard mode {mode!r}")
+        self.index = index
+        self.count = count
+        self.mode = mode
+        self.group = group
+        self.scheme = scheme
+        self.ring = HashRing(count)
+        self.kept = {}      # topic -> messages kept
+        self.skipped = {}   # topic -> messages left to other shards
+        self.devices = {}   # device id hex -> {"topic", "messages", "reordered", "last_seq"}
+        self._owner = {}    # device id -> shard, so the ring is walked once per device
+
+    def hashed(self, topic):
+        return self.mode == "hash" or (self.mode == "auto" and topic in ORDERED_TOPICS)
+
+    def subscription(self, topic):
+        if self.count > 1 and not self.hashed(topic):
+            return f"$share/{self.group}/{topic}"
+        return topic
+
+    def admit(self, topic, payload):
+        """True if this shard verifies the message; call from on_message, in arrival order."""
+        try:
+            frame = self.scheme.decode_frame(payload)
+        except CodecError:
+            frame = None  # counted as malformed by whichever shard takes it
+        device = bytes(frame.key) if frame is not None and len(frame.key) else topic.encode()
+        if self.hashed(topic):
+            owner = self._owner.get(device)
+            if owner is None:
+                owner = self._owner[device] = self.ring.shard_for(device)
+            if owner != self.index:
+                self.skipped[topic] = self.skipped.get(topic, 0) + 1
+                return False
+        self.kept[topic] = self.kept.get(topic, 0) + 1
+        dev = self.devices.get(device.hex())
+        if dev is None:
+            dev = self.devices[device.hex()] = {"topic": topic, "messages": 0, "reordered": 0, "last_seq": None}
+        dev["messages"] += 1
+        if frame is not None and frame.flags & FLAG_FRAME_META:
+            _, seq, _ = split_frame_meta(frame)
+            if dev["last_seq"] is not None and seq <= dev["last_seq"]:
+                dev["reordered"] += 1
+            dev["last_seq"] = seq
+        return True
+
+    def to_dict(self, metrics, sched, videos=()):
+        """Everything `merge` needs from this shard; `metrics` is topic -> TopicMetrics."""
+        return {
+            "shard": self.index,
+            "shards": self.count,
+            "mode": self.mode,
+            "group": self.group,
+            "hashed": sorted(t for t in metrics if self.hashed(t)),
+            "kept": self.kept,
+            "skipped": self.skipped,
+            "devices": {k: {f: v for f, v in d.items() if f != "last_seq"} for k, d in self.devices.items()},
+            "metrics": [tm.snapshot() for tm in metrics.values()],
+            "queues": sched.snapshot(),
+            "videos": list(videos),
+        }
+
+    def write(self, out_dir, metrics, sched, videos=()):
+        path = os.path.join(out_dir, SHARD_FILE)
+        with open(path, "w") as f:
+            json.dump(self.to_dict(metrics, sched, videos), f)
+        return path
+
+
+def parse_shard_spec(spec):
+    """'2/4' -> (2, 4)."""
+    index, _, count = spec.partition("/")
+    return int(index), int(count or 1)
+
+
+def add_shard_args(parser):
+    parser.add_argument("--shard", default=None, metavar="I/N", help="run as shard I of N (see iotbench.shards)")
+    parser.add_argument("--shard-mode", choices=MODES, default="auto",
+                        help="shared subscriptions, consistent hashing by device, or hash only cam (auto)")
+    parser.add_argument("--shard-group", default="verifiers", help="shared-subscription group name")
+
+
+def shard_from_args(args, scheme):
+    if not args.shard:
+        return None
+    index, count = parse_shard_spec(args.shard)
+    return Shard(index, count, args.shard_mode, args.shard_group, scheme)
+
+
+# --- MERGE ---
+def load_shards(paths):
+    """shard.json contents from shard directories (or the files themselves), ordered by shard index."""
+    shards = []
+    for path in paths:
+        if os.path.isdir(path):
+            path = os.path.join(path, SHARD_FILE)
+        with open(path) as f:
+            shards.append(json.load(f))
+    return sorted(shards, key=lambda s: s["shard"])
+
+
+def merge(shards):
+    """(per-topic rows, per-shard rows, problems) for a list of shard.json dicts."""
+    topics, rows_by_shard, problems = {}, [], []
+    owners = {}  # device -> shards it was verified on
+    counts = {s["shards"] for s in shards}
+    if len(counts) > 1:
+        problems.append(f"shards disagree on the shard count: {sorted(counts)}")
+    seen = [s["shard"] for s in shards]
+    missing = sorted(set(range(max(counts))) - set(seen))
+    if missing or len(seen) != len(set(seen)):
+        problems.append(f"shard files cover {seen}, expected each of 0..{max(counts) - 1} once")
+    for s in shards:
+        queues = {q["name"]: q for q in s["queues"]}
+        for m in s["metrics"]:
+            topic = m["topic"]
+            t = topics.setdefault(topic, {"shards": 0, "messages": 0, "failures": 0, "malformed": 0,
+                                          "unverified": 0, "replays": 0, "bytes_received": 0, "done": 0,
+                                          "slo_misses": 0, "slo_us": None, "verify": Histogram(),
+                                          "latency": Histogram()})
+            verify = Histogram.from_dict(m["verify_us"])
+            q = queues.get(topic)
+            latency = Histogram.from_dict(q["latency_us"]) if q else Histogram()
+            if m["messages"] or m["malformed"] or m["unverified"]:
+                t["shards"] += 1
+            for key in ("messages", "failures", "malformed", "unverified", "replays", "bytes_received"):
+                t[key] += m[key]
+            t["verify"].merge(verify)
+            t["latency"].merge(latency)
+            if q:
+                t["done"] += q["done"]
+                t["slo_misses"] += q["slo_misses"]
+                t["slo_us"] = q["slo_us"]
+            rows_by_shard.append({"shard": s["shard"], "topic": topic, "messages": m["messages"],
+                                  "skipped": s["skipped"].get(topic, 0),
+                                  "devices": sum(d["topic"] == topic for d in s["devices"].values()),
+                                  "verify_p99": verify.percentile(0.99), "latency_p99": latency.percentile(0.99)})
+        for device, d in s["devices"].items():
+            owners.setdefault((d["topic"], device), []).append(s["shard"])
+            if d["reordered"]:
+                problems.append(f"{d['topic']} device {device[:16]} had {d['reordered']} out-of-order "
+                                f"sequence numbers on shard {s['shard']}")
+    hashed = set().union(*(s["hashed"] for s in shards)) if shards else set()
+    for (topic, device), on in sorted(owners.items()):
+        if topic in hashed and len(on) > 1:
+            problems.append(f"{topic} device {device[:16]} was verified on shards {on}")
+
+    topic_rows = []
+    for topic, t in topics.items():
+        topic_rows.append({
+            "Topic": topic,
+            "Shards": t["shards"],
+            "Messages": t["messages"],
+            "Failures": t["failures"],
+            "Malformed": t["malformed"],
+            "Unverified": t["unverified"],
+            "Replays": t["replays"],
+            "MB_Received": f"{t['bytes_received'] / 1e6:.2f}",
+            "Verify_P50_uS": f"{t['verify'].percentile(0.50):.1f}",
+            "Verify_P99_uS": f"{t['verify'].percentile(0.99):.1f}",
+            "Latency_P50_uS": f"{t['latency'].percentile(0.50):.1f}",
+            "Latency_P99_uS": f"{t['latency'].percentile(0.99):.1f}",
+            "SLO_Miss_Pct": f"{100 * t['slo_misses'] / t['done']:.2f}" if t["slo_us"] and t["done"] else "",
+        })
+    totals = {t: v["messages"] for t, v in topics.items()}
+    shard_rows = [{
+        "Shard": r["shard"],
+        "Topic": r["topic"],
+        "Messages": r["messages"],
+        "Share_Pct": f"{100 * r['messages'] / totals[r['topic']]:.1f}" if totals[r["topic"]] else "",
+        "Skipped": r["skipped"],
+        "Devices": r["devices"],
+        "Verify_P99_uS": f"{r['verify_p99']:.1f}",
+        "Latency_P99_uS": f"{r['latency_p99']:.1f}",
+    } for r in rows_by_shard]
+    return topic_rows, shard_rows, problems
+
+
+def write_rows(path, fields, rows):
+    with open(path, "w", newline="") as f:
+        writer = csv.DictWriter(f, fieldnames=fields)
+        writer.writeheader()
+        writer.writerows(rows)
+
+
+def report(topic_rows, shard_rows, problems):
+    print(f"{'Topic':<6} {'Shards':>6} {'Messages':>9} {'Fail':>5} {'Malf':>5} {'Replay':>6} "
+          f"{'verify p50':>11} {'p99':>8} {'latency p50':>12} {'p99':>9}")
+    for r in topic_rows:
+        print(f"{r['Topic']:<6} {r['Shards']:>6} {r['Messages']:>9} {r['Failures']:>5} {r['Malformed']:>5} "
+              f"{r['Replays']:>6} {r['Verify_P50_uS']:>11} {r['Verify_P99_uS']:>8} {r['Latency_P50_uS']:>12} "
+              f"{r['Latency_P99_uS']:>9}")
+    print(f"{'Shard':>5} {'Topic':<6} {'Messages':>9} {'Share':>6} {'Skipped':>8} {'Devices':>8}")
+    for r in shard_rows:
+        print(f"{r['Shard']:>5} {r['Topic']:<6} {r['Messages']:>9} {r['Share_Pct']:>5}% {r['Skipped']:>8} "
+              f"{r['Devices']:>8}")
+    for p in problems:
+        print(f"WARNING: {p}")
+
+
+def merge_main(args):
+    paths = [p for pattern in args.dirs for p in sorted(glob.glob(pattern))]
+    if not paths:
+        raise SystemExit("No shard directories found.")
+    topic_rows, shard_rows, problems = merge(load_shards(paths))
+    out_dir = args.out or os.path.dirname(os.path.abspath(paths[0].rstrip("/")))
+    write_rows(os.path.join(out_dir, "cluster_summary.csv"), CLUSTER_FIELDS, topic_rows)
+    write_rows(os.path.join(out_dir, "cluster_shards.csv"), SHARD_FIELDS, shard_rows)
+    report(topic_rows, shard_rows, problems)
+    print(f"Summary: {os.path.join(out_dir, 'cluster_summary.csv')}")
+    return topic_rows, problems
+
+
+# --- TEST ---
+def ring_check(shards, devices=10_000):
+    """Balance of the ring and how many devices move when one shard is added."""
+    ring, grown = HashRing(shards), HashRing(shards + 1)
+    ids = [f"device-{i}".encode() for i in range(devices)]
+    owners = [ring.shard_for(d) for d in ids]
+    loads = [owners.count(s) for s in range(shards)]
+    moved = sum(ring.shard_for(d) != grown.shard_for(d) for d in ids)
+    print(f"Ring: {devices} devices on {shards} shards, {min(loads)}..{max(loads)} each "
+          f"(ideal {devices // shards}); adding shard {shards} moves {100 * moved / devices:.1f}% "
+          f"(ideal {100 / (shards + 1):.1f}%)")
+
+
+def simulate(args, root):
+    """No broker: stand in for shared subscriptions and fan-out in-process, then merge."""
+    from iotbench import codec
+    from iotbench.compression import Decompressor
+    from iotbench.metrics import MetricsRegistry
+    from iotbench.mixed_broker import MixedVerifier, VideoFiles
+    from iotbench.producers import h264_frames, therm_source
+    from iotbench.scheduler import FairScheduler
+    from iotbench.schemes import get_scheme
+
+    verifier_scheme = get_scheme(args.scheme)
+    cameras = [get_scheme(args.scheme, generate=True) for _ in range(args.cameras)]
+    therm = get_scheme(args.scheme, generate=True)
+    video, readings = h264_frames(seed=1), therm_source(seed=1)
+    traffic = []
+    for i in range(args.messages):
+        cam = cameras[i % len(cameras)]
+        data = codec.FRAME_META.pack(i * 1000, i // len(cameras)) + next(video)[0]
+        traffic.append(("cam", cam.encode(data, flags=codec.FLAG_FRAME_META)))
+        traffic.append(("therm", therm.encode(next(readings))))
+    shards = []
+    for index in range(args.shards):
+        out_dir = os.path.join(root, f"shard-{index}")
+        os.makedirs(out_dir)
+        shard = Shard(index, args.shards, args.mode, scheme=verifier_scheme)
+        registry = MetricsRegistry()
+        metrics = {t: registry.topic(t, d) for t, d in (("therm", "esp32"), ("cam", "pi5"))}
+        videos = VideoFiles(out_dir, "sim")
+        sched = FairScheduler(MixedVerifier(verifier_scheme, Decompressor(), metrics, videos))
+        for topic in metrics:
+            sched.add_queue(topic)
+        shards.append((shard, metrics, videos, sched, out_dir))
+    for n, (topic, payload) in enumerate(traffic):
+        if shards[0][0].hashed(topic):
+            for shard, *_, sched, _ in shards:
+                if shard.admit(topic, payload):
+                    sched.submit(topic, payload)
+        else:
+            # Shared subscription: the broker deals each message to one group member
+            shard, *_, sched, _ = shards[n % len(shards)]
+            if shard.admit(topic, payload):
+                sched.submit(topic, payload)
+    for shard, metrics, videos, sched, out_dir in shards:
+        sched.close()
+        videos.close()
+        shard.write(out_dir, metrics, sched, videos.paths)
+
+
+def live(args, root, port):
+    """One mixed_broker per shard and one producer per camera, against a real broker."""
+    py = sys.executable
+    verifiers = []
+    for index in range(args.shards):
+        out_dir = os.path.join(root, f"shard-{index}")
+        cmd = [py, "-m", "iotbench.mixed_broker", "--port", str(port), "--topics", "cam", "therm",
+               "--shard", f"{index}/{args.shards}", "--shard-mode", args.mode, "--scheme", args.scheme,
+               "--duration", str(args.duration + 5), "--out-dir", out_dir]
+        verifiers.append(subprocess.Popen(cmd, stdout=subprocess.DEVNULL))
+    time.sleep(1.5)  # let every shard subscribe before traffic starts
+    producers = [subprocess.Popen([py, "-m", "iotbench.producers", "--device", "pi5", "--port", str(port),
+                                   "--scheme", args.scheme, "--duration", str(args.duration), "--sequence",
+                                   "--seed", str(i)], stdout=subprocess.DEVNULL)
+                 for i in range(args.cameras)]
+    producers.append(subprocess.Popen([py, "-m", "iotbench.producers", "--device", "esp32", "--port", str(port),
+                                       "--scheme", args.scheme, "--duration", str(args.duration)],
+                                      stdout=subprocess.DEVNULL))
+    for p in producers + verifiers:
+        p.wait()
+
+
+def test_main(args):
+    ring_check(args.shards)
+    root = tempfile.mkdtemp(prefix="shards-")
+    local_broker = None
+    try:
+        if args.in_process:
+            simulate(args, root)
+        elif broker_reachable("localhost", args.port):
+            live(args, root, args.port)
+        else:
+            local_broker = start_broker(args.broker_kind)
+            print(f"No MQTT broker on localhost:{args.port}; started a {local_broker.kind} broker "
+                  f"on port {local_broker.port}")
+            live(args, root, local_broker.port)
+        args.dirs, args.out = [os.path.join(root, "shard-*")], root
+        topic_rows, problems = merge_main(args)
+        cam = next((r for r in topic_rows if r["Topic"] == "cam"), None)
+        ok = not problems and cam is not None and int(cam["Messages"]) > 0
+        print("Shard test:", "ok" if ok else "FAILED")
+        return ok
+    finally:
+        if local_broker:
+            local_broker.stop()
+        if args.keep:
+            print(f"Kept {root}")
+        else:
+            shutil.rmtree(root, ignore_errors=True)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Merge sharded verifier output, or test a local cluster.")
+    sub = parser.add_subparsers(dest="command", required=True)
+    m = sub.add_parser("merge", help="combine shard.json files into one run summary")
+    m.add_argument("dirs", nargs="+", help="shard output directories (globs are expanded)")
+    m.add_argument("--out", default=None, help="where cluster_*.csv go (default: the shards' parent)")
+    t = sub.add_parser("test", help="N shards and several cameras against a local broker")
+    t.add_argument("--shards", type=int, default=3)
+    t.add_argument("--cameras", type=int, default=4)
+    t.add_argument("--mode", choices=MODES, default="auto")
+    t.add_argument("--scheme", default="ed25519")
+    t.add_argument("--port", type=int, default=1883)
+    t.add_argument("--duration", type=float, default=10, help="seconds of producer traffic")
+    t.add_argument("--messages", type=int, default=2000, help="cam messages when replaying in-process")
+    t.add_argument("--broker-kind", choices=BROKER_KINDS, default="auto",
+                   help="local broker to start when none listens on --port (iotbench.testbroker)")
+    t.add_argument("--in-process", action="store_true", help="replay the traffic in-process, no broker")
+    t.add_argument("--keep", action="store_true", help="keep the shard directories")
+    args = parser.parse_args()
+    if args.command == "merge":
+        merge_main(args)
+    elif not test_main(args):
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,130 @@
+"""
+Parallel signing with strictly ordered publish, for the Pi5 video producer.
+
+    pool = SigningPool(scheme, lambda payload: client.publish(TOPIC, payload), workers=4)
+    for chunk in chunks:
+        pool.submit(chunk)   # blocks once max_inflight chunks are pending
+    pool.close()             # publishes everything still in flight, in order
+
+Chunks are signed by `workers` threads (PyNaCl and hashlib release the GIL
+while they hash) or, with mode="process", by worker processes. Futures queue
+up in submission order and a single publisher thread waits on the head of
+that queue, so a chunk that finishes early is held until every earlier chunk
+has gone out: the receiver sees the H.264 stream in sequence.
+"""
+import functools
+import queue
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+from nacl.signing import SigningKey
+
+from iotbench.profiling import StageTimer
+from iotbench.schemes import Ed25519Scheme, get_scheme
+
+
+def sign_chunk(scheme, data, flags=0):
+    """(payload, sign_time_us) for one chunk."""
+    tag, sign_time_us = scheme.timed_tag(data)
+    return scheme.encode(data, tag, sign_time_us, flags), sign_time_us
+
+
+# --- PROCESS WORKERS ---
+_worker_scheme = None
+
+
+def scheme_config(scheme):
+    """Picklable recipe for rebuilding `scheme` (same key) in a worker process."""
+    seed = bytes(scheme.signing_key) if isinstance(scheme, Ed25519Scheme) else None
+    return {"name": scheme.name, "seed": seed, "secret": getattr(scheme, "secret", None),
+            "ipfs_exe": getattr(scheme, "ipfs_exe", None), "legacy": scheme.legacy}
+
+
+def _init_worker(config):
+    global _worker_scheme
+    signing_key = SigningKey(config["seed"]) if config["seed"] else None
+    _worker_scheme = get_scheme(config["name"], signing_key=signing_key, secret=config["secret"],
+                                ipfs_exe=config["ipfs_exe"], legacy=config["legacy"])
+
+
+def _sign_in_worker(data, flags=0):
+    return sign_chunk(_worker_scheme, data, flags)
+
+
+# --- POOL ---
+class SigningPool:
+    """
+    Signs on `workers` threads/processes, publishes in submission order.
+    Records "sign" (tag time), "pipeline" (submit -> published) and
+    "publish" stages into `stages` from the publisher thread.
+    """
+
+    def __init__(self, scheme, publish, workers=2, mode="thread", max_inflight=None, stages=None):
+        self.publish = publish
+        self.workers = workers
+        self.mode = mode
+        self.max_inflight = max_inflight or workers * 4
+        self.stages = stages if stages is not None else StageTimer()
+        if mode == "process":
+            self._executor = ProcessPoolExecutor(workers, initializer=_init_worker,
+                                                 initargs=(scheme_config(scheme),))
+            self._sign = _sign_in_worker
+        elif mode == "thread":
+            self._executor = ThreadPoolExecutor(workers, thread_name_prefix="signer")
+            self._sign = functools.partial(sign_chunk, scheme)
+        else:
+            raise ValueError(f"Unknown signing pool mode '{mode}' (thread or process)")
+        self._pending = queue.Queue(self.max_inflight)
+        self.published = 0
+        self.bytes_published = 0
+        self.errors = 0
+        self._publisher = threading.Thread(target=self._drain, name="publisher", daemon=True)
+        self._publisher.start()
+
+    @property
+    def in_flight(self):
+        return self._pending.qsize()
+
+    def submit(self, data, flags=0):
+        submitted = time.perf_counter_ns()
+        future = self._executor.submit(self._sign, data, flags)
+        self._pending.put((submitted, future))  # backpressure on the reader
+
+    def _drain(self):
+        record = self.stages.record
+        while True:
+            item = self._pending.get()
+            if item is None:
+                return
+            submitted, future = item
+            try:
+                payload, sign_time_us = future.result()
+            except Exception as e:
+                self.errors += 1
+                print(f"Signer Error: {e}")
+                continue
+            p_start = time.perf_counter_ns()
+            try:
+                self.publish(payload)
+            except Exception as e:
+                # Keep draining: a dead publisher would block submit() forever
+                self.errors += 1
+                print(f"Publish Error: {e}")
+                continue
+            done = time.perf_counter_ns()
+            self.published += 1
+            self.bytes_published += len(payload)
+            record("sign", sign_time_us)
+            record("publish", (done - p_start) / 1000)
+            record("pipeline", (done - submitted) / 1000)
+
+    def close(self):
+        self._pending.put(None)
+        self._publisher.join()
+        self._executor.shutdown()
+
+
+def add_pool_args(parser):
+    parser.add_argument("--sign-workers", type=int, default=1, help="parallel signers (Pi5 has 4 cores)")
+    parser.add_argument("--sign-mode", choices=["thread", "process"], default="thread")
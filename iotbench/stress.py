@@ -0,0 +1,47 @@
+"""
+stress-ng wrapper shared by the producers and the benchmark orchestrator.
+"""
+import os
+import shutil
+import signal
+import subprocess
+
+
+def stress_ng_available():
+    return shutil.which("stress-ng") is not None
+
+
+def start_stress_test(cpu_load=50, workers=None):
+    """Starts stress-ng in the background to simulate heavy system load."""
+    workers = workers or os.cpu_count() or 1
+    print(f"--- STARTING STRESS TEST: {cpu_load}% CPU LOAD ({workers} workers) ---")
+    stress_command = [
+        "stress-ng",
+        "--cpu", str(workers),
+        "--cpu-load", str(cpu_load),
+        "--quiet"
+    ]
+    # Use os.setsid to ensure we can kill the entire process group later
+    return subprocess.Popen(stress_command, preexec_fn=os.setsid)
+
+
+def stop_stress_test(stress_process, timeout=5):
+    """Cleanly terminates a stress-ng process group started above."""
+    if not stress_process:
+        return
+    print("--- STOPPING STRESS TEST ---")
+    try:
+        os.killpg(os.getpgid(stress_process.pid), signal.SIGTERM)
+        stress_process.wait(timeout=timeout)
+    except ProcessLookupError:
+        pass
+    except subprocess.TimeoutExpired:
+        os.killpg(os.getpgid(stress_process.pid), signal.SIGKILL)
+        stress_process.wait()
+
+
+def stress_ng_version():
+    if not stress_ng_available():
+        return ""
+    result = subprocess.run(["stress-ng", "--version"], stdout=subprocess.PIPE, stderr=subprocess.STDOUT)
+    return result.stdout.decode("utf-8", errors="ignore").strip()
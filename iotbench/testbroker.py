@@ -0,0 +1,365 @@
+"""
+A throwaway local MQTT broker for tests and benchmarks: Mosquitto when it is
+installed, otherwise a small pure-Python broker, on an ephemeral port.
+
+    with start_broker() as broker:          # kind="auto" | "mosquitto" | "python" | "thread"
+        run_producer(port=broker.port)
+
+    python -m iotbench.testbroker [--port 1883]   # the Python broker on its own
+
+The Python broker speaks enough of MQTT 3.1.1 and 5 for this project's
+clients: CONNECT, PUBLISH at QoS 0/1/2 (delivered at no more than QoS 1),
+SUBSCRIBE/UNSUBSCRIBE with + and # wildcards, MQTT 5 shared subscriptions
+($share/<group>/<filter>, dealt round-robin as Mosquitto does), PINGREQ and
+DISCONNECT. There is no retained state, no wills, no persistence and no
+auth. A subscriber that stops reading loses QoS 0 messages once
+MAX_BUFFERED bytes are queued for it, like Mosquitto's queue limit.
+
+"python" runs the broker in a child process so it does not share the GIL
+with the code being measured; "thread" runs it on a background thread of
+the caller, which is cheaper to start but competes with it for the CPU.
+"""
+import argparse
+import asyncio
+import itertools
+import os
+import shutil
+import signal
+import socket
+import subprocess
+import sys
+import threading
+import time
+
+MAX_BUFFERED = 16 << 20  # bytes queued for one subscriber before QoS 0 messages are dropped
+KINDS = ("auto", "mosquitto", "python", "thread")
+
+CONNECT, CONNACK, PUBLISH, PUBACK, PUBREC, PUBREL, PUBCOMP = 1, 2, 3, 4, 5, 6, 7
+SUBSCRIBE, SUBACK, UNSUBSCRIBE, UNSUBACK, PINGREQ, PINGRESP, DISCONNECT = 8, 9, 10, 11, 12, 13, 14
+
+
+# --- WIRE FORMAT ---
+def _varint(n):
+    out = bytearray()
+    while True:
+        byte, n = n & 0x7F, n >> 7
+        out.append(byte | (0x80 if n else 0))
+        if not n:
+            return bytes(out)
+
+
+def _packet(kind, body, flags=0):
+    return bytes([kind << 4 | flags]) + _varint(len(body)) + body
+
+
+def _string(buf, i):
+    n = int.from_bytes(buf[i:i + 2], "big")
+    return bytes(buf[i + 2:i + 2 + n]).decode(), i + 2 + n
+
+
+def _skip_properties(buf, i):
+    n = shift = 0
+    while True:
+        byte = buf[i]
+        i += 1
+        n |= (byte & 0x7F) << shift
+        shift += 7
+        if not byte & 0x80:
+            return i + n
+
+
+def topic_matches(pattern, topic):
+    """MQTT filter matching: + is one level, # is the rest (including the parent)."""
+    if pattern == topic:
+        return True
+    p, t = pattern.split("/"), topic.split("/")
+    for i, level in enumerate(p):
+        if level == "#":
+            return not topic.startswith("$")
+        if i >= len(t) or (level != "+" and level != t[i]):
+            return False
+    return len(p) == len(t)
+
+
+# --- PYTHON BROKER ---
+class _Session:
+    def __init__(self, writer, version):
+        self.writer = writer
+        self.version = version
+        self.ids = itertools.cycle(range(1, 65536))
+
+    def send(self, topic, payload, qos, broker):
+        if self.writer.transport.get_write_buffer_size() > MAX_BUFFERED and qos == 0:
+            broker.dropped += 1
+            return
+        body = len(topic).to_bytes(2, "big") + topic
+        if qos:
+            body += next(self.ids).to_bytes(2, "big")
+        if self.version == 5:
+            body += b"\x00"
+        self.writer.write(_packet(PUBLISH, body + payload, qos << 1))
+        broker.delivered += 1
+
+
+class Broker:
+    """The asyncio broker. serve() binds and returns the port; run it on a loop you own."""
+
+    def __init__(self):
+        self.subs = {}     # filter -> {session: qos}
+        self.shared = {}   # (group, filter) -> [[session, qos], ...], next index
+        self.received = self.delivered = self.dropped = self.connections = 0
+        self.server = None
+        self._clients = {}  # handler task -> writer
+
+    async def serve(self, host="127.0.0.1", port=0):
+        self.server = await asyncio.start_server(self._client, host, port)
+        return self.server.sockets[0].getsockname()[1]
+
+    async def close(self):
+        self.server.close()
+        for writer in list(self._clients.values()):
+            writer.close()  # the client's pending read fails and its handler returns
+        await asyncio.gather(*self._clients, return_exceptions=True)
+
+    def publish(self, topic, payload, qos):
+        targets = {}
+        topic_bytes = topic.encode()
+        for pattern, sessions in self.subs.items():
+            if topic_matches(pattern, topic):
+                for session, sub_qos in sessions.items():
+                    targets[session] = max(targets.get(session, 0), sub_qos)
+        for (_, pattern), group in self.shared.items():
+            members = group[0]
+            if members and topic_matches(pattern, topic):
+                session, sub_qos = members[group[1] % len(members)]
+                group[1] += 1
+                targets[session] = max(targets.get(session, 0), sub_qos)
+        for session, sub_qos in targets.items():
+            session.send(topic_bytes, payload, min(qos, sub_qos), self)
+
+    def _subscribe(self, session, pattern, qos):
+        if pattern.startswith("$share/"):
+            _, group, pattern = pattern.split("/", 2)
+            members = self.shared.setdefault((group, pattern), [[], 0])[0]
+            members[:] = [m for m in members if m[0] is not session] + [[session, qos]]
+        else:
+            self.subs.setdefault(pattern, {})[session] = qos
+
+    def _unsubscribe(self, session, pattern):
+        if pattern.startswith("$share/"):
+            _, group, pattern = pattern.split("/", 2)
+            group_state = self.shared.get((group, pattern))
+            if group_state:
+                group_state[0][:] = [m for m in group_state[0] if m[0] is not session]
+        else:
+            self.subs.get(pattern, {}).pop(session, None)
+
+    def _drop(self, session):
+        for sessions in self.subs.values():
+            sessions.pop(session, None)
+        for members, _ in self.shared.values():
+            members[:] = [m for m in members if m[0] is not session]
+
+    async def _read_packet(self, reader):
+        header = (await reader.readexactly(1))[0]
+        length = shift = 0
+        while True:
+            byte = (await reader.readexactly(1))[0]
+            length |= (byte & 0x7F) << shift
+            shift += 7
+            if not byte & 0x80:
+                break
+        return header >> 4, header & 0x0F, await reader.readexactly(length) if length else b""
+
+    async def _client(self, reader, writer):
+        self.connections += 1
+        self._clients[asyncio.current_task()] = writer
+        session = None
+        try:
+            kind, _, body = await self._read_packet(reader)
+            if kind != CONNECT:
+                return
+            _, i = _string(body, 0)
+            version = body[i]
+            session = _Session(writer, version)
+            writer.write(_packet(CONNACK, b"\x00\x00\x00" if version == 5 else b"\x00\x00"))
+            while True:
+                kind, flags, body = await self._read_packet(reader)
+                if kind == PUBLISH:
+                    qos = (flags >> 1) & 3
+                    topic, i = _string(body, 0)
+                    packet_id = body[i:i + 2] if qos else b""
+                    i += len(packet_id)
+                    if version == 5:
+                        i = _skip_properties(body, i)
+                    self.received += 1
+                    self.publish(topic, body[i:], min(qos, 1))
+                    if qos == 1:
+                        writer.write(_packet(PUBACK, packet_id))
+                    elif qos == 2:
+                        writer.write(_packet(PUBREC, packet_id))
+                elif kind == PUBREL:
+                    writer.write(_packet(PUBCOMP, body[:2]))
+                elif kind in (SUBSCRIBE, UNSUBSCRIBE):
+                    packet_id, i = body[:2], 2
+                    if version == 5:
+                        i = _skip_properties(body, i)
+                    codes = bytearray()
+                    while i < len(body):
+                        pattern, i = _string(body, i)
+                        if kind == SUBSCRIBE:
+                            qos = min(body[i] & 3, 1)
+                            i += 1
+                            self._subscribe(session, pattern, qos)
+                            codes.append(qos)
+                        else:
+                            self._unsubscribe(session, pattern)
+                            codes.append(0)
+                    props = b"\x00" if version == 5 else b""
+                    if kind == SUBSCRIBE:
+                        writer.write(_packet(SUBACK, packet_id + props + codes))
+                    else:
+                        writer.write(_packet(UNSUBACK, packet_id + (props + codes if version == 5 else b"")))
+                elif kind == PINGREQ:
+                    writer.write(_packet(PINGRESP, b""))
+                elif kind == DISCONNECT:
+                    return
+                # PUBACK/PUBREC/PUBCOMP from subscribers need no answer: nothing is redelivered
+                if writer.transport.get_write_buffer_size() > MAX_BUFFERED:
+                    await writer.drain()
+        except (asyncio.IncompleteReadError, ConnectionError, IndexError, UnicodeDecodeError):
+            pass
+        finally:
+            if session:
+                self._drop(session)
+            writer.close()
+            self._clients.pop(asyncio.current_task(), None)
+
+    def stats(self):
+        return {"connections": self.connections, "received": self.received, "delivered": self.delivered,
+                "dropped": self.dropped}
+
+
+class _ThreadBroker:
+    """Broker on a daemon thread's event loop."""
+
+    def __init__(self, host, port):
+        self.broker = Broker()
+        self.loop = asyncio.new_event_loop()
+        ready = threading.Event()
+
+        def run():
+            asyncio.set_event_loop(self.loop)
+            self.port = self.loop.run_until_complete(self.broker.serve(host, port))
+            ready.set()
+            self.loop.run_forever()
+
+        self.thread = threading.Thread(target=run, name="testbroker", daemon=True)
+        self.thread.start()
+        ready.wait()
+
+    def stop(self):
+        asyncio.run_coroutine_threadsafe(self.broker.close(), self.loop).result()
+        self.loop.call_soon_threadsafe(self.loop.stop)
+        self.thread.join()
+        self.loop.close()
+
+
+# --- HARNESS ---
+def broker_reachable(host, port, timeout=1.0):
+    try:
+        with socket.create_connection((host, port), timeout=timeout):
+            return True
+    except OSError:
+        return False
+
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+class LocalBroker:
+    """A started broker: .host, .port and .kind; stop() (or leave the with-block) to shut it down."""
+
+    def __init__(self, kind, host, port, proc=None, thread=None):
+        self.kind, self.host, self.port = kind, host, port
+        self._proc, self._thread = proc, thread
+
+    def stats(self):
+        return self._thread.broker.stats() if self._thread else None
+
+    def stop(self):
+        if self._proc:
+            self._proc.terminate()
+            self._proc.wait()
+            self._proc = None
+        if self._thread:
+            self._thread.stop()
+            self._thread = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.stop()
+
+
+def start_broker(kind="auto", port=None, host="127.0.0.1"):
+    """Starts a broker on `port` (an ephemeral one by default); see the module docstring for `kind`."""
+    if kind not in KINDS:
+        raise ValueError(f"Unknown broker kind {kind!r} (choose from {', '.join(KINDS)})")
+    mosquitto = shutil.which("mosquitto")
+    if kind == "mosquitto" and not mosquitto:
+        raise SystemExit("mosquitto not found; install it or use --broker-kind python.")
+    if kind == "auto":
+        kind = "mosquitto" if mosquitto else "python"
+    if kind == "thread":
+        thread = _ThreadBroker(host, port or 0)
+        return LocalBroker(kind, host, thread.port, thread=thread)
+    port = port or free_port()
+    if kind == "mosquitto":
+        cmd = [mosquitto, "-p", str(port)]
+    else:
+        cmd = [sys.executable, "-m", "iotbench.testbroker", "--host", host, "--port", str(port), "--quiet"]
+    proc = subprocess.Popen(cmd, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+                            cwd=os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+    for _ in range(100):
+        if broker_reachable(host, port, timeout=0.2):
+            return LocalBroker(kind, host, port, proc=proc)
+        if proc.poll() is not None:
+            break
+        time.sleep(0.05)
+    proc.terminate()
+    proc.wait()
+    raise SystemExit(f"{kind} broker did not come up on port {port}.")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Minimal MQTT 3.1.1/5 broker for local tests.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=1883, help="0 = pick a free port")
+    parser.add_argument("--quiet", action="store_true")
+    args = parser.parse_args()
+
+    broker = Broker()
+    loop = asyncio.new_event_loop()
+    port = loop.run_until_complete(broker.serve(args.host, args.port))
+    if not args.quiet:
+        print(f"Listening on {args.host}:{port}", flush=True)
+    try:
+        loop.add_signal_handler(signal.SIGTERM, loop.stop)
+    except (NotImplementedError, AttributeError):  # Windows: Ctrl-C only
+        pass
+    try:
+        loop.run_forever()
+    except KeyboardInterrupt:
+        pass
+    loop.run_until_complete(broker.close())
+    if not args.quiet:
+        print(" ".join(f"{k}={v}" for k, v in broker.stats().items()))
+
+
+if __name__ == "__main__":
+    main()
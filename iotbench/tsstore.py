@@ -0,0 +1,448 @@
+"""
+Append-only, segmented time-series store for verified broker payloads.
+
+    store = TimeSeriesStore("store/")
+    writer = store.writer("esp32", "therm")     # starts a background flush thread
+    writer.append(time_us, data, flags)          # hot path: one deque append
+    writer.close()
+
+    cols = store.query("esp32", start_us, end_us)
+    cols["time_us"], cols["seq"], cols["temp"], ...
+
+Layout, one directory per device:
+
+    <root>/<device>/stream.json            kind and LED width
+    <root>/<device>/<first_seq:016d>/       one segment, up to segment_records records
+        time_us.col  seq.col  <field>.col   native-endian arrays, one per column
+        meta.json                           written when the segment is sealed
+
+Decoded fields per kind:
+
+    therm  temp (int16, 0.01 degC), hum (uint16, 0.01 %RH), pres (uint32, Pa),
+           the fixed point of iotbench.therm_batch; ASCII readings are parsed
+    light  r, g, b (uint8 x width LEDs per record), one colour plane per file
+
+Reads mmap each column file. A query binary-searches the time column of the
+segments that overlap the range and returns zero-copy slices: NumPy arrays
+when NumPy is installed, memoryviews otherwise.
+
+time_us is the broker's receive time, kept non-decreasing per device so the
+time column stays sorted; readings of a therm batch are spread back over
+the batch with their dt_ms. seq numbers a device's records from 0 and carries
+on across runs. The active segment has no meta.json; on reopen its columns
+are trimmed to the shortest one, so a crash loses at most the last flush.
+
+    python -m iotbench.tsstore DIR [--device esp32 --start-us .. --end-us ..]
+"""
+import argparse
+import array
+import bisect
+import collections
+import json
+import mmap
+import os
+import threading
+
+from iotbench.codec import FLAG_RECORD_BATCH
+from iotbench.therm_batch import decode_batch
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+SEGMENT_RECORDS = 1 << 20
+FLUSH_RECORDS = 8192
+FLUSH_MS = 200
+
+COMMON = [("time_us", "q"), ("seq", "Q")]
+KINDS = {
+    "therm": [("temp", "h"), ("hum", "H"), ("pres", "I")],
+    "light": [("r", "B"), ("g", "B"), ("b", "B")],
+}
+WIDE = {"light"}  # one value per LED per record
+
+
+def _columns(kind):
+    if kind not in KINDS:
+        raise ValueError(f"Unknown record kind '{kind}' (choose from {', '.join(KINDS)})")
+    return COMMON + KINDS[kind]
+
+
+def _read_json(path):
+    with open(path) as f:
+        return json.load(f)
+
+
+def _write_json(path, obj):
+    tmp = path + ".tmp"
+    with open(tmp, "w") as f:
+        json.dump(obj, f)
+    os.replace(tmp, path)
+
+
+# --- DECODERS (writer thread) ---
+def therm_rows(time_us, data, flags):
+    """[(time_us, temp, hum, pres)] in fixed point for one verified therm payload."""
+    if flags & FLAG_RECORD_BATCH:
+        _, records = decode_batch(data, vectorize=False)
+        last_dt = records[-1][0] if records else 0
+        return [(time_us - (last_dt - dt) * 1000, t, h, p) for dt, t, h, p in records]
+    t, h, p = (float(field.split(b"=")[1]) for field in bytes(data).split(b","))
+    return [(time_us, round(t * 100), round(h * 100), round(p * 100))]
+
+
+def light_rows(time_us, data, flags):
+    """[(time_us, r, g, b)] colour planes of one frame of rpi_ws281x colours (0x00RRGGBB)."""
+    data = bytes(data)
+    if len(data) % 4:
+        raise ValueError(f"LED frame of {len(data)} bytes is not whole uint32 colours")
+    # Little-endian uint32 0x00RRGGBB -> bytes B, G, R, 0
+    return [(time_us, data[2::4], data[1::4], data[0::4])]
+
+
+DECODERS = {"therm": therm_rows, "light": light_rows}
+
+
+# --- WRITER ---
+class StoreWriter:
+    """
+    Appends one device's records. append() only queues the verified payload;
+    a flush thread decodes and writes them every flush_ms (or every
+    FLUSH_RECORDS records), one write() per column per flush.
+    """
+
+    def __init__(self, path, kind, segment_records=SEGMENT_RECORDS, flush_ms=FLUSH_MS):
+        self.path = path
+        self.kind = kind
+        self.columns = _columns(kind)
+        self.segment_records = segment_records
+        self.flush_ms = flush_ms
+        self.decode = DECODERS[kind]
+        self.width = None
+        self.written = 0
+        self.rejected = 0
+        self.errors = 0
+        self._pending = collections.deque()
+        self._wake = threading.Event()
+        self._closing = False
+        self._files = None
+        self._segment = None
+        self._seg_count = 0
+        self._seg_min = self._seg_max = None
+        self._open_stream()
+        self._thread = threading.Thread(target=self._run, name=f"store-{os.path.basename(path)}", daemon=True)
+        self._thread.start()
+
+    @property
+    def backlog(self):
+        return len(self._pending)
+
+    def append(self, time_us, data, flags=0):
+        """Queues one verified payload; decoding and I/O happen on the flush thread."""
+        self._pending.append((time_us, data, flags))
+        if len(self._pending) >= FLUSH_RECORDS:
+            self._wake.set()
+
+    def close(self):
+        """Writes everything still queued and closes the active segment's files (without sealing it)."""
+        self._closing = True
+        self._wake.set()
+        self._thread.join()
+        self._close_files()
+
+    # --- flush thread ---
+    def _run(self):
+        while True:
+            self._wake.wait(self.flush_ms / 1000)
+            self._wake.clear()
+            closing = self._closing
+            while self._pending:
+                items = []
+                while self._pending and len(items) < FLUSH_RECORDS:
+                    items.append(self._pending.popleft())
+                try:
+                    self._write(self._decode(items))
+                except Exception as e:
+                    self.errors += 1
+                    print(f"Store write failed ({len(items)} payloads dropped): {e}")
+            if closing:
+                break
+
+    def _decode(self, items):
+        rows = []
+        for time_us, data, flags in items:
+            try:
+                decoded = self.decode(time_us, data, flags)
+            except Exception:
+                self.rejected += 1
+                continue
+            if self.kind in WIDE:
+                width = len(decoded[0][1])
+                if self.width is None:
+                    self._set_width(width)
+                elif width != self.width:
+                    self.rejected += 1
+                    continue
+            for row in decoded:
+                # Keep the time column sorted: clocks and batch back-dating can step backwards
+                t = max(row[0], self._last_time)
+                self._last_time = t
+                rows.append((t,) + row[1:])
+        return rows
+
+    def _write(self, rows):
+        while rows:
+            if self._files is None or self._seg_count >= self.segment_records:
+                self._roll()
+            n = min(len(rows), self.segment_records - self._seg_count)
+            chunk, rows = rows[:n], rows[n:]
+            self._files["time_us"].write(array.array("q", [r[0] for r in chunk]).tobytes())
+            self._files["seq"].write(array.array("Q", range(self.next_seq, self.next_seq + n)).tobytes())
+            for i, (name, typecode) in enumerate(KINDS[self.kind], start=1):
+                if self.kind in WIDE:
+                    self._files[name].write(b"".join(r[i] for r in chunk))
+                else:
+                    self._files[name].write(array.array(typecode, [r[i] for r in chunk]).tobytes())
+            for f in self._files.values():
+                f.flush()
+            if self._seg_min is None:
+                self._seg_min = chunk[0][0]
+            self._seg_max = chunk[-1][0]
+            self._seg_count += n
+            self.next_seq += n
+            self.written += n
+
+    # --- segments ---
+    def _open_stream(self):
+        os.makedirs(self.path, exist_ok=True)
+        stream_path = os.path.join(self.path, "stream.json")
+        if os.path.exists(stream_path):
+            stream = _read_json(stream_path)
+            if stream["kind"] != self.kind:
+                raise ValueError(f"{self.path} holds '{stream['kind']}' records, not '{self.kind}'")
+            self.width = stream.get("width")
+        else:
+            _write_json(stream_path, {"kind": self.kind, "width": None})
+        self.next_seq = 0
+        self._last_time = -(1 << 63)
+        segments = list_segments(self.path)
+        if not segments:
+            return
+        last = segments[-1]
+        meta_path = os.path.join(last, "meta.json")
+        if os.path.exists(meta_path):
+            meta = _read_json(meta_path)
+            self.next_seq = meta["first_seq"] + meta["count"]
+            self._last_time = meta["max_time_us"]
+            return
+        # Resume the unsealed segment, trimming any partially written flush
+        count = min(os.path.getsize(os.path.join(last, f"{name}.col")) // self._row_size(typecode)
+                    for name, typecode in self.columns)
+        for name, typecode in self.columns:
+            os.truncate(os.path.join(last, f"{name}.col"), count * self._row_size(typecode))
+        self._segment = last
+        self._seg_count = count
+        self.next_seq = int(os.path.basename(last)) + count
+        if count:
+            times = _map_column(os.path.join(last, "time_us.col"), "q")
+            self._seg_min = times[0]
+            self._seg_max = self._last_time = times[count - 1]
+        self._open_files()
+
+    def _row_size(self, typecode):
+        width = (self.width or 1) if self.kind in WIDE and typecode == "B" else 1
+        return array.array(typecode).itemsize * width
+
+    def _set_width(self, width):
+        self.width = width
+        _write_json(os.path.join(self.path, "stream.json"), {"kind": self.kind, "width": width})
+
+    def _roll(self):
+        if self._files is not None:
+            self._close_files()
+            _write_json(os.path.join(self._segment, "meta.json"), {
+                "first_seq": self.next_seq - self._seg_count, "count": self._seg_count,
+                "min_time_us": self._seg_min, "max_time_us": self._seg_max})
+        self._segment = os.path.join(self.path, f"{self.next_seq:016d}")
+        os.makedirs(self._segment)
+        self._seg_count = 0
+        self._seg_min = self._seg_max = None
+        self._open_files()
+
+    def _open_files(self):
+        self._files = {name: open(os.path.join(self._segment, f"{name}.col"), "ab") for name, _ in self.columns}
+
+    def _close_files(self):
+        if self._files:
+            for f in self._files.values():
+                f.close()
+        self._files = None
+
+
+# --- READER ---
+def list_segments(path):
+    return sorted(os.path.join(path, d) for d in os.listdir(path) if d.isdigit())
+
+
+def _map_column(path, typecode):
+    """Read-only mmap of a column as a typed memoryview (empty if the file is)."""
+    size = os.path.getsize(path)
+    if size == 0:
+        return memoryview(b"").cast(typecode)
+    with open(path, "rb") as f:
+        mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+    return memoryview(mm)[:size - size % array.array(typecode).itemsize].cast(typecode)
+
+
+class TimeSeriesStore:
+    """Opens writers and answers range queries for every device under `root`."""
+
+    def __init__(self, root):
+        self.root = root
+        self._maps = {}
+        self._metas = {}
+
+    def writer(self, device, kind, **kwargs):
+        return StoreWriter(os.path.join(self.root, device), kind, **kwargs)
+
+    def devices(self):
+        if not os.path.isdir(self.root):
+            return []
+        return sorted(d for d in os.listdir(self.root) if os.path.exists(os.path.join(self.root, d, "stream.json")))
+
+    def stream(self, device):
+        return _read_json(os.path.join(self.root, device, "stream.json"))
+
+    def scan(self, device, start_us=None, end_us=None):
+        """
+        Yields one dict of zero-copy column slices per segment with records
+        in [start_us, end_us). Light planes come back as (n, width).
+        """
+        stream = self.stream(device)
+        columns = _columns(stream["kind"])
+        width = stream.get("width") or 1
+        for segment in list_segments(os.path.join(self.root, device)):
+            meta_path = os.path.join(segment, "meta.json")
+            if os.path.exists(meta_path):
+                meta = self._meta(meta_path)
+                if (end_us is not None and meta["min_time_us"] >= end_us) or \
+                        (start_us is not None and meta["max_time_us"] < start_us):
+                    continue
+            times = self._column(segment, "time_us", "q")
+            count = len(times)
+            for name, typecode in columns:
+                per_row = width if stream["kind"] in WIDE and typecode == "B" else 1
+                count = min(count, len(self._column(segment, name, typecode)) // per_row)
+            if not count:
+                continue
+            lo = 0 if start_us is None else _search(times, start_us, count)
+            hi = count if end_us is None else _search(times, end_us, count)
+            if lo >= hi:
+                continue
+            out = {}
+            for name, typecode in columns:
+                col = self._column(segment, name, typecode)
+                if stream["kind"] in WIDE and typecode == "B":
+                    out[name] = _rows(col[lo * width:hi * width], width)
+                else:
+                    out[name] = col[lo:hi]
+            yield out
+
+    def query(self, device, start_us=None, end_us=None):
+        """Columns for [start_us, end_us) as one dict; copies only when the range spans segments."""
+        parts = list(self.scan(device, start_us, end_us))
+        if len(parts) == 1:
+            return parts[0]
+        stream = self.stream(device)
+        out = {}
+        for name, typecode in _columns(stream["kind"]):
+            pieces = [p[name] for p in parts]
+            if np is not None:
+                out[name] = np.concatenate(pieces) if pieces else np.empty(0, dtype=typecode)
+            else:
+                joined = b"".join(bytes(p) for p in pieces)
+                out[name] = memoryview(joined).cast(typecode) if not (stream["kind"] in WIDE and typecode == "B") \
+                    else _rows(memoryview(joined), stream.get("width") or 1)
+        return out
+
+    def count(self, device):
+        return sum(len(p["seq"]) for p in self.scan(device))
+
+    def _meta(self, path):
+        if path not in self._metas:
+            self._metas[path] = _read_json(path)
+        return self._metas[path]
+
+    def _column(self, segment, name, typecode):
+        """Cached mmap view; remapped when the (active) segment's file has grown."""
+        path = os.path.join(segment, f"{name}.col")
+        size = os.path.getsize(path)
+        cached = self._maps.get((path, typecode))
+        if cached is None or cached[0] != size:
+            view = _map_column(path, typecode)
+            if np is not None:
+                view = np.frombuffer(view, dtype=typecode) if len(view) else np.empty(0, dtype=typecode)
+            cached = self._maps[(path, typecode)] = (size, view)
+        return cached[1]
+
+
+def _search(times, t, count):
+    if np is not None:
+        return int(np.searchsorted(times[:count], t, side="left"))
+    return bisect.bisect_left(times, t, 0, count)
+
+
+def _rows(flat, width):
+    if np is not None:
+        return flat.reshape(-1, width)
+    return flat.cast("B", [len(flat) // width, width]) if len(flat) else flat
+
+
+# --- STORE ARGS ---
+def add_store_args(parser):
+    parser.add_argument("--store", default=None, help="append verified payloads to the time-series store in DIR")
+    parser.add_argument("--store-segment", type=int, default=SEGMENT_RECORDS, help="records per store segment")
+
+
+def store_from_args(args, device, kind):
+    """StoreWriter for this broker's device, or None without --store."""
+    if not args.store:
+        return None
+    writer = TimeSeriesStore(args.store).writer(device, kind, segment_records=args.store_segment)
+    print(f"Storing verified {kind} records in {writer.path} (next seq {writer.next_seq})")
+    return writer
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Summarize a time-series store or dump a time range.")
+    parser.add_argument("root")
+    parser.add_argument("--device", default=None, help="dump this device's records instead of the summary")
+    parser.add_argument("--start-us", type=int, default=None)
+    parser.add_argument("--end-us", type=int, default=None)
+    parser.add_argument("--limit", type=int, default=20, help="rows to print")
+    args = parser.parse_args()
+
+    store = TimeSeriesStore(args.root)
+    if not args.device:
+        for device in store.devices():
+            stream = store.stream(device)
+            segments = list_segments(os.path.join(args.root, device))
+            print(f"{device:<8} {stream['kind']:<6} {store.count(device):>10} records in {len(segments)} segments")
+        return
+    cols = store.query(args.device, args.start_us, args.end_us)
+    n = len(cols["seq"])
+    names = [name for name, _ in _columns(store.stream(args.device)["kind"])]
+    print(f"{n} records")
+    for i in range(min(n, args.limit)):
+        print("  " + "  ".join(f"{name}={_fmt(cols[name][i])}" for name in names))
+
+
+def _fmt(value):
+    if isinstance(value, int) or (np is not None and np.isscalar(value)):
+        return str(value)
+    return bytes(value).hex()[:12] + "..."
+
+
+if __name__ == "__main__":
+    main()